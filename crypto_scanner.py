@@ -11,6 +11,9 @@ from dotenv import load_dotenv
 from wired_exchange.kucoin import KucoinSpotClient
 from wired_exchange.core.ExchangeClient import ExchangeClient
 from wired_exchange.kucoin.WebSocket import WebSocketMessageHandler, WebSocketNotification
+from wired_exchange.scanner import MarketScanner
+from wired_exchange.backtest import Backtester, ema_crossover
+from wired_exchange.alerts import AlertEngine
 
 from ta.trend import ema_indicator, macd, macd_diff
 from ta.momentum import rsi
@@ -171,7 +174,7 @@ class CryptoScanner(WebSocketMessageHandler):
                         self._logger.warning(f'exporting {price[0]} prices', exc_info=True)
 
 
-async def scenario(kucoin: KucoinClient):
+async def scenario(kucoin: KucoinSpotClient):
     await kucoin.register_ticker_strategy_async(
         RecorderMessageHandler(CryptoScanner(kucoin, ['MNW', 'FTG', 'LINK'],
                                              output_folder='data/crypto_scanner'),
@@ -180,6 +183,19 @@ async def scenario(kucoin: KucoinClient):
     kucoin.stop_reading()
 
 
+async def watch_alerts(kucoin: KucoinSpotClient, profile: str = 'scanner', seconds: int = 60):
+    """alerts over every ticker, fired alerts are saved to the profile storage"""
+    engine = AlertEngine(profile)
+    for currency in ['MNW', 'FTG', 'LINK']:
+        engine.add_alert(f'{currency}-USDT', 'trailing_down', 5)
+        engine.add_alert(f'{currency}-USDT', 'trailing_up', 5)
+    await kucoin.register_ticker_strategy_async(engine)
+    await asyncio.sleep(seconds)
+    kucoin.stop_reading()
+    engine.close()
+    print(pd.DataFrame(engine.fired))
+
+
 def draw_graph():
     plt.figure(figsize=(10, 10))  # Create a figure containing a single axes.
     prices = pd.read_csv('data/LINK-USDT.csv', sep=';')
@@ -196,14 +212,33 @@ def draw_graph():
     plt.show()
 
 
+def market_scan(profile: str = 'scanner', top: int = 20):
+    """screen all USDT pairs at once from cached candles instead of one symbol at a time"""
+    scanner = MarketScanner(profile, resolution=60 * 60, depth=200)
+    with KucoinSpotClient() as kucoin:
+        scanner.refresh(kucoin)
+    ranked = scanner.scan()
+    print(ranked.head(top)[['close', 'rsi', 'macd_diff', 'bb_pband', 'score']])
+    return ranked
+
+
 def backtest():
     BackTester(CryptoScanner(), 'data/ws_messages.txt').start()
 
 
+def backtest_candles(base_currency: str = 'BTC', profile: str = 'scanner'):
+    """run a strategy over cached 1 minute candles, see MarketScanner.refresh to fill the cache"""
+    result = Backtester(profile, resolution=60).run(ema_crossover(50, 200), base_currency, 'USDT')
+    print(result.stats)
+    print(result.trades.tail(20))
+    return result
+
+
 if __name__ == "__main__":
     # draw_graph()
     # backtest()
-    with KucoinClient() as kucoin:
+    # market_scan()
+    with KucoinSpotClient() as kucoin:
         asyncio.run(scenario(kucoin))
 
 logger.info('--------------------- Wired Exchange Ended ---------------------')
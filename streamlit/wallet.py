@@ -1,9 +1,14 @@
 import os
-from dotenv import load_dotenv
+from datetime import timedelta
+
+from dotenv import dotenv_values
 
 import wired_exchange.core
+from wired_exchange.accounts import Accounts, load_accounts
 from wired_exchange.binance import BinanceClient
+from wired_exchange.kucoin import KucoinFuturesClient
 from wired_exchange.portfolio import Portfolio
+from wired_exchange.snapshots import SnapshotRefresher, age
 import streamlit as st
 
 import glob
@@ -22,56 +27,109 @@ def import_all(wallet: Portfolio):
     wallet.import_transactions()
 
 
+def get_futures_positions(values: dict):
+    """futures positions source bound to the credentials of a profile"""
+    def get_positions():
+        with KucoinFuturesClient(values.get('kucoin_futures_api_key'), values.get('kucoin_futures_api_passphrase'),
+                                 values.get('kucoin_futures_api_secret')) as futures:
+            return futures.get_positions()
+
+    return get_positions
+
+
+@st.cache(allow_output_mutation=True)
+def get_wallet(profile: str) -> Accounts:
+    """accounts of a profile, credentials are read once from its environment file, kept across script reruns"""
+    return Accounts(profile, load_accounts([profile]))
+
+
+@st.cache(allow_output_mutation=True)
+def get_refresher(profile: str) -> SnapshotRefresher:
+    """one background refresher per profile, kept across script reruns. sources hold the credentials of their
+    profile: the process environment is shared by the refreshers of every profile and left unchanged"""
+    values = dotenv_values(f'.env-{profile}')
+    if profile == 'EBL':
+        wallet = get_wallet(profile)
+        sources = dict(positions=wallet.snapshot_summary, orders=wallet.get_orders,
+                       futures=get_futures_positions(values))
+    else:
+        binance = BinanceClient(values.get('binance_api_key'), values.get('binance_api_secret'))
+        sources = dict(positions=binance.get_balances, orders=binance.get_transactions)
+    return SnapshotRefresher(profile, sources).start()
+
+
+def format_age(delta: timedelta) -> str:
+    seconds = int(delta.total_seconds())
+    if seconds < 60:
+        return f'{seconds}s'
+    if seconds < 3600:
+        return f'{seconds // 60}min'
+    return f'{seconds // 3600}h{(seconds % 3600) // 60:02d}'
+
+
+def show_snapshot(refresher: SnapshotRefresher, kind: str, title: str):
+    """render latest snapshot with its age, None when not taken yet"""
+    st.text(title)
+    snapshot = refresher.latest(kind)
+    if snapshot is None:
+        st.caption('waiting for first refresh...')
+        return None
+    stale = ' - stale, refreshing' if refresher.is_stale(snapshot) else ''
+    st.caption(f'as of {snapshot.as_of:%Y-%m-%d %H:%M:%S} UTC ({format_age(age(snapshot))} ago{stale})')
+    return snapshot.data
+
+
 profile = st.selectbox("select portfolio", ['EBL', 'POL'])
 
-load_dotenv(f'.env-{profile}', override=True)
+refresher = get_refresher(profile)
+
+st.title(f'{profile} Wallet')
+if st.button('Refresh now'):
+    refresher.request_refresh()
+if refresher.is_refreshing():
+    st.caption('refresh in progress...')
 
 if profile == 'EBL':
-    wallet = Portfolio(profile)
     if st.button('Update Wallet'):
-        import_all(wallet)
-
-    st.title(f'{profile} Wallet')
-    st.text("Positions:")
-    summary = wallet.get_summary()
-    if summary.size > 0:
-        summary = summary[(summary['total'] > .0001) & (summary.index != 'USDT') & (summary.index != 'USD')]
-        summary = summary[['total', 'available', 'PnL_pc', 'average_buy_price', 'price',
-                           'PnL_tt', 'average_buy_price_usd', 'price_usd']]
-    st.dataframe(summary
-                 .style.applymap(foreground_by_sign, subset=['PnL_pc', 'PnL_tt']))
-
-    st.text("last orders:")
-    orders = wallet.get_orders()
-    if orders.size > 0:
-        orders = orders[['base_currency', 'side', 'price', 'size', 'status', 'time']]
-    orders.set_index('base_currency', inplace=True)
-    # transactions = wallet.get_transaction()[['base_currency', 'time', 'side', 'price', 'size']]
-    # transactions.set_index('base_currency', inplace=True)
-    st.dataframe(orders.head(15))
-
-    st.text("futures positions:")
-    futures = wallet.get_futures()
-
-    if futures.size > 0:
-        futures = futures[['symbol', 'markPrice', 'realisedPnl', 'avgEntryPrice',
-                           'unrealisedPnlPcnt', 'realLeverage', 'openingTimestamp', 'liquidationPrice']]
-    # orders.set_index('base_currency', inplace=True)
-    # transactions = wallet.get_transaction()[['base_currency', 'time', 'side', 'price', 'size']]
-    # transactions.set_index('base_currency', inplace=True)
-    st.dataframe(futures.head(15))
+        import_all(get_wallet(profile))
+        refresher.request_refresh()
+
+    summary = show_snapshot(refresher, 'positions', 'Positions:')
+    if summary is not None:
+        if summary.size > 0:
+            if 'stale' in summary.columns and summary['stale'].any():
+                st.caption(f'cached balances for {", ".join(summary.loc[summary["stale"], "platform"].unique())}: '
+                           f'no answer in time')
+            summary = summary[(summary['total'] > .0001) & (summary.index != 'USDT') & (summary.index != 'USD')]
+            summary = summary[['total', 'available', 'PnL_pc', 'average_buy_price', 'price',
+                               'PnL_tt', 'average_buy_price_usd', 'price_usd']]
+        st.dataframe(summary
+                     .style.applymap(foreground_by_sign, subset=['PnL_pc', 'PnL_tt']))
+
+    orders = show_snapshot(refresher, 'orders', 'last orders:')
+    if orders is not None:
+        if orders.size > 0:
+            orders = orders[['base_currency', 'side', 'price', 'size', 'status', 'time']]
+            orders.set_index('base_currency', inplace=True)
+        st.dataframe(orders.head(15))
+
+    futures = show_snapshot(refresher, 'futures', 'futures positions:')
+    if futures is not None:
+        if futures.size > 0:
+            futures = futures[['symbol', 'markPrice', 'realisedPnl', 'avgEntryPrice',
+                               'unrealisedPnlPcnt', 'realLeverage', 'openingTimestamp', 'liquidationPrice']]
+        st.dataframe(futures.head(15))
 
 else:
     if profile == 'POL':
-        st.title(f'{profile} Wallet')
-        binance = BinanceClient(os.getenv('binance_api_key'), os.getenv('binance_api_secret'))
-        st.text("Positions:")
-        balances = binance.get_balances()
-        st.dataframe(balances[(balances['total'] > .0001) & (balances.index != 'USDT') & (balances.index != 'USD')])
-        st.text("last orders:")
-        transactions = binance.get_transactions()[
-            ['base_currency', 'side', 'price', 'size', 'amount', 'status', 'time']]
-        transactions.set_index('base_currency', inplace=True)
-        st.dataframe(transactions.head(15))
+        balances = show_snapshot(refresher, 'positions', 'Positions:')
+        if balances is not None and balances.size > 0:
+            st.dataframe(balances[(balances['total'] > .0001) & (balances.index != 'USDT')
+                                  & (balances.index != 'USD')])
+        transactions = show_snapshot(refresher, 'orders', 'last orders:')
+        if transactions is not None and transactions.size > 0:
+            transactions = transactions[['base_currency', 'side', 'price', 'size', 'amount', 'status', 'time']]
+            transactions.set_index('base_currency', inplace=True)
+            st.dataframe(transactions.head(15))
 
 st.text(f'wired_exchange v{wired_exchange.core.VERSION}')
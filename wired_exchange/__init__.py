@@ -1,16 +1,31 @@
-import logging
+"""wired exchange SDK
 
-import pytomlpp
-import os.path
+clients, storage and configuration are resolved on first access so that importing the package
+does not load every exchange connector with pandas, httpx, websockets and SQLAlchemy."""
+import importlib
 
-from datetime import datetime
+_LAZY_ATTRIBUTES = {
+    'FTXClient': 'wired_exchange.ftx',
+    'KucoinSpotClient': 'wired_exchange.kucoin',
+    'WiredStorage': 'wired_exchange.storage',
+    'config': 'wired_exchange.core',
+    'merge': 'wired_exchange.core',
+}
 
-from wired_exchange.ftx import FTXClient
-from wired_exchange.kucoin import KucoinSpotClient
-from wired_exchange.storage import WiredStorage
-from wired_exchange.core import config, merge
+_SUBMODULES = ['binance', 'bitpandapro', 'coingecko', 'core', 'exchange_rates', 'ftx', 'kucoin',
+               'portfolio', 'snapshots', 'storage', 'trades']
 
 
-if os.path.exists('wired_exchange.toml'):
-    with open('wired_exchange.toml', 'r') as cfg:
-        merge(config(), pytomlpp.load(cfg))
\ No newline at end of file
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+    elif name in _SUBMODULES:
+        value = importlib.import_module(f'{__name__}.{name}')
+    else:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(_LAZY_ATTRIBUTES.keys()) + _SUBMODULES)
@@ -0,0 +1,294 @@
+"""many exchange accounts synchronized at once into one profile store
+
+an account is a set of API credentials on a platform: a profile, a FTX subaccount, another API key... accounts are
+synchronized concurrently, each with its own clients, so refreshing many accounts takes about as long as the slowest
+one. requests of an API key are spread by its own RateLimiter (rate_limit of the platform configuration) and the
+clients of a same host share one connection pool. transactions, orders and last balances are stored in the profile
+store partitioned by account, Portfolio queries (lots, PnL, valuation history...) aggregate every account:
+
+    with Accounts('family', load_accounts(['EBL', 'POL'])) as accounts:
+        accounts.add(Account('ebl_ftx_bot', 'ftx', key, secret, subaccount='bot'))
+        accounts.import_transactions()
+        positions = accounts.get_positions()
+"""
+import hashlib
+import itertools
+import re
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Iterator, Optional
+
+import httpx
+import pandas as pd
+
+from wired_exchange.bitpandapro import BitPandaProClient
+from wired_exchange.core import config, drain, concat_batches
+from wired_exchange.core.ExchangeClient import ExchangeClient
+from wired_exchange.core.RateLimiter import get_rate_limiter
+from wired_exchange.deadlines import call_with_deadline
+from wired_exchange.ftx import FTXClient
+from wired_exchange.kucoin import KucoinSpotClient
+from wired_exchange.portfolio import Portfolio, DEFAULT_DEADLINE, _to_stored_operations, _to_stored_orders
+
+Account = namedtuple('Account', ['name', 'platform', 'api_key', 'api_secret', 'api_passphrase', 'subaccount',
+                                 'host_url'], defaults=[None, None, None])
+Account.__doc__ = """API credentials of an account on platform (see PLATFORMS), name identifies the account in
+storage (letters, digits and underscores). api_passphrase is required by Kucoin, subaccount is a FTX subaccount"""
+
+PLATFORMS = ('kucoin', 'ftx', 'bitpanda_pro', 'binance')
+# threads are only started when needed, one per account being synchronized
+MAX_ACCOUNT_WORKERS = 64
+# transactions history fetched for an account having none stored yet
+DEFAULT_HISTORY = timedelta(days=365)
+ACCOUNT_NAME = re.compile(r'\w+')
+
+
+class Accounts(Portfolio):
+    """portfolio of many accounts, see module documentation"""
+    SOURCE_COLUMN = 'account'
+
+    def __init__(self, profile: str, accounts: Iterable[Account] = (), deadline: float = DEFAULT_DEADLINE):
+        super().__init__(profile, deadline=deadline)
+        self._accounts = {}
+        self._clients = {}
+        self._transports = {}
+        self._public_ftx = None
+        self._clients_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=MAX_ACCOUNT_WORKERS, thread_name_prefix='wired_accounts')
+        for account in accounts:
+            self.add(account)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def accounts(self) -> list[Account]:
+        return list(self._accounts.values())
+
+    def add(self, account: Account):
+        """register account, an account of the same name is replaced"""
+        if ACCOUNT_NAME.fullmatch(account.name) is None:
+            raise ValueError(f'{account.name}: account names are made of letters, digits and underscores')
+        if account.platform not in PLATFORMS:
+            raise ValueError(f'{account.platform}: unsupported platform, expected one of {PLATFORMS}')
+        self.remove(account.name)
+        self._accounts[account.name] = account
+        return self
+
+    def remove(self, name: str) -> bool:
+        account = self._accounts.pop(name, None)
+        with self._clients_lock:
+            client = self._clients.pop(name, None)
+        if client is not None:
+            client.close()
+        return account is not None
+
+    def close(self):
+        """close clients and their shared connection pools, calls still running keep their threads until done"""
+        with self._clients_lock:
+            clients = list(self._clients.values()) + ([self._public_ftx] if self._public_ftx is not None else [])
+            self._clients.clear()
+            self._public_ftx = None
+            transports = list(self._transports.values())
+            self._transports.clear()
+        for client in clients:
+            client.close()
+        for transport in transports:
+            transport.close_pool()
+        self._executor.shutdown(wait=False)
+
+    def client(self, account: Account) -> ExchangeClient:
+        """open client of account, kept for the next calls"""
+        client = self._clients.get(account.name)
+        if client is None:
+            # opening may take a round trip (e.g. Binance), other accounts are not held up meanwhile
+            client = self._open_client(_new_client(account), account.api_key or account.api_secret)
+            with self._clients_lock:
+                opened = self._clients.setdefault(account.name, client)
+            if opened is not client:
+                client.close()
+            client = opened
+        return client
+
+    def import_transactions(self, start_time: datetime = None) -> int:
+        """stream transactions of every account into storage concurrently, return the number of saved transactions.
+        each account resumes from its last stored transaction unless start_time is given"""
+        return self._sync_accounts(lambda account: self._import_account_transactions(account, start_time))
+
+    def import_account_operations(self, start_time: datetime = None) -> int:
+        """stream deposits and withdrawals of every account into storage concurrently, return the number of saved
+        operations"""
+        return self._sync_accounts(lambda account: self._import_account_operations(account, start_time))
+
+    def sync_orders(self, start_time: Optional[datetime] = None, deadline: float = None) -> dict[str, str]:
+        """fetch orders of every account as Portfolio.sync_orders does by platform, return accounts which failed
+        to sync"""
+        calls = {account.name: (lambda a=account: self._sync_account_orders(a, start_time))
+                 for account in self._accounts.values() if account.platform in ORDER_SOURCES}
+        _, failures = call_with_deadline(calls, self._deadline(deadline), self.profile, self._executor)
+        return failures
+
+    def _balance_sources(self) -> dict:
+        return {account.name: (lambda a=account: self.client(a).get_balances().assign(account=a.name))
+                for account in self._accounts.values()}
+
+    def _sync_accounts(self, sync) -> int:
+        calls = {account.name: (lambda a=account: sync(a)) for account in self._accounts.values()}
+        counts, _ = call_with_deadline(calls, None, self.profile, self._executor)
+        return sum(counts.values())
+
+    def _import_account_transactions(self, account: Account, start_time: Optional[datetime]) -> int:
+        iter_transactions = TRANSACTION_SOURCES.get(account.platform)
+        if iter_transactions is None:
+            self._logger.info(f'{account.name}: {account.platform} transactions are not imported')
+            return 0
+        since = start_time if start_time is not None else self._get_account_sync_time(account)
+        batches = iter_transactions(self.client(account), since)
+        if account.platform != 'ftx':
+            # USD prices of the whole import are fetched with the first batch
+            batches = (self._get_public_ftx().enrich_usd_prices(batch, since)[0] for batch in batches)
+        count = drain((_to_account_rows(batch, account) for batch in batches), self._save_transactions)
+        self._logger.info(f'{account.name}: {count} transactions imported since {since}')
+        return count
+
+    def _import_account_operations(self, account: Account, start_time: Optional[datetime]) -> int:
+        source = OPERATION_SOURCES.get(account.platform)
+        if source is None:
+            return 0
+        iter_operations, statuses = source
+        since = start_time if start_time is not None else self._get_account_sync_time(account)
+        return drain((_to_account_rows(_to_stored_operations(ops, statuses), account)
+                      for ops in iter_operations(self.client(account), since)), self._save_transactions)
+
+    def _sync_account_orders(self, account: Account, start_time: Optional[datetime]):
+        with self._db_lock:
+            since = start_time if start_time is not None else self._db.read_orders_sync_time(account.platform,
+                                                                                              account.name)
+        if since is None:
+            since = self._get_account_sync_time(account)
+        orders = concat_batches(ORDER_SOURCES[account.platform](self.client(account), since))
+        stored = _to_stored_orders(orders, account.platform)
+        if stored.size > 0:
+            stored['id'] = account.name + '_' + stored['id']
+        with self._db_lock:
+            self._db.save_orders(account.platform, stored, since, account.name)
+        self._logger.info(f'{account.name}: {len(orders)} orders refreshed since {since}')
+
+    def _get_account_sync_time(self, account: Account) -> datetime:
+        """time of the last stored transaction of account, DEFAULT_HISTORY ago when none is stored"""
+        with self._db_lock:
+            times = self._db.read_transactions(account.name)['time']
+        if len(times) == 0:
+            return datetime.now(timezone.utc) - DEFAULT_HISTORY
+        return times.max().to_pydatetime()
+
+    def _save_transactions(self, transactions: pd.DataFrame):
+        with self._db_lock:
+            self._db.save_transactions(transactions)
+
+    def _get_public_ftx(self) -> FTXClient:
+        """FTX client of public market data, shared by every account"""
+        if self._public_ftx is None:
+            client = self._open_client(FTXClient(), None)
+            with self._clients_lock:
+                if self._public_ftx is None:
+                    self._public_ftx = client
+            if self._public_ftx is not client:
+                client.close()
+        return self._public_ftx
+
+    def _open_client(self, client: ExchangeClient, api_key: Optional[str]) -> ExchangeClient:
+        rate_limit = config()['exchanges'].get(client.platform, {}).get('rate_limit')
+        if rate_limit is not None:
+            # limiter names are logged, the API key is only known by a digest
+            key_id = hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:12] if api_key is not None else 'public'
+            client.rate_limiter = get_rate_limiter(f'{client.platform}/{key_id}', rate_limit)
+        if client.host_url is not None:
+            # keep-alive connections to a host are reused by every client of the host
+            with self._clients_lock:
+                transport = self._transports.get(client.host_url)
+                if transport is None:
+                    transport = self._transports[client.host_url] = _SharedTransport()
+            client.transport = transport
+        return client.open()
+
+
+class _SharedTransport(httpx.HTTPTransport):
+    """connection pool of a host, closing a client leaves it open for the other clients of the host"""
+
+    def close(self):
+        pass
+
+    def close_pool(self):
+        super().close()
+
+
+def load_accounts(profiles: Iterable[str], path: str = '.env-{profile}') -> list[Account]:
+    """accounts of the platforms having credentials in the environment file of each profile, named
+    <profile>_<platform>. FTX subaccounts listed comma separated by ftx_subaccounts are accounts as well, named
+    <profile>_ftx_<subaccount>. the process environment is left unchanged"""
+    from dotenv import dotenv_values
+    accounts = []
+    for profile in profiles:
+        values = dotenv_values(path.format(profile=profile))
+        for platform in PLATFORMS:
+            key, secret = values.get(f'{platform}_api_key'), values.get(f'{platform}_api_secret')
+            if key is None and secret is None:
+                continue
+            name = _to_account_name(f'{profile}_{platform}')
+            passphrase = values.get(f'{platform}_api_passphrase')
+            accounts.append(Account(name, platform, key, secret, passphrase))
+            if platform == 'ftx':
+                subaccounts = [s.strip() for s in (values.get('ftx_subaccounts') or '').split(',') if s.strip() != '']
+                accounts.extend(Account(_to_account_name(f'{name}_{subaccount}'), platform, key, secret, passphrase,
+                                        subaccount) for subaccount in subaccounts)
+    return accounts
+
+
+def _to_account_name(name: str) -> str:
+    return re.sub(r'\W', '_', name).lower()
+
+
+def _to_account_rows(frame: pd.DataFrame, account: Account) -> pd.DataFrame:
+    """rows of account with ids (the index) prefixed by the account name, as ids are prefixed by platform"""
+    if frame.size == 0:
+        return frame
+    frame = frame.assign(account=account.name)
+    frame.index = (account.name + '_' + frame.index.astype(str)).rename(frame.index.name)
+    return frame
+
+
+def _new_client(account: Account) -> ExchangeClient:
+    if account.platform == 'kucoin':
+        return KucoinSpotClient(account.api_key, account.api_passphrase, account.api_secret, account.host_url)
+    if account.platform == 'ftx':
+        return FTXClient(account.api_key, account.api_secret, account.subaccount, account.host_url)
+    if account.platform == 'bitpanda_pro':
+        return BitPandaProClient(account.api_key or account.api_secret, account.host_url)
+    # python-binance is only required by Binance accounts
+    from wired_exchange.binance import BinanceClient
+    return BinanceClient(account.api_key, account.api_secret)
+
+
+def _iter_kucoin_orders(kucoin: KucoinSpotClient, since: datetime) -> Iterator[pd.DataFrame]:
+    return itertools.chain(kucoin.iter_orders(start_time=since, status='done'),
+                           kucoin.iter_orders(start_time=since, status='active'))
+
+
+# paged sources of an account client by platform, as imported by Portfolio from environment credentials
+TRANSACTION_SOURCES = dict(
+    kucoin=lambda kucoin, since: kucoin.iter_transactions(since),
+    ftx=lambda ftx, since: ftx.iter_transactions(start_time=since),
+    bitpanda_pro=lambda bp, since: bp.iter_transactions(start_time=since, end_time=datetime.now(timezone.utc)))
+OPERATION_SOURCES = dict(
+    kucoin=(lambda kucoin, since: kucoin.iter_account_operations(since), ['SUCCESS']),
+    ftx=(lambda ftx, since: ftx.iter_account_operations(since), ['confirmed', 'complete']))
+ORDER_SOURCES = dict(
+    kucoin=_iter_kucoin_orders,
+    ftx=lambda ftx, since: ftx.iter_orders(since),
+    bitpanda_pro=lambda bp, since: bp.iter_orders(since, end_time=datetime.now(timezone.utc), include_filled=False))
@@ -0,0 +1,258 @@
+"""price alerts over Kucoin tickers
+
+level alerts fire when the price crosses their level: 'above' when it rises to the level or above, 'below' when it
+falls below it. levels are kept sorted by symbol (see events.ThresholdIndex), a tick finds the fired ones with two
+bisections between the previous and the current price. trailing alerts fire when the price falls
+('trailing_down') or rises ('trailing_up') by level percent from its best price since the alert was added.
+trailing alerts sharing a best price are one bucket sorted by percent, a new best price merges buckets instead of
+moving each alert. buckets are indexed by the price firing their first alert, a tick only visits the buckets it
+fires. alerts fire once, fired alerts are saved to the profile storage by a background thread:
+
+    engine = AlertEngine('default')
+    engine.add_alert('BTC-USDT', 'above', 30000)
+    engine.add_alert('ETH-USDT', 'trailing_down', 5)
+    await kucoin.register_ticker_strategy_async(engine)
+    ...
+    engine.close()
+"""
+import math
+import time
+import uuid
+from bisect import bisect_left, bisect_right, insort
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Literal, Optional, Union
+
+import pandas as pd
+
+from wired_exchange.events import ThresholdIndex
+from wired_exchange.kucoin.WebSocket import TickerStrategy
+from wired_exchange.storage import WiredStorage
+
+AlertKind = Literal['above', 'below', 'trailing_down', 'trailing_up']
+ALERT_KINDS = ('above', 'below', 'trailing_down', 'trailing_up')
+
+Alert = namedtuple('Alert', ['id', 'symbol', 'kind', 'level'])
+Alert.__doc__ = """level is a price for above and below alerts, a percentage for trailing alerts. ids are unique
+across engines and runs"""
+
+FiredAlert = namedtuple('FiredAlert', ['id', 'symbol', 'kind', 'level', 'price', 'time'])
+FiredAlert.__doc__ = """alert fired by price at time (UTC)"""
+
+
+class AlertEngine(TickerStrategy):
+    """price alerts of many symbols, fed by Kucoin tickers (see KucoinSpotClient.register_ticker_strategy_async)
+    or by on_price. tickers None follows every symbol, profile None keeps fired alerts in memory only. fired
+    alerts are saved by a single thread in firing order, close waits for them"""
+
+    def __init__(self, profile: str = None, tickers: Optional[list[Union[tuple[str, str], str]]] = None):
+        super().__init__(tickers)
+        self.fired = []
+        self._db = WiredStorage(profile) if profile is not None else None
+        # SQLite writes stay off the event loop
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='wired_alerts') \
+            if profile is not None else None
+        self._alerts = {}
+        self._levels = {}
+        self._trailing = {}
+        # trailing alerts added before the first price of their symbol
+        self._pending = {}
+        self._prices = {}
+
+    def add_alert(self, symbol: str, kind: AlertKind, level: float) -> str:
+        """return the alert id"""
+        if kind not in ALERT_KINDS:
+            raise ValueError(f'{kind}: unsupported alert kind, expected one of {ALERT_KINDS}')
+        alert = Alert(str(uuid.uuid4()), symbol, kind, level)
+        self._alerts[alert.id] = alert
+        if kind in ('above', 'below'):
+            self._levels.setdefault(symbol, ThresholdIndex()).add(level, alert.id, kind)
+        elif symbol in self._prices:
+            self._trailing_buckets(symbol, kind).add(alert.id, level, self._prices[symbol])
+        else:
+            self._pending.setdefault(symbol, []).append(alert)
+        return alert.id
+
+    def remove_alert(self, alert_id: str) -> bool:
+        alert = self._alerts.pop(alert_id, None)
+        if alert is None:
+            return False
+        if alert.kind in ('above', 'below'):
+            self._levels[alert.symbol].remove(alert.level, alert.id, alert.kind)
+        elif alert in self._pending.get(alert.symbol, []):
+            self._pending[alert.symbol].remove(alert)
+        else:
+            self._trailing[(alert.symbol, alert.kind)].remove(alert.id, alert.level)
+        return True
+
+    def get_alerts(self) -> pd.DataFrame:
+        return pd.DataFrame(self._alerts.values(), columns=Alert._fields).set_index('id')
+
+    def on_price(self, symbol: str, price: float, time_ns: int = None) -> list[FiredAlert]:
+        """apply a ticker price, return and save the alerts it fired"""
+        previous = self._prices.get(symbol)
+        self._prices[symbol] = price
+        fired_ids = []
+        levels = self._levels.get(symbol)
+        if levels is not None:
+            fired_ids.extend(alert_id for _, alert_id in levels.pop_crossed(previous, price))
+        for alert in self._pending.pop(symbol, []):
+            self._trailing_buckets(symbol, alert.kind).add(alert.id, alert.level, price)
+        for kind in ('trailing_down', 'trailing_up'):
+            buckets = self._trailing.get((symbol, kind))
+            if buckets is not None:
+                fired_ids.extend(buckets.update(price))
+        if len(fired_ids) == 0:
+            return []
+        fired_time = pd.Timestamp(time.time_ns() if time_ns is None else time_ns, unit='ns', tz='UTC')
+        fired = [FiredAlert(*self._alerts.pop(alert_id), price, fired_time) for alert_id in fired_ids]
+        self.fired.extend(fired)
+        if self._writer is not None:
+            self._writer.submit(self._save, symbol, fired)
+        return fired
+
+    def close(self):
+        """wait for fired alerts to be saved, no alert is saved afterwards"""
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+
+    def on_ticker(self, symbol: str, data: dict):
+        self.on_price(symbol, float(data['price']), int(data['time']) * 1_000_000)
+
+    def _save(self, symbol: str, fired: list[FiredAlert]):
+        try:
+            self._db.save_alerts(pd.DataFrame(fired, columns=FiredAlert._fields))
+        except:
+            self._logger.error(f'{symbol}: cannot save {len(fired)} fired alerts', exc_info=True)
+
+    def _trailing_buckets(self, symbol: str, kind: AlertKind) -> '_TrailingBuckets':
+        buckets = self._trailing.get((symbol, kind))
+        if buckets is None:
+            buckets = self._trailing[(symbol, kind)] = _TrailingBuckets(kind == 'trailing_down')
+        return buckets
+
+
+class _TrailingBuckets:
+    """trailing alerts of a symbol in one direction, bucketed by best price. keys are best prices for falling
+    alerts and negated best prices for rising ones, so that a price beats the best prices of lower keys. signed
+    trigger prices (price firing the first alert of a bucket, negated for rising alerts) are kept sorted: a price
+    fires the buckets of triggers greater than or equal to its key"""
+
+    def __init__(self, falling: bool):
+        self.sign = 1 if falling else -1
+        self.keys = []
+        # buckets by key
+        self.buckets = []
+        # (trigger, key) of every bucket, sorted
+        self.triggers = []
+        self._bucket_of = {}
+
+    def add(self, alert_id: str, percent: float, best_price: float):
+        key = self.sign * best_price
+        index = bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            bucket = self.buckets[index]
+            self._unindex(bucket)
+        else:
+            bucket = _Bucket(key)
+            self.keys.insert(index, key)
+            self.buckets.insert(index, bucket)
+        self._insert(bucket, percent, alert_id)
+        self._index(bucket)
+
+    def remove(self, alert_id: str, percent: float) -> bool:
+        bucket = self._bucket_of.pop(alert_id, None)
+        if bucket is None:
+            return False
+        position = bisect_left(bucket.percents, percent)
+        while bucket.ids[position] != alert_id:
+            position += 1
+        self._unindex(bucket)
+        del bucket.percents[position]
+        del bucket.ids[position]
+        if len(bucket.ids) == 0:
+            self._delete(bucket)
+        else:
+            self._index(bucket)
+        return True
+
+    def update(self, price: float) -> list[str]:
+        """move beaten best prices to price, pop and return ids of alerts fired by price"""
+        key = self.sign * price
+        beaten = bisect_left(self.keys, key)
+        if beaten > 0:
+            if beaten < len(self.keys) and self.keys[beaten] == key:
+                beaten += 1
+            for bucket in self.buckets[:beaten]:
+                self._unindex(bucket)
+            merged = self._merge(self.buckets[:beaten])
+            merged.key = key
+            del self.keys[:beaten]
+            del self.buckets[:beaten]
+            self.keys.insert(0, key)
+            self.buckets.insert(0, merged)
+            self._index(merged)
+        fireable = bisect_left(self.triggers, (key, -math.inf))
+        if fireable == len(self.triggers):
+            return []
+        fired = []
+        candidates = sorted((self._bucket_at(k) for _, k in self.triggers[fireable:]), key=lambda b: -b.key)
+        for bucket in candidates:
+            best_price = self.sign * bucket.key
+            # percent moved from the best price against the alert direction
+            moved = (1 - price / best_price if self.sign > 0 else price / best_price - 1) * 100
+            count = bisect_right(bucket.percents, moved)
+            if count == 0:
+                continue
+            self._unindex(bucket)
+            fired.extend(bucket.ids[:count])
+            for alert_id in bucket.ids[:count]:
+                del self._bucket_of[alert_id]
+            del bucket.percents[:count]
+            del bucket.ids[:count]
+            if len(bucket.ids) == 0:
+                self._delete(bucket)
+            else:
+                self._index(bucket)
+        return fired
+
+    def _bucket_at(self, key: float) -> '_Bucket':
+        return self.buckets[bisect_left(self.keys, key)]
+
+    def _delete(self, bucket: '_Bucket'):
+        index = bisect_left(self.keys, bucket.key)
+        del self.keys[index]
+        del self.buckets[index]
+
+    def _index(self, bucket: '_Bucket'):
+        bucket.trigger = bucket.key * (1 - self.sign * bucket.percents[0] / 100)
+        insort(self.triggers, (bucket.trigger, bucket.key))
+
+    def _unindex(self, bucket: '_Bucket'):
+        del self.triggers[bisect_left(self.triggers, (bucket.trigger, bucket.key))]
+
+    def _merge(self, buckets: list) -> '_Bucket':
+        """merge smaller buckets into the largest one"""
+        largest = max(buckets, key=lambda b: len(b.ids))
+        for bucket in buckets:
+            if bucket is not largest:
+                for percent, alert_id in zip(bucket.percents, bucket.ids):
+                    self._insert(largest, percent, alert_id)
+        return largest
+
+    def _insert(self, bucket: '_Bucket', percent: float, alert_id: str):
+        index = bisect_right(bucket.percents, percent)
+        bucket.percents.insert(index, percent)
+        bucket.ids.insert(index, alert_id)
+        self._bucket_of[alert_id] = bucket
+
+
+class _Bucket:
+    """trailing alerts sharing a best price key, percents sorted ascending"""
+    __slots__ = ('key', 'percents', 'ids', 'trigger')
+
+    def __init__(self, key: float):
+        self.key = key
+        self.percents = []
+        self.ids = []
+        self.trigger = None
@@ -0,0 +1,175 @@
+"""candle based backtesting computed over whole columns
+
+a strategy maps klines (as returned by get_prices_history / to_klines) to a target position per candle:
+1 long, 0 flat and -1 short. a position decided on a candle close is filled at the next candle open, all equity
+being invested on entry, fees are charged on entry and exit notional"""
+import logging
+from collections import namedtuple
+from datetime import datetime
+from typing import Callable, Literal, Union
+
+import numpy as np
+import pandas as pd
+
+from wired_exchange.storage import WiredStorage
+
+BacktestResult = namedtuple('BacktestResult', ['equity', 'trades', 'stats'])
+BacktestResult.__doc__ = """equity: mark to market equity by candle time, trades: one row per round trip,
+stats: total_return, max_drawdown, trade_count, win_rate and fees"""
+
+DEFAULT_FEE_RATE = 0.001
+DEFAULT_CAPITAL = 1000.0
+# platforms storing fee_rate as a percentage instead of a ratio
+PERCENT_FEE_PLATFORMS = ('bitpanda_pro',)
+
+TRADE_COLUMNS = ['entry_time', 'exit_time', 'side', 'entry_price', 'exit_price', 'size', 'fee', 'pnl', 'return',
+                 'is_open']
+
+
+class Backtester:
+    """run strategies over cached candles of a symbol, see WiredStorage.save_candles and MarketScanner.refresh"""
+
+    def __init__(self, profile: str, resolution: int = 60, platform: str = 'kucoin'):
+        self.profile = profile
+        self.resolution = resolution
+        self.platform = platform
+        self._db = WiredStorage(profile)
+        self._logger = logging.getLogger(type(self).__name__)
+
+    def load(self, base_currency: str, quote_currency: str, start_time: Union[datetime, int, None] = None,
+             end_time: Union[datetime, int, None] = None) -> pd.DataFrame:
+        candles = self._db.read_candles(self.platform, self.resolution, start_time, end_time, quote_currency,
+                                        base_currency)
+        return candles.set_index('time')[['open', 'high', 'low', 'close', 'volume']]
+
+    def fee_rate(self) -> float:
+        """median fee rate of our own transactions on platform"""
+        return fee_rate_of(self._db.read_transactions(), self.platform)
+
+    def run(self, strategy: Callable[[pd.DataFrame], np.ndarray], base_currency: str, quote_currency: str,
+            start_time: Union[datetime, int, None] = None, end_time: Union[datetime, int, None] = None,
+            fee_rate: float = None, capital: float = DEFAULT_CAPITAL) -> BacktestResult:
+        klines = self.load(base_currency, quote_currency, start_time, end_time)
+        if fee_rate is None:
+            fee_rate = self.fee_rate()
+        self._logger.info(f'{base_currency}-{quote_currency}: backtesting {len(klines)} candles, fee rate {fee_rate}')
+        return backtest(klines, strategy, fee_rate, capital)
+
+
+def backtest(klines: pd.DataFrame, strategy: Union[Callable[[pd.DataFrame], np.ndarray], np.ndarray, pd.Series],
+             fee_rate: float = DEFAULT_FEE_RATE, capital: float = DEFAULT_CAPITAL,
+             fill: Literal['next_open', 'close'] = 'next_open') -> BacktestResult:
+    """simulate strategy positions over time indexed klines, fill 'close' trades on the signal candle close"""
+    if len(klines) == 0:
+        equity = pd.Series([], index=klines.index, name='equity', dtype='float64')
+        trades = pd.DataFrame(columns=TRADE_COLUMNS)
+        return BacktestResult(equity, trades, _stats(equity, trades, capital))
+    targets = strategy(klines) if callable(strategy) else strategy
+    targets = np.clip(np.nan_to_num(np.asarray(targets, dtype='float64')), -1, 1).astype('int8')
+    closes = klines['close'].to_numpy(dtype='float64')
+    if fill == 'next_open':
+        positions = np.concatenate([[0], targets[:-1]]).astype('int8')
+        prices = klines['open'].to_numpy(dtype='float64')
+    else:
+        positions = targets
+        prices = closes
+    previous = np.concatenate([[0], positions[:-1]])
+    changes = positions != previous
+    entries = np.flatnonzero(changes & (positions != 0))
+    exits = np.flatnonzero(changes & (previous != 0))
+    closed = len(exits)
+    sides = positions[entries].astype('float64')
+    entry_prices = prices[entries]
+    exit_prices = np.concatenate([prices[exits], closes[-1:]])[:len(entries)]
+
+    # growth of the invested notional, a short gains what the price loses
+    growth = _growth(exit_prices / entry_prices, sides)
+    exit_fees = np.where(np.arange(len(entries)) < closed, fee_rate, 0.0)
+    multipliers = (1 - fee_rate) * growth * (1 - exit_fees)
+    equity_before = capital * np.concatenate([[1.0], np.cumprod(multipliers)])
+
+    trade_ids = np.cumsum(changes & (positions != 0)) - 1
+    in_trade = positions != 0
+    equity = equity_before[np.cumsum(changes & (previous != 0))]
+    current = trade_ids[in_trade]
+    equity[in_trade] = equity_before[current] * (1 - fee_rate) \
+        * _growth(closes[in_trade] / entry_prices[current], sides[current])
+
+    invested = equity_before[:-1]
+    times = klines.index
+    trades = pd.DataFrame(dict(entry_time=times[entries],
+                               exit_time=times[np.concatenate([exits, [len(times) - 1]])[:len(entries)]],
+                               side=np.where(sides > 0, 'long', 'short'), entry_price=entry_prices,
+                               exit_price=exit_prices, size=invested * (1 - fee_rate) / entry_prices,
+                               fee=invested * fee_rate * (1 + (1 - fee_rate) * growth * (exit_fees > 0)),
+                               pnl=invested * (multipliers - 1), is_open=np.arange(len(entries)) >= closed),
+                          columns=TRADE_COLUMNS)
+    trades['return'] = multipliers - 1
+    equity = pd.Series(equity, index=times, name='equity')
+    return BacktestResult(equity, trades, _stats(equity, trades, capital))
+
+
+def fee_rate_of(transactions: pd.DataFrame, platform: str) -> float:
+    """median fee rate of platform transactions as a ratio, DEFAULT_FEE_RATE when unknown"""
+    if transactions.size == 0 or 'fee_rate' not in transactions.columns:
+        return DEFAULT_FEE_RATE
+    rates = transactions.loc[transactions['platform'] == platform, 'fee_rate'].dropna()
+    if len(rates) == 0:
+        return DEFAULT_FEE_RATE
+    rate = float(rates.median())
+    return rate / 100 if platform in PERCENT_FEE_PLATFORMS else rate
+
+
+def ema_crossover(fast: int = 12, slow: int = 26) -> Callable[[pd.DataFrame], np.ndarray]:
+    """long while the fast close EMA is above the slow one"""
+
+    def strategy(klines: pd.DataFrame) -> np.ndarray:
+        closes = klines['close']
+        return (closes.ewm(span=fast, min_periods=fast, adjust=False).mean()
+                > closes.ewm(span=slow, min_periods=slow, adjust=False).mean()).to_numpy().astype('int8')
+
+    return strategy
+
+
+def rsi_reversion(oversold: float = 30, overbought: float = 70, window: int = 14) -> Callable[[pd.DataFrame],
+                                                                                              np.ndarray]:
+    """enter long when RSI falls below oversold, exit when it rises above overbought"""
+
+    def strategy(klines: pd.DataFrame) -> np.ndarray:
+        values = rsi(klines['close'], window).to_numpy()
+        return hold_between(values < oversold, values > overbought)
+
+    return strategy
+
+
+def rsi(closes: pd.Series, window: int = 14) -> pd.Series:
+    """Wilder RSI of a single series, as scanner.rsi which is meant for wide close matrices"""
+    diff = closes.diff()
+    up = diff.where(diff > 0, 0.0).ewm(alpha=1 / window, min_periods=window, adjust=False).mean()
+    down = (-diff).where(diff < 0, 0.0).ewm(alpha=1 / window, min_periods=window, adjust=False).mean()
+    return (100 - 100 / (1 + up / down)).where(down != 0, 100.0).where(up.notna())
+
+
+def hold_between(enter: np.ndarray, leave: np.ndarray) -> np.ndarray:
+    """long from each enter signal to the next leave signal, leave wins when both are raised"""
+    events = np.where(leave, 0.0, np.where(enter, 1.0, np.nan))
+    if len(events) == 0:
+        return events.astype('int8')
+    events[0] = 0.0 if np.isnan(events[0]) else events[0]
+    rows = np.where(np.isnan(events), 0, np.arange(len(events)))
+    np.maximum.accumulate(rows, out=rows)
+    return events[rows].astype('int8')
+
+
+def _growth(ratios: np.ndarray, sides: np.ndarray) -> np.ndarray:
+    return np.where(sides > 0, ratios, 2 - ratios)
+
+
+def _stats(equity: pd.Series, trades: pd.DataFrame, capital: float) -> dict:
+    values = equity.to_numpy()
+    drawdowns = 1 - values / np.maximum.accumulate(values) if len(values) > 0 else np.zeros(1)
+    closed = trades[~trades['is_open']]
+    return dict(total_return=(values[-1] / capital - 1) if len(values) > 0 else 0.0,
+                max_drawdown=float(drawdowns.max()), trade_count=len(trades),
+                win_rate=float((closed['pnl'] > 0).mean()) if len(closed) > 0 else np.nan,
+                fees=float(trades['fee'].sum()))
@@ -2,13 +2,28 @@ import numpy as np
 import pandas as pd
 from binance.client import Client
 
-from wired_exchange.core import to_transactions
+from typing import Iterator
+
+from wired_exchange.core import to_transactions, concat_batches
 from wired_exchange.core.ExchangeClient import ExchangeClient
+from wired_exchange.core.PayloadSchema import PayloadSchema, Field
+
+ORDERS_SCHEMA = PayloadSchema(dict(time=Field('time', 'datetime[ms]'), order_id=Field('orderId', 'string'),
+                                   base_currency='base_currency', quote_currency='quote_currency', side='side',
+                                   price=Field('price', 'float'), size=Field('origQty', 'float'),
+                                   amount=Field('cummulativeQuoteQty', 'float'), status='status'),
+                              id_source='orderId')
+
+BOOK_TICKERS_SCHEMA = PayloadSchema(dict(symbol='symbol', bid=Field('bidPrice', 'float'),
+                                         bid_size=Field('bidQty', 'float'), ask=Field('askPrice', 'float'),
+                                         ask_size=Field('askQty', 'float')))
 
 
 class BinanceClient(ExchangeClient):
     def __init__(self, api_key=None, api_secret=None):
         super().__init__('binance', api_key, api_secret, None)
+        # base and quote currencies by symbol, Binance symbols have no separator
+        self._symbols = None
 
     def open(self):
         if self._httpClient is None:
@@ -41,39 +56,37 @@ class BinanceClient(ExchangeClient):
         balances.set_index('currency', inplace=True)
         return balances
 
+    def get_book_tickers(self) -> pd.DataFrame:
+        """best bid and ask of every symbol"""
+        self.open()
+        if self._symbols is None:
+            self._symbols = pd.DataFrame([(s['symbol'], s['baseAsset'], s['quoteAsset'])
+                                          for s in self._httpClient.get_exchange_info()['symbols']],
+                                         columns=['symbol', 'base_currency', 'quote_currency']).set_index('symbol')
+        tickers = BOOK_TICKERS_SCHEMA.normalize(self._httpClient.get_orderbook_tickers())
+        return tickers.join(self._symbols, on='symbol', how='inner').drop(columns=['symbol'])
+
     def get_transactions(self, symbol: str = None):
+        return concat_batches(self.iter_transactions(symbol))
+
+    def iter_transactions(self, symbol: str = None) -> Iterator[pd.DataFrame]:
+        """yield typed orders symbol by symbol as they are received"""
         self.open()
         if symbol is not None:
-            transactions = self._httpClient.get_all_orders(symbol=symbol)
-        else:
-            transactions = None
-            for currency in self.get_balances().index:
-                if currency != 'USDT':
-                    try:
-                        current_transactions = pd.DataFrame(self._httpClient.get_all_orders(symbol=f'{currency}USDT'))
-                        current_transactions['base_currency'] = currency
-                        current_transactions['quote_currency'] = 'USDT'
-                        if transactions is None:
-                            transactions = current_transactions
-                        else:
-                            transactions = transactions.append(current_transactions, ignore_index=True)
-                    except:
-                        self._logger.error(f'{currency}: cannot retrieve orders for currency', exc_info=True)
-        return self._to_transactions(transactions)
+            yield self._to_transactions(self._httpClient.get_all_orders(symbol=symbol))
+            return
+        for currency in self.get_balances().index:
+            if currency != 'USDT':
+                try:
+                    orders = self._httpClient.get_all_orders(symbol=f'{currency}USDT')
+                except:
+                    self._logger.error(f'{currency}: cannot retrieve orders for currency', exc_info=True)
+                    continue
+                yield self._to_transactions(orders, currency, 'USDT')
 
-    def _to_transactions(self, orders: dict) -> pd.DataFrame:
-        tr = pd.DataFrame(orders)
-        if tr.size == 0:
-            return tr
-        tr['time'] = pd.to_datetime(tr['time'], unit='ms', utc=True)
-        tr['fee'] = np.NAN
-        tr['fee_currency'] = None
-        tr.rename(
-            columns=dict(orderId='order_id', cummulativeQuoteQty='amount', origQty='size'), inplace=True)
-        tr.drop(['symbol', 'orderListId', 'clientOrderId', 'executedQty', 'timeInForce',
-                 'type', 'stopPrice', 'icebergQty', 'updateTime', 'isWorking', 'origQuoteOrderQty'],
-                axis='columns', inplace=True)
-        tr.astype(dict(order_id='string'))
-        tr['platform'] = self.platform
-        tr['id'] = tr['order_id'].apply(lambda id: f'{self.platform}_{id}')
-        return to_transactions(tr[tr['status'] != 'CANCELED'])
\ No newline at end of file
+    def _to_transactions(self, orders: list, base_currency: str = None, quote_currency: str = None) -> pd.DataFrame:
+        if orders is None or len(orders) == 0:
+            return pd.DataFrame()
+        currencies = {} if base_currency is None else dict(base_currency=base_currency, quote_currency=quote_currency)
+        tr = ORDERS_SCHEMA.normalize(orders, self.platform, fee=np.NAN, fee_currency=None, **currencies)
+        return to_transactions(tr[tr['status'] != 'CANCELED'])
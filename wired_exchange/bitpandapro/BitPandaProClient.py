@@ -3,19 +3,42 @@ from datetime import datetime
 import numpy as np
 import pandas as pd
 
-from wired_exchange.core import to_transactions, to_isoformat, merge
+from wired_exchange.core import to_transactions, merge, concat_batches
 from wired_exchange.core.ExchangeClient import ExchangeClient
+from wired_exchange.core.PayloadSchema import PayloadSchema, Field, SymbolSplit
+from wired_exchange.core.times import to_iso
 
-from typing import Union, Literal
+from typing import Union, Literal, Iterator
 
 from wired_exchange.exchange_rates.ExchangeRatesClient import ExchangeRatesClient
 
+MAX_PAGE_SIZE = 100
+
+TRADES_SCHEMA = PayloadSchema(dict(trade_id='trade_id', order_id='order_id',
+                                   side=Field('side', transform=lambda s: s.str.lower()),
+                                   price=Field('price', 'float'), size=Field('amount', 'float'),
+                                   time=Field('time', 'datetime'), fee=Field('fee_amount', 'float'),
+                                   fee_rate=Field('fee_percentage', 'float'), fee_currency='fee_currency'),
+                              symbol=SymbolSplit('instrument_code', '_'), id_source='trade_id')
+
+ORDERS_SCHEMA = PayloadSchema(dict(id='order_id', type='type', side='side', price=Field('price', 'float'),
+                                   size=Field('amount', 'float'), status='status', time=Field('time', 'datetime'),
+                                   trigger_price=Field('trigger_price', 'float')),
+                              symbol=SymbolSplit('instrument_code', '_'))
+
+BALANCES_SCHEMA = PayloadSchema(dict(currency='currency_code', available=Field('available', 'float'),
+                                     locked=Field('locked', 'float'), time=Field('time', 'datetime')))
+
+BOOK_TICKERS_SCHEMA = PayloadSchema(dict(bid=Field('best_bid', 'float'), ask=Field('best_ask', 'float')),
+                                    symbol=SymbolSplit('instrument_code', '_'))
+
 
 class BitPandaProClient(ExchangeClient):
     """BitPanda Pro API client"""
 
     def __init__(self, api_secret=None, host_url=None):
-        super().__init__('bitpanda_pro', None, api_secret, host_url, always_authenticate=False)
+        # BitPanda Pro API keys are single bearer tokens, given as api_secret or read from bitpanda_pro_api_key
+        super().__init__('bitpanda_pro', api_secret, api_secret, host_url, always_authenticate=False)
 
     def _authenticate(self, request):
         request.headers["Authorization"] = "Bearer " + self._api_key
@@ -24,33 +47,41 @@ class BitPandaProClient(ExchangeClient):
     def get_orders(self, start_time: Union[datetime, int, float, None] = None,
                    end_time: Union[datetime, int, float, None] = None,
                    include_filled: bool = True):
+        return concat_batches(self.iter_orders(start_time, end_time, include_filled))
+
+    def iter_orders(self, start_time: Union[datetime, int, float, None] = None,
+                    end_time: Union[datetime, int, float, None] = None,
+                    include_filled: bool = True) -> Iterator[pd.DataFrame]:
+        """yield typed orders page by page as they are received"""
         self.open()
-        params = {'with_just_orders': True, 'with_just_filled_inactive': False}
+        params = {'with_just_orders': True}
         self._set_date_range_params(params, start_time, end_time)
         try:
-            response = self._send_get(f'/v1/account/orders', params=params, authenticated=True)
-            orders = list(map(lambda x: x['order'], response['order_history']))
-            if include_filled:
-                params['with_just_filled_inactive'] = True
-                response = self._send_get(f'/account/orders', params=params, authenticated=True)
-                orders += list(map(lambda x: x['order'], response['order_history']))
-            return self._to_orders(orders)
+            for just_filled in [False, True] if include_filled else [False]:
+                params['with_just_filled_inactive'] = just_filled
+                for page in self._iter_pages('/v1/account/orders', params, 'order_history'):
+                    yield self._to_orders([x['order'] for x in page])
 
         except BaseException as ex:
             raise Exception('cannot retrieve orders from BitPanda Pro') from ex
 
     def get_transactions(self, start_time: Union[datetime, int, float, None] = None,
                          end_time: Union[datetime, int, float, None] = None):
+        tr = concat_batches(self.iter_transactions(start_time, end_time))
+        return tr.sort_values(by='time', ascending=False) if tr.size > 0 else tr
+
+    def iter_transactions(self, start_time: Union[datetime, int, float, None] = None,
+                          end_time: Union[datetime, int, float, None] = None) -> Iterator[pd.DataFrame]:
+        """yield typed transactions page by page as they are received"""
         self.open()
         params = {}
         self._set_date_range_params(params, start_time, end_time)
         try:
-            response = self._send_get(f'/v1/account/trades', params=params, authenticated=True)
-            transactions = list(map(lambda x: merge(x['trade'], x['fee']), response['trade_history']))
-            return self._to_transactions(transactions)
+            for page in self._iter_pages('/v1/account/trades', params, 'trade_history'):
+                yield self._to_transactions([merge(x['trade'], x['fee']) for x in page])
 
         except BaseException as ex:
-            raise Exception('cannot retrieve orders from BitPanda Pro') from ex
+            raise Exception('cannot retrieve transactions from BitPanda Pro') from ex
 
     def get_balances(self):
         self.open()
@@ -60,6 +91,14 @@ class BitPandaProClient(ExchangeClient):
         except BaseException as ex:
             raise Exception('cannot retrieve positions from BitPanda Pro') from ex
 
+    def get_book_tickers(self) -> pd.DataFrame:
+        """best bid and ask of every instrument"""
+        self.open()
+        try:
+            return BOOK_TICKERS_SCHEMA.normalize(self._send_get('/v1/market-ticker'))
+        except BaseException as ex:
+            raise Exception('cannot retrieve book tickers from BitPanda Pro') from ex
+
     def _send_get(self, path: str, params: dict = None, authenticated: bool = False):
         request = self._httpClient.build_request('GET', path, params=params)
         if authenticated:
@@ -67,6 +106,16 @@ class BitPandaProClient(ExchangeClient):
         response = self._httpClient.send(request).json()
         return response
 
+    def _iter_pages(self, path: str, params: dict, key: str):
+        """follow BitPanda Pro cursors until the last page"""
+        params = dict(params, max_page_size=MAX_PAGE_SIZE)
+        while True:
+            response = self._send_get(path, params=params, authenticated=True)
+            yield response[key]
+            if 'cursor' not in response:
+                break
+            params['cursor'] = response['cursor']
+
     # {'order_history': [
     #   {'order':  {
     #       'trigger_price': '1501.0',
@@ -87,54 +136,23 @@ class BitPandaProClient(ExchangeClient):
     #       'trades': []},
     #  ], 'max_page_size': 100}}
 
-    def _to_orders(self, orders: dict):
-        frame = self.to_response_dataframe(orders)
-        if frame.size == 0:
-            return frame
-        frame = frame.loc[:, ('order_id', 'base_currency', 'quote_currency', 'type', 'side', 'price',
-                              'amount', 'status', 'time', 'platform', 'trigger_price')]
-        # frame['status'].replace('closed', 'FILLED', inplace=True)
-        frame.loc['id'] = frame['order_id'].apply(lambda o_id: f'{self.platform}_{o_id}')
-        frame.rename(columns={'amount': 'size'}, inplace=True)
-        frame.astype(dict(price='float', size='float', trigger_price='float'))
-        frame.set_index('id', inplace=True)
-        return frame
+    def _to_orders(self, orders: list):
+        return self.to_response_dataframe(orders, ORDERS_SCHEMA)
 
-    def _to_transactions(self, transactions: dict):
-        frame = self.to_response_dataframe(transactions)
+    def _to_transactions(self, transactions: list):
+        frame = self.to_response_dataframe(transactions, TRADES_SCHEMA)
         if frame.size == 0:
             return frame
-        frame = frame.loc[:, ('trade_id', 'order_id', 'base_currency', 'quote_currency', 'side', 'price',
-                              'amount', 'time', 'platform', 'fee_amount', 'fee_percentage', 'fee_currency')]
-        frame.rename(columns={'amount': 'size', 'fee_amount': 'fee',
-                              'fee_percentage': 'fee_rate'},
-                     inplace=True)
-        frame['id'] = frame['trade_id'].apply(lambda t_id: f'{self.platform}_{t_id}')
-        frame['side'] = frame['side'].apply(lambda s: s.lower())
-        frame.astype(dict(fee_rate='float'))
         return to_transactions(frame)
 
-    def to_response_dataframe(self, transactions):
-        frame = pd.DataFrame(transactions)
-        if frame.size == 0:
-            return frame
-        frame.loc[:, 'base_currency'] = frame['instrument_code'].apply(lambda s: s.split('_')[0])
-        frame.loc[:, 'quote_currency'] = frame['instrument_code'].apply(lambda s: s.split('_')[1])
-        frame['platform'] = self.platform
-        frame['time'] = pd.to_datetime(frame['time'])
-        return frame
+    def to_response_dataframe(self, records: list, schema: PayloadSchema = None):
+        return (TRADES_SCHEMA if schema is None else schema).normalize(records, self.platform)
 
-    def _to_balances(self, balances: dict):
-        frame = pd.DataFrame(balances)
+    def _to_balances(self, balances: list):
+        frame = BALANCES_SCHEMA.normalize(balances, self.platform)
         if frame.size == 0:
             return frame
-        frame.rename(columns=dict(currency_code='currency'), inplace=True)
-        frame = frame.loc[:, ('currency', 'available', 'locked', 'time')]
-        frame['platform'] = self.platform
-        frame['available'] = pd.to_numeric(frame['available'])
-        frame['locked'] = pd.to_numeric(frame['locked'])
         frame['total'] = frame['available'] + frame['locked']
-        frame['time'] = pd.to_datetime(frame['time'])
         # evaluate current price
         with ExchangeRatesClient() as change:
             frame['price'] = frame['currency'].apply(lambda c: self.get_rate(change, c, 'USDT'))
@@ -143,11 +161,11 @@ class BitPandaProClient(ExchangeClient):
         return frame
 
     @staticmethod
-    def _set_date_range_params(params: dict, start_time, end_time, precision: Literal['s', 'ms'] = None) -> dict:
+    def _set_date_range_params(params: dict, start_time, end_time, precision: Literal['s', 'ms'] = 'ms') -> dict:
         if start_time is not None:
-            params['from'] = to_isoformat(start_time, precision)
+            params['from'] = to_iso(start_time, precision)
         if end_time is not None:
-            params['to'] = to_isoformat(end_time, precision)
+            params['to'] = to_iso(end_time, precision)
         return params
 
     def get_rate(self, change: ExchangeRatesClient, base_currency: str, quote_currency: str):
@@ -0,0 +1,99 @@
+import asyncio
+import itertools
+import logging
+
+import httpx
+import pandas as pd
+
+from wired_exchange.core import VERSION, config
+from wired_exchange.core.RateLimiter import get_rate_limiter
+from wired_exchange.core.times import to_utc_datetimes
+
+# ids accepted by one coins/markets request, its per_page maximum
+MARKETS_BATCH_SIZE = 250
+DEFAULT_MAX_CONCURRENCY = 4
+MAX_RETRY = 5
+# seconds waited on a 429 response without Retry-After header
+REQUEST_DELAY = 15
+
+
+class CoinGeckoClient:
+    """asynchronous CoinGecko API v3 client, see https://www.coingecko.com/en/api/documentation
+
+    requests are spread by the process wide coingecko RateLimiter (rate_limit of the coingecko configuration),
+    at most max_concurrency of them are in flight"""
+
+    def __init__(self, host_url: str = None, max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        exchange_config = config()['exchanges'].get('coingecko', {})
+        self.host_url = host_url if host_url is not None else exchange_config.get('url')
+        self.max_concurrency = max_concurrency
+        self.transport = None
+        rate_limit = exchange_config.get('rate_limit')
+        self.rate_limiter = None if rate_limit is None else get_rate_limiter('coingecko', rate_limit,
+                                                                             max(1.0, rate_limit))
+        self._http = None
+        self._semaphore = None
+        self._logger = logging.getLogger(type(self).__name__)
+
+    async def __aenter__(self):
+        return await self.open_async()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close_async()
+
+    async def open_async(self):
+        if self._http is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._http = httpx.AsyncClient(base_url=self.host_url, transport=self.transport,
+                                           headers={'Accept': 'application/json',
+                                                    "User-Agent": "wired_exchange/" + VERSION})
+        return self
+
+    async def close_async(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def ping_async(self) -> dict:
+        return await self._get_async('/ping')
+
+    async def get_coins_async(self) -> pd.DataFrame:
+        """every coin: symbol and name indexed by CoinGecko id"""
+        coins = await self._get_async('/coins/list')
+        return pd.DataFrame(coins, columns=['id', 'symbol', 'name']).set_index('id')
+
+    async def get_exchanges_async(self) -> pd.DataFrame:
+        """every exchange: name indexed by CoinGecko id"""
+        exchanges = await self._get_async('/exchanges/list')
+        return pd.DataFrame(exchanges, columns=['id', 'name']).set_index('id')
+
+    async def get_markets_async(self, ids: list[str], vs_currency: str = 'usd') -> pd.DataFrame:
+        """market data (price, market cap, volume...) in vs_currency indexed by CoinGecko id
+
+        ids are fetched MARKETS_BATCH_SIZE at a time, batches are sent concurrently"""
+        ids = list(dict.fromkeys(ids))
+        batches = [ids[i:i + MARKETS_BATCH_SIZE] for i in range(0, len(ids), MARKETS_BATCH_SIZE)]
+        pages = await asyncio.gather(*[self._get_async('/coins/markets', {
+            'vs_currency': vs_currency, 'ids': ','.join(batch), 'per_page': MARKETS_BATCH_SIZE, 'page': 1})
+            for batch in batches])
+        markets = pd.DataFrame(list(itertools.chain.from_iterable(pages)))
+        if markets.empty:
+            return pd.DataFrame(columns=['symbol', 'name', 'current_price', 'market_cap', 'total_volume',
+                                         'last_updated'], index=pd.Index([], name='id'))
+        markets['last_updated'] = to_utc_datetimes(markets['last_updated'])
+        return markets.set_index('id')
+
+    async def _get_async(self, path: str, params: dict = None):
+        await self.open_async()
+        async with self._semaphore:
+            for retry in range(1, MAX_RETRY + 1):
+                if self.rate_limiter is not None:
+                    await asyncio.to_thread(self.rate_limiter.acquire)
+                response = await self._http.get(path, params=params)
+                if response.status_code != 429:
+                    response.raise_for_status()
+                    return response.json()
+                delay = float(response.headers.get('Retry-After', REQUEST_DELAY))
+                self._logger.warning(f'request threshold reach, waiting {delay}s #{retry}...')
+                await asyncio.sleep(delay)
+        raise Exception(f'too many requests, cannot get response from {path}')
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import threading
+from typing import Iterable
+
+import pandas as pd
+
+from wired_exchange.coingecko.CoinGeckoClient import CoinGeckoClient
+from wired_exchange.storage import WiredStorage, COINS_TABLE_NAME, EXCHANGES_TABLE_NAME
+
+# reference data is shared by every profile
+REFERENCE_PROFILE = 'coingecko'
+
+
+class CoinGeckoReference:
+    """CoinGecko coins and exchanges kept in storage, with an in-memory symbol -> coin ids index
+
+    a sync only writes the rows that changed since the previous one, market data of many symbols is fetched with
+    as few coins/markets requests as possible:
+
+        async with CoinGeckoReference() as reference:
+            await reference.sync_async()
+            markets = await reference.get_markets_async(['BTC', 'ETH', 'KCS'])"""
+
+    def __init__(self, storage: WiredStorage = None, client: CoinGeckoClient = None):
+        self._db = storage if storage is not None else WiredStorage(REFERENCE_PROFILE)
+        self.client = client if client is not None else CoinGeckoClient()
+        self._ids_by_symbol = None
+        # storage is not thread safe, coins and exchanges are written one after the other
+        self._db_lock = threading.Lock()
+        self._logger = logging.getLogger(type(self).__name__)
+
+    async def __aenter__(self):
+        await self.client.open_async()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.client.close_async()
+        self._db.close()
+
+    async def sync_async(self) -> dict[str, tuple[int, int]]:
+        """sync coins and exchanges concurrently, returns (upserted, deleted) row counts by table"""
+        coins, exchanges = await asyncio.gather(self.sync_coins_async(), self.sync_exchanges_async())
+        return {COINS_TABLE_NAME: coins, EXCHANGES_TABLE_NAME: exchanges}
+
+    async def sync_coins_async(self) -> tuple[int, int]:
+        coins = await self.client.get_coins_async()
+        changes = await asyncio.to_thread(self._sync_table, COINS_TABLE_NAME, coins)
+        self._ids_by_symbol = _index_by_symbol(coins)
+        self._logger.info(f'{COINS_TABLE_NAME}: {changes[0]} upserted, {changes[1]} deleted')
+        return changes
+
+    async def sync_exchanges_async(self) -> tuple[int, int]:
+        exchanges = await self.client.get_exchanges_async()
+        changes = await asyncio.to_thread(self._sync_table, EXCHANGES_TABLE_NAME, exchanges)
+        self._logger.info(f'{EXCHANGES_TABLE_NAME}: {changes[0]} upserted, {changes[1]} deleted')
+        return changes
+
+    def coin_ids(self, symbol: str) -> list[str]:
+        """CoinGecko ids of the coins of symbol (case insensitive), many coins may share a symbol"""
+        if self._ids_by_symbol is None:
+            with self._db_lock:
+                self._ids_by_symbol = _index_by_symbol(self._db.read_reference_data(COINS_TABLE_NAME))
+        return self._ids_by_symbol.get(symbol.lower(), [])
+
+    async def get_markets_async(self, symbols: Iterable[str], vs_currency: str = 'usd') -> pd.DataFrame:
+        """market data in vs_currency indexed by upper case symbol, symbols of many coins resolve to the one with
+        the largest market cap. unknown symbols are left out"""
+        ids_by_symbol = {symbol.upper(): self.coin_ids(symbol) for symbol in symbols}
+        markets = await self.client.get_markets_async([i for ids in ids_by_symbol.values() for i in ids],
+                                                      vs_currency)
+        markets = markets.assign(symbol=markets['symbol'].str.upper()).reset_index()
+        return (markets.sort_values('market_cap', ascending=False, na_position='last')
+                .drop_duplicates('symbol').set_index('symbol'))
+
+    def _sync_table(self, table_name: str, data: pd.DataFrame) -> tuple[int, int]:
+        with self._db_lock:
+            return self._db.sync_reference_data(table_name, data)
+
+
+def _index_by_symbol(coins: pd.DataFrame) -> dict[str, list[str]]:
+    return coins.index.to_series().groupby(coins['symbol'].str.lower()).agg(list).to_dict()
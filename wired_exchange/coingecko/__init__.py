@@ -1,53 +1,27 @@
-import asyncio
-import pandas as pd
-import sqlalchemy
-from coingecko_api_client.client import CoinGeckoAPIAsyncClient
-from sqlalchemy import Table, MetaData, select
+"""CoinGecko reference data helpers"""
+
+from .CoinGeckoClient import CoinGeckoClient, DEFAULT_MAX_CONCURRENCY, MARKETS_BATCH_SIZE, MAX_RETRY, REQUEST_DELAY
+from .CoinGeckoReference import CoinGeckoReference, REFERENCE_PROFILE
 
 
 async def ping_coingecko():
-    coingecko = CoinGeckoAPIAsyncClient()
-    try:
-        # pis CoinGecko API with async client
-        async_ping_data = await coingecko.ping()
-        print(async_ping_data)
-    finally:
-        await coingecko.close()
-
-
-async def load_coins_data():
-    coingecko = CoinGeckoAPIAsyncClient()
-    try:
-        # pis CoinGecko API with async client
-        coins = await coingecko.coins_list()
-        df = pd.DataFrame(coins).set_index('symbol').rename(columns={'id': 'id_coingecko'})
-        db = sqlalchemy.create_engine('sqlite:///wired_exchange.sqlite')
-        df.to_sql('COINS', db, if_exists='replace', index=True
-                    , dtype={"id_coingecko": sqlalchemy.types.NVARCHAR(50),
-                             "symbol": sqlalchemy.types.NVARCHAR(20),
-                             "name": sqlalchemy.types.NVARCHAR(80)})
-    finally:
-        await coingecko.close()
-
-async def load_exchanges_data():
-    coingecko = CoinGeckoAPIAsyncClient()
-    try:
-        exchanges = await coingecko.exchanges_list()
-        df = pd.DataFrame(exchanges).set_index('name').rename(columns={'id': 'id_coingecko'})
-        db = sqlalchemy.create_engine('sqlite:///wired_exchange.sqlite')
-        df.to_sql('EXCHANGES', db, if_exists='replace', index=True
-                    , dtype={"id_coingecko": sqlalchemy.types.NVARCHAR(50),
-                             "name": sqlalchemy.types.NVARCHAR(80)})
-    finally:
-        await coingecko.close()
-
-async def load_market_data(symbol):
-    try:
-        db = sqlalchemy.create_engine('sqlite:///wired_exchange.sqlite')
-        metadata = MetaData()
-        coins = Table('COINS', metadata, autoload=True, autoload_with=db)
-        id_coingecko = db.scalar(select(coins.c.id_coingecko).where(coins.symbol == symbol))
-        coingecko = CoinGeckoAPIAsyncClient()
-        raise RuntimeError('to be implemented')
-    finally:
-        await coingecko.close()
+    async with CoinGeckoClient() as coingecko:
+        print(await coingecko.ping_async())
+
+
+async def load_coins_data() -> tuple[int, int]:
+    """upsert new and changed coins, delete delisted ones, returns (upserted, deleted) row counts"""
+    async with CoinGeckoReference() as reference:
+        return await reference.sync_coins_async()
+
+
+async def load_exchanges_data() -> tuple[int, int]:
+    """upsert new and changed exchanges, delete removed ones, returns (upserted, deleted) row counts"""
+    async with CoinGeckoReference() as reference:
+        return await reference.sync_exchanges_async()
+
+
+async def load_market_data(symbols, vs_currency: str = 'usd'):
+    """market data of a symbol or of a list of symbols, indexed by symbol"""
+    async with CoinGeckoReference() as reference:
+        return await reference.get_markets_async([symbols] if isinstance(symbols, str) else symbols, vs_currency)
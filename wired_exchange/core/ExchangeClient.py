@@ -21,6 +21,10 @@ class ExchangeClient:
         self._logger = logging.getLogger(type(self).__name__)
         self.platform = platform
         self._httpClient = None
+        # optional httpx transport, clients of a same host may share its connection pool
+        self.transport = None
+        # optional RateLimiter taken by every request, shared by the clients of an API key
+        self.rate_limiter = None
         self.always_authenticate = always_authenticate
         self._api_key = api_key if api_key is not None else self._get_exchange_env_value('api_key')
         self._api_secret = api_secret if api_secret is not None else self._get_exchange_env_value('api_secret')
@@ -40,11 +44,11 @@ class ExchangeClient:
 
     def open(self):
         if self._httpClient is None:
-            self._httpClient = httpx.Client(base_url=self.host_url,
+            self._httpClient = httpx.Client(base_url=self.host_url, transport=self.transport,
                                             event_hooks={
-                                                'request': [self._log_request,
+                                                'request': [self._log_request, self._throttle,
                                                             self._authenticate] if self.always_authenticate else [
-                                                    self._log_request],
+                                                    self._log_request, self._throttle],
                                                 'response': [self._log_response, raise_on_4xx_5xx]},
                                             headers={'Accept': 'application/json',
                                                      "User-Agent": "wired_exchange/" + VERSION})
@@ -63,6 +67,10 @@ class ExchangeClient:
     def __str__(self):
         return f'{self.platform} exchange client'
 
+    def _throttle(self, request: httpx.Request):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+
     def _log_request(self, request):
         self._logger.debug(request.headers)
         self._logger.debug(f"Request event hook: {request.method} {request.url} - Waiting for response")
@@ -0,0 +1,122 @@
+from collections import namedtuple
+from typing import Union, Callable
+
+import numpy as np
+import pandas as pd
+
+from wired_exchange.core.times import to_utc_datetimes
+
+Field = namedtuple('Field', ['source', 'dtype', 'transform'], defaults=[None, None])
+Field.__doc__ = """payload field mapping: source key, target dtype and optional vectorized Series transform
+
+supported dtypes: float, int, bool, string, category, datetime (ISO strings), datetime[s], datetime[ms]"""
+
+SymbolSplit = namedtuple('SymbolSplit', ['source', 'separator', 'base', 'quote'],
+                         defaults=['base_currency', 'quote_currency'])
+SymbolSplit.__doc__ = """split a market symbol (e.g. BTC-USDT) into base and quote currency columns"""
+
+FLOAT_DTYPES = ('float', 'float64')
+
+
+class PayloadSchema:
+    """declarative conversion of an exchange JSON payload into a typed DataFrame
+
+    fields maps each output column to a payload Field (a plain string is a source key kept as is),
+    payload keys not referenced are dropped."""
+
+    def __init__(self, fields: dict[str, Union[Field, str]], symbol: SymbolSplit = None,
+                 id_source: str = None, index: str = None, record_keys: list[str] = None):
+        self.fields = {name: Field(f) if isinstance(f, str) else f for name, f in fields.items()}
+        self.symbol = symbol
+        self.id_source = id_source
+        self.index = index
+        # positional payloads (list of lists) are labelled with record_keys
+        self.record_keys = record_keys
+        sources = [f.source for f in self.fields.values()]
+        if symbol is not None:
+            sources.append(symbol.source)
+        if id_source is not None:
+            sources.append(id_source)
+        self._sources = list(dict.fromkeys(sources))
+
+    @property
+    def columns(self) -> list[str]:
+        columns = list(self.fields.keys())
+        if self.symbol is not None:
+            columns += [self.symbol.base, self.symbol.quote]
+        if self.id_source is not None:
+            columns.append('id')
+        return columns
+
+    def normalize(self, payload: Union[list, pd.DataFrame], platform: str = None, **constants) -> pd.DataFrame:
+        """convert payload into typed columns, platform is used as id prefix and platform column"""
+        raw = self._to_raw_frame(payload)
+        # numeric fields are parsed together in a single 2-D conversion
+        floats = _to_floats(raw, {name: f.source for name, f in self.fields.items()
+                                  if f.dtype in FLOAT_DTYPES and f.transform is None})
+        columns = {}
+        for name, f in self.fields.items():
+            columns[name] = floats[name] if name in floats else _convert(raw[f.source], f.dtype, f.transform)
+        if self.symbol is not None:
+            columns[self.symbol.base], columns[self.symbol.quote] = split_symbols(raw[self.symbol.source],
+                                                                                  self.symbol.separator)
+        if platform is not None:
+            columns['platform'] = platform
+        columns.update(constants)
+        if self.id_source is not None:
+            ids = raw[self.id_source].astype('string')
+            columns['id'] = ids if platform is None else f'{platform}_' + ids
+        frame = pd.DataFrame(columns, index=raw.index)
+        if self.index is not None:
+            frame.set_index(self.index, inplace=True)
+        return frame
+
+    def _to_raw_frame(self, payload) -> pd.DataFrame:
+        if isinstance(payload, pd.DataFrame):
+            return payload.reindex(columns=self._sources)
+        if self.record_keys is not None:
+            return pd.DataFrame(payload, columns=self.record_keys).reindex(columns=self._sources)
+        return pd.DataFrame(payload, columns=self._sources)
+
+
+def split_symbols(symbols: pd.Series, separator: str) -> tuple[pd.Series, pd.Series]:
+    """split symbols once per distinct value, histories hold few distinct markets for many rows"""
+    codes, uniques = pd.factorize(symbols)
+    bases = np.empty(len(uniques) + 1, dtype=object)
+    quotes = np.empty(len(uniques) + 1, dtype=object)
+    for i, symbol in enumerate(uniques):
+        base, _, quote = str(symbol).partition(separator)
+        bases[i] = base
+        quotes[i] = quote if quote != '' else None
+    # factorize flags missing values with -1, pointing to the trailing None
+    bases[-1] = quotes[-1] = None
+    return (pd.Series(bases[codes], index=symbols.index, dtype='string'),
+            pd.Series(quotes[codes], index=symbols.index, dtype='string'))
+
+
+def _to_floats(raw: pd.DataFrame, sources: dict[str, str]) -> dict[str, pd.Series]:
+    if len(sources) == 0:
+        return {}
+    values = raw[list(sources.values())].to_numpy()
+    try:
+        values = values.astype('float64')
+        return {name: pd.Series(values[:, i], index=raw.index) for i, name in enumerate(sources.keys())}
+    except (ValueError, TypeError):
+        # malformed numbers (e.g. empty strings) are coerced column by column
+        return {name: pd.to_numeric(raw[source], errors='coerce') for name, source in sources.items()}
+
+
+def _convert(values: pd.Series, dtype: str, transform: Callable = None) -> pd.Series:
+    if transform is not None:
+        values = transform(values)
+    if dtype is None:
+        return values
+    if dtype in FLOAT_DTYPES:
+        return pd.to_numeric(values, errors='coerce')
+    if dtype == 'datetime' or dtype.startswith('datetime['):
+        return to_utc_datetimes(values, dtype[9:-1] if dtype != 'datetime' else 'ns')
+    if dtype == 'bool':
+        return values.astype('boolean')
+    if dtype == 'int':
+        return pd.to_numeric(values).astype('Int64')
+    return values.astype(dtype)
@@ -0,0 +1,43 @@
+import logging
+import threading
+import time
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class RateLimiter:
+    """token bucket allowing rate requests per second on average and bursts of capacity requests
+
+    acquire blocks the calling thread until a request is allowed, one limiter is shared by every client of an API key"""
+
+    def __init__(self, name: str, rate: float, capacity: float = None):
+        self.name = name
+        self.rate = rate
+        self.capacity = rate if capacity is None else capacity
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._logger = logging.getLogger(type(self).__name__)
+
+    def acquire(self) -> float:
+        """take a token, return the seconds waited for it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= 1
+            # the token is reserved now, callers queued behind wait for the next ones
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if delay > 0:
+            self._logger.debug(f'{self.name}: throttled for {delay:.3f}s')
+            time.sleep(delay)
+        return delay
+
+
+def get_rate_limiter(name: str, rate: float, capacity: float = None) -> RateLimiter:
+    """process wide limiter of name (e.g. platform and API key), created with rate and capacity on first use"""
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = RateLimiter(name, rate, capacity)
+        return _limiters[name]
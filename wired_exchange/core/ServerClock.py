@@ -0,0 +1,52 @@
+import logging
+import threading
+import time
+from typing import Callable
+
+DEFAULT_SYNC_INTERVAL = 15 * 60
+
+
+class ServerClock:
+    """exchange server time estimated from the local clock and a periodically measured offset
+
+    fetch_server_time returns the server time in milliseconds, it is called at most once per sync_interval"""
+
+    def __init__(self, fetch_server_time: Callable[[], int], sync_interval: float = DEFAULT_SYNC_INTERVAL):
+        self.sync_interval = sync_interval
+        self.offset_ms = 0
+        self._fetch_server_time = fetch_server_time
+        self._synced_at = None
+        self._syncing = threading.Lock()
+        self._logger = logging.getLogger(type(self).__name__)
+
+    def now_ms(self) -> int:
+        """current server time in milliseconds"""
+        if self.is_stale():
+            self.sync()
+        return int(time.time() * 1000) + self.offset_ms
+
+    def is_stale(self) -> bool:
+        """whether next now_ms call synchronizes first"""
+        return self._synced_at is None or time.monotonic() - self._synced_at > self.sync_interval
+
+    def sync(self):
+        """measure offset against the server, taking local time at the middle of the round trip"""
+        # concurrent callers keep using the current offset while one of them syncs
+        if not self._syncing.acquire(blocking=False):
+            return
+        try:
+            sent = time.time()
+            server_time = self._fetch_server_time()
+            received = time.time()
+            self.offset_ms = int(round(server_time - (sent + received) / 2 * 1000))
+            self._logger.debug(f'server clock offset: {self.offset_ms}ms (round trip {(received - sent) * 1000:.0f}ms)')
+        except:
+            self._logger.warning('cannot synchronize server clock, keeping previous offset', exc_info=True)
+        finally:
+            # a failing server is retried on next interval only, not on every request
+            self._synced_at = time.monotonic()
+            self._syncing.release()
+
+    def invalidate(self):
+        """force a sync on next use, e.g. after a timestamp rejection"""
+        self._synced_at = None
@@ -1,23 +1,35 @@
-import datetime
+from __future__ import annotations
+
 import os
-from typing import Union, Literal
-from datetime import datetime, timedelta
+from typing import Union, Literal, Iterable, Callable, Any, TYPE_CHECKING
+from datetime import datetime
+
+from wired_exchange.core.times import to_epoch, to_utc_datetime, to_iso, to_utc_datetimes
 
-import pandas as pd
-import pytomlpp
-import pytz
-import tzlocal
+if TYPE_CHECKING:
+    import pandas as pd
 
 resource_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "resources")
 config_path = os.path.join(resource_path, 'wired_exchange.toml')
+# optional configuration overrides read from the working directory
+local_config_path = 'wired_exchange.toml'
 
 VERSION = '1.5.0'
 
-with open(config_path, 'r') as cfg:
-    _config = pytomlpp.load(cfg)
+_config = None
 
 
 def config():
+    """configuration is read on first use, merging local overrides into packaged resources"""
+    global _config
+    if _config is None:
+        import pytomlpp
+        with open(config_path, 'r') as cfg:
+            loaded = pytomlpp.load(cfg)
+        if os.path.exists(local_config_path):
+            with open(local_config_path, 'r') as cfg:
+                merge(loaded, pytomlpp.load(cfg))
+        _config = loaded
     return _config
 
 
@@ -37,28 +49,25 @@ def merge(a, b, path=None):
     return a
 
 
-def to_timestamp(dt, resolution) -> int:
-    return to_timestamp_in_seconds(dt) if resolution == 's' else to_timestamp_in_milliseconds(dt)
+def to_timestamp(dt, resolution: Literal['s', 'ms']) -> int:
+    return to_epoch(dt, resolution)
 
 
 def from_timestamp(timestamp: Union[int, float], precision: Literal['s', 'ms']) -> datetime:
-    if precision == 's':
-        dt = datetime.datetime.fromtimestamp(timestamp, tzlocal.get_localzone())
-    else:
-        dt = datetime.datetime.fromtimestamp(timestamp / 1000, tzlocal.get_localzone())
-        dt += timedelta(milliseconds=timestamp % 1000)
-    return dt
+    """aware UTC datetime"""
+    return to_utc_datetime(timestamp, precision)
 
 
 def to_timestamp_in_seconds(dt: datetime) -> int:
-    return int(round(dt.timestamp()))
+    return to_epoch(dt, 's')
 
 
 def to_timestamp_in_milliseconds(dt: datetime) -> int:
-    return int(round(dt.timestamp() * 1000 + (dt.microsecond / 1000)))
+    return to_epoch(dt, 'ms')
 
 
 def read_transactions(path_or_buf, orient='index') -> pd.DataFrame:
+    import pandas as pd
     tr = pd.read_json(path_or_buf, orient=orient)
     return to_transactions(tr)
 
@@ -72,25 +81,43 @@ def to_transactions(tr) -> pd.DataFrame:
     return tr.sort_values(by='time', ascending=False)
 
 
+def concat_batches(batches: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    """concatenate streamed batches once, avoiding quadratic DataFrame.append growth"""
+    import pandas as pd
+    frames = [batch for batch in batches if batch is not None and batch.size > 0]
+    return pd.concat(frames) if len(frames) > 0 else pd.DataFrame()
+
+
+def drain(batches: Iterable[pd.DataFrame], sink: Callable[[pd.DataFrame], Any]) -> int:
+    """hand over each streamed batch to sink as soon as it is available, return the number of rows written"""
+    count = 0
+    for batch in batches:
+        if batch is not None and batch.size > 0:
+            sink(batch)
+            count += len(batch)
+    return count
+
+
 def read_klines(path_or_buf, base: str = None, quote: str = None) -> pd.DataFrame:
+    import pandas as pd
     return to_klines(pd.read_json(path_or_buf), base, quote)
 
 
 def to_klines(pr, base: str = None, quote: str = None) -> pd.DataFrame:
+    import pandas as pd
     if (base is not None) and ('base_currency' not in pr.columns):
         pr['base_currency'] = base
     if (quote is not None) and ('quote_currency' not in pr.columns):
         pr['quote_currency'] = quote
     if 'base_currency' in pr.columns:
-        pr.astype(dict(base_currency='string'))
+        pr = pr.astype(dict(base_currency='string'))
     if 'quote_currency' in pr.columns:
-        pr.astype(dict(quote_currency='string'))
-    pr['time'] = pd.to_datetime(pr['time'], unit='ms', utc=True)
+        pr = pr.astype(dict(quote_currency='string'))
+    if not pd.api.types.is_datetime64_any_dtype(pr['time']):
+        pr['time'] = to_utc_datetimes(pr['time'], 'ms')
     pr.set_index('time', inplace=True)
-    pr.astype(dict(open='float', high='float', low='float', close='float', volume='float'))
-    return pr
+    return pr.astype(dict(open='float', high='float', low='float', close='float', volume='float'))
 
 
 def to_isoformat(dt: Union[datetime, int, float], precision: Literal['s', 'ms'] = None) -> str:
-    return dt.astimezone(pytz.utc).isoformat() if isinstance(dt, datetime) else \
-        from_timestamp(dt, precision).astimezone(pytz.utc).isoformat()
+    return to_iso(dt, precision or 'ms')
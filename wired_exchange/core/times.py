@@ -0,0 +1,112 @@
+"""UTC instants as int64 epoch nanoseconds
+
+scalar helpers convert a datetime (naive ones are UTC), a pandas Timestamp, a numpy datetime64, an ISO string or an
+epoch number in a given unit to epoch nanoseconds and back to an aware UTC datetime, with exact integer arithmetic.
+array helpers convert whole columns at once, without a Python datetime per row:
+
+    to_epoch(datetime(2022, 1, 1), 'ms')          # 1640995200000
+    to_utc_datetime(1640995200123, 'ms')          # datetime(2022, 1, 1, 0, 0, 0, 123000, tzinfo=timezone.utc)
+    to_utc_datetimes(payload['createdAt'], 'ms')  # datetime64[ns, UTC] Series
+"""
+from __future__ import annotations
+
+import time
+from datetime import datetime, timedelta, timezone
+from numbers import Integral, Real
+from typing import Literal, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+Unit = Literal['s', 'ms', 'us', 'ns']
+NANOS = dict(s=1_000_000_000, ms=1_000_000, us=1_000, ns=1)
+# int64 minimum, the NaT of numpy and pandas
+NAT_NS = -2 ** 63
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+Instant = Union[datetime, str, int, float]
+
+
+def now_ns() -> int:
+    return time.time_ns()
+
+
+def to_epoch_ns(value: Instant, unit: Unit = 'ns') -> int:
+    """numbers are epoch times in unit"""
+    if isinstance(value, datetime):
+        # pandas Timestamp keeps its nanoseconds, naive ones hold UTC wall time as well
+        value_ns = getattr(value, 'value', None)
+        if isinstance(value_ns, int):
+            return value_ns
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        delta = value - EPOCH
+        return (delta.days * 86_400 + delta.seconds) * 1_000_000_000 + delta.microseconds * 1_000
+    if isinstance(value, str):
+        return to_epoch_ns(datetime.fromisoformat(value.replace('Z', '+00:00')))
+    if getattr(getattr(value, 'dtype', None), 'kind', None) == 'M':
+        return int(value.astype('datetime64[ns]').astype('int64'))
+    if isinstance(value, Integral):
+        return int(value) * NANOS[unit]
+    return int(round(value * NANOS[unit]))
+
+
+def to_epoch(value: Instant, precision: Unit) -> int:
+    """epoch time in precision, truncated toward the past. numbers are already epoch times in precision"""
+    if isinstance(value, Real):
+        return int(round(value))
+    return to_epoch_ns(value) // NANOS[precision]
+
+
+def to_utc_datetime(value: Instant, unit: Unit = 'ns') -> datetime:
+    """aware UTC datetime (microsecond precision), numbers are epoch times in unit"""
+    return EPOCH + timedelta(microseconds=to_epoch_ns(value, unit) // 1_000)
+
+
+def to_iso(value: Instant, unit: Unit = 'ns') -> str:
+    """ISO 8601 UTC time, numbers are epoch times in unit"""
+    return to_utc_datetime(value, unit).isoformat()
+
+
+def to_epoch_ns_array(values, unit: Unit = 'ns') -> np.ndarray:
+    """int64 epoch nanoseconds of a column of datetimes (naive ones are UTC), ISO strings or epoch numbers in unit
+    (numeric strings included), missing values are NAT_NS"""
+    import numpy as np
+    import pandas as pd
+    if isinstance(values, (pd.Series, pd.Index)) and pd.api.types.is_datetime64_any_dtype(values.dtype):
+        # asi8 of aware times is UTC, naive times hold UTC wall time
+        return pd.DatetimeIndex(values).asi8
+    array = np.asarray(values)
+    kind = array.dtype.kind
+    if kind == 'M':
+        return array.astype('datetime64[ns]').view('int64')
+    if kind in 'iu':
+        return array.astype('int64') * NANOS[unit]
+    if kind == 'f':
+        return _floats_to_ns(array.astype('float64'), unit)
+    try:
+        numbers = pd.to_numeric(array)
+    except (ValueError, TypeError):
+        return pd.DatetimeIndex(pd.to_datetime(array, utc=True)).asi8
+    return to_epoch_ns_array(numbers, unit)
+
+
+def to_utc_datetimes(values, unit: Unit = 'ns') -> Union[pd.Series, pd.DatetimeIndex]:
+    """datetime64[ns, UTC] column of values (see to_epoch_ns_array), a Series keeps its index and name"""
+    import pandas as pd
+    times = pd.DatetimeIndex(to_epoch_ns_array(values, unit).view('datetime64[ns]')).tz_localize('UTC')
+    if isinstance(values, pd.Series):
+        return pd.Series(times, index=values.index, name=values.name)
+    return times
+
+
+def _floats_to_ns(array: np.ndarray, unit: Unit) -> np.ndarray:
+    import numpy as np
+    result = np.full(len(array), NAT_NS, dtype='int64')
+    valid = ~np.isnan(array)
+    # whole units are scaled as integers, keeping epoch milliseconds parsed as floats (e.g. with missing values) exact
+    whole = np.floor(array[valid])
+    result[valid] = whole.astype('int64') * NANOS[unit] + np.round((array[valid] - whole) * NANOS[unit]).astype('int64')
+    return result
@@ -0,0 +1,106 @@
+import logging
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor, wait
+from typing import Callable, Any, Optional
+
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_COOL_DOWN = 5 * 60
+MAX_WORKERS = 16
+
+# calls missing their deadline keep running in background, they must not hold up the caller's thread
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='wired_exchange')
+_breakers = {}
+_breakers_lock = threading.Lock()
+_logger = logging.getLogger('deadlines')
+
+
+class CircuitBreaker:
+    """skip a source failing failure_threshold times in a row until cool_down seconds have elapsed,
+    then let a single trial call through"""
+
+    def __init__(self, name: str, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 cool_down: float = DEFAULT_COOL_DOWN):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cool_down = cool_down
+        self.failures = 0
+        self.last_success = None
+        self._opened_at = None
+        self._lock = threading.Lock()
+        self._logger = logging.getLogger(type(self).__name__)
+
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.cool_down:
+                # half open: the next failure reopens the circuit for a whole cool down
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                self._logger.info(f'{self.name}: circuit closed')
+            self.failures = 0
+            self._opened_at = None
+            self.last_success = time.time()
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    self._logger.warning(f'{self.name}: circuit opened after {self.failures} failures, '
+                                         f'skipped for {self.cool_down}s')
+                self._opened_at = time.monotonic()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """process wide breaker of a source, shared by every Portfolio instance"""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def call_with_deadline(calls: dict[str, Callable[[], Any]], deadline: Optional[float],
+                       scope: str = None, executor: Executor = None) -> tuple[dict[str, Any], dict[str, str]]:
+    """run calls concurrently and wait at most deadline seconds (None waits for all), return results and failure
+    reasons by name
+
+    each name has its own circuit breaker within scope (e.g. a profile), open circuits are skipped without calling.
+    calls run on executor, by default a pool of MAX_WORKERS threads shared by every caller"""
+    executor = _executor if executor is None else executor
+    futures = {}
+    failures = {}
+    for name, call in calls.items():
+        if get_breaker(_breaker_name(scope, name)).allow():
+            futures[name] = executor.submit(call)
+        else:
+            failures[name] = 'circuit open'
+    done, _ = wait(futures.values(), timeout=deadline)
+    results = {}
+    for name, future in futures.items():
+        breaker = get_breaker(_breaker_name(scope, name))
+        if future not in done:
+            failures[name] = 'deadline exceeded'
+            breaker.record_failure()
+            _logger.warning(f'{name}: no response within {deadline}s')
+        elif future.exception() is not None:
+            failures[name] = 'error'
+            breaker.record_failure()
+            _logger.error(f'{name}: call failed', exc_info=future.exception())
+        else:
+            results[name] = future.result()
+            breaker.record_success()
+    return results, failures
+
+
+def _breaker_name(scope: str, name: str) -> str:
+    return name if scope is None else f'{scope}/{name}'
@@ -0,0 +1,266 @@
+"""price events subscribed by bots
+
+bots subscribe a filter and a callback to an EventBus fed with ticker prices, e.g. by a TickerFeed registered on
+the Kucoin websocket. filters are crossings of a level by a value computed once per symbol and tick: the price
+(PriceCross), its percent change over a time window (PriceChange) or a tick indicator (IndicatorCross). levels of a
+value are kept sorted, so a tick finds the crossed ones by bisecting between the previous and the current value
+whatever the number of subscriptions:
+
+    bus = EventBus()
+    bus.subscribe(PriceCross('BTC-USDT', 30000, 'above'), print)
+    bus.subscribe(PriceChange(None, 5, 300, 'down'), print)  # any symbol losing 5% within 5 minutes
+    bus.subscribe(IndicatorCross('ETH-USDT', 'rsi', 14, 30, 'below'), print)
+    await kucoin.register_ticker_strategy_async(TickerFeed(bus))
+"""
+import itertools
+import logging
+import time
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from typing import Callable, Literal, Optional, Union
+
+from wired_exchange.kucoin.WebSocket import TickerStrategy
+
+Direction = Literal['above', 'below']
+
+PriceCross = namedtuple('PriceCross', ['symbol', 'level', 'direction'], defaults=['above'])
+PriceCross.__doc__ = """price of symbol (None for any symbol) rising to level or above, or falling below level"""
+
+PriceChange = namedtuple('PriceChange', ['symbol', 'change_pcnt', 'window', 'direction'], defaults=['up'])
+PriceChange.__doc__ = """price of symbol (None for any symbol) up or down by change_pcnt compared to window seconds
+ago"""
+
+IndicatorCross = namedtuple('IndicatorCross', ['symbol', 'indicator', 'window', 'level', 'direction'],
+                            defaults=['above'])
+IndicatorCross.__doc__ = """indicator ('rsi' or 'ema' over window ticks) of symbol (None for any symbol) rising to
+level or above, or falling below level"""
+
+PriceEvent = namedtuple('PriceEvent', ['subscription', 'filter', 'symbol', 'time', 'price', 'value'])
+PriceEvent.__doc__ = """filter of subscription met by symbol at time (epoch ns), value is the crossing value: price,
+percent change or indicator"""
+
+INDICATORS = ('rsi', 'ema')
+
+
+class ThresholdIndex:
+    """levels sorted by crossing direction, each level being a key (e.g. a subscription id)"""
+
+    def __init__(self):
+        self._levels = dict(above=[], below=[])
+        self._keys = dict(above=[], below=[])
+
+    def __len__(self):
+        return len(self._keys['above']) + len(self._keys['below'])
+
+    def add(self, level: float, key, direction: Direction = 'above'):
+        levels, keys = self._levels[direction], self._keys[direction]
+        index = bisect_right(levels, level)
+        levels.insert(index, level)
+        keys.insert(index, key)
+
+    def remove(self, level: float, key, direction: Direction = 'above') -> bool:
+        levels, keys = self._levels[direction], self._keys[direction]
+        index = bisect_left(levels, level)
+        while index < len(levels) and levels[index] == level:
+            if keys[index] == key:
+                del levels[index]
+                del keys[index]
+                return True
+            index += 1
+        return False
+
+    def crossed(self, previous: Optional[float], current: Optional[float]) -> list:
+        """keys of levels crossed from previous to current: rising to or above levels, falling below levels"""
+        direction, crossed = self._crossed(previous, current)
+        return [] if crossed is None else self._keys[direction][crossed]
+
+    def pop_crossed(self, previous: Optional[float], current: Optional[float]) -> list[tuple[float, object]]:
+        """remove levels crossed from previous to current, return their (level, key)"""
+        direction, crossed = self._crossed(previous, current)
+        if crossed is None:
+            return []
+        levels, keys = self._levels[direction], self._keys[direction]
+        popped = list(zip(levels[crossed], keys[crossed]))
+        del levels[crossed]
+        del keys[crossed]
+        return popped
+
+    def _crossed(self, previous: Optional[float], current: Optional[float]) -> tuple[Direction, Optional[slice]]:
+        if previous is None or current is None or previous == current:
+            return 'above', None
+        if current > previous:
+            levels = self._levels['above']
+            return 'above', slice(bisect_right(levels, previous), bisect_right(levels, current))
+        levels = self._levels['below']
+        return 'below', slice(bisect_right(levels, current), bisect_right(levels, previous))
+
+
+class EventBus:
+    """in-process price events, callbacks run on the publishing thread (the websocket event loop for a TickerFeed)"""
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self._subscriptions = {}
+        # threshold indexes by (symbol or None, value key), value keys are ('price',), ('change', window)
+        # or (indicator, window)
+        self._indexes = {}
+        self._value_keys = {}
+        # previous value by (symbol, value key)
+        self._values = {}
+        self._indicators = {}
+        self._histories = {}
+        self._logger = logging.getLogger(type(self).__name__)
+
+    def subscribe(self, event_filter: Union[PriceCross, PriceChange, IndicatorCross],
+                  callback: Callable[[PriceEvent], None]) -> int:
+        """return the subscription id"""
+        value_key, level, direction = _to_threshold(event_filter)
+        subscription_id = next(self._ids)
+        self._subscriptions[subscription_id] = (event_filter, callback)
+        index = self._indexes.get((event_filter.symbol, value_key))
+        if index is None:
+            index = self._indexes[(event_filter.symbol, value_key)] = ThresholdIndex()
+            self._value_keys.setdefault(event_filter.symbol, set()).add(value_key)
+        index.add(level, subscription_id, direction)
+        return subscription_id
+
+    def unsubscribe(self, subscription_id: int) -> bool:
+        subscription = self._subscriptions.pop(subscription_id, None)
+        if subscription is None:
+            return False
+        event_filter = subscription[0]
+        value_key, level, direction = _to_threshold(event_filter)
+        index = self._indexes[(event_filter.symbol, value_key)]
+        index.remove(level, subscription_id, direction)
+        if len(index) == 0:
+            del self._indexes[(event_filter.symbol, value_key)]
+            self._value_keys[event_filter.symbol].discard(value_key)
+        return True
+
+    def publish(self, symbol: str, price: float, time_ns: int = None) -> list[PriceEvent]:
+        """apply a ticker price, call and return the events it raised"""
+        time_ns = time.time_ns() if time_ns is None else time_ns
+        value_keys = self._value_keys.get(symbol, set()) | self._value_keys.get(None, set())
+        if len(value_keys) == 0:
+            return []
+        windows = [key[1] for key in value_keys if key[0] == 'change']
+        if len(windows) > 0:
+            history = self._histories.get(symbol)
+            if history is None:
+                history = self._histories[symbol] = _PriceHistory()
+            history.append(time_ns, price, max(windows))
+        events = []
+        for value_key in value_keys:
+            current = self._value_of(symbol, value_key, price, time_ns)
+            previous = self._values.get((symbol, value_key))
+            self._values[(symbol, value_key)] = current
+            for index_symbol in (symbol, None):
+                index = self._indexes.get((index_symbol, value_key))
+                if index is None:
+                    continue
+                for subscription_id in index.crossed(previous, current):
+                    events.append(PriceEvent(subscription_id, self._subscriptions[subscription_id][0], symbol,
+                                             time_ns, price, current))
+        for event in events:
+            # a callback may have unsubscribed the next ones
+            subscription = self._subscriptions.get(event.subscription)
+            if subscription is None:
+                continue
+            try:
+                subscription[1](event)
+            except:
+                self._logger.error(f'{event.symbol}: subscription {event.subscription} callback failed',
+                                   exc_info=True)
+        return events
+
+    def _value_of(self, symbol: str, value_key: tuple, price: float, time_ns: int) -> Optional[float]:
+        kind = value_key[0]
+        if kind == 'price':
+            return price
+        if kind == 'change':
+            past = self._histories[symbol].price_at(time_ns - value_key[1] * 1_000_000_000)
+            return None if past is None else (price / past - 1) * 100
+        indicator = self._indicators.get((symbol, value_key))
+        if indicator is None:
+            indicator = self._indicators[(symbol, value_key)] = _TickIndicator(kind, value_key[1])
+        return indicator.update(price)
+
+
+class TickerFeed(TickerStrategy):
+    """ticker strategy publishing Kucoin ticker prices to an event bus. tickers None follows every symbol"""
+
+    def __init__(self, bus: EventBus, tickers: Optional[list[Union[tuple[str, str], str]]] = None):
+        super().__init__(tickers)
+        self.bus = bus
+
+    def on_ticker(self, symbol: str, data: dict):
+        self.bus.publish(symbol, float(data['price']), int(data['time']) * 1_000_000)
+
+
+class _PriceHistory:
+    """ticks of a symbol over the longest subscribed window"""
+
+    def __init__(self):
+        self.times = []
+        self.prices = []
+        self.start = 0
+
+    def append(self, time_ns: int, price: float, window: int):
+        self.times.append(time_ns)
+        self.prices.append(price)
+        # the last tick before the window is kept as the price at the window start
+        oldest = bisect_right(self.times, time_ns - window * 1_000_000_000, lo=self.start) - 1
+        if oldest > self.start:
+            self.start = oldest
+        if self.start > len(self.times) // 2:
+            del self.times[:self.start]
+            del self.prices[:self.start]
+            self.start = 0
+
+    def price_at(self, time_ns: int) -> Optional[float]:
+        index = bisect_right(self.times, time_ns, lo=self.start) - 1
+        return self.prices[index] if index >= self.start else None
+
+
+class _TickIndicator:
+    """indicator updated tick by tick, None until window ticks were seen"""
+
+    def __init__(self, kind: str, window: int):
+        self.kind = kind
+        self.window = window
+        self.count = 0
+        self.last = None
+        self.ema = None
+        self.up = 0.0
+        self.down = 0.0
+
+    def update(self, price: float) -> Optional[float]:
+        self.count += 1
+        if self.kind == 'ema':
+            alpha = 2 / (self.window + 1)
+            self.ema = price if self.ema is None else self.ema + alpha * (price - self.ema)
+            return self.ema if self.count >= self.window else None
+        # Wilder RSI, as backtest.rsi
+        if self.last is not None:
+            alpha = 1 / self.window
+            self.up += alpha * (max(price - self.last, 0.0) - self.up)
+            self.down += alpha * (max(self.last - price, 0.0) - self.down)
+        self.last = price
+        if self.count < self.window:
+            return None
+        return 100.0 if self.down == 0 else 100 - 100 / (1 + self.up / self.down)
+
+
+def _to_threshold(event_filter) -> tuple[tuple, float, Direction]:
+    """value key, level and crossing direction of a filter"""
+    if isinstance(event_filter, PriceCross):
+        return ('price',), event_filter.level, event_filter.direction
+    if isinstance(event_filter, PriceChange):
+        if event_filter.direction == 'up':
+            return ('change', event_filter.window), event_filter.change_pcnt, 'above'
+        return ('change', event_filter.window), -event_filter.change_pcnt, 'below'
+    if isinstance(event_filter, IndicatorCross):
+        if event_filter.indicator not in INDICATORS:
+            raise ValueError(f'{event_filter.indicator}: unsupported indicator, expected one of {INDICATORS}')
+        return (event_filter.indicator, event_filter.window), event_filter.level, event_filter.direction
+    raise ValueError(f'{type(event_filter).__name__}: unsupported event filter')
@@ -1,32 +1,66 @@
 import hashlib
 import hmac
-import math
-import time
+import threading
 import urllib.parse
 
-from datetime import datetime, timedelta
+from datetime import datetime
 
 import numpy as np
 import pandas as pd
 
 import httpx
 
-from wired_exchange.core import to_timestamp_in_seconds, to_klines, to_transactions, to_timestamp
+from wired_exchange.core import to_klines, to_transactions, concat_batches
 from wired_exchange.core.ExchangeClient import ExchangeClient
+from wired_exchange.core.PayloadSchema import PayloadSchema, Field, SymbolSplit
+from wired_exchange.core.ServerClock import ServerClock
+from wired_exchange.core.times import NANOS, now_ns, to_epoch, to_epoch_ns
 
-from typing import Union
+from typing import Union, Iterator, Literal
 
 RESOLUTION = 60 * 60
 
+FILLS_SCHEMA = PayloadSchema(dict(time=Field('time', 'datetime'), base_currency='baseCurrency',
+                                  quote_currency='quoteCurrency', type='type', side='side',
+                                  price=Field('price', 'float'), size=Field('size', 'float'), order_id='orderId',
+                                  trade_id='tradeId', fee_rate=Field('feeRate', 'float'),
+                                  fee=Field('fee', 'float'), fee_currency='feeCurrency'),
+                             id_source='id')
+
+ORDERS_SCHEMA = PayloadSchema(dict(id='id', type='type', side='side', price=Field('price', 'float'),
+                                   size=Field('size', 'float'),
+                                   status=Field('status', transform=lambda s: s.replace('closed', 'FILLED')),
+                                   time=Field('createdAt', 'datetime')),
+                              symbol=SymbolSplit('market', '/'))
+
+KLINES_SCHEMA = PayloadSchema(dict(time=Field('time', 'datetime[ms]'), open=Field('open', 'float'),
+                                   high=Field('high', 'float'), low=Field('low', 'float'),
+                                   close=Field('close', 'float'), volume=Field('volume', 'float')))
+
+BOOK_TICKERS_SCHEMA = PayloadSchema(dict(base_currency='baseCurrency', quote_currency='quoteCurrency',
+                                         bid=Field('bid', 'float'), ask=Field('ask', 'float')))
+
+BALANCES_SCHEMA = PayloadSchema(dict(currency='coin', total=Field('total', 'float'),
+                                     available=Field('availableWithoutBorrow', 'float')))
+
+MARKETS_SCHEMA = PayloadSchema(dict(currency='baseCurrency', quote_currency='quoteCurrency',
+                                    priceIncrement=Field('priceIncrement', 'float'),
+                                    sizeIncrement=Field('sizeIncrement', 'float'),
+                                    minProvideSize=Field('minProvideSize', 'float'), last=Field('last', 'float'),
+                                    bid=Field('bid', 'float'), ask=Field('ask', 'float'),
+                                    price=Field('price', 'float'), change1h=Field('change1h', 'float'),
+                                    change24h=Field('change24h', 'float'),
+                                    quoteVolume24h=Field('quoteVolume24h', 'float'),
+                                    volumeUsd24h=Field('volumeUsd24h', 'float')))
+
+OPERATIONS_SCHEMA = PayloadSchema(dict(size=Field('size', 'float'), base_currency='coin', status='status',
+                                       time=Field('time', 'datetime'), id='txid'))
+
 
 def _to_klines(base: str, quote: str, candles: list):
-    df = pd.DataFrame(candles)
-    if df.size == 0:
-        return df
-    df['base_currency'] = base
-    df['quote_currency'] = quote
-    df.drop(['startTime'], axis='columns', inplace=True)
-    return to_klines(df, base, quote)
+    if len(candles) == 0:
+        return pd.DataFrame()
+    return to_klines(KLINES_SCHEMA.normalize(candles), base, quote)
 
 
 def _find_price(symbol: str, prices: pd.DataFrame, asof_date: datetime):
@@ -45,30 +79,57 @@ class FTXClient(ExchangeClient):
     def __init__(self, api_key=None, api_secret=None, subaccount_name=None, host_url=None):
         super().__init__('ftx', api_key, api_secret, host_url, always_authenticate=False)
         self.subaccount_name = subaccount_name
+        self.clock = ServerClock(self.get_server_time)
+        self._hmac = None
+        self._headers = None
+        # USD price history by currency and the epoch seconds range it covers, shared by the batches of an import
+        self._usd_prices = {}
+        self._usd_price_ranges = {}
+        self._usd_prices_lock = threading.Lock()
 
     def _authenticate(self, request):
-        ts = int(time.time() * 1000)
-        signature_payload = f'{ts}{request.method.upper()}{request.url.raw_path.decode("utf-8")}'
+        if self._hmac is None:
+            self._build_signing_context()
+        ts = self.clock.now_ms()
+        signature_payload = f'{ts}{request.method.upper()}{request.url.raw_path.decode("utf-8")}'.encode('utf-8')
         if request.content:
-            signature_payload += request.content.decode('utf-8')
+            signature_payload += request.content
         self._logger.debug(f'timestamp: {ts}')
         self._logger.debug(f'payload: {signature_payload}')
-        signature = hmac.new(self._api_secret.encode("utf-8"), signature_payload.encode("utf-8"),
-                             hashlib.sha256).hexdigest()
-        request.headers['FTX-KEY'] = self._api_key
-        request.headers['FTX-SIGN'] = signature
+        signer = self._hmac.copy()
+        signer.update(signature_payload)
+        request.headers.update(self._headers)
+        request.headers['FTX-SIGN'] = signer.hexdigest()
         request.headers['FTX-TS'] = str(ts)
-        if self.subaccount_name is not None:
-            request.headers['FTX-SUBACCOUNT'] = urllib.parse.quote(self.subaccount_name)
         self._logger.debug('authentication headers added')
 
+    def _build_signing_context(self):
+        """keyed HMAC and constant headers are computed once per client"""
+        self._hmac = hmac.new(self._api_secret.encode("utf-8"), digestmod=hashlib.sha256)
+        self._headers = {'FTX-KEY': self._api_key}
+        if self.subaccount_name is not None:
+            self._headers['FTX-SUBACCOUNT'] = urllib.parse.quote(self.subaccount_name)
+
+    def get_server_time(self) -> int:
+        """server time in milliseconds"""
+        self.open()
+        response = self._httpClient.get('/time').json()
+        if not response['success']:
+            raise RuntimeError('cannot retrieve server time from FTX')
+        return to_epoch(response['result'], 'ms')
+
     def get_transactions(self, start_time=None, end_time=None):
+        tr = concat_batches(self.iter_transactions(start_time, end_time))
+        return tr.sort_values(by='time', ascending=False) if tr.size > 0 else tr
+
+    def iter_transactions(self, start_time=None, end_time=None) -> Iterator[pd.DataFrame]:
+        """yield typed transactions page by page as they are received"""
         self.open()
         params = {}
         self._set_date_range_params(params, start_time, end_time, precision='s')
         try:
-            response = self._send_get('/fills', params, authenticated=True)
-            return self._to_transactions(response['result'])
+            for page in self._iter_pages('/fills', params, 'time'):
+                yield self._to_transactions(page, start_time)
         except httpx.HTTPStatusError as ex:
             raise Exception('cannot retrieve transactions from FTX') from ex
 
@@ -91,11 +152,9 @@ class FTXClient(ExchangeClient):
     def resolve_price(self, asof_time: Union[datetime, int, float], base_currency: str, quote_currency: str):
         self.open()
         window_size = 15
-        asof_time = asof_time if isinstance(asof_time, datetime) else datetime.fromtimestamp(asof_time)
-        params = {'start_time': to_timestamp_in_seconds(asof_time - timedelta(seconds=asof_time.second)
-                                                        + timedelta(
-            seconds=math.floor(asof_time.second / window_size) * window_size)),
-                  'end_time': to_timestamp_in_seconds(asof_time + timedelta(seconds=window_size)),
+        asof_time = to_epoch(asof_time, 's')
+        params = {'start_time': asof_time - asof_time % window_size,
+                  'end_time': asof_time + window_size,
                   'resolution': window_size}
         try:
             response = self._send_get(f'/markets/{base_currency}/{quote_currency}/candles', params=params)
@@ -118,38 +177,77 @@ class FTXClient(ExchangeClient):
         except BaseException as ex:
             raise Exception(f'cannot retrieve {base_currency}/{quote_currency} current price from FTX') from ex
 
-    def enrich_usd_prices(self, tr):
-        """retrieve quote and fee currencies usd equivalent"""
-        prices = None
+    def get_book_tickers(self) -> pd.DataFrame:
+        """best bid and ask of every spot market"""
+        self.open()
+        try:
+            response = self._send_get('/markets')
+            if not response['success']:
+                raise RuntimeError('FTX response is not a success')
+            tickers = BOOK_TICKERS_SCHEMA.normalize(response['result'])
+            # futures have no base currency
+            return tickers[tickers['base_currency'].notna()]
+        except BaseException as ex:
+            raise Exception('cannot retrieve book tickers from FTX') from ex
+
+    def enrich_usd_prices(self, tr, start_time: Union[datetime, int, float, None] = None):
+        """retrieve quote and fee currencies usd equivalent
+
+        price histories are cached by the client: the first batch of an import fetches a currency from start_time
+        (or the batch) to now, later batches only fetch the range the cache misses"""
         if tr.size == 0:
             return tr, tr
-        for priceRange in pd.DataFrame(tr[tr['fee_currency'] != 'USD'].groupby(['fee_currency']).agg(['min', 'max'])[
-                                           'time']).append(
-            tr[tr['quote_currency'] != 'USD'].groupby(['quote_currency']).agg(['min', 'max'])[
-                'time']).itertuples():
-            try:
-                new_prices = self.get_prices_history(priceRange.Index, 'USD', RESOLUTION, priceRange.min,
-                                                     priceRange.max)
-                if prices is None:
-                    prices = new_prices
-                else:
-                    prices = prices.append(new_prices)
-                self._logger.info(f'USD prices retrieved for {priceRange.Index}')
-            except:
-                self._logger.error(f'unable to retrieve prices for {priceRange.Index}/USD', exc_info=True)
+        price_ranges = pd.concat([tr[tr['fee_currency'] != 'USD'].groupby(['fee_currency']).agg(['min', 'max'])['time'],
+                                  tr[tr['quote_currency'] != 'USD'].groupby(['quote_currency']).agg(['min', 'max'])[
+                                      'time']])
+        price_ranges = price_ranges.groupby(level=0).agg({'min': 'min', 'max': 'max'})
+        with self._usd_prices_lock:
+            for priceRange in price_ranges.itertuples():
+                self._cache_usd_prices(priceRange.Index, to_epoch(priceRange.min, 's'),
+                                       to_epoch(priceRange.max, 's'), start_time)
+            cached = [self._usd_prices[c] for c in price_ranges.index if c in self._usd_prices]
+        prices = pd.concat(cached) if len(cached) > 0 else None
         tr['price_usd'] = tr.apply(lambda row: _find_price(row.quote_currency, prices, row.time), axis='columns')
         tr['fee_usd'] = tr.apply(lambda row: _find_price(row.fee_currency, prices, row.time), axis='columns')
         return tr, prices
 
+    def _cache_usd_prices(self, currency: str, low: int, high: int, start_time):
+        covered = self._usd_price_ranges.get(currency)
+        if covered is not None and covered[0] <= low and high <= covered[1]:
+            return
+        if covered is None:
+            start = low if start_time is None else min(low, to_epoch(start_time, 's'))
+            missing = [(start, max(high, now_ns() // NANOS['s']))]
+        else:
+            # pages go backward in time, doubling the covered range keeps fetches logarithmic in the pages
+            missing = [(min(low, 2 * covered[0] - covered[1]), covered[0])] if low < covered[0] else []
+            missing += [(covered[1], high)] if high > covered[1] else []
+        for start, end in missing:
+            try:
+                klines = self.get_prices_history(currency, 'USD', RESOLUTION, start, end)
+                self._logger.info(f'USD prices retrieved for {currency}')
+            except:
+                self._logger.error(f'unable to retrieve prices for {currency}/USD', exc_info=True)
+                continue
+            if klines.size > 0:
+                prices = pd.concat([self._usd_prices[currency], klines]) if currency in self._usd_prices else klines
+                self._usd_prices[currency] = prices[~prices.index.duplicated(keep='last')].sort_index()
+            covered = (start, end) if covered is None else (min(start, covered[0]), max(end, covered[1]))
+            self._usd_price_ranges[currency] = covered
+
     def get_orders(self, start_time: Union[datetime, int, float, None] = None,
                    end_time: Union[datetime, int, float, None] = None):
+        return concat_batches(self.iter_orders(start_time, end_time))
+
+    def iter_orders(self, start_time: Union[datetime, int, float, None] = None,
+                    end_time: Union[datetime, int, float, None] = None) -> Iterator[pd.DataFrame]:
+        """yield typed orders page by page as they are received"""
         self.open()
         params = {}
         self._set_date_range_params(params, start_time, end_time, precision='s')
         try:
-            response = self._send_get(f'/orders/history', params=params, authenticated=True)
-            return self._to_orders(response['result'])
-
+            for page in self._iter_pages('/orders/history', params, 'createdAt'):
+                yield self._to_orders(page)
         except BaseException as ex:
             raise Exception(
                 'cannot retrieve orders from FTX') from ex
@@ -175,22 +273,11 @@ class FTXClient(ExchangeClient):
     #     "price_usd": 64189.0,
     #     "fee_usd": 1.0005
     # }
-    def _to_transactions(self, fills: list):
-        tr = pd.DataFrame(fills)
-        if tr.size == 0:
-            return tr
-        tr['platform'] = self.platform
-        tr['time'] = pd.to_datetime(tr['time'])
-        tr.rename(
-            columns=dict(baseCurrency='base_currency', quoteCurrency='quote_currency',
-                         orderId='order_id', tradeId='trade_id', feeCurrency='fee_currency',
-                         feeRate='fee_rate', id='fill_id'),
-            inplace=True)
-        tr.astype(dict(order_id='string', trade_id='string', fill_id='string'))
-        tr['id'] = tr['fill_id'].apply(lambda id: f'{self.platform}_{id}')
-        tr.drop(['market', 'future', 'liquidity', 'fill_id'], axis='columns', inplace=True)
-        tr = to_transactions(tr)
-        self.enrich_usd_prices(tr)
+    def _to_transactions(self, fills: list, start_time: Union[datetime, int, float, None] = None):
+        if len(fills) == 0:
+            return pd.DataFrame()
+        tr = to_transactions(FILLS_SCHEMA.normalize(fills, self.platform))
+        self.enrich_usd_prices(tr, start_time)
         return tr
 
     def get_balances(self):
@@ -211,26 +298,19 @@ class FTXClient(ExchangeClient):
     #     "usdValue": 399.7430372727522,
     #     "spotBorrow": 0.0
     #   }
-    def _to_balances(self, balances_json: dict):
-        balances = pd.DataFrame(balances_json)
+    def _to_balances(self, balances_json: list):
+        balances = BALANCES_SCHEMA.normalize(balances_json)
         if balances.size == 0:
             return balances
         balances = balances[balances['total'] > 0]
-        balances.rename(columns=dict(availableWithoutBorrow='available', coin='currency'), inplace=True)
-        balances.drop(columns=['free', 'usdValue', 'spotBorrow'], inplace=True)
         try:
             request = self._httpClient.build_request('GET', '/markets')
             tickers = self._httpClient.send(request).json()
             if not tickers['success']:
                 raise Exception('FTX response is not a success')
-            tickers = pd.DataFrame(tickers['result'])
-            tickers = tickers[tickers['quoteCurrency'] == 'USDT']
-            balances = balances.merge(tickers, left_on='currency',
-                                      right_on='baseCurrency', how='left')
-            balances.drop(columns=['name', 'enabled', 'postOnly', 'restricted',
-                                   'highLeverageFeeExempt', 'baseCurrency', 'quoteCurrency',
-                                   'underlying', 'type', 'changeBod', 'tokenizedEquity'], inplace=True)
-            balances.rename(columns=dict(baseCurrency='currency'), inplace=True)
+            tickers = MARKETS_SCHEMA.normalize(tickers['result'])
+            tickers = tickers[tickers['quote_currency'] == 'USDT'].drop(columns=['quote_currency'])
+            balances = balances.merge(tickers, on='currency', how='left')
         except:
             self._logger.warning('cannot retrieve current tickers', exc_info=True)
         balances.set_index('currency', inplace=True)
@@ -238,56 +318,69 @@ class FTXClient(ExchangeClient):
         return balances
 
     def get_account_operations(self, start_time=None, end_time=None) -> pd.DataFrame:
+        return concat_batches(self.iter_account_operations(start_time, end_time))
+
+    def iter_account_operations(self, start_time=None, end_time=None) -> Iterator[pd.DataFrame]:
+        """yield typed deposits then withdrawals as they are received"""
         self.open()
         params = {}
         self._set_date_range_params(params, start_time, end_time, 's')
         try:
-            columns = ['size', 'coin',
-                       'status', 'time', 'txid']
-            result = self._send_get('/wallet/deposits', params, authenticated=True)
-            deposits = pd.DataFrame(result['result'], columns=columns)
-            deposits['type'] = 'deposit'
-            result = self._send_get('/wallet/withdrawals', params, authenticated=True)
-            withdrawals = pd.DataFrame(result['result'], columns=columns)
-            withdrawals['type'] = 'withdrawal'
-            return self._to_account_operations(deposits, withdrawals)
+            for path, operation_type in [('/wallet/deposits', 'deposit'), ('/wallet/withdrawals', 'withdrawal')]:
+                for page in self._iter_pages(path, params, 'time'):
+                    yield self._to_account_operations(page, operation_type)
         except httpx.HTTPStatusError as ex:
             raise RuntimeError('cannot retrieve account operations from FTX') from ex
 
+    def _iter_pages(self, path: str, params: dict, time_field: str):
+        """FTX pages backward in time, the exact time of the oldest item of a page is the inclusive end of the next
+        request. items of that time already yielded are skipped by id"""
+        params = dict(params)
+        oldest, seen = None, set()
+        while True:
+            response = self._send_get(path, params, authenticated=True)
+            page = [item for item in response['result'] if item['id'] not in seen]
+            if len(page) > 0:
+                yield page
+            if not response.get('hasMoreData', False) or len(response['result']) == 0:
+                break
+            if len(page) == 0:
+                self._logger.warning(f'{path}: a whole page of items at {params["end_time"]}, older ones are skipped')
+                break
+            page_oldest = min(to_epoch_ns(item[time_field]) for item in page)
+            if page_oldest != oldest:
+                oldest, seen = page_oldest, set()
+            seen.update(item['id'] for item in page if to_epoch_ns(item[time_field]) == oldest)
+            params['end_time'] = f'{oldest // NANOS["s"]}.{oldest % NANOS["s"]:09d}'
+
     def _send_get(self, path: str, params: dict = None, authenticated: bool = False):
         request = self._httpClient.build_request('GET', path, params=params)
         if authenticated:
             self._authenticate(request)
-        response = self._httpClient.send(request).json()
+        try:
+            response = self._httpClient.send(request).json()
+        except httpx.HTTPStatusError as ex:
+            if not authenticated or ex.response.status_code != 401:
+                raise ex
+            # an expired request timestamp is rejected as unauthorized, retry once with a fresh clock offset
+            self._logger.warning('request rejected, synchronizing server clock')
+            self.clock.sync()
+            self._authenticate(request)
+            response = self._httpClient.send(request).json()
         if not response['success']:
             raise Exception('FTX response is not a success')
         return response
 
-    def _to_account_operations(self, deposits, withdrawals):
-        operations = deposits.append(withdrawals, ignore_index=True)
-        operations['time'] = pd.to_datetime(operations['time'])
-        operations['platform'] = self.platform
-        operations.rename(columns=dict(coin='base_currency', txid='id'), inplace=True)
-        return operations
-
-    def _to_orders(self, orders: dict):
-        frame = pd.DataFrame(orders)
-        frame.loc[:, 'base_currency'] = frame['market'].apply(lambda s: s.split('/')[0])
-        frame.loc[:, 'quote_currency'] = frame['market'].apply(lambda s: s.split('/')[1])
-        frame['time'] = pd.to_datetime(frame['createdAt'])
-        frame = frame.loc[:, ('id', 'base_currency', 'quote_currency', 'type', 'side', 'price',
-                              'size', 'status', 'time')]
-        frame['status'].replace('closed', 'FILLED', inplace=True)
-        frame['platform'] = self.platform
-        frame.astype(dict(price='float', size='float'))
-        return frame
+    def _to_account_operations(self, operations: list, operation_type: Literal['deposit', 'withdrawal']):
+        return OPERATIONS_SCHEMA.normalize(operations, platform=self.platform, type=operation_type)
+
+    def _to_orders(self, orders: list):
+        return ORDERS_SCHEMA.normalize(orders, platform=self.platform)
 
     @staticmethod
     def _set_date_range_params(params: dict, start_time, end_time, precision) -> dict:
         if start_time is not None:
-            params['start_time'] = to_timestamp(start_time, precision) if isinstance(start_time, datetime) else int(
-                round(start_time))
+            params['start_time'] = to_epoch(start_time, precision)
         if end_time is not None:
-            params['end_time'] = to_timestamp(end_time, precision) if isinstance(end_time, datetime) else int(
-                round(end_time))
+            params['end_time'] = to_epoch(end_time, precision)
         return params
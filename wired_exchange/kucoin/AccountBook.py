@@ -0,0 +1,203 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from wired_exchange.kucoin.WebSocket import WebSocketMessageHandler, WebSocketNotification
+
+ORDERS_TOPIC = '/spotMarket/tradeOrders'
+BALANCE_TOPIC = '/account/balance'
+DEFAULT_MAX_CLOSED_ORDERS = 1000
+
+# orderChange message type -> order status as returned by KucoinSpotClient.get_orders
+ORDER_STATUSES = dict(open='NEW', match='PARTIALLY_FILLED', filled='FILLED', canceled='CANCELED')
+CLOSED_STATUSES = ('FILLED', 'CANCELED')
+
+ORDER_COLUMNS = ['id', 'client_oid', 'type', 'side', 'price', 'size', 'filled_size', 'remain_size', 'status',
+                 'base_currency', 'quote_currency', 'platform', 'time', 'updated']
+BALANCE_COLUMNS = ['currency', 'account_type', 'total', 'available', 'holds', 'platform', 'updated']
+
+
+class KucoinAccountBook(WebSocketMessageHandler):
+    """in-memory state of our own Kucoin orders and balances, seeded once from REST then kept current
+    by private channel updates
+
+    usage: await KucoinSpotClient().register_account_book_async(book)"""
+
+    def __init__(self, max_closed_orders: int = DEFAULT_MAX_CLOSED_ORDERS):
+        self.topics = [ORDERS_TOPIC, BALANCE_TOPIC]
+        self.max_closed_orders = max_closed_orders
+        self._open_orders = {}
+        # closed orders are kept for display, oldest ones are evicted first
+        self._closed_orders = OrderedDict()
+        self._balances = {}
+        # updates received before the REST snapshot is complete are replayed afterwards
+        self._pending = []
+        self._seeded = False
+        self._connected = True
+        # client of the last seed, the book is seeded again with it once the connection is restored
+        self._client = None
+        # callables notified of each applied order change, e.g. KucoinOrderGateway
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._logger = logging.getLogger(type(self).__name__)
+
+    def is_live(self) -> bool:
+        """book is seeded and still receives updates"""
+        return self._seeded and self._connected
+
+    def seed(self, client):
+        """load active orders and account balances from REST then replay updates received meanwhile"""
+        self._client = client
+        seed_time_ms = int(time.time() * 1000)
+        orders = client.get_active_orders()
+        accounts = client.get_accounts()
+        with self._lock:
+            # orders no longer active were closed while the book was not updated
+            self._open_orders = {}
+            self._balances = {}
+            if orders.size > 0:
+                for order in orders.to_dict('records'):
+                    self._store_order(dict(order, id=str(order['id']), client_oid=None, filled_size=None,
+                                           remain_size=None, time=order['time'].value,
+                                           updated=seed_time_ms * 1_000_000))
+            if accounts.size > 0:
+                for account in accounts.to_dict('records'):
+                    self._balances[(account['account_type'], account['currency'])] = \
+                        dict(account, updated=seed_time_ms)
+            changes = [self._apply(message) for message in self._pending]
+            self._logger.info(f'book seeded with {len(self._open_orders)} active orders, {len(self._balances)} '
+                              f'balances and {len(self._pending)} pending updates')
+            self._pending = []
+            self._seeded = True
+        for change in changes:
+            self._notify(change)
+
+    def add_listener(self, listener):
+        """listener(order: dict) is called with each applied order change, it must return quickly"""
+        self._listeners.append(listener)
+
+    def can_handle(self, message: str) -> bool:
+        return f'"topic":"{ORDERS_TOPIC}"' in message or f'"topic":"{BALANCE_TOPIC}"' in message
+
+    def handle(self, message: str) -> bool:
+        data = json.loads(message)
+        change = None
+        with self._lock:
+            if self._seeded:
+                change = self._apply(data)
+            else:
+                self._pending.append(data)
+        self._notify(change)
+        return True
+
+    def on_notification(self, notification: WebSocketNotification):
+        if notification == WebSocketNotification.CONNECTION_LOST:
+            self._connected = False
+            self._logger.warning('connection lost, book is no longer updated')
+        elif notification == WebSocketNotification.CONNECTION_RESTORED and self._client is not None:
+            # changes missed while disconnected are only known from REST, updates are held until then
+            with self._lock:
+                self._seeded = False
+            self._connected = True
+            threading.Thread(target=self._reseed, name='account-book-seed', daemon=True).start()
+
+    def _reseed(self):
+        try:
+            self.seed(self._client)
+        except:
+            self._logger.error('cannot seed the book again, book is no longer updated', exc_info=True)
+            self._connected = False
+
+    def get_orders(self) -> pd.DataFrame:
+        """open then closed orders, most recent first"""
+        with self._lock:
+            orders = list(self._open_orders.values()) + list(self._closed_orders.values())
+        return self._to_orders(orders)
+
+    def get_open_orders(self) -> pd.DataFrame:
+        with self._lock:
+            orders = list(self._open_orders.values())
+        return self._to_orders(orders)
+
+    def get_balances(self, by_account: bool = False) -> pd.DataFrame:
+        """balances per currency, or per account type and currency"""
+        with self._lock:
+            balances = pd.DataFrame(list(self._balances.values()), columns=BALANCE_COLUMNS)
+        balances['updated'] = pd.to_datetime(balances['updated'], unit='ms', utc=True)
+        if by_account:
+            return balances.set_index(['account_type', 'currency'])
+        balances = balances.groupby('currency').agg(dict(total='sum', available='sum', holds='sum',
+                                                         updated='max'))
+        balances['platform'] = 'kucoin'
+        return balances[balances['total'] != 0.0]
+
+    def _apply(self, message: dict):
+        data = message.get('data', {})
+        if message.get('topic') == ORDERS_TOPIC:
+            return self._apply_order_change(data)
+        if message.get('topic') == BALANCE_TOPIC:
+            self._apply_balance_change(data)
+        return None
+
+    def _notify(self, order: dict):
+        if order is None:
+            return
+        for listener in self._listeners:
+            try:
+                listener(order)
+            except:
+                self._logger.error(f'{order["id"]}: order listener failed', exc_info=True)
+
+    def _apply_order_change(self, data: dict):
+        order_id = data['orderId']
+        ts = int(data['ts'])
+        current = self._open_orders.get(order_id, self._closed_orders.get(order_id))
+        if current is not None and current['updated'] >= ts:
+            # already reflected by the REST snapshot or a later message
+            return None
+        status = ORDER_STATUSES.get(data['type'], current['status'] if current is not None else 'NEW')
+        base_currency, _, quote_currency = data['symbol'].partition('-')
+        order = dict(id=order_id, client_oid=data.get('clientOid'), type=data.get('orderType'),
+                     side=data.get('side'), price=_to_float(data.get('price')), size=_to_float(data.get('size')),
+                     filled_size=_to_float(data.get('filledSize')), remain_size=_to_float(data.get('remainSize')),
+                     status=status, base_currency=base_currency, quote_currency=quote_currency, platform='kucoin',
+                     time=int(data['orderTime']), updated=ts)
+        self._store_order(order)
+        return dict(order)
+
+    def _store_order(self, order: dict):
+        order_id = order['id']
+        if order['status'] in CLOSED_STATUSES:
+            self._open_orders.pop(order_id, None)
+            self._closed_orders[order_id] = order
+            self._closed_orders.move_to_end(order_id)
+            while len(self._closed_orders) > self.max_closed_orders:
+                self._closed_orders.popitem(last=False)
+        else:
+            self._open_orders[order_id] = order
+
+    def _apply_balance_change(self, data: dict):
+        # relation event is prefixed by the account type, e.g. trade.hold or main.deposit
+        key = (data['relationEvent'].split('.')[0], data['currency'])
+        updated = int(data['time'])
+        current = self._balances.get(key)
+        if current is not None and current['updated'] > updated:
+            return
+        self._balances[key] = dict(currency=data['currency'], account_type=key[0],
+                                   total=_to_float(data['total']), available=_to_float(data['available']),
+                                   holds=_to_float(data['hold']), platform='kucoin', updated=updated)
+
+    @staticmethod
+    def _to_orders(orders: list) -> pd.DataFrame:
+        orders = pd.DataFrame(orders, columns=ORDER_COLUMNS)
+        orders['time'] = pd.to_datetime(orders['time'], unit='ns', utc=True)
+        orders['updated'] = pd.to_datetime(orders['updated'], unit='ns', utc=True)
+        return orders.sort_values(by='time', ascending=False, ignore_index=True)
+
+
+def _to_float(value):
+    return None if value is None or value == '' else float(value)
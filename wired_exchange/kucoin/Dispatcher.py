@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Executor
+from enum import Enum
+from typing import Callable, Optional
+
+from wired_exchange.kucoin.WebSocket import WebSocketMessageHandler, WebSocketNotification, topic_of
+
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_MAX_WORKERS = 4
+
+
+class OverflowPolicy(Enum):
+    """what to do with a message when the handler queue is full"""
+    # stop reading the socket until the handler catches up. pongs are not read meanwhile either, a handler
+    # slower than the ping timeout gets the connection closed: keep it for handlers which must see every message
+    BLOCK = 1
+    DROP_OLDEST = 2  # discard the oldest queued message
+    COALESCE = 3  # replace the queued message with the same key (e.g. topic), drop oldest if none
+
+
+class HandlerDispatcher:
+    """run strategy handlers off the websocket event loop
+
+    each wrapped handler gets its own bounded queue drained by one task at a time on a shared thread pool, so
+    messages reach a handler in order while different handlers run in parallel. a process pool is not used as
+    strategies keep their state in memory"""
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, executor: Executor = None):
+        self._executor = executor if executor is not None else ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='strategy')
+        self.handlers = []
+        self._logger = logging.getLogger(type(self).__name__)
+
+    def wrap(self, handler: WebSocketMessageHandler, queue_size: int = DEFAULT_QUEUE_SIZE,
+             policy: OverflowPolicy = OverflowPolicy.COALESCE,
+             coalesce_key: Callable[[str], Optional[str]] = topic_of) -> 'DispatchedHandler':
+        """market data handlers only need the latest message of a topic, a full queue never holds up the socket
+        by default"""
+        dispatched = DispatchedHandler(handler, self._executor, queue_size, policy, coalesce_key)
+        self.handlers.append(dispatched)
+        return dispatched
+
+    def close(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+class DispatchedHandler(WebSocketMessageHandler):
+    """queue messages accepted by the inner handler and process them on the dispatcher pool"""
+
+    def __init__(self, inner: WebSocketMessageHandler, executor: Executor, queue_size: int,
+                 policy: OverflowPolicy, coalesce_key: Callable[[str], Optional[str]]):
+        self.inner = inner
+        self.queue_size = queue_size
+        self.policy = policy
+        self.name = type(inner).__name__
+        self.dropped = 0
+        self.coalesced = 0
+        # WebSocketMetrics set by KucoinWebSocket when registered
+        self.metrics = None
+        self._coalesce_key = coalesce_key
+        self._executor = executor
+        self._queue = deque()
+        self._scheduled = False
+        self._lock = threading.Lock()
+        self._space = threading.Condition(self._lock)
+        self._space_waiters = []
+        self._logger = logging.getLogger(f'{type(self).__name__}[{type(inner).__name__}]')
+
+    def __getattr__(self, name):
+        # strategy attributes (topics, tickers...) are read when subscribing
+        if name == 'inner':
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def can_handle(self, message: str) -> bool:
+        return self.inner.can_handle(message)
+
+    def handle(self, message: str):
+        """enqueue message, return an awaitable when the queue is full under BLOCK policy in an event loop"""
+        if self._try_put(message):
+            return True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            with self._space:
+                self._space.wait_for(lambda: len(self._queue) < self.queue_size)
+            self._try_put(message)
+            return True
+        return self._put_async(message, loop)
+
+    def on_notification(self, notification: WebSocketNotification):
+        # notifications are delivered after messages already queued
+        with self._lock:
+            self._queue.append(_Notification(notification))
+            self._schedule()
+
+    async def _put_async(self, message: str, loop: asyncio.AbstractEventLoop):
+        while not self._try_put(message):
+            space = asyncio.Event()
+            with self._lock:
+                self._space_waiters.append((loop, space))
+            # re-check after registration, a slot may have been released meanwhile
+            if len(self._queue) < self.queue_size:
+                continue
+            await space.wait()
+        return True
+
+    def _try_put(self, message: str) -> bool:
+        with self._lock:
+            if len(self._queue) >= self.queue_size:
+                if self.policy == OverflowPolicy.BLOCK:
+                    return False
+                if self.policy == OverflowPolicy.COALESCE and self._replace_same_key(message):
+                    self.coalesced += 1
+                    return True
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(message)
+            self._schedule()
+            return True
+
+    def _replace_same_key(self, message: str) -> bool:
+        key = self._coalesce_key(message)
+        if key is None:
+            return False
+        for i in range(len(self._queue) - 1, -1, -1):
+            queued = self._queue[i]
+            if isinstance(queued, str) and self._coalesce_key(queued) == key:
+                # latest value takes the queued message place, keeping its turn
+                self._queue[i] = message
+                return True
+        return False
+
+    def _schedule(self):
+        if not self._scheduled:
+            self._scheduled = True
+            self._executor.submit(self._drain)
+
+    def _drain(self):
+        while True:
+            with self._lock:
+                if len(self._queue) == 0:
+                    self._scheduled = False
+                    return
+                item = self._queue.popleft()
+                self._release_space()
+            try:
+                if isinstance(item, _Notification):
+                    self.inner.on_notification(item.notification)
+                elif self.metrics is None:
+                    self.inner.handle(item)
+                else:
+                    self.metrics.record_delay(topic_of(item), item)
+                    started = time.perf_counter()
+                    self.inner.handle(item)
+                    self.metrics.record_processing(self.name, (time.perf_counter() - started) * 1000)
+            except:
+                self._logger.error(f'something goes wrong when processing message: {item}', exc_info=True)
+
+    def _release_space(self):
+        self._space.notify()
+        for loop, space in self._space_waiters:
+            loop.call_soon_threadsafe(space.set)
+        self._space_waiters.clear()
+
+
+class _Notification:
+    def __init__(self, notification: WebSocketNotification):
+        self.notification = notification
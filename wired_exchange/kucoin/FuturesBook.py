@@ -0,0 +1,199 @@
+import json
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+from wired_exchange.kucoin.WebSocket import WebSocketMessageHandler, WebSocketNotification
+
+INSTRUMENT_TOPIC = '/contract/instrument'
+POSITION_TOPIC = '/contract/position'
+MARK_PRICE_SUBJECT = 'mark.index.price'
+FUNDING_RATE_SUBJECT = 'funding.rate'
+POSITION_CHANGE_SUBJECT = 'position.change'
+
+# position fields kept as received, hot fields (quantity, prices, pnl) live in arrays
+POSITION_FIELDS = ['settleCurrency', 'isInverse', 'realLeverage', 'posMargin', 'maintainMargin', 'realisedPnl',
+                   'openingTimestamp']
+HOT_FIELDS = dict(currentQty='_qty', avgEntryPrice='_entry', liquidationPrice='_liquidation')
+POSITION_COLUMNS = ['symbol', 'currentQty', 'avgEntryPrice', 'markPrice', 'liquidationPrice', 'unrealisedPnl',
+                    'unrealisedPnlPcnt', 'liquidationDistancePcnt', 'fundingRate'] + POSITION_FIELDS + ['updated']
+
+
+class KucoinFuturesBook(WebSocketMessageHandler):
+    """live Kucoin futures positions, seeded once from REST then kept current by mark price, funding rate and
+    position change messages. unrealised PnL of every position is recomputed at once on each mark price
+
+    usage: await KucoinFuturesClient().register_futures_book_async(book)"""
+
+    def __init__(self, symbols: list[str] = None):
+        # contract symbols to follow, those of open positions when None
+        self.symbols = list(symbols) if symbols is not None else None
+        self._clear()
+        self._contracts = {}
+        self._funding_rates = {}
+        self._pending = []
+        self._client = None
+        self._seeded = False
+        self._connected = True
+        self._lock = threading.Lock()
+        self._logger = logging.getLogger(type(self).__name__)
+
+    @property
+    def topics(self) -> list[str]:
+        return [f'{INSTRUMENT_TOPIC}:{symbol}' for symbol in self.symbols]
+
+    @property
+    def private_topics(self) -> list[str]:
+        return [f'{POSITION_TOPIC}:{symbol}' for symbol in self.symbols]
+
+    def is_live(self) -> bool:
+        """book is seeded and still receives updates"""
+        return self._seeded and self._connected
+
+    def seed(self, client):
+        """load contracts and positions from REST then replay updates received meanwhile"""
+        contracts = client.get_contracts()
+        positions = client.get_positions()
+        self._client = client
+        with self._lock:
+            self._clear()
+            for contract in contracts.to_dict('records'):
+                self._contracts[contract['symbol']] = contract
+                self._funding_rates[contract['symbol']] = contract['fundingFeeRate']
+            for position in positions.to_dict('records'):
+                updated = position['currentTimestamp'].value // 1_000_000 \
+                    if not pd.isna(position['currentTimestamp']) else 0
+                self._store_position(position['symbol'], position, updated)
+            for message in self._pending:
+                self._apply(message)
+            self._logger.info(f'book seeded with {len(self._rows)} positions and {len(self._pending)} pending updates')
+            self._pending = []
+            self._seeded = True
+            self._recompute()
+
+    def can_handle(self, message: str) -> bool:
+        return f'"topic":"{INSTRUMENT_TOPIC}:' in message or f'"topic":"{POSITION_TOPIC}:' in message
+
+    def handle(self, message: str) -> bool:
+        data = json.loads(message)
+        with self._lock:
+            if self._seeded:
+                self._apply(data)
+            else:
+                self._pending.append(data)
+        return True
+
+    def on_notification(self, notification: WebSocketNotification):
+        if notification == WebSocketNotification.CONNECTION_LOST:
+            self._connected = False
+            self._logger.warning('connection lost, book is no longer updated')
+        elif notification == WebSocketNotification.CONNECTION_RESTORED and self._client is not None:
+            # positions changed while disconnected are only known from REST, updates are held until then
+            with self._lock:
+                self._seeded = False
+            self._connected = True
+            threading.Thread(target=self._reseed, name='futures-book-seed', daemon=True).start()
+
+    def _reseed(self):
+        try:
+            self.seed(self._client)
+        except:
+            self._logger.error('cannot seed the book again, book is no longer updated', exc_info=True)
+            self._connected = False
+
+    def get_positions(self) -> pd.DataFrame:
+        """open positions with unrealised PnL at the latest mark price"""
+        with self._lock:
+            symbols = list(self._rows.keys())
+            positions = pd.DataFrame(dict(symbol=symbols, currentQty=self._qty.copy(),
+                                          avgEntryPrice=self._entry.copy(), markPrice=self._mark.copy(),
+                                          liquidationPrice=self._liquidation.copy(), unrealisedPnl=self._pnl.copy(),
+                                          unrealisedPnlPcnt=self._pnl_pcnt.copy(),
+                                          liquidationDistancePcnt=self._liquidation_distance(),
+                                          fundingRate=[self._funding_rates.get(s) for s in symbols],
+                                          updated=np.maximum(self._updated, self._mark_updated)))
+            fields = pd.DataFrame([self._fields[s] for s in symbols], columns=POSITION_FIELDS)
+        positions = pd.concat([positions, fields], axis=1)
+        positions['updated'] = pd.to_datetime(positions['updated'], unit='ms', utc=True)
+        return positions.loc[positions['currentQty'] != 0, POSITION_COLUMNS].reset_index(drop=True)
+
+    def get_positions_at_risk(self, max_distance_pcnt: float = 10.0) -> pd.DataFrame:
+        """positions whose mark price is within max_distance_pcnt of their liquidation price"""
+        positions = self.get_positions()
+        return positions[positions['liquidationDistancePcnt'] < max_distance_pcnt]
+
+    def get_funding_rates(self) -> pd.Series:
+        with self._lock:
+            return pd.Series(self._funding_rates, name='fundingRate', dtype='float64')
+
+    def _apply(self, message: dict):
+        data = message.get('data', {})
+        symbol = message.get('topic', '').partition(':')[2]
+        subject = message.get('subject')
+        if subject == MARK_PRICE_SUBJECT:
+            self._apply_mark_price(symbol, float(data['markPrice']), int(data['timestamp']))
+        elif subject == FUNDING_RATE_SUBJECT:
+            self._funding_rates[symbol] = float(data['fundingRate'])
+        elif subject == POSITION_CHANGE_SUBJECT:
+            self._store_position(symbol, data, int(data.get('currentTimestamp', 0)))
+            self._recompute()
+
+    def _apply_mark_price(self, symbol: str, mark_price: float, timestamp: int):
+        row = self._rows.get(symbol)
+        if row is None or self._mark_updated[row] > timestamp:
+            return
+        self._mark[row] = mark_price
+        self._mark_updated[row] = timestamp
+        self._recompute()
+
+    def _store_position(self, symbol: str, position: dict, updated: int):
+        row = self._rows.get(symbol)
+        if row is None:
+            row = self._rows[symbol] = len(self._rows)
+            contract = self._contracts.get(symbol, {})
+            self._qty, self._entry, self._mark, self._liquidation, self._pnl, self._pnl_pcnt = \
+                [np.append(a, 0.0) for a in (self._qty, self._entry, self._mark, self._liquidation, self._pnl,
+                                             self._pnl_pcnt)]
+            self._multiplier = np.append(self._multiplier, abs(float(contract.get('multiplier', 1.0))))
+            self._inverse = np.append(self._inverse, bool(contract.get('isInverse', position.get('isInverse'))))
+            self._updated = np.append(self._updated, 0)
+            self._mark_updated = np.append(self._mark_updated, 0)
+            self._fields[symbol] = dict.fromkeys(POSITION_FIELDS)
+        elif self._updated[row] > updated:
+            return
+        # changes caused by the mark price only carry the fields it moves, others are kept
+        for field, array in HOT_FIELDS.items():
+            if position.get(field) is not None:
+                getattr(self, array)[row] = float(position[field])
+        if position.get('markPrice') is not None and self._mark_updated[row] <= updated:
+            self._mark[row] = float(position['markPrice'])
+            self._mark_updated[row] = updated
+        self._updated[row] = updated
+        self._fields[symbol].update({field: position[field] for field in POSITION_FIELDS if field in position})
+
+    def _clear(self):
+        self._rows = {}
+        self._fields = {}
+        self._qty, self._entry, self._mark, self._liquidation, self._multiplier, self._pnl, self._pnl_pcnt = \
+            [np.zeros(0) for _ in range(7)]
+        self._inverse = np.zeros(0, dtype=bool)
+        # last position change and last mark price of each row, mark price ticks do not carry the position
+        self._updated = np.zeros(0, dtype='int64')
+        self._mark_updated = np.zeros(0, dtype='int64')
+
+    def _recompute(self):
+        """unrealised PnL in settlement currency of all positions, inverse contracts are valued in quote
+        currency so their PnL is quantity x multiplier x (1 / entry - 1 / mark)"""
+        size = self._qty * self._multiplier
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self._pnl = np.where(self._inverse, size * (1 / self._entry - 1 / self._mark),
+                                 size * (self._mark - self._entry))
+            cost = np.abs(np.where(self._inverse, size / self._entry, size * self._entry))
+            self._pnl_pcnt = np.where(cost > 0, self._pnl / cost, 0.0)
+
+    def _liquidation_distance(self) -> np.ndarray:
+        """distance in percent from mark price to liquidation price, in the adverse direction of each position"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.sign(self._qty) * (self._mark - self._liquidation) / self._mark * 100
@@ -1,32 +1,84 @@
+import asyncio
 import base64
 import hashlib
 import hmac
 import logging
 import time
+
+import httpx
 from httpx import Request
 
+from wired_exchange.core.ServerClock import ServerClock
+
+# KC-API-TIMESTAMP Invalid: request timestamp is out of the server acceptance window
+INVALID_TIMESTAMP_CODE = '400002'
+
+
 class KucoinAuthenticator:
+    """signing context built once per client: keyed HMAC and constant headers are precomputed"""
+
     def __init__(self, api_key: str = None, api_passphrase: str = None,
-                 api_secret: str = None):
+                 api_secret: str = None, clock: ServerClock = None):
         self._api_secret = api_secret
         self._api_passphrase = api_passphrase
         self._api_key = api_key
+        self.clock = clock
+        self._hmac = None
+        self._headers = None
         self._logger = logging.getLogger(type(self).__name__)
 
     def authenticate(self, request: Request):
-        ts = int(round(time.time())) * 1000
+        if self._hmac is None:
+            self._build_signing_context()
+        ts = self.clock.now_ms() if self.clock is not None else int(time.time() * 1000)
         self._logger.debug(f'timestamp {ts}')
-        signature_payload = f'{str(ts)}{request.method.upper()}{request.url.raw_path.decode("utf-8")}'
+        signature_payload = f'{ts}{request.method.upper()}{request.url.raw_path.decode("utf-8")}'.encode('utf-8')
         if request.content:
-            signature_payload += request.content.decode('utf-8')
-        signature = base64.b64encode(
-            hmac.new(self._api_secret.encode('utf-8'), signature_payload.encode('utf-8'), hashlib.sha256).digest())
+            signature_payload += request.content
+        signer = self._hmac.copy()
+        signer.update(signature_payload)
         self._logger.debug(f'payload {signature_payload}')
-        passphrase = base64.b64encode(
-            hmac.new(self._api_secret.encode('utf-8'), self._api_passphrase.encode('utf-8'),
-                     hashlib.sha256).digest())
-        request.headers['KC-API-SIGN'] = signature.decode('utf-8')
+        request.headers.update(self._headers)
+        request.headers['KC-API-SIGN'] = base64.b64encode(signer.digest()).decode('utf-8')
         request.headers['KC-API-TIMESTAMP'] = str(ts)
-        request.headers['KC-API-KEY'] = self._api_key
-        request.headers['KC-API-PASSPHRASE'] = passphrase.decode('utf-8')
-        request.headers['KC-API-KEY-VERSION'] = "2"
\ No newline at end of file
+
+    def send(self, http: httpx.Client, request: Request) -> httpx.Response:
+        """sign and send request, a timestamp rejected by the server is signed again once with a synchronized
+        clock"""
+        self.authenticate(request)
+        try:
+            return http.send(request)
+        except httpx.HTTPStatusError as ex:
+            # the response hook raises before the body is read
+            if self.clock is None or ex.response.status_code != 400 \
+                    or INVALID_TIMESTAMP_CODE.encode('utf-8') not in ex.response.read():
+                raise ex
+            self._logger.warning('request timestamp rejected, synchronizing server clock')
+            self.clock.sync()
+        self.authenticate(request)
+        return http.send(request)
+
+    async def send_async(self, http: httpx.AsyncClient, request: Request) -> httpx.Response:
+        """send as does send, the clock is synchronized off the event loop. request is signed right before being
+        sent, callers limiting concurrency call it once their turn has come"""
+        if self.clock is not None and self.clock.is_stale():
+            await asyncio.to_thread(self.clock.sync)
+        self.authenticate(request)
+        try:
+            return await http.send(request)
+        except httpx.HTTPStatusError as ex:
+            if self.clock is None or ex.response.status_code != 400 \
+                    or INVALID_TIMESTAMP_CODE.encode('utf-8') not in await ex.response.aread():
+                raise ex
+            self._logger.warning('request timestamp rejected, synchronizing server clock')
+            await asyncio.to_thread(self.clock.sync)
+        self.authenticate(request)
+        return await http.send(request)
+
+    def _build_signing_context(self):
+        secret = self._api_secret.encode('utf-8')
+        self._hmac = hmac.new(secret, digestmod=hashlib.sha256)
+        passphrase = base64.b64encode(hmac.new(secret, self._api_passphrase.encode('utf-8'), hashlib.sha256).digest())
+        self._headers = {'KC-API-KEY': self._api_key,
+                         'KC-API-PASSPHRASE': passphrase.decode('utf-8'),
+                         'KC-API-KEY-VERSION': '2'}
@@ -1,9 +1,34 @@
+import asyncio
+
 import httpx
 import pandas as pd
 
 from wired_exchange.core.ExchangeClient import ExchangeClient
+from wired_exchange.core.PayloadSchema import PayloadSchema, Field
+from wired_exchange.core.ServerClock import ServerClock
 from wired_exchange.kucoin.KucoinAuthenticator import KucoinAuthenticator
 
+POSITIONS_SCHEMA = PayloadSchema(dict(
+    symbol='symbol', autoDeposit='autoDeposit', isOpen='isOpen', isInverse='isInverse',
+    settleCurrency='settleCurrency',
+    realLeverage=Field('realLeverage', 'float'), currentQty=Field('currentQty', 'float'),
+    currentCost=Field('currentCost', 'float'), currentComm=Field('currentComm', 'float'),
+    unrealisedCost=Field('unrealisedCost', 'float'), realisedCost=Field('realisedCost', 'float'),
+    markPrice=Field('markPrice', 'float'), posCost=Field('posCost', 'float'), posInit=Field('posInit', 'float'),
+    posComm=Field('posComm', 'float'), posLoss=Field('posLoss', 'float'), posMargin=Field('posMargin', 'float'),
+    maintainMargin=Field('maintainMargin', 'float'), realisedPnl=Field('realisedPnl', 'float'),
+    unrealisedPnl=Field('unrealisedPnl', 'float'), unrealisedPnlPcnt=Field('unrealisedPnlPcnt', 'float'),
+    avgEntryPrice=Field('avgEntryPrice', 'float'), liquidationPrice=Field('liquidationPrice', 'float'),
+    bankruptPrice=Field('bankruptPrice', 'float'),
+    openingTimestamp=Field('openingTimestamp', 'datetime[ms]'),
+    currentTimestamp=Field('currentTimestamp', 'datetime[ms]')))
+
+CONTRACTS_SCHEMA = PayloadSchema(dict(
+    symbol='symbol', baseCurrency='baseCurrency', quoteCurrency='quoteCurrency', settleCurrency='settleCurrency',
+    isInverse=Field('isInverse', 'bool'), multiplier=Field('multiplier', 'float'),
+    tickSize=Field('tickSize', 'float'), markPrice=Field('markPrice', 'float'),
+    fundingFeeRate=Field('fundingFeeRate', 'float')))
+
 
 class KucoinFuturesClient(ExchangeClient):
 
@@ -12,17 +37,31 @@ class KucoinFuturesClient(ExchangeClient):
         super().__init__('kucoin_futures', futures_api_key, futures_api_secret, futures_host_url, always_authenticate=False)
         self._api_passphrase = futures_api_passphrase if futures_api_passphrase is not None else self._get_exchange_env_value(
             'api_passphrase')
-        self._authenticator = KucoinAuthenticator(self._api_key, self._api_passphrase, self._api_secret)
+        self._ws = None
+        # websocket topic prefixes delivered latest value wins, e.g. ['/contract/instrument']
+        self.conflated_topics = []
+        self._authenticator = KucoinAuthenticator(self._api_key, self._api_passphrase, self._api_secret,
+                                                  ServerClock(self.get_server_time))
 
     def _authenticate(self, request):
         self._authenticator.authenticate(request)
 
+    def _send_signed(self, request: httpx.Request) -> httpx.Response:
+        return self._authenticator.send(self._httpClient, request)
+
+    def get_server_time(self) -> int:
+        """server time in milliseconds"""
+        self.open()
+        json = self._httpClient.get('v1/timestamp').json()
+        if not json['code'].startswith('200'):
+            raise RuntimeError(f'{json["msg"]} ({json["code"]}): response code does not indicate a success')
+        return int(json['data'])
+
     def get_positions(self) -> pd.DataFrame:
         self.open()
         request = self._httpClient.build_request('GET', 'v1/positions')
-        self._authenticate(request)
         try:
-            json = self._httpClient.send(request).json()
+            json = self._send_signed(request).json()
             if not json['code'].startswith('200'):
                 raise RuntimeError(f'{json["msg"]} ({json["code"]}): response code does not indicate a success')
             return self._to_positions(json)
@@ -32,40 +71,70 @@ class KucoinFuturesClient(ExchangeClient):
     def get_position(self, symbol:str):
         self.open()
         request = self._httpClient.build_request('GET', 'v1/positions', params={symbol: symbol})
-        self._authenticate(request)
         try:
-            json = self._httpClient.send(request).json()
+            json = self._send_signed(request).json()
             if not json['code'].startswith('200'):
                 raise RuntimeError(f'{json["msg"]} ({json["code"]}): response code does not indicate a success')
             return self._to_positions(json)
         except httpx.HTTPStatusError as ex:
             raise RuntimeError('cannot retrieve futures positions from Kucoin') from ex
 
+    def get_contracts(self) -> pd.DataFrame:
+        """open contracts with their multiplier, mark price and current funding rate"""
+        self.open()
+        try:
+            json = self._httpClient.get('v1/contracts/active').json()
+            if not json['code'].startswith('200'):
+                raise RuntimeError(f'{json["msg"]} ({json["code"]}): response code does not indicate a success')
+            return CONTRACTS_SCHEMA.normalize(json['data'])
+        except httpx.HTTPStatusError as ex:
+            raise RuntimeError('cannot retrieve futures contracts from Kucoin') from ex
+
     def _to_positions(self, json):
-        positions = pd.DataFrame(json['data'])
-        if positions.size == 0:
-            return positions
-        positions.drop(columns=['id', 'maintMarginReq', 'riskLimit', 'crossMode', 'markValue', 'unrealisedRoePcnt', 'posMaint', 'maintMargin', 'realisedGrossPnl', 'posCross', 'delevPercentage', 'realisedGrossCost'], inplace=True)
-        positions['realLeverage'] = pd.to_numeric(positions['realLeverage'])
-        positions['currentQty'] = pd.to_numeric(positions['currentQty'])
-        positions['currentCost'] = pd.to_numeric(positions['currentCost'])
-        positions['currentComm'] = pd.to_numeric(positions['currentComm'])
-        positions['unrealisedCost'] = pd.to_numeric(positions['unrealisedCost'])
-        positions['realisedCost'] = pd.to_numeric(positions['realisedCost'])
-        positions['markPrice'] = pd.to_numeric(positions['markPrice'])
-        positions['posCost'] = pd.to_numeric(positions['posCost'])
-        positions['posInit'] = pd.to_numeric(positions['posInit'])
-        positions['posComm'] = pd.to_numeric(positions['posComm'])
-        positions['posLoss'] = pd.to_numeric(positions['posLoss'])
-        positions['posMargin'] = pd.to_numeric(positions['posMargin'])
-        positions['realisedPnl'] = pd.to_numeric(positions['realisedPnl'])
-        positions['unrealisedPnl'] = pd.to_numeric(positions['unrealisedPnl'])
-        positions['avgEntryPrice'] = pd.to_numeric(positions['avgEntryPrice'])
-        positions['liquidationPrice'] = pd.to_numeric(positions['liquidationPrice'])
-        positions['bankruptPrice'] = pd.to_numeric(positions['bankruptPrice'])
-        positions['unrealisedPnlPcnt'] = pd.to_numeric(positions['unrealisedPnlPcnt'])
-        positions['openingTimestamp'] = pd.to_datetime(positions['openingTimestamp'], unit='ms')
-        positions['currentTimestamp'] = pd.to_datetime(positions['currentTimestamp'], unit='ms')
-        return positions
+        return POSITIONS_SCHEMA.normalize(json['data'])
+
+    def _get_ws_connection_info(self):
+        request = self._httpClient.build_request('POST', 'v1/bullet-private')
+        try:
+            return self._send_signed(request).json()['data']
+        except httpx.HTTPStatusError as ex:
+            raise RuntimeError('cannot retrieve websocket token from Kucoin futures') from ex
+
+    def _open_websocket(self):
+        if self._ws is not None:
+            return
+        # websockets is only loaded when streaming is actually used
+        from wired_exchange.kucoin.WebSocket import KucoinWebSocket
+        self.open()
+        ws_cx_data = self._get_ws_connection_info()
+        server = ws_cx_data['instanceServers'][0]
+        self._ws = KucoinWebSocket(server['endpoint'], ws_cx_data['token'], server['encrypt'],
+                                   server['pingInterval'], server['pingTimeout'],
+                                   conflated_topics=self.conflated_topics)
+        return asyncio.create_task(self._ws.open_async())
+
+    async def register_futures_book_async(self, book):
+        """subscribe book to mark price, funding rate and position changes of its symbols, then seed it from REST
+
+        symbols default to those of open positions, subscription happens first so that no change is lost while
+        the snapshot is taken"""
+        self._open_websocket()
+        if book.symbols is None:
+            book.symbols = list((await asyncio.to_thread(self.get_positions))['symbol'])
+        self._ws.insert_handler(book)
+        for topic in book.topics:
+            await self._ws.subscribe_topic_async(topic)
+        for topic in book.private_topics:
+            await self._ws.subscribe_private_async(topic)
+        await asyncio.to_thread(book.seed, self)
 
+    @property
+    def websocket_metrics(self):
+        """live WebSocketMetrics of the opened websocket, None when not streaming"""
+        return self._ws.metrics if self._ws is not None else None
 
+    def stop_reading(self):
+        if self._ws is not None:
+            self._logger.debug('stopping web socket')
+            self._ws.close()
+            self._ws = None
@@ -1,22 +1,68 @@
 import asyncio
-import functools
+import itertools
 import time
 import uuid
-from datetime import datetime, timedelta
-from typing import Literal, Union
+from datetime import datetime, timedelta, timezone
+from typing import Literal, Union, Iterator
 
 import httpx
+import numpy as np
 import pandas as pd
-import tzlocal
 from pandas import DataFrame
 
-from wired_exchange.core import to_timestamp, to_transactions, to_klines, from_timestamp
+from wired_exchange.core import to_transactions, to_klines, concat_batches
 from wired_exchange.core.ExchangeClient import ExchangeClient
+from wired_exchange.core.PayloadSchema import PayloadSchema, Field, SymbolSplit
+from wired_exchange.core.ServerClock import ServerClock
+from wired_exchange.core.times import to_epoch, to_utc_datetime
 from wired_exchange.kucoin import CandleStickResolution
 from wired_exchange.kucoin.KucoinAuthenticator import KucoinAuthenticator
-from wired_exchange.kucoin.WebSocket import KucoinWebSocket
 
 QUERY_MAX_DAYS_RANGE = 7
+# seconds waited before retrying a request rejected by the rate limiter (429)
+RATE_LIMIT_DELAY = 11
+
+FILLS_SCHEMA = PayloadSchema(dict(time=Field('createdAt', 'datetime[ms]'), side='side', type='type',
+                                  price=Field('price', 'float'), size=Field('size', 'float'),
+                                  fee=Field('fee', 'float'), fee_rate=Field('feeRate', 'float'),
+                                  fee_currency='feeCurrency', order_id=Field('orderId', 'string'),
+                                  trade_id=Field('tradeId', 'string')),
+                             symbol=SymbolSplit('symbol', '-'), id_source='tradeId')
+
+ORDERS_SCHEMA = PayloadSchema(dict(id='id', type='type', side='side', price=Field('price', 'float'),
+                                   size=Field('size', 'float'), status='status', is_active='isActive',
+                                   fee=Field('fee', 'float'), fee_currency='feeCurrency',
+                                   time=Field('createdAt', 'datetime[ms]')),
+                              symbol=SymbolSplit('symbol', '-'))
+
+KLINES_SCHEMA = PayloadSchema(dict(time=Field('time', 'datetime[s]'), open=Field('open', 'float'),
+                                   close=Field('close', 'float'), high=Field('high', 'float'),
+                                   low=Field('low', 'float'), volume=Field('volume', 'float')),
+                              record_keys=['time', 'open', 'close', 'high', 'low', 'volume', 'amount'])
+
+BALANCES_SCHEMA = PayloadSchema(dict(currency='currency', total=Field('balance', 'float'),
+                                     available=Field('available', 'float'), holds=Field('holds', 'float')))
+
+ACCOUNTS_SCHEMA = PayloadSchema(dict(currency='currency', account_type='type', total=Field('balance', 'float'),
+                                     available=Field('available', 'float'), holds=Field('holds', 'float')))
+
+BOOK_TICKERS_SCHEMA = PayloadSchema(dict(bid=Field('buy', 'float'), ask=Field('sell', 'float')),
+                                    symbol=SymbolSplit('symbol', '-'))
+
+TICKERS_SCHEMA = PayloadSchema(dict(symbol='symbol', symbolName='symbolName', bid=Field('buy', 'float'),
+                                    ask=Field('sell', 'float'), changeRate=Field('changeRate', 'float'),
+                                    change24h=Field('changePrice', 'float'), high24h=Field('high', 'float'),
+                                    low24h=Field('low', 'float'), vol=Field('vol', 'float'),
+                                    quoteVolume24h=Field('volValue', 'float'), last=Field('last', 'float'),
+                                    averagePrice=Field('averagePrice', 'float'),
+                                    takerFeeRate=Field('takerFeeRate', 'float'),
+                                    makerFeeRate=Field('makerFeeRate', 'float'),
+                                    takerCoefficient=Field('takerCoefficient', 'float'),
+                                    makerCoefficient=Field('makerCoefficient', 'float')),
+                               symbol=SymbolSplit('symbol', '-', base='currency'))
+
+OPERATIONS_SCHEMA = PayloadSchema(dict(size=Field('amount', 'float'), base_currency='currency', status='status',
+                                       time=Field('updatedAt', 'datetime[ms]'), id='walletTxId'))
 
 
 class KucoinSpotClient(ExchangeClient):
@@ -27,33 +73,42 @@ class KucoinSpotClient(ExchangeClient):
         self._api_passphrase = api_passphrase if api_passphrase is not None else self._get_exchange_env_value(
             'api_passphrase')
         self._ws = None
-        self._authenticator = KucoinAuthenticator(self._api_key, self._api_passphrase, self._api_secret)
+        self._ws_private = False
+        # websocket topic prefixes delivered latest value wins, e.g. ['/market/ticker']
+        self.conflated_topics = []
+        self._authenticator = KucoinAuthenticator(self._api_key, self._api_passphrase, self._api_secret,
+                                                  ServerClock(self.get_server_time))
 
     def _authenticate(self, request):
         self._authenticator.authenticate(request)
 
+    def _send_signed(self, request: httpx.Request) -> httpx.Response:
+        return self._authenticator.send(self._httpClient, request)
+
+    def get_server_time(self) -> int:
+        """server time in milliseconds"""
+        self.open()
+        response = self._httpClient.get('/v1/timestamp').json()
+        if not response['code'].startswith('200'):
+            raise RuntimeError(f'{response["code"]}: response code does not indicate a success')
+        return int(response['data'])
+
     def get_transactions(self, start_time: datetime, end_time: datetime = None,
                          trade_type: Literal['spot', 'margin'] = 'spot') -> pd.DataFrame:
+        tr = concat_batches(self.iter_transactions(start_time, end_time, trade_type))
+        return tr.sort_values(by='time', ascending=False) if tr.size > 0 else tr
+
+    def iter_transactions(self, start_time: datetime, end_time: datetime = None,
+                          trade_type: Literal['spot', 'margin'] = 'spot') -> Iterator[pd.DataFrame]:
+        """yield typed transactions page by page as they are received"""
         self.open()
-        if end_time is None:
-            end_time = datetime.now(tzlocal.get_localzone())
-        else:
-            if not isinstance(end_time, datetime):
-                end_time = from_timestamp(end_time)
-        if not isinstance(start_time, datetime):
-            start_time = from_timestamp(start_time)
+        end_time = datetime.now(timezone.utc) if end_time is None else to_utc_datetime(end_time, 'ms')
+        start_time = to_utc_datetime(start_time, 'ms')
         params = {'tradeType': 'MARGIN_TRADE' if trade_type.lower() == 'margin' else 'TRADE'}
-        transactions = None
         try:
             for p in self._get_date_ranges(params, start_time, end_time):
-                current_transactions = self._read_pages('/v1/fills', p, authenticated=True)
-                if len(current_transactions) > 0:
-                    transactions = pd.DataFrame(current_transactions) if transactions is None else transactions.append(
-                        pd.DataFrame(current_transactions), ignore_index=True)
-            if transactions is not None:
-                return self._to_transactions(transactions)
-            else:
-                return pd.DataFrame()
+                for page in self._get_pages('/v1/fills', p, authenticated=True):
+                    yield self._to_transactions(page)
         except httpx.HTTPStatusError as ex:
             raise RuntimeError('cannot retrieve transactions from Kucoin') from ex
 
@@ -62,6 +117,14 @@ class KucoinSpotClient(ExchangeClient):
                    trade_type: Literal['spot', 'margin'] = 'spot',
                    status: Literal['done', 'active'] = None,
                    side: Literal['buy', 'sell'] = None) -> pd.DataFrame:
+        return concat_batches(self.iter_orders(symbol, start_time, end_time, trade_type, status, side))
+
+    def iter_orders(self, symbol: str = None, start_time: Union[datetime, int, float, type(None)] = None,
+                    end_time: Union[datetime, int, float, type(None)] = None,
+                    trade_type: Literal['spot', 'margin'] = 'spot',
+                    status: Literal['done', 'active'] = None,
+                    side: Literal['buy', 'sell'] = None) -> Iterator[pd.DataFrame]:
+        """yield typed orders and stop orders page by page as they are received"""
         self.open()
         params = {'tradeType': 'MARGIN_TRADE' if trade_type.lower() == 'margin' else 'TRADE'}
         if symbol is not None:
@@ -70,22 +133,27 @@ class KucoinSpotClient(ExchangeClient):
             params['status'] = status
         if side is not None:
             params['side'] = side
-        orders = None
         try:
             for p in self._get_date_ranges(params, start_time, end_time):
                 for path in ['/v1/orders', '/v1/stop-order']:
-                    current_orders = self._read_pages(path, params=p, authenticated=True)
-                    if len(current_orders) > 0:
-                        orders = pd.DataFrame(current_orders) if orders is None else orders.append(
-                            pd.DataFrame(current_orders), ignore_index=True)
-            if orders is not None:
-                if 'cancelExist' in orders.columns:
-                    orders = orders[orders['cancelExist'] != True]
-                return self._to_orders(orders)
-            else:
-                return pd.DataFrame()
+                    for page in self._get_pages(path, params=p, authenticated=True):
+                        orders = pd.DataFrame(page)
+                        if 'cancelExist' in orders.columns:
+                            orders = orders[orders['cancelExist'] != True]
+                        yield self._to_orders(orders)
         except httpx.HTTPStatusError as ex:
-            raise RuntimeError('cannot retrieve transactions from Kucoin') from ex
+            raise RuntimeError('cannot retrieve orders from Kucoin') from ex
+
+    def get_active_orders(self, trade_type: Literal['spot', 'margin'] = 'spot') -> pd.DataFrame:
+        """all currently active orders and stop orders, whatever their creation time"""
+        self.open()
+        params = {'tradeType': 'MARGIN_TRADE' if trade_type.lower() == 'margin' else 'TRADE', 'status': 'active'}
+        try:
+            return concat_batches(self._to_orders(pd.DataFrame(page))
+                                  for path in ['/v1/orders', '/v1/stop-order']
+                                  for page in self._get_pages(path, dict(params), authenticated=True))
+        except httpx.HTTPStatusError as ex:
+            raise RuntimeError('cannot retrieve active orders from Kucoin') from ex
 
     def get_prices_history(self, base_currency: str, quote_currency: str, resolution: int,
                            start_time: Union[datetime, int, float],
@@ -105,64 +173,55 @@ class KucoinSpotClient(ExchangeClient):
         except httpx.HTTPStatusError as ex:
             raise RuntimeError('cannot retrieve transactions from Kucoin') from ex
 
-    def _to_transactions(self, fills: Union[DataFrame, dict]) -> pd.DataFrame:
-        tr = pd.DataFrame(fills) if isinstance(fills, dict) else fills
-        if tr.size == 0:
-            return tr
-        tr['time'] = pd.to_datetime(tr['createdAt'], unit='ms', utc=True)
-        tr['base_currency'] = tr['symbol'].apply(lambda s: s.split('-')[0])
-        tr['quote_currency'] = tr['symbol'].apply(lambda s: s.split('-')[1])
-        tr.rename(
-            columns=dict(feeCurrency='fee_currency', tradeId='trade_id', orderId='order_id',
-                         counterOrderId='counter_order_id', feeRate='fee_rate'), inplace=True)
-        tr.drop(['createdAt', 'symbol', 'forceTaker', 'stop', 'tradeType',
-                 'funds', 'liquidity', 'counter_order_id'],
-                axis='columns', inplace=True)
-        tr.astype(dict(order_id='string', trade_id='string'))
-        tr['platform'] = self.platform
-        tr['id'] = tr['trade_id'].apply(lambda t_id: f'{self.platform}_{t_id}')
-        return to_transactions(tr)
-
-    def _to_klines(self, candles: dict, base: str, quote: str) -> pd.DataFrame:
-        tr = pd.DataFrame(candles, columns=['time', 'open', 'close', 'high', 'low', 'volume', 'amount'])
-        if tr.size == 0:
-            return tr
-        tr.drop(['amount'], inplace=True, axis='columns')
-        tr['time'] = pd.to_numeric(tr['time']) * 1000
-        return to_klines(tr, base, quote)
+    def _to_transactions(self, fills: Union[DataFrame, list]) -> pd.DataFrame:
+        if len(fills) == 0:
+            return pd.DataFrame()
+        return to_transactions(FILLS_SCHEMA.normalize(fills, self.platform))
+
+    def _to_klines(self, candles: list, base: str, quote: str) -> pd.DataFrame:
+        if len(candles) == 0:
+            return pd.DataFrame()
+        return to_klines(KLINES_SCHEMA.normalize(candles), base, quote)
 
     def get_balances(self) -> pd.DataFrame:
         self.open()
         try:
             request = self._httpClient.build_request('GET', '/v1/accounts')
-            self._authenticate(request)
-            response = self._httpClient.send(request).json()
+            response = self._send_signed(request).json()
             if not response['code'].startswith('200'):
                 raise RuntimeError(f'{response["code"]}: response code does not indicate a success')
             return self._to_balances(response['data'])
         except httpx.HTTPStatusError as ex:
             raise RuntimeError('cannot retrieve accounts list from Kucoin') from ex
 
-    def _to_balances(self, balances_json: dict) -> pd.DataFrame:
-        balances = pd.DataFrame(balances_json)
+    def get_accounts(self) -> pd.DataFrame:
+        """raw balances per account type (main, trade, margin...) without price enrichment"""
+        self.open()
+        try:
+            request = self._httpClient.build_request('GET', '/v1/accounts')
+            response = self._send_signed(request).json()
+            if not response['code'].startswith('200'):
+                raise RuntimeError(f'{response["code"]}: response code does not indicate a success')
+            return ACCOUNTS_SCHEMA.normalize(response['data'], platform=self.platform)
+        except httpx.HTTPStatusError as ex:
+            raise RuntimeError('cannot retrieve accounts list from Kucoin') from ex
+
+    def _to_balances(self, balances_json: list) -> pd.DataFrame:
+        balances = BALANCES_SCHEMA.normalize(balances_json)
         if balances.size == 0:
             return balances
-        balances['balance'] = pd.to_numeric(balances['balance'])
-        balances = balances[balances['balance'] != 0.0]
-        balances['available'] = pd.to_numeric(balances['available'])
-        balances = balances.groupby('currency').sum()
+        balances = balances[balances['total'] != 0.0].groupby('currency').sum()
         try:
             tickers = self.get_all_tickers()
             balances = balances.merge(tickers, left_index=True,
                                       right_on='currency', how='left')
-            balances.drop(columns=['symbol', 'symbolName'], inplace=True)
+            balances.drop(columns=['symbol', 'symbolName', 'quote_currency', 'averagePrice'], inplace=True)
         except:
             self._logger.warning('cannot retrieve current tickers', exc_info=True)
-        balances.drop(columns=['averagePrice'], inplace=True)
-        balances.rename(columns=dict(balance='total', last='price'), inplace=True)
+            balances.reset_index(inplace=True)
+        balances.rename(columns=dict(last='price'), inplace=True)
         balances.set_index('currency', inplace=True)
         balances['platform'] = self.platform
-        balances.convert_dtypes()
         return balances
 
     def get_all_tickers(self) -> pd.DataFrame:
@@ -172,76 +231,40 @@ class KucoinSpotClient(ExchangeClient):
         tickers = self._convert_to_ticker(tickers)
         return tickers
 
+    def get_book_tickers(self) -> pd.DataFrame:
+        """best bid and ask of every symbol"""
+        self.open()
+        tickers = self._httpClient.get('v1/market/allTickers').json()
+        if not tickers['code'].startswith('200'):
+            raise RuntimeError(f'{tickers["code"]}: response code does not indicate a success')
+        return BOOK_TICKERS_SCHEMA.normalize(tickers['data']['ticker'])
+
     def _convert_to_ticker(self, tickers: dict) -> pd.DataFrame:
-        asof_time = pd.to_datetime(tickers['data']['time'], unit='ms', utc=True)
-        tickers = pd.DataFrame(tickers['data']['ticker'])
-        tickers = tickers[tickers['symbol'].str.endswith('USDT')]
-        tickers['currency'] = tickers['symbol'].apply(lambda s: s.split('-')[0])
-        tickers['time'] = asof_time
-        tickers.rename(columns=dict(buy='bid', sell='ask', changePrice='change24h'
-                                    , high='high24h', low='low24h', volValue='quoteVolume24h'), inplace=True)
-        tickers.bid = pd.to_numeric(tickers.bid)
-        tickers.ask = pd.to_numeric(tickers.ask)
-        tickers.changeRate = pd.to_numeric(tickers.changeRate)
-        tickers.change24h = pd.to_numeric(tickers.change24h)
-        tickers.high24h = pd.to_numeric(tickers.high24h)
-        tickers.low24h = pd.to_numeric(tickers.low24h)
-        tickers.vol = pd.to_numeric(tickers.vol)
-        tickers.quoteVolume24h = pd.to_numeric(tickers.quoteVolume24h)
-        tickers['last'] = pd.to_numeric(tickers['last'])
-        tickers.averagePrice = pd.to_numeric(tickers.averagePrice)
-        tickers.takerFeeRate = pd.to_numeric(tickers.takerFeeRate)
-        tickers.makerFeeRate = pd.to_numeric(tickers.makerFeeRate)
-        tickers.takerCoefficient = pd.to_numeric(tickers.takerCoefficient)
-        return tickers
+        asof_time = to_utc_datetime(tickers['data']['time'], 'ms')
+        usdt_tickers = [t for t in tickers['data']['ticker'] if t['symbol'].endswith('USDT')]
+        return TICKERS_SCHEMA.normalize(usdt_tickers, time=asof_time)
 
     def get_account_operations(self, start_time: Union[datetime, int, float, type(None)] = None,
                                end_time: Union[datetime, int, float, type(None)] = None) -> pd.DataFrame:
+        return concat_batches(self.iter_account_operations(start_time, end_time))
+
+    def iter_account_operations(self, start_time: Union[datetime, int, float, type(None)] = None,
+                                end_time: Union[datetime, int, float, type(None)] = None) -> Iterator[pd.DataFrame]:
+        """yield typed deposits and withdrawals page by page as they are received"""
         self.open()
         params = {}
-        if end_time is None:
-            end_time = datetime.now(tzlocal.get_localzone())
-        else:
-            if not isinstance(end_time, datetime):
-                end_time = from_timestamp(end_time)
-        if not isinstance(start_time, datetime):
-            start_time = from_timestamp(start_time)
-        deposits = None
-        withdrawals = None
-        columns = ['amount', 'currency', 'status', 'createdAt', 'updatedAt', 'walletTxId']
+        end_time = datetime.now(timezone.utc) if end_time is None else to_utc_datetime(end_time, 'ms')
+        start_time = to_utc_datetime(start_time, 'ms')
         try:
             for p in self._get_date_ranges(params, start_time, end_time):
-                current_deposits = self._read_pages('/v1/deposits', p, authenticated=True)
-                if len(current_deposits) > 0:
-                    current_deposits = pd.DataFrame(current_deposits, columns=columns)
-                    current_deposits['type'] = 'deposit'
-                    deposits = current_deposits if deposits is None else deposits.append(current_deposits,
-                                                                                         ignore_index=True)
-                current_withdrawals = self._read_pages('/v1/withdrawals', p, authenticated=True)
-                if len(current_withdrawals) > 0:
-                    current_withdrawals = pd.DataFrame(current_withdrawals, columns=columns)
-                    current_withdrawals['type'] = 'withdrawal'
-                    withdrawals = current_withdrawals if withdrawals is None else withdrawals.append(
-                        current_withdrawals, ignore_index=True)
-            return self._to_account_operations(deposits, withdrawals)
+                for path, operation_type in [('/v1/deposits', 'deposit'), ('/v1/withdrawals', 'withdrawal')]:
+                    for page in self._get_pages(path, p, authenticated=True):
+                        yield self._to_account_operations(page, operation_type)
         except httpx.HTTPStatusError as ex:
-            raise RuntimeError('cannot retrieve transactions from Kucoin') from ex
+            raise RuntimeError('cannot retrieve account operations from Kucoin') from ex
 
-    def _to_account_operations(self, deposits: pd.DataFrame, withdrawals: pd.DataFrame):
-        if deposits is None and withdrawals is None:
-            return pd.DataFrame()
-        if deposits is None:
-            operations = withdrawals
-        else:
-            if withdrawals is None:
-                operations = deposits
-            else:
-                operations = deposits.append(withdrawals, ignore_index=True)
-        operations['updatedAt'] = pd.to_datetime(operations['updatedAt'], unit='ms', utc=True)
-        operations['platform'] = self.platform
-        operations.rename(columns=dict(updatedAt='time', walletTxId='id',
-                                       amount='size', currency='base_currency'), inplace=True)
-        return operations
+    def _to_account_operations(self, operations: list, operation_type: Literal['deposit', 'withdrawal']):
+        return OPERATIONS_SCHEMA.normalize(operations, platform=self.platform, type=operation_type)
 
     def get_orders_v1(self, symbol=None, start_time: Union[datetime, int, float, type(None)] = None,
                       end_time: Union[datetime, int, float, type(None)] = None) -> pd.DataFrame:
@@ -271,16 +294,14 @@ class KucoinSpotClient(ExchangeClient):
             retry = True
             response = None
             while retry:
-                if authenticated:
-                    self._authenticate(request)
                 try:
-                    response = self._httpClient.send(request)
+                    response = self._send_signed(request) if authenticated else self._httpClient.send(request)
                     retry = False
                 except httpx.HTTPStatusError as ex:
                     if 429 == ex.response.status_code:
                         retry = True
-                        self._logger.warning('request threshold reach, waiting 10s...')
-                        time.sleep(11)
+                        self._logger.warning(f'request threshold reach, waiting {RATE_LIMIT_DELAY}s...')
+                        time.sleep(RATE_LIMIT_DELAY)
                     else:
                         raise ex
             json = response.json()
@@ -294,7 +315,7 @@ class KucoinSpotClient(ExchangeClient):
     def _get_date_ranges(self, params: dict, start_time: datetime, end_time: datetime = None) -> dict:
         last_query = False
         if end_time is None:
-            end_time = datetime.now(tzlocal.get_localzone())
+            end_time = datetime.now(timezone.utc)
         while not last_query:
             date_range = end_time - start_time
             if date_range > timedelta(0):
@@ -310,42 +331,62 @@ class KucoinSpotClient(ExchangeClient):
 
     @staticmethod
     def _aggregate_pages(iterable):
-        read_orders = [json for json in iterable]
-        if len(read_orders) > 0:
-            return functools.reduce(lambda x, y: x + y, read_orders)
-        else:
-            return {}
+        return list(itertools.chain.from_iterable(iterable))
 
     def _get_ws_connection_info(self, private: bool = False):
-        if private:
-            request = self._httpClient.build_request('POST', '/v1/bullet-private')
-            self._authenticate(request)
-        else:
-            request = self._httpClient.build_request('POST', '/v1/bullet-public')
         try:
-            return self._httpClient.send(request).json()['data']
+            if private:
+                return self._send_signed(self._httpClient.build_request('POST', '/v1/bullet-private')).json()['data']
+            return self._httpClient.post('/v1/bullet-public').json()['data']
         except httpx.HTTPStatusError as ex:
             raise RuntimeError('cannot retrieve websocket token from Kucoin') from ex
 
     def _open_websocket(self, private: bool = False):
         if self._ws is not None:
+            if private and not self._ws_private:
+                raise RuntimeError('a public websocket is already opened, private channels are not available')
             return
+        # websockets is only loaded when streaming is actually used
+        from wired_exchange.kucoin.WebSocket import KucoinWebSocket
         ws_cx_data = self._get_ws_connection_info(private)
         server = ws_cx_data['instanceServers'][0]
         self._ws = KucoinWebSocket(server['endpoint'], ws_cx_data['token'], server['encrypt'],
-                                   server['pingInterval'], server['pingTimeout'])
+                                   server['pingInterval'], server['pingTimeout'],
+                                   conflated_topics=self.conflated_topics)
+        self._ws_private = private
         return asyncio.create_task(self._ws.open_async())
 
-    async def register_candle_strategy_async(self, strategy, private: bool = False):
+    async def register_candle_strategy_async(self, strategy, private: bool = False, dispatcher=None):
+        """strategy runs on the event loop unless a HandlerDispatcher is given"""
         self._open_websocket(private)
+        if dispatcher is not None:
+            strategy = dispatcher.wrap(strategy)
         self._ws.insert_handler(strategy)
         await self._ws.subscribe_klines_async(strategy.topics)
 
-    async def register_ticker_strategy_async(self, strategy, private: bool = False):
+    async def register_ticker_strategy_async(self, strategy, private: bool = False, dispatcher=None):
+        """strategy runs on the event loop unless a HandlerDispatcher is given"""
         self._open_websocket(private)
+        if dispatcher is not None:
+            strategy = dispatcher.wrap(strategy)
         self._ws.insert_handler(strategy)
         await self._ws.subscribe_tickers_async(strategy.tickers)
 
+    async def register_account_book_async(self, book):
+        """subscribe book to private order and balance channels, then seed it from REST
+
+        subscription happens first so that no change is lost while the snapshot is taken"""
+        self._open_websocket(private=True)
+        self._ws.insert_handler(book)
+        for topic in book.topics:
+            await self._ws.subscribe_private_async(topic)
+        await asyncio.to_thread(book.seed, self)
+
+    @property
+    def websocket_metrics(self):
+        """live WebSocketMetrics of the opened websocket, None when not streaming"""
+        return self._ws.metrics if self._ws is not None else None
+
     def stop_reading(self):
         if self._ws is not None:
             self._logger.debug('stopping web socket')
@@ -356,37 +397,20 @@ class KucoinSpotClient(ExchangeClient):
     def _set_date_range_params(params: dict, start_time: Union[datetime, int, float, type(None)],
                                end_time: Union[datetime, int, float, type(None)], precision) -> dict:
         if start_time is not None:
-            params['startAt'] = to_timestamp(start_time, precision) if isinstance(start_time, datetime) else int(
-                round(start_time))
+            params['startAt'] = to_epoch(start_time, precision)
         if end_time is not None:
-            params['endAt'] = to_timestamp(end_time, precision) if isinstance(end_time, datetime) else int(
-                round(end_time))
+            params['endAt'] = to_epoch(end_time, precision)
         return params
 
     def _to_orders(self, orders: pd.DataFrame):
         if orders.size == 0:
             return orders
-        orders.loc[:, 'time'] = pd.to_datetime(orders['createdAt'], unit='ms', utc=True)
-        orders.loc[:, 'base_currency'] = orders['symbol'].apply(lambda s: s.split('-')[0])
-        orders.loc[:, 'quote_currency'] = orders['symbol'].apply(lambda s: s.split('-')[1])
-        if 'status' not in orders.columns:
-            orders['status'] = pd.NA
-        if 'isActive' in orders.columns:
-            orders.loc[:, 'isActive'].fillna(True, inplace=True)
-            orders.loc[(orders['isActive'] == False) & orders['status'].isna(), 'status'] = 'FILLED'
-            orders.loc[(orders['isActive'] == True) & orders['status'].isna(), 'status'] = 'NEW'
-        if 'fee' in orders.columns:
-            orders = orders.loc[:, ('id', 'base_currency', 'quote_currency', 'type', 'side', 'price',
-                                    'size', 'status', 'fee', 'feeCurrency', 'time')]
-            orders.loc[:, 'fee'] = pd.to_numeric(orders['fee'])
-        else:
-            orders = orders.loc[:, ('id', 'base_currency', 'quote_currency', 'type', 'side', 'price',
-                                    'size', 'status', 'feeCurrency', 'time')]
-        orders.loc[:, 'price'] = pd.to_numeric(orders['price'])
-        orders.loc[:, 'size'] = pd.to_numeric(orders['size'])
-        orders.astype(dict(status='string'))
-        orders.rename(columns={'feeCurrency': 'fee_currency'})
-        orders.loc[:, 'platform'] = self.platform
+        orders = ORDERS_SCHEMA.normalize(orders, platform=self.platform)
+        # stop orders carry a status, regular ones only tell if they are still active
+        is_active = orders.pop('is_active')
+        orders['status'] = orders['status'].where(orders['status'].notna(),
+                                                  np.where(is_active == False, 'FILLED', 'NEW'))
+        orders['status'] = orders['status'].astype('string')
         return orders
 
     def place_order(self, symbol: str, side: Literal['buy', 'sell'], limit: float, stop: float = None,
@@ -409,8 +433,7 @@ class KucoinSpotClient(ExchangeClient):
             data['remark'] = remark
         try:
             request = self._httpClient.build_request('POST', path, json=data)
-            self._authenticate(request)
-            response = self._httpClient.send(request).json()
+            response = self._send_signed(request).json()
             # if not response['code'].startswith('200'):
             #     raise RuntimeError(f'{response["code"]}: response code does not indicate a success')
             return response
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+DEFAULT_LAG_INTERVAL = 0.5
+
+
+class Stat:
+    """running count, mean, max and last value of a measure"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.last = value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count > 0 else 0.0
+
+    def __repr__(self):
+        return f'Stat(count={self.count}, mean={self.mean:.3f}, max={self.max:.3f}, last={self.last:.3f})'
+
+
+class WebSocketMetrics:
+    """live websocket pipeline measures, all durations in milliseconds
+
+    - delays: exchange timestamp to handler start by topic
+    - processing: handler processing time by handler
+    - loop_lag: event loop scheduling lag
+    - gauges: current values read on demand (queue depths, dropped messages...)"""
+
+    def __init__(self):
+        self.delays = {}
+        self.processing = {}
+        self.loop_lag = Stat()
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self._logger = logging.getLogger(type(self).__name__)
+
+    def register_gauge(self, name: str, read: Callable[[], float]):
+        self._gauges[name] = read
+
+    def record_delay(self, topic: Optional[str], message: str, now_ms: float = None):
+        exchange_ms = exchange_time_ms(message)
+        if topic is None or exchange_ms is None:
+            return
+        now_ms = time.time() * 1000 if now_ms is None else now_ms
+        self._add(self.delays, topic, now_ms - exchange_ms)
+
+    def record_processing(self, handler: str, elapsed_ms: float):
+        self._add(self.processing, handler, elapsed_ms)
+
+    def gauges(self) -> dict[str, float]:
+        return {name: read() for name, read in self._gauges.items()}
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(gauges=self.gauges(), delays=dict(self.delays), processing=dict(self.processing),
+                        loop_lag=self.loop_lag)
+
+    async def monitor_loop_async(self, interval: float = DEFAULT_LAG_INTERVAL):
+        """measure how late the event loop wakes up a task sleeping interval seconds"""
+        while True:
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            self.loop_lag.add(max(0.0, time.perf_counter() - expected) * 1000)
+
+    def _add(self, stats: dict, key: str, value: float):
+        with self._lock:
+            stat = stats.get(key)
+            if stat is None:
+                stat = stats[key] = Stat()
+            stat.add(value)
+
+
+def exchange_time_ms(message: str) -> Optional[float]:
+    """exchange timestamp of a message in milliseconds, Kucoin uses s, ms or ns depending on the channel"""
+    for field in ('"time":', '"ts":'):
+        start = message.find(field)
+        if start >= 0:
+            break
+    else:
+        return None
+    start += len(field)
+    if message[start] == '"':
+        start += 1
+    end = start
+    while end < len(message) and message[end].isdigit():
+        end += 1
+    if end == start:
+        return None
+    value = int(message[start:end])
+    if value > 10 ** 17:
+        return value / 1_000_000
+    if value > 10 ** 14:
+        return value / 1000
+    if value > 10 ** 11:
+        return float(value)
+    return value * 1000.0
@@ -0,0 +1,245 @@
+import asyncio
+import itertools
+import logging
+import uuid
+from collections import namedtuple
+from decimal import Decimal, ROUND_DOWN, ROUND_UP
+from typing import Optional
+
+import httpx
+import pandas as pd
+
+from wired_exchange.core import VERSION
+from wired_exchange.kucoin.KucoinSpotClient import KucoinSpotClient
+
+# orders of a single symbol accepted by one /v1/orders/multi request
+MULTI_ORDER_BATCH_SIZE = 5
+DEFAULT_MAX_CONCURRENCY = 8
+
+OrderRequest = namedtuple('OrderRequest', ['symbol', 'side', 'price', 'size', 'stop', 'stop_price',
+                                           'take_profit_pct', 'stop_loss_pct', 'remark', 'client_oid'],
+                          defaults=[None, None, None, None, None, None])
+OrderRequest.__doc__ = """limit order to place, stop ('loss' or 'entry') with stop_price makes it a stop limit order.
+take_profit_pct and stop_loss_pct (percent of price) place an exit once the order is filled"""
+
+OrderResult = namedtuple('OrderResult', ['client_oid', 'order_id', 'success', 'message'])
+
+
+class KucoinOrderGateway:
+    """asynchronous order placement batching orders of a same symbol into Kucoin multi order requests
+
+    when an account book is given, filled orders with take profit or stop loss get their exit placed: a native
+    OCO order (limit take profit + stop limit stop loss) when both are set, a limit or a stop limit order otherwise"""
+
+    def __init__(self, client: KucoinSpotClient, book=None, max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.transport = None
+        # tracked orders by client order id
+        self.orders = {}
+        self._http = None
+        self._loop = None
+        self._semaphore = None
+        self._increments = None
+        self._tasks = set()
+        # exits of entries filled while the gateway is closed
+        self._pending_exits = []
+        self._logger = logging.getLogger(type(self).__name__)
+        if book is not None:
+            book.add_listener(self._on_order_change)
+
+    async def __aenter__(self):
+        return await self.open_async()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close_async()
+
+    async def open_async(self):
+        if self._http is None:
+            self._loop = asyncio.get_running_loop()
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._http = httpx.AsyncClient(base_url=self.client.host_url, transport=self.transport,
+                                           event_hooks={'response': [_raise_on_4xx_5xx]},
+                                           headers={'Accept': 'application/json',
+                                                    "User-Agent": "wired_exchange/" + VERSION})
+            # server clock is synchronized off the loop, as are later re-syncs
+            self.client.open()
+            await asyncio.to_thread(self.client._authenticator.clock.sync)
+            pending, self._pending_exits = self._pending_exits, []
+            for entry in pending:
+                self._spawn(self._place_exit_async(entry))
+        return self
+
+    async def close_async(self):
+        if len(self._tasks) > 0:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def place_orders_async(self, orders: list[OrderRequest]) -> list[OrderResult]:
+        """place orders with one request per batch of MULTI_ORDER_BATCH_SIZE orders of a same symbol,
+        batches are sent concurrently"""
+        await self.open_async()
+        orders = [o if o.client_oid is not None else o._replace(client_oid=str(uuid.uuid4())) for o in orders]
+        for order in orders:
+            self._track(order, role='entry')
+        by_symbol = itertools.groupby(sorted(orders, key=lambda o: o.symbol), key=lambda o: o.symbol)
+        batches = [batch for _, symbol_orders in by_symbol for batch in _chunks(list(symbol_orders))]
+        results = await asyncio.gather(*[self._place_batch_async(batch) for batch in batches])
+        return list(itertools.chain.from_iterable(results))
+
+    async def place_order_async(self, order: OrderRequest) -> OrderResult:
+        return (await self.place_orders_async([order]))[0]
+
+    async def cancel_order_async(self, client_oid: str):
+        await self.open_async()
+        response = await self._send_async('DELETE', f'/v1/order/client-order/{client_oid}')
+        self._set_status(client_oid, 'CANCELED')
+        return response
+
+    def get_orders(self) -> pd.DataFrame:
+        """tracked orders with their placement status and exchange order id"""
+        return pd.DataFrame(list(self.orders.values()),
+                            columns=['client_oid', 'order_id', 'symbol', 'side', 'price', 'size', 'role', 'parent',
+                                     'status', 'message'])
+
+    async def _place_batch_async(self, batch: list[OrderRequest]) -> list[OrderResult]:
+        body = dict(symbol=batch[0].symbol, orderList=[_to_order_payload(o) for o in batch])
+        try:
+            response = await self._send_async('POST', '/v1/orders/multi', json=body)
+        except Exception as ex:
+            self._logger.error(f'{batch[0].symbol}: cannot place {len(batch)} orders', exc_info=True)
+            return [self._record_result(OrderResult(o.client_oid, None, False, str(ex))) for o in batch]
+        placed = {item.get('clientOid'): item for item in response['data']['data']}
+        results = []
+        for order in batch:
+            item = placed.get(order.client_oid, {})
+            results.append(self._record_result(OrderResult(order.client_oid, item.get('id'),
+                                                           item.get('status') == 'success', item.get('failMsg'))))
+        return results
+
+    async def _send_async(self, method: str, path: str, json: dict = None) -> dict:
+        request = self._http.build_request(method, path, json=json)
+        # signed once its turn has come, a queued request would otherwise leave the timestamp window
+        async with self._semaphore:
+            try:
+                response = (await self.client._authenticator.send_async(self._http, request)).json()
+            except httpx.HTTPStatusError as ex:
+                raise RuntimeError(f'{method} {path}: request rejected by Kucoin') from ex
+        if not response['code'].startswith('200'):
+            raise RuntimeError(f'{response.get("msg")} ({response["code"]}): response code does not indicate a success')
+        return response
+
+    def _on_order_change(self, order: dict):
+        """account book listener, may be called from another thread"""
+        tracked = self.orders.get(order.get('client_oid'))
+        if tracked is None:
+            return
+        tracked['order_id'] = order['id']
+        tracked['status'] = order['status']
+        if order['status'] == 'FILLED' and tracked['role'] == 'entry' \
+                and (tracked['take_profit_pct'] is not None or tracked['stop_loss_pct'] is not None):
+            if self._http is None or self._loop.is_closed():
+                self._logger.warning(f'{tracked["client_oid"]}: gateway is closed, exit placed once reopened')
+                self._pending_exits.append(tracked)
+                return
+            self._loop.call_soon_threadsafe(self._place_exit, tracked)
+
+    def _place_exit(self, entry: dict):
+        if self._http is None:
+            self._pending_exits.append(entry)
+        else:
+            self._spawn(self._place_exit_async(entry))
+
+    def _spawn(self, coroutine):
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _place_exit_async(self, entry: dict):
+        """take profit and stop loss of a filled entry on the opposite side, an OCO order needs both legs"""
+        price_increment = Decimal(await self._get_price_increment_async(entry['symbol']))
+        price = Decimal(str(entry['price']))
+        buy = entry['side'] == 'buy'
+        client_oid = str(uuid.uuid4())
+        body = dict(clientOid=client_oid, symbol=entry['symbol'], side='sell' if buy else 'buy',
+                    size=_format(entry['size']))
+        if entry['take_profit_pct'] is not None:
+            ratio = 1 + Decimal(str(entry['take_profit_pct'])) / 100 * (1 if buy else -1)
+            body['price'] = _format(_round(price * ratio, price_increment, ROUND_UP if buy else ROUND_DOWN))
+        if entry['stop_loss_pct'] is not None:
+            ratio = 1 - Decimal(str(entry['stop_loss_pct'])) / 100 * (1 if buy else -1)
+            stop_price = _format(_round(price * ratio, price_increment, ROUND_DOWN if buy else ROUND_UP))
+            body['stopPrice'] = body['limitPrice'] = stop_price
+        if 'price' in body and 'stopPrice' in body:
+            path = '/v3/oco/order'
+        elif 'price' in body:
+            path = '/v1/orders'
+            body['type'] = 'limit'
+        else:
+            # stop loss of a long position triggers when price falls, of a short one when it rises
+            path = '/v1/stop-order'
+            body.update(type='limit', stop='loss' if buy else 'entry', price=body.pop('limitPrice'))
+        self.orders[client_oid] = dict(client_oid=client_oid, order_id=None, symbol=entry['symbol'], side=body['side'],
+                                       price=body.get('price'), size=entry['size'], role='exit',
+                                       parent=entry['client_oid'], status='PENDING', message=None,
+                                       take_profit_pct=None, stop_loss_pct=None)
+        try:
+            response = await self._send_async('POST', path, json=body)
+            self.orders[client_oid].update(order_id=response['data'].get('orderId'), status='NEW')
+            self._logger.info(f'{entry["client_oid"]}: exit placed as {client_oid}')
+        except Exception as ex:
+            self.orders[client_oid].update(status='FAILED', message=str(ex))
+            self._logger.error(f'{entry["client_oid"]}: cannot place exit order', exc_info=True)
+
+    async def _get_price_increment_async(self, symbol: str) -> str:
+        if self._increments is None:
+            response = await self._send_async('GET', '/v2/symbols')
+            self._increments = {s['symbol']: s['priceIncrement'] for s in response['data']}
+        return self._increments[symbol]
+
+    def _track(self, order: OrderRequest, role: str, parent: Optional[str] = None):
+        self.orders[order.client_oid] = dict(client_oid=order.client_oid, order_id=None, symbol=order.symbol,
+                                             side=order.side, price=order.price, size=order.size, role=role,
+                                             parent=parent, status='PENDING', message=None,
+                                             take_profit_pct=order.take_profit_pct,
+                                             stop_loss_pct=order.stop_loss_pct)
+
+    def _record_result(self, result: OrderResult) -> OrderResult:
+        tracked = self.orders[result.client_oid]
+        # a fill notified before the placement response is kept
+        if tracked['status'] == 'PENDING':
+            tracked['status'] = 'NEW' if result.success else 'FAILED'
+        tracked.update(order_id=result.order_id or tracked['order_id'], message=result.message)
+        return result
+
+    def _set_status(self, client_oid: str, status: str):
+        if client_oid in self.orders:
+            self.orders[client_oid]['status'] = status
+
+
+def _to_order_payload(order: OrderRequest) -> dict:
+    payload = dict(clientOid=order.client_oid, side=order.side, type='limit', price=_format(order.price),
+                   size=_format(order.size))
+    if order.stop is not None:
+        payload.update(stop=order.stop, stopPrice=_format(order.stop_price))
+    if order.remark is not None:
+        payload['remark'] = order.remark
+    return payload
+
+
+def _chunks(orders: list) -> list[list]:
+    return [orders[i:i + MULTI_ORDER_BATCH_SIZE] for i in range(0, len(orders), MULTI_ORDER_BATCH_SIZE)]
+
+
+def _round(value: Decimal, increment: Decimal, rounding) -> Decimal:
+    return (value / increment).quantize(Decimal(1), rounding=rounding) * increment
+
+
+def _format(value) -> str:
+    return format(Decimal(str(value)).normalize(), 'f')
+
+
+async def _raise_on_4xx_5xx(response: httpx.Response):
+    response.raise_for_status()
@@ -1,17 +1,23 @@
 import asyncio
+import inspect
+import json
 import logging
 import random
+import time
+from collections import deque
 from enum import Enum
 from uuid import uuid4
 
 import websockets
 
 from wired_exchange.kucoin import CandleStickResolution
+from wired_exchange.kucoin.Metrics import WebSocketMetrics
 
-from typing import Union
+from typing import Union, Optional
 
 WS_OPEN_TIMEOUT = 10
 WS_CONNECTION_TIMEOUT = 3
+DEFAULT_BUFFER_SIZE = 10000
 
 
 class WebSocketState(Enum):
@@ -21,6 +27,8 @@ class WebSocketState(Enum):
 
 class WebSocketNotification(Enum):
     CONNECTION_LOST = 1
+    # reconnected and subscribed again, messages missed in between are lost
+    CONNECTION_RESTORED = 2
 
 
 class WebSocketMessageHandler:
@@ -37,10 +45,65 @@ class WebSocketMessageHandler:
         pass
 
 
+def topic_of(message: str) -> Optional[str]:
+    """topic of a Kucoin message without parsing it, e.g. /market/ticker:BTC-USDT"""
+    start = message.find('"topic":"')
+    if start < 0:
+        return None
+    start += 9
+    return message[start:message.find('"', start)]
+
+
+class MessageBuffer:
+    """received data messages waiting for their handler
+
+    messages of conflated topics are latest value wins: a newer message replaces the queued one of the same
+    topic, keeping its place. other messages are kept in order, reading waits when max_size is reached"""
+
+    def __init__(self, conflated_topics: list[str] = None, max_size: int = DEFAULT_BUFFER_SIZE):
+        self.conflated_topics = tuple(conflated_topics) if conflated_topics is not None else ()
+        self.max_size = max_size
+        self.conflated = 0
+        self._entries = deque()
+        self._latest = {}
+        self._changed = asyncio.Condition()
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def put(self, message: str):
+        async with self._changed:
+            topic = topic_of(message) if len(self.conflated_topics) > 0 else None
+            if topic is not None and topic.startswith(self.conflated_topics):
+                if topic in self._latest:
+                    self._latest[topic] = message
+                    self.conflated += 1
+                    return
+                self._latest[topic] = message
+                self._entries.append(_TopicSlot(topic))
+            else:
+                await self._changed.wait_for(lambda: len(self._entries) < self.max_size)
+                self._entries.append(message)
+            self._changed.notify_all()
+
+    async def get(self) -> str:
+        async with self._changed:
+            await self._changed.wait_for(lambda: len(self._entries) > 0)
+            entry = self._entries.popleft()
+            self._changed.notify_all()
+            return self._latest.pop(entry.topic) if isinstance(entry, _TopicSlot) else entry
+
+
+class _TopicSlot:
+    def __init__(self, topic: str):
+        self.topic = topic
+
+
 class KucoinWebSocket:
 
     def __init__(self, endpoint, token, encrypt: bool,
-                 ping_interval: int, ping_timeout: int, connect_id: str = None):
+                 ping_interval: int, ping_timeout: int, connect_id: str = None,
+                 conflated_topics: list[str] = None):
         self._encrypt = encrypt
         self._ping_timeout = ping_timeout
         self._ping_interval = ping_interval
@@ -53,6 +116,20 @@ class KucoinWebSocket:
         self._handlers = [PongMessageHandler(self, self._ping_interval, self._ping_timeout),
                           self.WelcomeMessageHandler(self._connected), SinkMessageHandler()]
         self._state: WebSocketState = WebSocketState.STATE_WS_READY
+        # topic prefixes (e.g. /market/ticker) delivered latest value wins when handlers lag behind
+        self.conflated_topics = list(conflated_topics) if conflated_topics is not None else []
+        self.metrics = WebSocketMetrics()
+        self._buffer = None
+        # subscription message builders taking a message id, sent again on reconnection
+        self._subscriptions = []
+        self._restore_task = None
+        self.metrics.register_gauge('buffer_depth', lambda: len(self._buffer) if self._buffer is not None else 0)
+        self.metrics.register_gauge('buffer_conflated',
+                                    lambda: self._buffer.conflated if self._buffer is not None else 0)
+
+    def conflate(self, topic_prefix: str):
+        """deliver messages of topics starting with topic_prefix latest value wins, from next connection"""
+        self.conflated_topics.append(topic_prefix)
 
     async def open_async(self):
         uri = f"{self._endpoint}?token={self._token}&connectId={self._id}"
@@ -61,65 +138,149 @@ class KucoinWebSocket:
                 return
             async for ws in websockets.connect(uri,
                                                logger=self._logger,
-                                               ssl=self._encrypt,
+                                               ssl=True if self._encrypt else None,
                                                open_timeout=WS_OPEN_TIMEOUT,
                                                ping_interval=self._ping_interval,
                                                ping_timeout=self._ping_timeout):
+                if self._state == WebSocketState.STATE_WS_CLOSING:
+                    break
+                reconnected = self._ws is not None
+                self._ws = ws
+                self._disconnect()
+                if reconnected:
+                    self._restore_task = asyncio.create_task(self._restore_async())
                 try:
-                    if self._state == WebSocketState.STATE_WS_CLOSING:
-                        break
-                    self._ws = ws
-                    self._disconnect()
                     await self._run_message_loop(ws)
                 except websockets.ConnectionClosed:
-                    continue
+                    pass
+                if self._state != WebSocketState.STATE_WS_CLOSING:
+                    self._logger.warning('connection lost, reconnecting')
+                    self._notify(WebSocketNotification.CONNECTION_LOST)
         finally:
-            for handler in self._handlers:
-                handler.on_notification(WebSocketNotification.CONNECTION_LOST)
+            if self._restore_task is not None:
+                self._restore_task.cancel()
+            self._notify(WebSocketNotification.CONNECTION_LOST)
             self._disconnect()
             self._ws = None
             self._state = WebSocketState.STATE_WS_READY
 
+    async def _restore_async(self):
+        """subscribe again to every topic once the new connection is welcomed"""
+        try:
+            for new_subscription_message in self._subscriptions:
+                await self._send_subscription_async(new_subscription_message, record=False)
+            self._logger.info(f'connection restored, {len(self._subscriptions)} subscriptions renewed')
+            self._notify(WebSocketNotification.CONNECTION_RESTORED)
+        except TimeoutError:
+            self._logger.error('connection restore timeout', exc_info=True)
+
+    def _notify(self, notification: WebSocketNotification):
+        for handler in list(self._handlers):
+            try:
+                handler.on_notification(notification)
+            except:
+                self._logger.error(f'{type(handler).__name__}: {notification.name} notification failed',
+                                   exc_info=True)
+
     async def _run_message_loop(self, ws: websockets):
-        async for message in ws:
+        """read the socket while a separate task feeds handlers, so that slow handlers do not delay
+        control messages (welcome, pong, acks) which are handled as soon as they are read"""
+        self._buffer = MessageBuffer(self.conflated_topics)
+        tasks = [asyncio.create_task(self._process_messages(self._buffer)),
+                 asyncio.create_task(self.metrics.monitor_loop_async())]
+        try:
+            async for message in ws:
+                try:
+                    if self._state == WebSocketState.STATE_WS_CLOSING:
+                        break
+                    if '"type":"message"' in message:
+                        await self._buffer.put(message)
+                    else:
+                        await self._handle_message(message)
+                except:
+                    self._logger.error(f'something goes wrong when processing message: {message}', exc_info=True)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _process_messages(self, buffer: MessageBuffer):
+        while True:
+            message = await buffer.get()
             try:
-                if self._state == WebSocketState.STATE_WS_CLOSING:
-                    break
-                self._handle_message(message)
+                await self._handle_message(message)
             except:
                 self._logger.error(f'something goes wrong when processing message: {message}', exc_info=True)
 
     def insert_handler(self, handler: WebSocketMessageHandler):
+        # dispatched handlers measure their own delays and processing times on their worker
+        if getattr(handler, 'metrics', False) is None:
+            handler.metrics = self.metrics
+            self.metrics.register_gauge(f'queue_depth[{handler.name}]', lambda: handler.depth)
+            self.metrics.register_gauge(f'dropped[{handler.name}]', lambda: handler.dropped + handler.coalesced)
         self._handlers.insert(0, handler)
         self._logger.debug(f'{type(handler).__name__}: handler registered')
 
-    def _handle_message(self, message):
+    async def _handle_message(self, message):
         for handler in self._handlers:
             if handler.can_handle(message):
                 self._logger.debug(f'handler found: {type(handler).__name__}')
-                handler.handle(message)
+                if getattr(handler, 'metrics', None) is not None:
+                    result = handler.handle(message)
+                else:
+                    self.metrics.record_delay(topic_of(message), message)
+                    started = time.perf_counter()
+                    result = handler.handle(message)
+                    self.metrics.record_processing(type(handler).__name__, (time.perf_counter() - started) * 1000)
+                # dispatched handlers return an awaitable to apply backpressure without blocking the loop
+                if inspect.isawaitable(result):
+                    await result
                 return
 
     async def subscribe_klines_async(self, topics: list[tuple[str, str, CandleStickResolution]]):
         try:
-            await self.wait_connection_async()
-            subscription_id = random.randint(100000000, 1000000000)
-            self.insert_handler(SubscriptionHandler(subscription_id))
-            await self._ws.send(self._new_klines_subscription_message(subscription_id, topics))
+            await self._send_subscription_async(lambda sid: self._new_klines_subscription_message(sid, topics))
             self._logger.debug('kline subscription completed')
         except TimeoutError:
             self._logger.error('kline subscription timeout', exc_info=True)
 
     async def subscribe_tickers_async(self, tickers: Union[list[tuple[str, str]], None]):
         try:
-            await self.wait_connection_async()
-            subscription_id = random.randint(100000000, 1000000000)
-            self.insert_handler(SubscriptionHandler(subscription_id))
-            await self._ws.send(self._new_tickers_subscription_message(subscription_id, tickers))
+            await self._send_subscription_async(lambda sid: self._new_tickers_subscription_message(sid, tickers))
             self._logger.debug('ticker subscription completed')
         except TimeoutError:
             self._logger.error('ticker subscription timeout', exc_info=True)
 
+    async def subscribe_private_async(self, topic: str):
+        """subscribe to a private channel, websocket must be opened with a private token"""
+        await self.subscribe_topic_async(topic, private=True)
+
+    async def subscribe_topic_async(self, topic: str, private: bool = False):
+        try:
+            await self._send_subscription_async(
+                lambda sid: self._new_topic_subscription_message(sid, topic, private))
+            self._logger.debug(f'{topic}: subscription completed')
+        except TimeoutError:
+            self._logger.error(f'{topic}: subscription timeout', exc_info=True)
+
+    async def _send_subscription_async(self, new_subscription_message, record: bool = True):
+        await self.wait_connection_async()
+        subscription_id = random.randint(100000000, 1000000000)
+        self.insert_handler(SubscriptionHandler(subscription_id))
+        await self._ws.send(new_subscription_message(subscription_id))
+        if record:
+            self._subscriptions.append(new_subscription_message)
+
+    def _new_topic_subscription_message(self, subscription_id: int, topic: str, private: bool):
+        return f"""
+        {{
+        "id": {subscription_id},
+            "type": "subscribe",
+            "topic": "{topic}",
+            "privateChannel": {'true' if private else 'false'},
+            "response": true
+        }}
+        """
+
     def _new_tickers_subscription_message(self, subscription_id: int,
                                           tickers: Union[list[tuple[str, str]], None]):
         if tickers is None:
@@ -219,6 +380,9 @@ class PongMessageHandler(WebSocketMessageHandler):
     def on_notification(self, notification: WebSocketNotification):
         if notification == WebSocketNotification.CONNECTION_LOST:
             self._task.cancel()
+        elif notification == WebSocketNotification.CONNECTION_RESTORED and self._task.done():
+            self._task = asyncio.create_task(self._loop())
+            self._task.set_name('ping_pong')
 
     def _send_ping_message(self):
         message_id = random.randint(100000000, 1000000000)
@@ -255,3 +419,31 @@ class SubscriptionHandler(WebSocketMessageHandler):
 
 class StrategyHandler(WebSocketMessageHandler):
     pass
+
+
+class TickerStrategy(WebSocketMessageHandler):
+    """strategy fed by Kucoin tickers, see KucoinSpotClient.register_ticker_strategy_async. tickers are (base, quote)
+    or base currencies quoted in USDT, None follows every symbol. subclasses implement on_ticker"""
+
+    def __init__(self, tickers: Optional[list[Union[tuple[str, str], str]]] = None):
+        self.tickers = None if tickers is None else [(t, 'USDT') if type(t) is str else (t[0], t[1])
+                                                     for t in tickers]
+        self._logger = logging.getLogger(type(self).__name__)
+
+    def can_handle(self, message: str) -> bool:
+        return '"subject":"trade.ticker"' in message or '"topic":"/market/ticker:all"' in message
+
+    def handle(self, message: str) -> bool:
+        ticker = json.loads(message)
+        # the all tickers topic gives the symbol as subject
+        symbol = topic_of(message).partition(':')[2]
+        self.on_ticker(ticker['subject'] if symbol == 'all' else symbol, ticker['data'])
+        return True
+
+    def on_ticker(self, symbol: str, data: dict):
+        """data of a symbol ticker: price, bestBid, bestAsk, their sizes and time in milliseconds"""
+        pass
+
+    def on_notification(self, notification: WebSocketNotification):
+        if notification == WebSocketNotification.CONNECTION_LOST:
+            self._logger.warning('connection lost, tickers are not received anymore')
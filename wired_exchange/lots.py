@@ -0,0 +1,305 @@
+"""lot based cost basis and realized PnL in USD
+
+each acquisition opens a lot (size, USD unit cost, time), disposals consume lots first in first out, last in
+first out or at average cost. crypto quoted trades are two legs: buying ETH-BTC disposes of BTC. withdrawals
+move lots in transit and the next deposits of the currency take them back, keeping their cost, so transfers
+between our exchanges realize nothing. deposits not matching a withdrawal open lots of unknown cost"""
+import logging
+from typing import Literal, Optional
+
+import numpy as np
+import pandas as pd
+
+from wired_exchange.core.times import to_epoch_ns_array, to_utc_datetimes
+
+LotMethod = Literal['fifo', 'lifo', 'average']
+
+# currencies not tracked as lots, their USD value is their size
+FIAT_CURRENCIES = ('USD', 'USDT', 'USDC', 'BUSD', 'CHF', 'EUR')
+# currencies worth one USD when their rate is missing
+USD_EQUIVALENTS = ('USD', 'USDT', 'USDC', 'BUSD')
+# sizes below are rounding leftovers
+DUST = 1e-10
+LOT_COLUMNS = ['currency', 'status', 'size', 'unit_cost_usd', 'time']
+PNL_COLUMNS = ['size', 'cost_usd', 'average_cost_usd', 'unknown_cost_size', 'realized_pnl_usd', 'fees_usd']
+
+
+class LotQueue:
+    """open lots of a currency in parallel arrays, appended at the tail and consumed from the head (fifo) or
+    the tail (lifo), average cost keeps a single merged lot"""
+
+    def __init__(self, method: LotMethod = 'fifo', capacity: int = 8):
+        self.method = method
+        self.sizes = np.empty(capacity)
+        self.costs = np.empty(capacity)
+        self.times = np.empty(capacity, dtype='int64')
+        self.head = 0
+        self.tail = 0
+
+    def __len__(self):
+        return self.tail - self.head
+
+    @property
+    def size(self) -> float:
+        return float(self.sizes[self.head:self.tail].sum())
+
+    def append(self, size: float, unit_cost: float, time: int):
+        if size <= DUST:
+            return
+        if self.method == 'average' and len(self) > 0:
+            self._merge(size, unit_cost)
+            return
+        if self.tail == len(self.sizes):
+            self._grow()
+        self.sizes[self.tail] = size
+        self.costs[self.tail] = unit_cost
+        self.times[self.tail] = time
+        self.tail += 1
+
+    def extend(self, sizes: np.ndarray, unit_costs: np.ndarray, times: np.ndarray):
+        for size, unit_cost, time in zip(sizes, unit_costs, times):
+            self.append(size, unit_cost, time)
+
+    def consume(self, quantity: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """remove quantity from lots, return consumed (sizes, unit costs, times), less than quantity when lots
+        are exhausted"""
+        last = self.method == 'lifo'
+        sizes = self.sizes[self.head:self.tail]
+        if last:
+            sizes = sizes[::-1]
+        cumulated = np.cumsum(sizes)
+        full = int(np.searchsorted(cumulated, quantity + DUST, side='right'))
+        remaining = quantity - (cumulated[full - 1] if full > 0 else 0.0)
+        partial = full < len(sizes) and remaining > DUST
+        taken = slice(self.tail - full, self.tail) if last else slice(self.head, self.head + full)
+        consumed_sizes = self.sizes[taken].copy()
+        consumed_costs = self.costs[taken].copy()
+        consumed_times = self.times[taken].copy()
+        if last:
+            self.tail -= full
+        else:
+            self.head += full
+        if partial:
+            index = self.tail - 1 if last else self.head
+            self.sizes[index] -= remaining
+            consumed_sizes = np.append(consumed_sizes, remaining)
+            consumed_costs = np.append(consumed_costs, self.costs[index])
+            consumed_times = np.append(consumed_times, self.times[index])
+        if self.head == self.tail:
+            self.head = self.tail = 0
+        return consumed_sizes, consumed_costs, consumed_times
+
+    def to_arrays(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return (self.sizes[self.head:self.tail], self.costs[self.head:self.tail],
+                self.times[self.head:self.tail])
+
+    def _merge(self, size: float, unit_cost: float):
+        index = self.head
+        total = self.sizes[index] + size
+        # a lot of unknown cost keeps the known average of the others
+        known = [(s, c) for s, c in ((self.sizes[index], self.costs[index]), (size, unit_cost)) if not np.isnan(c)]
+        self.costs[index] = sum(s * c for s, c in known) / sum(s for s, _ in known) if len(known) > 0 else np.nan
+        self.sizes[index] = total
+
+    def _grow(self):
+        count = len(self)
+        capacity = len(self.sizes) * 2 if count > len(self.sizes) // 2 else len(self.sizes)
+        for name in ('sizes', 'costs', 'times'):
+            current = getattr(self, name)
+            grown = np.empty(capacity, dtype=current.dtype)
+            grown[:count] = current[self.head:self.tail]
+            setattr(self, name, grown)
+        self.head, self.tail = 0, count
+
+
+class LotBook:
+    """open lots, realized PnL and fees of every currency, fed incrementally with transactions ordered by time
+
+    see Portfolio.get_lots for the persisted book updated after each import"""
+
+    def __init__(self, method: LotMethod = 'fifo'):
+        self.method = method
+        self.realized = {}
+        self.fees = {}
+        # time (ns) of the last processed transaction and number of processed transactions up to it
+        self.last_time = None
+        self.processed = 0
+        self._open = {}
+        self._in_transit = {}
+        self._logger = logging.getLogger(type(self).__name__)
+
+    def process(self, transactions: pd.DataFrame) -> int:
+        """apply transactions (stored transactions and account operations) more recent than last_time"""
+        if transactions.size == 0:
+            return 0
+        times = to_epoch_ns_array(transactions['time'])
+        if self.last_time is not None:
+            transactions = transactions[times > self.last_time]
+            times = times[times > self.last_time]
+        if len(transactions) == 0:
+            return 0
+        order = np.argsort(times, kind='stable')
+        columns = {name: transactions[name].to_numpy()[order] if name in transactions.columns
+                   else np.full(len(transactions), None) for name in
+                   ('type', 'side', 'base_currency', 'quote_currency', 'price', 'size', 'fee', 'fee_currency',
+                    'price_usd', 'fee_usd')}
+        times = times[order]
+        for i in range(len(times)):
+            self._apply(times[i], **{name: values[i] for name, values in columns.items()})
+        self.last_time = int(times[-1])
+        self.processed += len(times)
+        return len(times)
+
+    def covers(self, transactions: pd.DataFrame) -> bool:
+        """whether transactions up to last_time are still the processed ones, older imports require a rebuild"""
+        if self.last_time is None:
+            return True
+        return int((to_epoch_ns_array(transactions['time']) <= self.last_time).sum()) == self.processed
+
+    def get_lots(self, currency: str = None) -> pd.DataFrame:
+        frames = [self._to_lots(queue, c, status) for status, queues in (('open', self._open),
+                                                                         ('transit', self._in_transit))
+                  for c, queue in queues.items() if len(queue) > 0 and (currency is None or c == currency)]
+        lots = pd.concat(frames, ignore_index=True) if len(frames) > 0 else pd.DataFrame(columns=LOT_COLUMNS)
+        lots['time'] = to_utc_datetimes(lots['time'])
+        return lots
+
+    def get_pnl(self, prices_usd: Optional[pd.Series] = None) -> pd.DataFrame:
+        """cost basis, realized and unrealized PnL by currency, unrealized PnL needs USD prices by currency"""
+        currencies = sorted(set(self._open) | set(self._in_transit) | set(self.realized))
+        rows = []
+        for currency in currencies:
+            sizes, costs = [], []
+            for queues in (self._open, self._in_transit):
+                if currency in queues:
+                    queue_sizes, queue_costs, _ = queues[currency].to_arrays()
+                    sizes.append(queue_sizes)
+                    costs.append(queue_costs)
+            sizes = np.concatenate(sizes) if len(sizes) > 0 else np.zeros(0)
+            costs = np.concatenate(costs) if len(costs) > 0 else np.zeros(0)
+            known = ~np.isnan(costs)
+            known_size = sizes[known].sum()
+            cost = float((sizes[known] * costs[known]).sum())
+            rows.append((sizes.sum(), cost, cost / known_size if known_size > DUST else np.nan,
+                         sizes[~known].sum(), self.realized.get(currency, 0.0), self.fees.get(currency, 0.0)))
+        pnl = pd.DataFrame(rows, index=pd.Index(currencies, name='currency'), columns=PNL_COLUMNS)
+        if prices_usd is not None:
+            pnl['price_usd'] = prices_usd.reindex(pnl.index)
+            pnl['unrealized_pnl_usd'] = (pnl['price_usd'] - pnl['average_cost_usd']) \
+                * (pnl['size'] - pnl['unknown_cost_size'])
+        return pnl
+
+    def to_frames(self) -> dict[str, pd.DataFrame]:
+        """persistable state: lots, realized PnL and fees by currency, processing cursor"""
+        lots = self.get_lots()
+        lots['time'] = lots['time'].astype('int64')
+        totals = pd.DataFrame(dict(realized_pnl_usd=pd.Series(self.realized, dtype='float64'),
+                                   fees_usd=pd.Series(self.fees, dtype='float64'))).fillna(0.0)
+        totals.index.name = 'currency'
+        cursor = pd.DataFrame(dict(method=[self.method], last_time=[self.last_time], processed=[self.processed]))
+        return dict(lots=lots, totals=totals, cursor=cursor)
+
+    @staticmethod
+    def from_frames(method: LotMethod, lots: pd.DataFrame, totals: pd.DataFrame, cursor: pd.DataFrame) -> 'LotBook':
+        book = LotBook(method)
+        for (status, currency), group in lots.groupby(['status', 'currency'], sort=False):
+            queues = book._open if status == 'open' else book._in_transit
+            queue = queues.setdefault(currency, LotQueue('fifo' if status == 'transit' else method))
+            queue.extend(group['size'].to_numpy(), group['unit_cost_usd'].to_numpy(),
+                         group['time'].to_numpy(dtype='int64'))
+        book.realized = totals['realized_pnl_usd'].to_dict()
+        book.fees = totals['fees_usd'].to_dict()
+        last_time = cursor['last_time'].iloc[0]
+        book.last_time = None if pd.isna(last_time) else int(last_time)
+        book.processed = int(cursor['processed'].iloc[0])
+        return book
+
+    def _apply(self, time: int, type, side, base_currency, quote_currency, price, size, fee, fee_currency,
+               price_usd, fee_usd):
+        size = _to_float(size)
+        if np.isnan(size) or size <= 0:
+            return
+        if type == 'deposit':
+            self._deposit(base_currency, size, time)
+            return
+        if type == 'withdrawal':
+            self._withdraw(base_currency, size)
+            return
+        if side is None or pd.isna(side):
+            return
+        price = _to_float(price)
+        quote_rate = _usd_rate(quote_currency, price_usd)
+        fee = _to_float(fee)
+        fee = 0.0 if np.isnan(fee) else fee
+        fee_amount_usd = fee * _usd_rate(fee_currency, fee_usd) if fee_currency != base_currency \
+            else fee * price * quote_rate
+        value_usd = size * price * quote_rate
+        self._add_fee(base_currency, fee_amount_usd)
+        base_fee = fee if fee_currency == base_currency else 0.0
+        quote_fee = fee if fee_currency == quote_currency else 0.0
+        other_fee_usd = 0.0 if fee_currency in (base_currency, quote_currency) else fee_amount_usd
+        if str(side).lower() == 'buy':
+            # the fee is part of the cost, whatever its currency
+            self._acquire(base_currency, size - base_fee,
+                          value_usd + (fee_amount_usd if base_fee == 0.0 else 0.0), time)
+            # the quote fee is disposed of at market value, it is a cost of the base, not a loss on the quote
+            self._dispose(quote_currency, size * price + quote_fee, value_usd + quote_fee * quote_rate)
+        else:
+            self._dispose(base_currency, size + base_fee, value_usd - quote_fee * quote_rate - other_fee_usd)
+            self._acquire(quote_currency, size * price - quote_fee, value_usd - quote_fee * quote_rate, time)
+
+    def _acquire(self, currency: str, size: float, cost_usd: float, time: int):
+        if currency in FIAT_CURRENCIES or size <= DUST:
+            return
+        self._queue(self._open, currency).append(size, cost_usd / size, time)
+
+    def _dispose(self, currency: str, size: float, proceeds_usd: float):
+        if currency in FIAT_CURRENCIES or size <= DUST:
+            return
+        sizes, costs, _ = self._queue(self._open, currency).consume(size)
+        known = ~np.isnan(costs)
+        # proceeds of units bought before our history or of unknown cost are not realized
+        realized = proceeds_usd * sizes[known].sum() / size - (sizes[known] * costs[known]).sum()
+        if not np.isnan(realized):
+            self.realized[currency] = self.realized.get(currency, 0.0) + float(realized)
+
+    def _withdraw(self, currency: str, size: float):
+        if currency in FIAT_CURRENCIES:
+            return
+        sizes, costs, times = self._queue(self._open, currency).consume(size)
+        self._queue(self._in_transit, currency, 'fifo').extend(sizes, costs, times)
+
+    def _deposit(self, currency: str, size: float, time: int):
+        if currency in FIAT_CURRENCIES:
+            return
+        sizes, costs, times = self._queue(self._in_transit, currency, 'fifo').consume(size)
+        queue = self._queue(self._open, currency)
+        queue.extend(sizes, costs, times)
+        queue.append(size - sizes.sum(), np.nan, time)
+
+    def _add_fee(self, currency: str, amount_usd: float):
+        if not np.isnan(amount_usd) and amount_usd != 0.0:
+            self.fees[currency] = self.fees.get(currency, 0.0) + amount_usd
+
+    def _queue(self, queues: dict, currency: str, method: LotMethod = None) -> LotQueue:
+        queue = queues.get(currency)
+        if queue is None:
+            queue = queues[currency] = LotQueue(self.method if method is None else method)
+        return queue
+
+    @staticmethod
+    def _to_lots(queue: LotQueue, currency: str, status: str) -> pd.DataFrame:
+        sizes, costs, times = queue.to_arrays()
+        return pd.DataFrame(dict(currency=currency, status=status, size=sizes, unit_cost_usd=costs, time=times),
+                            columns=LOT_COLUMNS)
+
+
+def _to_float(value) -> float:
+    return np.nan if value is None or pd.isna(value) else float(value)
+
+
+def _usd_rate(currency: str, rate) -> float:
+    rate = _to_float(rate)
+    if np.isnan(rate) and currency in USD_EQUIVALENTS:
+        return 1.0
+    return rate
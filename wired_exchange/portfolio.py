@@ -1,72 +1,94 @@
+import itertools
 import logging
+import threading
+import time
 
+import numpy as np
 import pandas as pd
 from collections import namedtuple
-from datetime import datetime, timezone
-from typing import Union
+from datetime import datetime, timezone, timedelta
+from typing import Union, Literal
 from wired_exchange import WiredStorage, KucoinSpotClient
 from wired_exchange.bitpandapro import BitPandaProClient
 from wired_exchange.ftx import FTXClient
-from wired_exchange.core import to_transactions
+from wired_exchange.core import to_transactions, concat_batches, drain
+from wired_exchange.core.times import to_epoch, to_epoch_ns, to_utc_datetimes
+from wired_exchange.deadlines import call_with_deadline, get_breaker
 from wired_exchange.kucoin import KucoinFuturesClient
+from wired_exchange.lots import LotBook, LotMethod, USD_EQUIVALENTS
+from wired_exchange.scanner import DEFAULT_RESOLUTION
+
+DEFAULT_DEADLINE = 10.0
+# candles read before the first valued time, prices are carried forward from the last candle
+PRICE_LOOKBACK = timedelta(days=7)
+
+ValuationHistory = namedtuple('ValuationHistory', ['holdings', 'prices', 'values', 'total'])
+ValuationHistory.__doc__ = """time x currency matrices of holdings, USD prices and USD values, total USD value by
+time"""
 
 
 class Portfolio:
-    def __init__(self, profile: str):
+    # column of stored orders naming their source, stale flags and freshness are given by source
+    SOURCE_COLUMN = 'platform'
+
+    def __init__(self, profile: str, kucoin_book=None, deadline: float = DEFAULT_DEADLINE, futures_book=None):
         self.profile = profile
+        # overall time budget in seconds of a query across exchanges
+        self.deadline = deadline
+        # live KucoinAccountBook replacing Kucoin orders polling while it is updated
+        self.kucoin_book = kucoin_book
+        # live KucoinFuturesBook replacing futures positions polling while it is updated
+        self.futures_book = futures_book
         self._db = WiredStorage(self.profile)
+        # SQLite allows a single writer, concurrent calls fetch in parallel and use storage one at a time
+        self._db_lock = threading.Lock()
+        # executor of concurrent calls, None for the process wide one of deadlines
+        self._executor = None
         self._logger = logging.getLogger(type(self).__name__)
 
-    def import_transactions(self, start_time: datetime = None) -> pd.DataFrame:
+    def import_transactions(self, start_time: datetime = None) -> int:
+        """stream transactions of every exchange into storage, return the number of saved transactions"""
         if start_time is None:
             start_time = self._get_last_transaction_time()
         with FTXClient() as ftx:
-            tr = ftx.get_transactions(start_time=start_time)
+            count = drain(ftx.iter_transactions(start_time=start_time), self._db.save_transactions)
             with KucoinSpotClient() as kucoin:
                 try:
-                    kucoin_tr, _ = ftx.enrich_usd_prices(kucoin.get_transactions(start_time=start_time))
-                    tr = tr.append(kucoin_tr)
+                    count += drain((ftx.enrich_usd_prices(tr, start_time)[0]
+                                    for tr in kucoin.iter_transactions(start_time)),
+                                   self._db.save_transactions)
                 except:
                     self._logger.error('cannot retrieve transactions from Kucoin', exc_info=True)
             with BitPandaProClient() as bp:
                 try:
-                    bp_tr, _ = ftx.enrich_usd_prices(bp.get_transactions(start_time=start_time,
-                                                                         end_time=datetime.now(timezone.utc)))
-                    tr = tr.append(bp_tr)
+                    count += drain((ftx.enrich_usd_prices(tr, start_time)[0]
+                                    for tr in bp.iter_transactions(start_time=start_time,
+                                                                   end_time=datetime.now(timezone.utc))),
+                                   self._db.save_transactions)
                 except:
                     self._logger.error('cannot retrieve transactions from BitPanda Pro', exc_info=True)
-        self._db.save_transactions(tr)
-        return tr
+        return count
 
-    def import_account_operations(self, start_time: datetime = None) -> pd.DataFrame:
+    def import_account_operations(self, start_time: datetime = None) -> int:
+        """stream deposits and withdrawals into storage, return the number of saved operations"""
         if start_time is None:
             start_time = self._get_last_transaction_time()
-        ops = None
+        count = 0
         with KucoinSpotClient() as kucoin:
             try:
-                kucoin_ops = kucoin.get_account_operations(start_time)
-                if kucoin_ops.size > 0:
-                    ops = pd.DataFrame(kucoin_ops[kucoin_ops['status'] == 'SUCCESS'],
-                                       columns=['size', 'base_currency', 'id', 'type', 'platform', 'time'])
+                count += drain((_to_stored_operations(ops, ['SUCCESS'])
+                                for ops in kucoin.iter_account_operations(start_time)),
+                               self._db.save_transactions)
             except:
                 self._logger.error('cannot retrieve operations from Kucoin', exc_info=True)
         with FTXClient() as ftx:
             try:
-                ftx_ops = ftx.get_account_operations(start_time)
-                if ftx_ops.size > 0:
-                    ftx_ops = pd.DataFrame(ftx_ops[ftx_ops['status'].isin(['confirmed', 'complete'])],
-                                           columns=['size', 'base_currency', 'id', 'type', 'platform', 'time'])
-                    if ops is not None:
-                        ops = ops.append(ftx_ops)
-                    else:
-                        ops = ftx_ops
+                count += drain((_to_stored_operations(ops, ['confirmed', 'complete'])
+                                for ops in ftx.iter_account_operations(start_time)),
+                               self._db.save_transactions)
             except:
                 self._logger.error('cannot retrieve operations from FTX', exc_info=True)
-        if ops is not None:
-            ops['id'] = ops.apply(lambda row: f'{row["platform"]}_{row["id"]}', axis=1)
-            ops.set_index('id', inplace=True)
-            self._db.save_transactions(ops)
-        return ops
+        return count
 
     def append_transactions(self, transactions: pd.DataFrame):
         self._db.save_transactions(transactions)
@@ -76,36 +98,24 @@ class Portfolio:
         tr = self._db.read_transactions()
         if tr.size == 0:
             return tr
-        tr['time'] = pd.to_datetime(tr['time'])
+        tr['time'] = to_utc_datetimes(tr['time'])
         return to_transactions(tr)
 
-    def get_positions(self):
-        positions = pd.DataFrame()
-        with KucoinSpotClient() as kucoin:
-            try:
-                positions = positions.append(kucoin.get_balances())
-            except:
-                self._logger.error('cannot retrieve balances from Kucoin', exc_info=True)
-        with BitPandaProClient() as bp:
-            try:
-                positions = positions.append(bp.get_balances())
-            except:
-                self._logger.error('cannot retrieve balances from BitPanda Pro', exc_info=True)
-        with FTXClient() as ftx:
-            try:
-                positions = positions.append(ftx.get_balances())
-            except:
-                self._logger.error('cannot retrieve balances from FTX', exc_info=True)
-            try:
-                usdt_usd_rate = ftx.get_live_rate('USDT', 'USD')
-                usd_usdt_rate = 1 / usdt_usd_rate
-                positions['price'] = usd_usdt_rate * positions[pd.isna(positions['price']), ['price_usd']]
-                positions['price'] = positions[pd.isna(positions['price']), 'currency']\
-                    .apply(lambda c: ftx.get_live_rate(c, 'USDT'))
-                positions['price_usd'] = usdt_usd_rate * positions[pd.isna(positions['price_usd']), ['price']]
-            except:
-                self._logger.error('cannot enrich prices', exc_info=True)
-        return positions
+    def get_positions(self, deadline: float = None):
+        """balances of every exchange within deadline seconds, late exchanges are served from their last good
+        balances flagged as stale"""
+        started = time.monotonic()
+        positions = self._query_sources('balances', self._balance_sources(), deadline)
+        if positions.size == 0:
+            return positions
+        remaining = max(0.0, self._deadline(deadline) - (time.monotonic() - started))
+        enriched, _ = call_with_deadline(dict(ftx_rates=lambda: _enrich_prices(positions)), remaining, self.profile,
+                                         self._executor)
+        return enriched.get('ftx_rates', positions)
+
+    def _balance_sources(self) -> dict:
+        return dict(kucoin=_get_balances(KucoinSpotClient), bitpanda_pro=_get_balances(BitPandaProClient),
+                    ftx=_get_balances(FTXClient))
 
     def get_average_buy_prices(self):
         tr = self.get_transaction()
@@ -145,8 +155,35 @@ class Portfolio:
         return pd.DataFrame(positions.values(), index=positions.keys(),
                             columns=['size', 'average_buy_price', 'average_buy_price_usd'])
 
-    def get_summary(self):
-        p = self.get_positions()
+    def get_lots(self, method: LotMethod = 'fifo') -> LotBook:
+        """lot book of method, stored transactions imported since it was last saved are applied to it. the book is
+        rebuilt when older transactions were imported in between"""
+        transactions = self._db.read_transactions()
+        book = self._read_lot_book(method)
+        if book is None or not book.covers(transactions):
+            book = LotBook(method)
+        if book.process(transactions) > 0:
+            self._db.save_snapshots({f'lots_{method}_{name}': frame for name, frame in book.to_frames().items()})
+        return book
+
+    def get_pnl(self, method: LotMethod = 'fifo', prices_usd: pd.Series = None,
+                deadline: float = None) -> pd.DataFrame:
+        """cost basis, realized and unrealized PnL by currency, current prices are taken from positions when
+        prices_usd is not given"""
+        if prices_usd is None:
+            positions = self.get_positions(deadline)
+            if 'price_usd' in positions.columns:
+                prices_usd = positions.groupby(level=0)['price_usd'].first()
+        return self.get_lots(method).get_pnl(prices_usd)
+
+    def _read_lot_book(self, method: LotMethod):
+        snapshots = {name: self._db.read_snapshot(f'lots_{method}_{name}') for name in ('lots', 'totals', 'cursor')}
+        if any(snapshot is None for snapshot in snapshots.values()):
+            return None
+        return LotBook.from_frames(method, **{name: snapshot.data for name, snapshot in snapshots.items()})
+
+    def get_summary(self, deadline: float = None):
+        p = self.get_positions(deadline)
         abp = self.get_average_buy_prices()
         if abp.size == 0:
             return p
@@ -156,56 +193,225 @@ class Portfolio:
         summary['PnL_tt'] = (summary['price_usd'] - summary['average_buy_price_usd']) * summary['total']
         return summary
 
-    def get_orders(self, start_time: Union[datetime, int, float, type(None)] = None):
-        if start_time is None:
-            start_time = self._get_first_transaction_time()
-        ops = None
-        with KucoinSpotClient() as kucoin:
-            try:
-                kucoin_ops = kucoin.get_orders(start_time=start_time, status='done')
-                if kucoin_ops.size > 0:
-                    ops = pd.DataFrame(kucoin_ops)
-                kucoin_ops = kucoin.get_orders(start_time=start_time, status='active')
-                if kucoin_ops.size > 0:
-                    if ops is not None:
-                        ops = ops.append(kucoin_ops)
-                    else:
-                        ops = kucoin_ops
-            except:
-                self._logger.error('cannot retrieve orders from Kucoin', exc_info=True)
-        with FTXClient() as ftx:
-            try:
-                ftx_ops = ftx.get_orders(start_time)
-                if ftx_ops.size > 0:
-                    if ops is not None:
-                        ops = ops.append(ftx_ops)
-                    else:
-                        ops = ftx_ops
-            except:
-                self._logger.error('cannot retrieve orders from FTX', exc_info=True)
-        with BitPandaProClient() as bp:
-            try:
-                bp_ops = bp.get_orders(start_time, end_time=datetime.now(timezone.utc), include_filled=False)
-                if bp_ops.size > 0:
-                    if ops is not None:
-                        ops = ops.append(bp_ops)
-                    else:
-                        ops = bp_ops
-            except:
-                self._logger.error('cannot retrieve orders from BitPanda Pro', exc_info=True)
-        if ops is not None:
-            ops.drop_duplicates(subset=['id'], inplace=True)
-            ops['id'] = ops.apply(lambda row: f'{row["platform"]}_{row["id"]}', axis=1)
-            # ops.set_index('id', inplace=True)
-            ops.sort_values(by=['time'], ascending=False, inplace=True)
-        return ops
-
-    def get_futures(self):
-        with KucoinFuturesClient() as futures:
-            return futures.get_positions()
+    def snapshot_summary(self, asof_time: datetime = None, deadline: float = None) -> pd.DataFrame:
+        """compute the summary and append it to the valuations time series"""
+        summary = self.get_summary(deadline)
+        self._db.save_valuations(_to_valuations(summary, datetime.now(timezone.utc) if asof_time is None
+                                                else asof_time))
+        return summary
+
+    def get_valuation_history(self, start_time: datetime = None, end_time: datetime = None,
+                              currency: str = None) -> pd.DataFrame:
+        return self._db.read_valuations(start_time, end_time, currency)
+
+    def valuation_history(self, start_time: datetime = None, end_time: datetime = None, freq: str = 'D',
+                          resolution: int = DEFAULT_RESOLUTION, platform: str = 'kucoin',
+                          quote_currency: str = 'USDT') -> ValuationHistory:
+        """holdings rebuilt from stored transactions and account operations at each freq time, valued with the
+        last cached candle close (see MarketScanner.refresh) of platform. quote_currency is valued at par with USD,
+        currencies without candles are not valued"""
+        holdings = _to_holdings(self._db.read_transactions())
+        if holdings.size == 0:
+            empty = pd.DataFrame(index=pd.DatetimeIndex([], tz='UTC'))
+            return ValuationHistory(empty, empty, empty, pd.Series(dtype='float64', name='total'))
+        start_time = holdings.index[0] if start_time is None else _to_utc_timestamp(start_time)
+        end_time = pd.Timestamp.now(tz='UTC') if end_time is None else _to_utc_timestamp(end_time)
+        times = pd.date_range(start_time.floor('D'), end_time, freq=freq)
+        holdings = holdings.reindex(times, method='ffill').fillna(0.0)
+        holdings = holdings.loc[:, (holdings != 0).any()]
+
+        # only candles closing on valued times are read when valued times are aligned on the candles
+        step = int(times.freq.nanos // 1_000_000_000) if isinstance(times.freq, pd.offsets.Tick) else 86400
+        aligned = step % resolution == 0 and times[0].value // 1_000_000_000 % step == 0
+        closes = self._db.read_candle_closes(platform, resolution, quote_currency, times[0] - PRICE_LOOKBACK,
+                                             end_time, step if aligned else None, list(holdings.columns))
+        prices = closes.reindex(columns=holdings.columns).reindex(times, method='ffill')
+        prices.loc[:, prices.columns.isin(USD_EQUIVALENTS + (quote_currency,))] = 1.0
+        values = holdings * prices
+        return ValuationHistory(holdings, prices, values, values.sum(axis=1).rename('total'))
+
+    def get_equity_curve(self, freq: Literal['D', 'W'] = 'D', start_time: datetime = None,
+                         end_time: datetime = None) -> pd.DataFrame:
+        """total USD value and PnL per day or week from stored valuations, with drawdown from running peak"""
+        rollup = self._db.read_valuation_rollup(freq, start_time, end_time)
+        equity = rollup.groupby('period')[['value_usd', 'pnl_usd']].sum()
+        equity['drawdown'] = equity['value_usd'] / equity['value_usd'].cummax() - 1
+        return equity
+
+    def get_orders(self, start_time: Union[datetime, int, float, type(None)] = None, deadline: float = None):
+        """orders of every exchange from the local store, after fetching what may have changed since last sync.
+        orders of exchanges which could not be synchronized within deadline seconds are flagged as stale"""
+        failures = self.sync_orders(start_time, deadline)
+        # exchanges late for the deadline may still be storing their orders
+        with self._db_lock:
+            orders = self._db.read_orders()
+        orders['stale'] = orders[self.SOURCE_COLUMN].isin(list(failures.keys()))
+        orders['as_of'] = pd.to_datetime(orders[self.SOURCE_COLUMN].map(
+            lambda source: get_breaker(f'{self.profile}/{source}').last_success), unit='s', utc=True)
+        return orders
+
+    def sync_orders(self, start_time: Union[datetime, int, float, type(None)] = None,
+                    deadline: float = None) -> dict[str, str]:
+        """fetch orders newer than the last stored one plus the ones still open, terminal orders are never
+        fetched twice. start_time forces a refresh from that time. return exchanges which failed to sync"""
+        calls = {}
+        if self.kucoin_book is not None and self.kucoin_book.is_live():
+            with self._db_lock:
+                self._db.save_orders('kucoin', _to_stored_orders(self.kucoin_book.get_orders(), 'kucoin'))
+        else:
+            calls['kucoin'] = lambda: self._sync_platform_orders(
+                'kucoin', KucoinSpotClient, start_time,
+                lambda kucoin, since: itertools.chain(kucoin.iter_orders(start_time=since, status='done'),
+                                                      kucoin.iter_orders(start_time=since, status='active')))
+        calls['ftx'] = lambda: self._sync_platform_orders('ftx', FTXClient, start_time,
+                                                          lambda ftx, since: ftx.iter_orders(since))
+        calls['bitpanda_pro'] = lambda: self._sync_platform_orders(
+            'bitpanda_pro', BitPandaProClient, start_time,
+            lambda bp, since: bp.iter_orders(since, end_time=datetime.now(timezone.utc), include_filled=False))
+        _, failures = call_with_deadline(calls, self._deadline(deadline), self.profile, self._executor)
+        return failures
+
+    def _sync_platform_orders(self, platform: str, client_type, start_time, iter_orders):
+        with self._db_lock:
+            since = start_time if start_time is not None else self._db.read_orders_sync_time(platform)
+            if since is None:
+                since = self._get_first_transaction_time()
+        with client_type() as client:
+            orders = concat_batches(iter_orders(client, since))
+        with self._db_lock:
+            self._db.save_orders(platform, _to_stored_orders(orders, platform), since)
+        self._logger.info(f'{platform}: {len(orders)} orders refreshed since {since}')
+
+    def get_futures(self, deadline: float = None):
+        if self.futures_book is not None and self.futures_book.is_live():
+            return _with_freshness(self.futures_book.get_positions(), datetime.now(timezone.utc), False)
+        return self._query_sources('futures', dict(kucoin_futures=_get_futures_positions), deadline)
+
+    def _query_sources(self, query: str, calls: dict, deadline: float = None) -> pd.DataFrame:
+        """call sources concurrently within deadline, a source missing it or failing is served from its last
+        good result, rows are flagged with as_of and stale columns"""
+        results, failures = call_with_deadline(calls, self._deadline(deadline), self.profile, self._executor)
+        now = datetime.now(timezone.utc)
+        frames = []
+        for name in calls.keys():
+            kind = f'last_{query}_{name}'
+            if name in results:
+                if results[name].size > 0:
+                    with self._db_lock:
+                        self._db.save_snapshot(kind, results[name], now)
+                frames.append(_with_freshness(results[name], now, False))
+                continue
+            with self._db_lock:
+                cached = self._db.read_snapshot(kind)
+            if cached is None:
+                self._logger.error(f'{name}: {failures[name]}, no {query} available')
+            else:
+                self._logger.warning(f'{name}: {failures[name]}, {query} served as of {cached.as_of}')
+                frames.append(_with_freshness(cached.data, cached.as_of, True))
+        return concat_batches(frames)
+
+    def _deadline(self, deadline: float = None) -> float:
+        return self.deadline if deadline is None else deadline
 
     def _get_last_transaction_time(self) -> datetime:
         return self._db.read_transactions()['time'].max().to_pydatetime()
 
     def _get_first_transaction_time(self) -> datetime:
         return self._db.read_transactions()['time'].min().to_pydatetime()
+
+
+def _get_balances(client_type):
+    def get_balances():
+        with client_type() as client:
+            return client.get_balances()
+
+    return get_balances
+
+
+def _get_futures_positions():
+    with KucoinFuturesClient() as futures:
+        return futures.get_positions()
+
+
+def _enrich_prices(positions: pd.DataFrame) -> pd.DataFrame:
+    """complete missing prices from FTX live rates, positions are not modified"""
+    positions = positions.copy()
+    for column in ('price', 'price_usd'):
+        if column not in positions.columns:
+            positions[column] = np.nan
+    currencies = positions['currency'] if 'currency' in positions.columns else positions.index.to_series()
+    with FTXClient() as ftx:
+        usdt_usd_rate = ftx.get_live_rate('USDT', 'USD')
+        missing = positions['price'].isna()
+        positions.loc[missing, 'price'] = positions.loc[missing, 'price_usd'] / usdt_usd_rate
+        missing = positions['price'].isna()
+        rates = {c: _get_usdt_rate(ftx, c) for c in currencies[missing].unique()}
+        positions.loc[missing, 'price'] = currencies[missing].map(rates).to_numpy()
+        missing = positions['price_usd'].isna()
+        positions.loc[missing, 'price_usd'] = usdt_usd_rate * positions.loc[missing, 'price']
+    return positions
+
+
+def _get_usdt_rate(ftx: FTXClient, currency: str) -> float:
+    if currency == 'USDT':
+        return 1.0
+    try:
+        return ftx.get_live_rate(currency, 'USDT')
+    except:
+        logging.getLogger('Portfolio').warning(f'{currency}: no USDT live rate', exc_info=True)
+        return np.nan
+
+
+def _to_holdings(transactions: pd.DataFrame) -> pd.DataFrame:
+    """cumulated size of each currency after each transaction time, trades move base, quote and fee currencies,
+    account operations their currency"""
+    if transactions.size == 0:
+        return pd.DataFrame()
+    sides = transactions['side'].str.lower().map(dict(buy=1.0, sell=-1.0))
+    operations = transactions['type'].map(dict(deposit=1.0, withdrawal=-1.0))
+    sizes = transactions['size'].astype('float64')
+    changes = pd.concat([
+        pd.DataFrame(dict(time=transactions['time'], currency=transactions['base_currency'],
+                          size=sides.fillna(operations) * sizes)),
+        pd.DataFrame(dict(time=transactions['time'], currency=transactions['quote_currency'],
+                          size=-sides * sizes * transactions['price'].astype('float64'))),
+        pd.DataFrame(dict(time=transactions['time'], currency=transactions['fee_currency'],
+                          size=-transactions['fee'].astype('float64')))])
+    changes = changes[changes['currency'].notna() & changes['size'].notna()]
+    changes['time'] = to_utc_datetimes(changes['time'])
+    holdings = changes.groupby(['time', 'currency'])['size'].sum().unstack(fill_value=0.0).cumsum()
+    return holdings.where(np.abs(holdings) > 1e-12, 0.0)
+
+
+def _to_utc_timestamp(dt: datetime) -> pd.Timestamp:
+    return pd.Timestamp(to_epoch_ns(dt), tz=timezone.utc)
+
+
+def _with_freshness(data: pd.DataFrame, as_of: datetime, stale: bool) -> pd.DataFrame:
+    return data.assign(as_of=pd.Timestamp(as_of), stale=stale) if data.size > 0 else data
+
+
+def _to_valuations(summary: pd.DataFrame, asof_time: datetime) -> pd.DataFrame:
+    valuations = summary.reindex(columns=['platform', 'total', 'price', 'price_usd', 'average_buy_price_usd',
+                                          'PnL_tt', 'PnL_pc'])
+    valuations = valuations.rename(columns=dict(PnL_tt='pnl_usd', PnL_pc='pnl_pc'))
+    valuations['currency'] = summary.index
+    valuations['time'] = to_epoch(asof_time, 's')
+    # balances priced in USDT only are valued at par with USD
+    valuations['value_usd'] = valuations['total'] * valuations['price_usd'].fillna(valuations['price'])
+    return valuations[valuations['total'] > 0]
+
+
+def _to_stored_operations(ops: pd.DataFrame, statuses: list[str]) -> pd.DataFrame:
+    ops = pd.DataFrame(ops[ops['status'].isin(statuses)],
+                       columns=['size', 'base_currency', 'id', 'type', 'platform', 'time'])
+    ops['id'] = ops['platform'] + '_' + ops['id'].astype(str)
+    return ops.set_index('id')
+
+
+def _to_stored_orders(orders: pd.DataFrame, platform: str) -> pd.DataFrame:
+    if orders.size == 0:
+        return orders
+    orders = orders.assign(platform=platform)
+    orders['id'] = platform + '_' + orders['id'].astype(str)
+    return orders
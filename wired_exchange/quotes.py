@@ -0,0 +1,243 @@
+"""consolidated top of book across exchanges
+
+venues update the best bid and ask of their symbols, from a websocket feed where the repository streams one
+(KucoinQuoteFeed) or by polling their book tickers (QuotePoller). symbols are normalized as BASE-QUOTE. each update
+recomputes the consolidated best bid and ask of its symbol only, listeners receive a spread event when they changed
+and an arbitrage event when a venue bids above the ask of another one by more than both taker fees:
+
+    quotes = ConsolidatedQuotes(min_edge_pcnt=0.1)
+    quotes.add_listener(print)
+    await kucoin.register_ticker_strategy_async(KucoinQuoteFeed(quotes, [('BTC', 'USDT'), ('ETH', 'USDT')]))
+    await asyncio.gather(QuotePoller(quotes, ftx).run_async(), QuotePoller(quotes, bitpanda).run_async())
+"""
+import asyncio
+import logging
+import time
+from collections import namedtuple
+from typing import Callable, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from wired_exchange.kucoin.WebSocket import TickerStrategy
+
+QuoteEvent = namedtuple('QuoteEvent', ['kind', 'symbol', 'time', 'venue', 'bid_venue', 'bid', 'ask_venue', 'ask',
+                                       'spread_pcnt', 'edge_pcnt'])
+QuoteEvent.__doc__ = """kind: 'spread' when the consolidated best bid or ask changed, 'arbitrage' when bid_venue bids
+above the ask of ask_venue by edge_pcnt net of taker fees. venue sent the update at time (epoch ns)"""
+
+VENUES = ('kucoin', 'ftx', 'bitpanda_pro', 'binance')
+# symbol separator of each venue, Binance symbols are split by BinanceClient.get_book_tickers
+SYMBOL_SEPARATORS = dict(kucoin='-', ftx='/', bitpanda_pro='_')
+TAKER_FEE_RATES = dict(kucoin=0.001, ftx=0.0007, bitpanda_pro=0.0015, binance=0.001)
+# quotes older than this (seconds) are left out of the consolidated book
+DEFAULT_MAX_AGE = 30.0
+DEFAULT_POLLING_INTERVAL = 1.0
+BOOK_COLUMNS = ['symbol', 'venue', 'bid', 'ask', 'bid_size', 'ask_size', 'time']
+
+
+def normalize_symbol(venue: str, symbol: str) -> str:
+    """BASE-QUOTE symbol of a venue market, e.g. BTC_EUR on BitPanda Pro is BTC-EUR"""
+    return symbol.replace(SYMBOL_SEPARATORS.get(venue, '-'), '-').upper()
+
+
+class ConsolidatedQuotes:
+    """best bid and ask of each symbol on each venue in (symbols x venues) arrays, with the consolidated best bid
+    and ask of every symbol. updates are expected on a single thread, e.g. the websocket event loop"""
+
+    def __init__(self, venues: tuple[str] = VENUES, taker_fee_rates: dict[str, float] = None,
+                 min_edge_pcnt: float = 0.0, max_age: float = DEFAULT_MAX_AGE, capacity: int = 64):
+        self.venues = list(venues)
+        fee_rates = TAKER_FEE_RATES if taker_fee_rates is None else taker_fee_rates
+        self.fee_rates = np.array([fee_rates.get(venue, 0.0) for venue in self.venues])
+        self.min_edge_pcnt = min_edge_pcnt
+        self.max_age_ns = int(max_age * 1_000_000_000)
+        self._venue_columns = {venue: i for i, venue in enumerate(self.venues)}
+        self._symbol_rows = {}
+        self._symbols = []
+        shape = (capacity, len(self.venues))
+        self.bids = np.full(shape, np.nan)
+        self.asks = np.full(shape, np.nan)
+        self.bid_sizes = np.full(shape, np.nan)
+        self.ask_sizes = np.full(shape, np.nan)
+        self.times = np.zeros(shape, dtype='int64')
+        # consolidated best bid and ask venues by symbol, -1 when unknown
+        self.best_bid_venues = np.full(capacity, -1)
+        self.best_ask_venues = np.full(capacity, -1)
+        self.best_bids = np.full(capacity, np.nan)
+        self.best_asks = np.full(capacity, np.nan)
+        self._listeners = []
+        self._logger = logging.getLogger(type(self).__name__)
+
+    def add_listener(self, listener: Callable[[QuoteEvent], None]):
+        """listener is called with each QuoteEvent, on the updating thread"""
+        self._listeners.append(listener)
+
+    def update(self, venue: str, symbol: str, bid: float, ask: float, bid_size: float = np.nan,
+               ask_size: float = np.nan, time_ns: int = None) -> list[QuoteEvent]:
+        """set the best bid and ask of a normalized symbol on venue, return the raised events"""
+        row = self._row(symbol)
+        column = self._venue_columns[venue]
+        time_ns = time.time_ns() if time_ns is None else time_ns
+        self.bids[row, column] = bid
+        self.asks[row, column] = ask
+        self.bid_sizes[row, column] = bid_size
+        self.ask_sizes[row, column] = ask_size
+        self.times[row, column] = time_ns
+        return self._consolidate(np.array([row]), venue, time_ns)
+
+    def update_many(self, venue: str, tickers: pd.DataFrame, time_ns: int = None) -> list[QuoteEvent]:
+        """set best bids and asks of venue from book tickers (base_currency, quote_currency, bid, ask and optional
+        bid_size, ask_size), only symbols which changed are consolidated"""
+        if len(tickers) == 0:
+            return []
+        column = self._venue_columns[venue]
+        time_ns = time.time_ns() if time_ns is None else time_ns
+        symbols = (tickers['base_currency'].astype(str) + '-' + tickers['quote_currency'].astype(str)).str.upper()
+        rows = np.fromiter((self._row(symbol) for symbol in symbols), dtype='int64', count=len(symbols))
+        bids = tickers['bid'].to_numpy(dtype='float64')
+        asks = tickers['ask'].to_numpy(dtype='float64')
+        # a venue price unchanged since its last poll does not move the consolidated book
+        changed = (bids != self.bids[rows, column]) | (asks != self.asks[rows, column]) \
+            | (self.times[rows, column] < time_ns - self.max_age_ns)
+        self.bids[rows, column] = bids
+        self.asks[rows, column] = asks
+        for name, sizes in (('bid_size', self.bid_sizes), ('ask_size', self.ask_sizes)):
+            sizes[rows, column] = tickers[name].to_numpy(dtype='float64') if name in tickers.columns else np.nan
+        self.times[rows, column] = time_ns
+        return self._consolidate(rows[changed], venue, time_ns)
+
+    def get_book(self, symbol: str = None) -> pd.DataFrame:
+        """quotes by symbol and venue, time as UTC datetime"""
+        rows = np.arange(len(self._symbols)) if symbol is None else np.array([self._symbol_rows[symbol]])
+        bids = self.bids[rows]
+        quoted = ~np.isnan(bids) | ~np.isnan(self.asks[rows])
+        symbol_rows, columns = np.nonzero(quoted)
+        rows = rows[symbol_rows]
+        book = pd.DataFrame(dict(symbol=np.array(self._symbols, dtype=object)[rows],
+                                 venue=np.array(self.venues, dtype=object)[columns], bid=self.bids[rows, columns],
+                                 ask=self.asks[rows, columns], bid_size=self.bid_sizes[rows, columns],
+                                 ask_size=self.ask_sizes[rows, columns],
+                                 time=pd.to_datetime(self.times[rows, columns], unit='ns', utc=True)),
+                            columns=BOOK_COLUMNS)
+        return book
+
+    def get_best(self) -> pd.DataFrame:
+        """consolidated best bid and ask by symbol, a negative spread is crossed across venues"""
+        count = len(self._symbols)
+        venues = np.array(self.venues + [None], dtype=object)
+        best = pd.DataFrame(dict(bid_venue=venues[self.best_bid_venues[:count]], bid=self.best_bids[:count],
+                                 ask_venue=venues[self.best_ask_venues[:count]], ask=self.best_asks[:count]),
+                            index=pd.Index(self._symbols, name='symbol'))
+        best['spread_pcnt'] = _spread_pcnt(best['bid'].to_numpy(), best['ask'].to_numpy())
+        return best
+
+    def _consolidate(self, rows: np.ndarray, venue: str, time_ns: int) -> list[QuoteEvent]:
+        if len(rows) == 0:
+            return []
+        live = self.times[rows] >= time_ns - self.max_age_ns
+        bids = np.where(live, self.bids[rows], np.nan)
+        asks = np.where(live, self.asks[rows], np.nan)
+        has_bid = ~np.isnan(bids).all(axis=1)
+        has_ask = ~np.isnan(asks).all(axis=1)
+        bid_venues = np.where(has_bid, np.argmax(np.nan_to_num(bids, nan=-np.inf), axis=1), -1)
+        ask_venues = np.where(has_ask, np.argmin(np.nan_to_num(asks, nan=np.inf), axis=1), -1)
+        indexes = np.arange(len(rows))
+        best_bids = np.where(has_bid, bids[indexes, bid_venues], np.nan)
+        best_asks = np.where(has_ask, asks[indexes, ask_venues], np.nan)
+        changed = (bid_venues != self.best_bid_venues[rows]) | (ask_venues != self.best_ask_venues[rows]) \
+            | ~_same(best_bids, self.best_bids[rows]) | ~_same(best_asks, self.best_asks[rows])
+        self.best_bid_venues[rows] = bid_venues
+        self.best_ask_venues[rows] = ask_venues
+        self.best_bids[rows] = best_bids
+        self.best_asks[rows] = best_asks
+        # taker buys on the ask venue and sells on the bid venue
+        edges = (best_bids * (1 - self.fee_rates[bid_venues]) / (best_asks * (1 + self.fee_rates[ask_venues])) - 1) \
+            * 100
+        arbitrages = changed & has_bid & has_ask & (bid_venues != ask_venues) & (edges > self.min_edge_pcnt)
+        spreads = _spread_pcnt(best_bids, best_asks)
+        events = []
+        for i in np.flatnonzero(changed):
+            bid_venue = self.venues[bid_venues[i]] if bid_venues[i] >= 0 else None
+            ask_venue = self.venues[ask_venues[i]] if ask_venues[i] >= 0 else None
+            symbol = self._symbols[rows[i]]
+            events.append(QuoteEvent('spread', symbol, time_ns, venue, bid_venue, best_bids[i], ask_venue,
+                                     best_asks[i], spreads[i], np.nan))
+            if arbitrages[i]:
+                events.append(QuoteEvent('arbitrage', symbol, time_ns, venue, bid_venue, best_bids[i], ask_venue,
+                                         best_asks[i], spreads[i], edges[i]))
+        for event in events:
+            for listener in self._listeners:
+                try:
+                    listener(event)
+                except:
+                    self._logger.error(f'{event.symbol}: quote listener failed', exc_info=True)
+        return events
+
+    def _row(self, symbol: str) -> int:
+        row = self._symbol_rows.get(symbol)
+        if row is None:
+            row = self._symbol_rows[symbol] = len(self._symbols)
+            self._symbols.append(symbol)
+            if row == len(self.bids):
+                self._grow()
+        return row
+
+    def _grow(self):
+        capacity = len(self.bids) * 2
+        for name in ('bids', 'asks', 'bid_sizes', 'ask_sizes', 'times', 'best_bid_venues', 'best_ask_venues',
+                     'best_bids', 'best_asks'):
+            current = getattr(self, name)
+            fill = 0 if name == 'times' else -1 if name.endswith('venues') else np.nan
+            grown = np.full((capacity,) + current.shape[1:], fill, dtype=current.dtype)
+            grown[:len(current)] = current
+            setattr(self, name, grown)
+
+
+class KucoinQuoteFeed(TickerStrategy):
+    """ticker strategy streaming Kucoin best bid and ask into consolidated quotes. tickers None follows every
+    symbol"""
+
+    def __init__(self, quotes: ConsolidatedQuotes, tickers: Optional[list[Union[tuple[str, str], str]]] = None):
+        super().__init__(tickers)
+        self.quotes = quotes
+
+    def on_ticker(self, symbol: str, data: dict):
+        self.quotes.update('kucoin', normalize_symbol('kucoin', symbol), float(data['bestBid']),
+                           float(data['bestAsk']), float(data['bestBidSize']), float(data['bestAskSize']),
+                           int(data['time']) * 1_000_000)
+
+
+class QuotePoller:
+    """poll book tickers of a venue without streamed quotes into consolidated quotes, client is an exchange client
+    with get_book_tickers (FTX, BitPanda Pro, Binance, Kucoin) opened by the caller"""
+
+    def __init__(self, quotes: ConsolidatedQuotes, client, interval: float = DEFAULT_POLLING_INTERVAL):
+        self.quotes = quotes
+        self.client = client
+        self.interval = interval
+        self._running = False
+        self._logger = logging.getLogger(type(self).__name__)
+
+    async def run_async(self):
+        """poll until stop is called, a failed poll is logged and retried at the next interval"""
+        self._running = True
+        while self._running:
+            started = time.monotonic()
+            try:
+                tickers = await asyncio.to_thread(self.client.get_book_tickers)
+                self.quotes.update_many(self.client.platform, tickers)
+            except:
+                self._logger.error(f'{self.client.platform}: cannot poll book tickers', exc_info=True)
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def stop(self):
+        self._running = False
+
+
+def _spread_pcnt(bids: np.ndarray, asks: np.ndarray) -> np.ndarray:
+    return (asks - bids) / ((asks + bids) / 2) * 100
+
+
+def _same(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    return (left == right) | (np.isnan(left) & np.isnan(right))
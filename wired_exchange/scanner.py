@@ -0,0 +1,172 @@
+"""market wide indicators computed on a single (time x symbol) close matrix
+
+indicators follow the ta package definitions (Wilder RSI, MACD 12/26/9, Bollinger 20/2) so that a symbol scanned
+here matches the per symbol computation of CryptoScanner"""
+import logging
+from collections import namedtuple
+from datetime import datetime, timezone, timedelta
+from typing import Union
+
+import numpy as np
+import pandas as pd
+
+from wired_exchange.core.times import to_utc_datetime
+from wired_exchange.storage import WiredStorage
+
+CloseMatrix = namedtuple('CloseMatrix', ['times', 'symbols', 'closes'])
+CloseMatrix.__doc__ = """aligned closes: times (DatetimeIndex) x symbols (Index of base currencies) array"""
+
+DEFAULT_RESOLUTION = 60 * 60
+DEFAULT_DEPTH = 200
+RANK_COLUMNS = ['close', 'rsi', 'macd', 'macd_signal', 'macd_diff', 'bb_high', 'bb_mavg', 'bb_low', 'bb_pband',
+                'rsi_rank', 'macd_rank', 'bb_rank', 'score']
+
+
+class MarketScanner:
+    """screen every symbol quoted in quote_currency from cached candles
+
+    refresh() tops up the candles cache from the exchange, scan() only reads the cache"""
+
+    def __init__(self, profile: str, resolution: int = DEFAULT_RESOLUTION, depth: int = DEFAULT_DEPTH,
+                 platform: str = 'kucoin', quote_currency: str = 'USDT'):
+        self.profile = profile
+        self.resolution = resolution
+        self.depth = depth
+        self.platform = platform
+        self.quote_currency = quote_currency
+        self._db = WiredStorage(profile)
+        self._logger = logging.getLogger(type(self).__name__)
+
+    def refresh(self, client, base_currencies: list[str] = None) -> int:
+        """fetch candles missing from cache for every listed symbol (client.get_all_tickers by default),
+        return the number of fetched candles"""
+        if base_currencies is None:
+            base_currencies = client.get_all_tickers()['currency'].dropna().unique()
+        last_times = self._db.read_candles_last_times(self.platform, self.resolution)
+        now = datetime.now(timezone.utc)
+        oldest = now - timedelta(seconds=self.resolution * self.depth)
+        count = 0
+        for base in base_currencies:
+            last_time = last_times.get((base, self.quote_currency))
+            start_time = oldest if last_time is None else max(oldest, last_time + timedelta(seconds=self.resolution))
+            if start_time >= now:
+                continue
+            try:
+                klines = client.get_prices_history(base, self.quote_currency, self.resolution, start_time, now)
+                self._db.save_candles(self.platform, self.resolution, klines)
+                count += len(klines)
+            except:
+                self._logger.warning(f'{base}-{self.quote_currency}: cannot refresh candles', exc_info=True)
+        self._logger.info(f'{count} candles fetched for {len(base_currencies)} symbols')
+        return count
+
+    def load(self, end_time: Union[datetime, int, None] = None) -> CloseMatrix:
+        end_time = datetime.now(timezone.utc) if end_time is None else end_time
+        start_time = to_utc_datetime(end_time, 's') - timedelta(seconds=self.resolution * self.depth)
+        candles = self._db.read_candles(self.platform, self.resolution, start_time, end_time, self.quote_currency)
+        return to_close_matrix(candles)
+
+    def scan(self, end_time: Union[datetime, int, None] = None) -> pd.DataFrame:
+        """latest indicators of every symbol ranked by score, lowest scores are the most oversold symbols
+        with a rising momentum"""
+        return rank(self.load(end_time))
+
+
+def to_close_matrix(candles: pd.DataFrame) -> CloseMatrix:
+    """pivot long format candles into an aligned close matrix, gaps are forward filled"""
+    time_codes, times = pd.factorize(candles['time'], sort=True)
+    symbol_codes, symbols = pd.factorize(candles['base_currency'], sort=True)
+    closes = np.full((len(times), len(symbols)), np.nan)
+    closes[time_codes, symbol_codes] = candles['close'].to_numpy(dtype='float64')
+    return CloseMatrix(pd.DatetimeIndex(times), pd.Index(symbols), _ffill(closes))
+
+
+def rank(matrix: CloseMatrix) -> pd.DataFrame:
+    """indicators of the last row, ranked by RSI (ascending), MACD histogram relative to price (descending)
+    and Bollinger %B (ascending), score is the mean rank. nothing is ranked without closes (e.g. empty cache)"""
+    closes = matrix.closes
+    if closes.size == 0:
+        return pd.DataFrame(columns=RANK_COLUMNS, index=matrix.symbols.rename('base_currency'), dtype='float64')
+    macd_line, signal_line, histogram = macd(closes)
+    high, mavg, low = bollinger(closes)
+    last = pd.DataFrame(dict(close=closes[-1], rsi=rsi(closes)[-1], macd=macd_line[-1], macd_signal=signal_line[-1],
+                             macd_diff=histogram[-1], bb_high=high[-1], bb_mavg=mavg[-1], bb_low=low[-1]),
+                        index=matrix.symbols.rename('base_currency'))
+    last['bb_pband'] = (last['close'] - last['bb_low']) / (last['bb_high'] - last['bb_low'])
+    last['rsi_rank'] = last['rsi'].rank()
+    last['macd_rank'] = (last['macd_diff'] / last['close']).rank(ascending=False)
+    last['bb_rank'] = last['bb_pband'].rank()
+    last['score'] = last[['rsi_rank', 'macd_rank', 'bb_rank']].mean(axis=1)
+    return last.sort_values(by='score')
+
+
+def rsi(closes: np.ndarray, window: int = 14) -> np.ndarray:
+    """Wilder RSI of each column"""
+    diff = np.diff(closes, axis=0, prepend=np.nan)
+    # first close of a symbol has no change, as with ta on a per symbol series
+    first = np.isnan(diff) & ~np.isnan(closes)
+    up = np.where(first, 0.0, np.fmax(diff, 0.0))
+    down = np.where(first, 0.0, np.fmax(-diff, 0.0))
+    ema_up = ewm(up, 1 / window, window)
+    ema_down = ewm(down, 1 / window, window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(ema_down == 0, 100.0, 100 - 100 / (1 + ema_up / ema_down))
+
+
+def macd(closes: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9) -> tuple[np.ndarray, np.ndarray,
+                                                                                       np.ndarray]:
+    """MACD line, signal line and histogram of each column"""
+    macd_line = ewm(closes, 2 / (fast + 1), fast) - ewm(closes, 2 / (slow + 1), slow)
+    signal_line = ewm(macd_line, 2 / (signal + 1), signal)
+    return macd_line, signal_line, macd_line - signal_line
+
+
+def bollinger(closes: np.ndarray, window: int = 20, window_dev: float = 2) -> tuple[np.ndarray, np.ndarray,
+                                                                                    np.ndarray]:
+    """high band, moving average and low band of each column"""
+    mavg, mstd = rolling_mean_std(closes, window)
+    return mavg + window_dev * mstd, mavg, mavg - window_dev * mstd
+
+
+def ewm(values: np.ndarray, alpha: float, min_periods: int) -> np.ndarray:
+    """exponential moving average along time (pandas ewm with adjust=False), one pass over rows for all columns,
+    each column starts at its first value"""
+    result = np.empty_like(values)
+    state = np.full(values.shape[1], np.nan)
+    count = np.zeros(values.shape[1], dtype='int64')
+    for t in range(values.shape[0]):
+        x = values[t]
+        valid = ~np.isnan(x)
+        state = np.where(valid, np.where(np.isnan(state), x, state + alpha * (x - state)), state)
+        count += valid
+        result[t] = np.where(count >= min_periods, state, np.nan)
+    return result
+
+
+def rolling_mean_std(values: np.ndarray, window: int) -> tuple[np.ndarray, np.ndarray]:
+    """rolling mean and population standard deviation along time from cumulative sums, NaN until window is full"""
+    valid = ~np.isnan(values)
+    # centering on each column mean keeps the sum of squares accurate for large prices
+    with np.errstate(invalid='ignore'):
+        reference = np.nan_to_num(np.nanmean(np.where(valid, values, np.nan), axis=0))
+    centered = np.where(valid, values - reference, 0.0)
+    sums = _window_sums(centered, window)
+    squares = _window_sums(centered ** 2, window)
+    counts = _window_sums(valid.astype('float64'), window)
+    mean = sums / window
+    variance = np.maximum(squares / window - mean ** 2, 0.0)
+    full = counts == window
+    return np.where(full, mean + reference, np.nan), np.where(full, np.sqrt(variance), np.nan)
+
+
+def _window_sums(values: np.ndarray, window: int) -> np.ndarray:
+    cumulated = np.cumsum(values, axis=0)
+    sums = cumulated.copy()
+    sums[window:] -= cumulated[:-window]
+    return sums
+
+
+def _ffill(values: np.ndarray) -> np.ndarray:
+    rows = np.where(np.isnan(values), 0, np.arange(values.shape[0])[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return values[rows, np.arange(values.shape[1])]
@@ -0,0 +1,85 @@
+import logging
+import threading
+from datetime import datetime, timezone, timedelta
+from typing import Callable, Optional
+
+import pandas as pd
+
+from wired_exchange.storage import WiredStorage, Snapshot
+
+DEFAULT_REFRESH_INTERVAL = 5 * 60
+DEFAULT_MAX_AGE = 15 * 60
+
+
+class SnapshotRefresher:
+    """keeps snapshots of slow exchange queries in the profile store, refreshed from a background thread
+
+    sources maps each snapshot kind to the query producing it, e.g. {'positions': wallet.get_summary}"""
+
+    def __init__(self, profile: str, sources: dict[str, Callable[[], pd.DataFrame]],
+                 interval: float = DEFAULT_REFRESH_INTERVAL, max_age: float = DEFAULT_MAX_AGE):
+        self.profile = profile
+        self.interval = interval
+        self.max_age = max_age
+        self._sources = sources
+        self._thread = None
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._refreshing = threading.Lock()
+        self._logger = logging.getLogger(type(self).__name__)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name=f'{self.profile}_snapshots', daemon=True)
+            self._thread.start()
+            self._logger.debug(f'{self.profile}: snapshot refresh started every {self.interval}s')
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return self
+
+    def request_refresh(self):
+        """wake the background worker up, does not wait for the refresh to complete"""
+        self._wake.set()
+
+    def is_refreshing(self) -> bool:
+        return self._refreshing.locked()
+
+    def refresh(self, kinds: list[str] = None):
+        """query sources and store their snapshots, a failing source keeps its previous snapshot"""
+        with self._refreshing:
+            with WiredStorage(self.profile) as db:
+                for kind in kinds if kinds is not None else self._sources.keys():
+                    try:
+                        db.save_snapshot(kind, self._sources[kind]())
+                        self._logger.info(f'{self.profile}: {kind} snapshot refreshed')
+                    except:
+                        self._logger.error(f'{self.profile}: cannot refresh {kind} snapshot', exc_info=True)
+
+    def latest(self, kind: str) -> Optional[Snapshot]:
+        """latest stored snapshot, a missing or stale one triggers a background refresh"""
+        with WiredStorage(self.profile) as db:
+            snapshot = db.read_snapshot(kind)
+        if snapshot is None or self.is_stale(snapshot):
+            self.request_refresh()
+        return snapshot
+
+    def is_stale(self, snapshot: Snapshot) -> bool:
+        return age(snapshot) > timedelta(seconds=self.max_age)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self.refresh()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+        self._logger.debug(f'{self.profile}: snapshot refresh stopped')
+
+
+def age(snapshot: Snapshot) -> timedelta:
+    return datetime.now(timezone.utc) - snapshot.as_of
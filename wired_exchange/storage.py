@@ -1,8 +1,40 @@
+from collections import namedtuple
+from datetime import datetime, timezone
+from typing import Optional, Literal, Union
+
 import pandas as pd
-from sqlalchemy import create_engine, MetaData, Table, Column, String, FLOAT, NVARCHAR
+from sqlalchemy import create_engine, MetaData, Table, Column, String, FLOAT, NVARCHAR, INTEGER, select, insert, \
+    Index, text, func, Boolean
+
+from wired_exchange.core.times import NANOS, to_epoch, to_epoch_ns_array, to_utc_datetime, to_utc_datetimes
 
 WIRED_EXCHANGE_DATABASE = 'wired_exchange.sqlite'
 TRANSACTIONS_TABLE_NAME = 'TRANSACTIONS'
+SNAPSHOTS_TABLE_NAME = 'SNAPSHOTS'
+VALUATIONS_TABLE_NAME = 'VALUATIONS'
+ORDERS_TABLE_NAME = 'ORDERS'
+CANDLES_TABLE_NAME = 'CANDLES'
+ALERTS_TABLE_NAME = 'ALERTS'
+COINS_TABLE_NAME = 'COINS'
+EXCHANGES_TABLE_NAME = 'EXCHANGES'
+CANDLE_COLUMNS = ['platform', 'resolution', 'base_currency', 'quote_currency', 'time', 'open', 'high', 'low',
+                  'close', 'volume']
+ORDER_COLUMNS = ['id', 'base_currency', 'quote_currency', 'type', 'side', 'price', 'size', 'status', 'fee',
+                 'fee_currency', 'platform', 'time', 'account']
+# orders in these statuses can no longer change, once stored they are never fetched again
+TERMINAL_ORDER_STATUSES = ['FILLED', 'FILLED_FULLY', 'FILLED_CLOSED', 'FILLED_REJECTED', 'CANCELED', 'CANCELLED',
+                           'REJECTED', 'CLOSED', 'TRIGGERED']
+VALUATION_COLUMNS = ['time', 'currency', 'platform', 'total', 'price', 'price_usd', 'value_usd',
+                     'average_buy_price_usd', 'pnl_usd', 'pnl_pc']
+ALERT_COLUMNS = ['id', 'symbol', 'kind', 'level', 'price', 'time']
+# CoinGecko reference data, rows are keyed by CoinGecko id
+REFERENCE_COLUMNS = {COINS_TABLE_NAME: ['symbol', 'name'], EXCHANGES_TABLE_NAME: ['name']}
+# rollup periods in seconds and their alignment from epoch (1970-01-05 is the first monday)
+ROLLUP_PERIODS = {'D': (86400, 0), 'W': (7 * 86400, 4 * 86400)}
+# host parameters limit of a single SQLite statement (SQLITE_MAX_VARIABLE_NUMBER since 3.32)
+SQLITE_MAX_VARIABLES = 32766
+
+Snapshot = namedtuple('Snapshot', ['kind', 'data', 'as_of'])
 
 
 class WiredStorage:
@@ -33,10 +65,13 @@ class WiredStorage:
         return self
 
     def save_transactions(self, tr):
+        """upsert transactions, an account column partitions them by account (see accounts.Accounts)"""
         self.open()
         if not self._does_table_exist(TRANSACTIONS_TABLE_NAME):
             self._create_transactions_table()
-        tr.to_sql('TRANSACTIONS', self.__db, method=_upsert, if_exists='append', index=True, index_label='id')
+        self._add_account_column(TRANSACTIONS_TABLE_NAME)
+        tr.to_sql('TRANSACTIONS', self.__db, method=_upsert, if_exists='append', index=True, index_label='id',
+                  chunksize=_max_rows_per_statement(tr))
 
     def _does_table_exist(self, table_name: str) -> bool:
         return table_name in self.__metadata.tables.keys()
@@ -59,18 +94,406 @@ class WiredStorage:
                                  Column('fee_currency', NVARCHAR(5)),
                                  Column('platform', NVARCHAR(50)),
                                  Column('price_usd', FLOAT),
-                                 Column('fee_usd', FLOAT)
+                                 Column('fee_usd', FLOAT),
+                                 Column('account', NVARCHAR(50))
                                  )
             transactions.create(self.__db)
 
-    def read_transactions(self) -> pd.DataFrame:
+    def _add_account_column(self, table_name: str):
+        """tables created before accounts were stored get a nullable account column, NULL being no account"""
+        table = self.__metadata.tables[table_name]
+        if 'account' in table.c:
+            return
+        with self.__db.begin() as cx:
+            cx.execute(text(f'ALTER TABLE {table_name} ADD COLUMN account NVARCHAR(50)'))
+        self.__metadata.remove(table)
+        self.__metadata.reflect(only=[table_name])
+
+    def read_transactions(self, account: str = None) -> pd.DataFrame:
+        """transactions of every account or of account only"""
         self.open()
         if not self._does_table_exist(TRANSACTIONS_TABLE_NAME):
             self._create_transactions_table()
-        data = pd.read_sql_table('TRANSACTIONS', self.__db, index_col='id')
-        data.time = pd.to_datetime(data.time)
+        self._add_account_column(TRANSACTIONS_TABLE_NAME)
+        if account is None:
+            data = pd.read_sql_table(TRANSACTIONS_TABLE_NAME, self.__db, index_col='id')
+        else:
+            transactions = self.__metadata.tables[TRANSACTIONS_TABLE_NAME]
+            with self.__db.connect() as cx:
+                data = pd.read_sql(select(transactions).where(transactions.c.account == account), cx,
+                                   index_col='id')
+        data.time = to_utc_datetimes(data.time)
         return data
 
+    def save_snapshot(self, kind: str, data: pd.DataFrame, as_of: datetime = None):
+        """replace the latest snapshot of kind (e.g. positions, orders) and record when it was taken"""
+        self.save_snapshots({kind: data}, as_of)
+
+    def save_snapshots(self, snapshots_by_kind: dict[str, pd.DataFrame], as_of: datetime = None):
+        """replace the latest snapshots of several kinds at once, readers never see some of them updated only"""
+        self.open()
+        if not self._does_table_exist(SNAPSHOTS_TABLE_NAME):
+            self._create_snapshots_table()
+        as_of = datetime.now(timezone.utc) if as_of is None else as_of
+        snapshots = self.__metadata.tables[SNAPSHOTS_TABLE_NAME]
+        with self.__db.begin() as cx:
+            for kind, data in snapshots_by_kind.items():
+                index_label = data.index.name if data.index.name is not None else 'index'
+                data.to_sql(_get_snapshot_tablename(kind), cx, if_exists='replace', index=True,
+                            index_label=index_label, chunksize=_max_rows_per_statement(data))
+                cx.execute(insert(snapshots).prefix_with('OR REPLACE'),
+                           dict(kind=kind, as_of=as_of.isoformat(), index_label=index_label, size=len(data)))
+
+    def read_snapshot(self, kind: str) -> Optional[Snapshot]:
+        """latest snapshot of kind, None when it has never been taken"""
+        self.open()
+        if not self._does_table_exist(SNAPSHOTS_TABLE_NAME):
+            return None
+        snapshots = self.__metadata.tables[SNAPSHOTS_TABLE_NAME]
+        with self.__db.connect() as cx:
+            row = cx.execute(select(snapshots).where(snapshots.c.kind == kind)).first()
+            if row is None:
+                return None
+            data = pd.read_sql_table(_get_snapshot_tablename(kind), cx, index_col=row.index_label)
+        # SQLite keeps UTC datetimes without their time zone
+        for column in data.select_dtypes(include='datetime64[ns]').columns:
+            data[column] = data[column].dt.tz_localize(timezone.utc)
+        return Snapshot(kind, data, datetime.fromisoformat(row.as_of))
+
+    def _create_snapshots_table(self):
+        if not self._does_table_exist(SNAPSHOTS_TABLE_NAME):
+            snapshots = Table(SNAPSHOTS_TABLE_NAME, self.__metadata,
+                              Column('kind', NVARCHAR(25), primary_key=True),
+                              Column('as_of', String),
+                              Column('index_label', NVARCHAR(50)),
+                              Column('size', INTEGER))
+            snapshots.create(self.__db)
+
+    def save_valuations(self, valuations: pd.DataFrame):
+        """append a valuation snapshot (VALUATION_COLUMNS, time as epoch seconds), rows are never updated"""
+        self.open()
+        if not self._does_table_exist(VALUATIONS_TABLE_NAME):
+            self._create_valuations_table()
+        valuations = valuations.reindex(columns=VALUATION_COLUMNS)
+        valuations.to_sql(VALUATIONS_TABLE_NAME, self.__db, if_exists='append', index=False,
+                          chunksize=_max_rows_per_statement(valuations))
+
+    def read_valuations(self, start_time: Union[datetime, int, None] = None, end_time: Union[datetime, int, None] = None,
+                        currency: str = None) -> pd.DataFrame:
+        """valuation snapshots between start_time and end_time, served by time or (currency, time) indexes"""
+        self.open()
+        if not self._does_table_exist(VALUATIONS_TABLE_NAME):
+            return pd.DataFrame(columns=VALUATION_COLUMNS)
+        valuations = self.__metadata.tables[VALUATIONS_TABLE_NAME]
+        query = select(valuations)
+        if start_time is not None:
+            query = query.where(valuations.c.time >= _to_epoch(start_time))
+        if end_time is not None:
+            query = query.where(valuations.c.time <= _to_epoch(end_time))
+        if currency is not None:
+            query = query.where(valuations.c.currency == currency)
+        with self.__db.connect() as cx:
+            data = pd.read_sql(query.order_by(valuations.c.time), cx)
+        return _with_utc_time(data)
+
+    def save_alerts(self, alerts: pd.DataFrame):
+        """append fired alerts (ALERT_COLUMNS, time as UTC datetime)"""
+        self.open()
+        if not self._does_table_exist(ALERTS_TABLE_NAME):
+            self._create_alerts_table()
+        alerts = alerts.reindex(columns=ALERT_COLUMNS)
+        alerts['time'] = to_epoch_ns_array(alerts['time']) // NANOS['s']
+        alerts.to_sql(ALERTS_TABLE_NAME, self.__db, if_exists='append', index=False,
+                      chunksize=_max_rows_per_statement(alerts))
+
+    def read_alerts(self, start_time: Union[datetime, int, None] = None, symbol: str = None) -> pd.DataFrame:
+        """fired alerts since start_time, ordered by time"""
+        self.open()
+        if not self._does_table_exist(ALERTS_TABLE_NAME):
+            return pd.DataFrame(columns=ALERT_COLUMNS)
+        alerts = self.__metadata.tables[ALERTS_TABLE_NAME]
+        query = select(alerts)
+        if start_time is not None:
+            query = query.where(alerts.c.time >= _to_epoch(start_time))
+        if symbol is not None:
+            query = query.where(alerts.c.symbol == symbol)
+        with self.__db.connect() as cx:
+            data = pd.read_sql(query.order_by(alerts.c.time), cx)
+        return _with_utc_time(data)
+
+    def read_valuation_rollup(self, freq: Literal['D', 'W'] = 'D', start_time: Union[datetime, int, None] = None,
+                              end_time: Union[datetime, int, None] = None) -> pd.DataFrame:
+        """last valuation snapshot of each day or week, time is the period start"""
+        self.open()
+        if not self._does_table_exist(VALUATIONS_TABLE_NAME):
+            return pd.DataFrame(columns=VALUATION_COLUMNS)
+        period, offset = ROLLUP_PERIODS[freq]
+        bucket = f'((time - {offset}) / {period}) * {period} + {offset}'
+        query = text(f"""
+            SELECT periods.period AS period, v.* FROM {VALUATIONS_TABLE_NAME} v
+            JOIN (SELECT {bucket} AS period, MAX(time) AS last_time FROM {VALUATIONS_TABLE_NAME}
+                  WHERE time BETWEEN :start_time AND :end_time GROUP BY period) periods
+            ON v.time = periods.last_time
+            ORDER BY v.time""")
+        with self.__db.connect() as cx:
+            data = pd.read_sql(query, cx, params=dict(
+                start_time=_to_epoch(start_time) if start_time is not None else 0,
+                end_time=_to_epoch(end_time) if end_time is not None else 2 ** 62))
+        data['period'] = to_utc_datetimes(data['period'], 's')
+        return _with_utc_time(data)
+
+    def save_orders(self, platform: str, orders: pd.DataFrame, since: Union[datetime, int, None] = None,
+                    account: str = None):
+        """store orders of platform (ids already prefixed by platform) and account, newest version of an order wins
+
+        open orders of the account stored from since are first removed: an order missing from a refresh covering
+        that range has been cancelled and discarded by the exchange"""
+        self.open()
+        if not self._does_table_exist(ORDERS_TABLE_NAME):
+            self._create_orders_table()
+        self._add_account_column(ORDERS_TABLE_NAME)
+        stored = self.__metadata.tables[ORDERS_TABLE_NAME]
+        orders = orders.reindex(columns=ORDER_COLUMNS).drop_duplicates(subset=['id'], keep='last')
+        orders['account'] = account
+        orders['time'] = to_epoch_ns_array(orders['time']) // NANOS['ms'] if orders.size > 0 else orders['time']
+        orders['is_open'] = ~orders['status'].isin(TERMINAL_ORDER_STATUSES)
+        with self.__db.begin() as cx:
+            if since is not None:
+                cx.execute(stored.delete().where((stored.c.platform == platform) & (stored.c.account == account)
+                                                 & (stored.c.is_open == True)
+                                                 & (stored.c.time >= _to_epoch(since) * 1000)))
+            if orders.size > 0:
+                orders.to_sql(ORDERS_TABLE_NAME, cx, method=_replace, if_exists='append', index=False,
+                              chunksize=_max_rows_per_statement(orders))
+
+    def read_orders(self, platform: str = None, open_only: bool = False, account: str = None) -> pd.DataFrame:
+        """stored orders of every account or of account only, most recent first"""
+        self.open()
+        if not self._does_table_exist(ORDERS_TABLE_NAME):
+            return pd.DataFrame(columns=ORDER_COLUMNS)
+        self._add_account_column(ORDERS_TABLE_NAME)
+        stored = self.__metadata.tables[ORDERS_TABLE_NAME]
+        query = select([stored.c[c] for c in ORDER_COLUMNS])
+        if platform is not None:
+            query = query.where(stored.c.platform == platform)
+        if account is not None:
+            query = query.where(stored.c.account == account)
+        if open_only:
+            query = query.where(stored.c.is_open == True)
+        with self.__db.connect() as cx:
+            data = pd.read_sql(query.order_by(stored.c.time.desc()), cx)
+        data['time'] = to_utc_datetimes(data['time'], 'ms')
+        return data
+
+    def read_orders_sync_time(self, platform: str, account: str = None) -> Optional[datetime]:
+        """time from which platform orders of account must be fetched again: the latest stored order or the oldest
+        still open one, None when no order is stored"""
+        self.open()
+        if not self._does_table_exist(ORDERS_TABLE_NAME):
+            return None
+        self._add_account_column(ORDERS_TABLE_NAME)
+        stored = self.__metadata.tables[ORDERS_TABLE_NAME]
+        partition = (stored.c.platform == platform) & (stored.c.account == account)
+        with self.__db.connect() as cx:
+            last_time = cx.execute(select(func.max(stored.c.time)).where(partition)).scalar()
+            first_open_time = cx.execute(select(func.min(stored.c.time))
+                                         .where(partition & (stored.c.is_open == True))).scalar()
+        if last_time is None:
+            return None
+        sync_time = last_time if first_open_time is None else min(last_time, first_open_time)
+        return to_utc_datetime(sync_time, 'ms')
+
+    def _create_orders_table(self):
+        if not self._does_table_exist(ORDERS_TABLE_NAME):
+            orders = Table(ORDERS_TABLE_NAME, self.__metadata,
+                           Column('id', NVARCHAR(50), primary_key=True),
+                           Column('base_currency', NVARCHAR(5)),
+                           Column('quote_currency', NVARCHAR(5)),
+                           Column('type', NVARCHAR(25)),
+                           Column('side', NVARCHAR(25)),
+                           Column('price', FLOAT),
+                           Column('size', FLOAT),
+                           Column('status', NVARCHAR(25)),
+                           Column('fee', FLOAT),
+                           Column('fee_currency', NVARCHAR(5)),
+                           Column('platform', NVARCHAR(50), nullable=False),
+                           Column('time', INTEGER, nullable=False),
+                           Column('is_open', Boolean, nullable=False),
+                           Column('account', NVARCHAR(50)),
+                           Index('IX_ORDERS_PLATFORM_OPEN_TIME', 'platform', 'is_open', 'time'))
+            orders.create(self.__db)
+
+    def save_candles(self, platform: str, resolution: int, klines: pd.DataFrame):
+        """cache klines (time indexed, as returned by get_prices_history), already cached candles are kept"""
+        self.open()
+        if not self._does_table_exist(CANDLES_TABLE_NAME):
+            self._create_candles_table()
+        if klines.size == 0:
+            return
+        candles = klines.reset_index().assign(platform=platform, resolution=resolution)
+        candles['time'] = to_epoch_ns_array(candles['time']) // NANOS['s']
+        candles = candles.reindex(columns=CANDLE_COLUMNS)
+        candles.to_sql(CANDLES_TABLE_NAME, self.__db, method=_upsert, if_exists='append', index=False,
+                       chunksize=_max_rows_per_statement(candles))
+
+    def read_candles(self, platform: str, resolution: int, start_time: Union[datetime, int, None] = None,
+                     end_time: Union[datetime, int, None] = None, quote_currency: str = None,
+                     base_currency: str = None) -> pd.DataFrame:
+        """cached candles of every symbol (or of base_currency) in long format, ordered by time"""
+        self.open()
+        if not self._does_table_exist(CANDLES_TABLE_NAME):
+            return pd.DataFrame(columns=CANDLE_COLUMNS)
+        candles = self.__metadata.tables[CANDLES_TABLE_NAME]
+        query = select(candles).where((candles.c.platform == platform) & (candles.c.resolution == resolution))
+        if start_time is not None:
+            query = query.where(candles.c.time >= _to_epoch(start_time))
+        if end_time is not None:
+            query = query.where(candles.c.time <= _to_epoch(end_time))
+        if quote_currency is not None:
+            query = query.where(candles.c.quote_currency == quote_currency)
+        if base_currency is not None:
+            query = query.where(candles.c.base_currency == base_currency)
+        with self.__db.connect() as cx:
+            data = pd.read_sql(query.order_by(candles.c.time), cx)
+        return _with_utc_time(data)
+
+    def read_candle_closes(self, platform: str, resolution: int, quote_currency: str,
+                           start_time: Union[datetime, int, None] = None, end_time: Union[datetime, int, None] = None,
+                           every: int = None, base_currencies: list[str] = None) -> pd.DataFrame:
+        """time x base currency matrix of cached candle closes in quote_currency, time being the candle close time.
+        every (seconds) keeps candles closing on multiples of every since epoch only, e.g. 86400 for daily prices"""
+        self.open()
+        if not self._does_table_exist(CANDLES_TABLE_NAME):
+            return pd.DataFrame(index=pd.DatetimeIndex([], tz=timezone.utc, name='time'))
+        candles = self.__metadata.tables[CANDLES_TABLE_NAME]
+        close_time = (candles.c.time + resolution).label('time')
+        # a base currency has one candle by time and quote currency
+        query = select(close_time, candles.c.base_currency, candles.c.close) \
+            .where((candles.c.platform == platform) & (candles.c.resolution == resolution)
+                   & (candles.c.quote_currency == quote_currency))
+        if start_time is not None:
+            query = query.where(candles.c.time >= _to_epoch(start_time) - resolution)
+        if end_time is not None:
+            query = query.where(candles.c.time <= _to_epoch(end_time) - resolution)
+        if base_currencies is not None:
+            query = query.where(candles.c.base_currency.in_(base_currencies))
+        if every is not None:
+            query = query.where((candles.c.time + resolution) % every == 0)
+        with self.__db.connect() as cx:
+            data = pd.read_sql(query, cx)
+        return _with_utc_time(data).pivot(index='time', columns='base_currency', values='close')
+
+    def read_candles_last_times(self, platform: str, resolution: int) -> dict[tuple[str, str], datetime]:
+        """time of the latest cached candle by (base, quote) symbol"""
+        self.open()
+        if not self._does_table_exist(CANDLES_TABLE_NAME):
+            return {}
+        candles = self.__metadata.tables[CANDLES_TABLE_NAME]
+        query = select(candles.c.base_currency, candles.c.quote_currency, func.max(candles.c.time)) \
+            .where((candles.c.platform == platform) & (candles.c.resolution == resolution)) \
+            .group_by(candles.c.base_currency, candles.c.quote_currency)
+        with self.__db.connect() as cx:
+            return {(base, quote): to_utc_datetime(last_time, 's')
+                    for base, quote, last_time in cx.execute(query)}
+
+    def sync_reference_data(self, table_name: str, data: pd.DataFrame) -> tuple[int, int]:
+        """make the COINS or EXCHANGES table hold data (indexed by CoinGecko id): new and changed rows are upserted,
+        rows missing from data are deleted. returns the (upserted, deleted) row counts"""
+        self.open()
+        self._create_reference_table(table_name)
+        table = self.__metadata.tables[table_name]
+        columns = REFERENCE_COLUMNS[table_name]
+        data = data.reindex(columns=columns)
+        data = data[~data.index.duplicated(keep='last')].rename_axis('id')
+        with self.__db.begin() as cx:
+            stored = pd.read_sql(select(table), cx, index_col='id')
+            deleted = stored.index.difference(data.index)
+            known = data.index.intersection(stored.index)
+            unchanged = (data.loc[known].fillna('') == stored.loc[known, columns].fillna('')).all(axis=1)
+            changed = data.drop(unchanged.index[unchanged])
+            for i in range(0, len(deleted), SQLITE_MAX_VARIABLES):
+                cx.execute(table.delete().where(table.c.id.in_(deleted[i:i + SQLITE_MAX_VARIABLES].tolist())))
+            if len(changed) > 0:
+                changed.to_sql(table_name, cx, method=_replace, if_exists='append', index=True, index_label='id',
+                               chunksize=_max_rows_per_statement(changed))
+        return len(changed), len(deleted)
+
+    def read_reference_data(self, table_name: str) -> pd.DataFrame:
+        """stored COINS or EXCHANGES indexed by CoinGecko id"""
+        self.open()
+        self._create_reference_table(table_name)
+        return pd.read_sql_table(table_name, self.__db, index_col='id')
+
+    def _create_reference_table(self, table_name: str):
+        if self._does_table_exist(table_name):
+            return
+        columns = [Column(c, NVARCHAR(100)) for c in REFERENCE_COLUMNS[table_name]]
+        indexes = [Index(f'IX_{table_name}_SYMBOL', 'symbol')] if table_name == COINS_TABLE_NAME else []
+        Table(table_name, self.__metadata, Column('id', NVARCHAR(100), primary_key=True), *columns,
+              *indexes).create(self.__db)
+
+    def _create_candles_table(self):
+        if not self._does_table_exist(CANDLES_TABLE_NAME):
+            candles = Table(CANDLES_TABLE_NAME, self.__metadata,
+                            Column('platform', NVARCHAR(50), primary_key=True),
+                            Column('resolution', INTEGER, primary_key=True),
+                            Column('base_currency', NVARCHAR(10), primary_key=True),
+                            Column('quote_currency', NVARCHAR(10), primary_key=True),
+                            Column('time', INTEGER, primary_key=True),
+                            Column('open', FLOAT),
+                            Column('high', FLOAT),
+                            Column('low', FLOAT),
+                            Column('close', FLOAT),
+                            Column('volume', FLOAT),
+                            Index('IX_CANDLES_PLATFORM_RESOLUTION_TIME', 'platform', 'resolution', 'time'))
+            candles.create(self.__db)
+
+    def _create_valuations_table(self):
+        if not self._does_table_exist(VALUATIONS_TABLE_NAME):
+            valuations = Table(VALUATIONS_TABLE_NAME, self.__metadata,
+                               Column('time', INTEGER, nullable=False),
+                               Column('currency', NVARCHAR(5), nullable=False),
+                               Column('platform', NVARCHAR(50)),
+                               Column('total', FLOAT),
+                               Column('price', FLOAT),
+                               Column('price_usd', FLOAT),
+                               Column('value_usd', FLOAT),
+                               Column('average_buy_price_usd', FLOAT),
+                               Column('pnl_usd', FLOAT),
+                               Column('pnl_pc', FLOAT),
+                               Index('IX_VALUATIONS_TIME', 'time'),
+                               Index('IX_VALUATIONS_CURRENCY_TIME', 'currency', 'time'))
+            valuations.create(self.__db)
+
+    def _create_alerts_table(self):
+        if not self._does_table_exist(ALERTS_TABLE_NAME):
+            alerts = Table(ALERTS_TABLE_NAME, self.__metadata,
+                           Column('id', NVARCHAR(36), nullable=False),
+                           Column('symbol', NVARCHAR(25), nullable=False),
+                           Column('kind', NVARCHAR(15), nullable=False),
+                           Column('level', FLOAT),
+                           Column('price', FLOAT),
+                           Column('time', INTEGER, nullable=False),
+                           Index('IX_ALERTS_TIME', 'time'))
+            alerts.create(self.__db)
+
+
+def _to_epoch(dt: Union[datetime, int]) -> int:
+    return to_epoch(dt, 's')
+
+
+def _with_utc_time(data: pd.DataFrame) -> pd.DataFrame:
+    data['time'] = to_utc_datetimes(data['time'], 's')
+    return data
+
+
+def _get_snapshot_tablename(kind: str):
+    return f'SNAPSHOT_{kind.upper()}'
+
+
+def _max_rows_per_statement(frame: pd.DataFrame) -> int:
+    return max(1, SQLITE_MAX_VARIABLES // (len(frame.columns) + 1))
+
 
 def _get_unicode_name(name):
     try:
@@ -102,7 +525,7 @@ def _get_currencies_tablename(platform: str, symbol: str):
     return f'CURRENCY_{platform}_{symbol}'
 
 
-def insert_statement(*, table, columns: list, num_rows: int):
+def insert_statement(*, table, columns: list, num_rows: int, on_conflict: str = 'DO NOTHING'):
     names = list(map(str, table.frame.columns))
     wld = "?"  # wildcard char
     escape = _get_valid_sqlite_name
@@ -117,7 +540,7 @@ def insert_statement(*, table, columns: list, num_rows: int):
     row_wildcards = ",".join([wld] * len(names))
     wildcards = ",".join(f"({row_wildcards})" for _ in range(num_rows))
     insert_statement = (
-        f"INSERT INTO {escape(table.name)} ({col_names}) VALUES {wildcards} ON CONFLICT DO NOTHING"
+        f"INSERT INTO {escape(table.name)} ({col_names}) VALUES {wildcards} ON CONFLICT {on_conflict}"
     )
     return insert_statement
 
@@ -126,3 +549,11 @@ def _upsert(table, cx, keys, data_iter):
     data_list = list(data_iter)
     flattened_data = [x for row in data_list for x in row]
     cx.execute(insert_statement(table=table, columns=keys, num_rows=len(data_list)), flattened_data)
+
+
+def _replace(table, cx, keys, data_iter):
+    data_list = list(data_iter)
+    flattened_data = [x for row in data_list for x in row]
+    updates = ','.join(f'{_get_valid_sqlite_name(k)}=excluded.{_get_valid_sqlite_name(k)}' for k in keys)
+    cx.execute(insert_statement(table=table, columns=keys, num_rows=len(data_list),
+                                on_conflict=f'(id) DO UPDATE SET {updates}'), flattened_data)
@@ -0,0 +1,97 @@
+"""lightweight timing and peak memory measurement with stored baselines
+
+environment variables:
+- wired_exchange_bench_sizes: comma separated row counts (default 1000, e.g. 1000,100000,1000000)
+- wired_exchange_bench_update: when set to 1, measured values replace stored baselines
+- wired_exchange_bench_tolerance: ratio above baseline considered as a regression (default 3.0)
+"""
+import gc
+import json
+import os
+import time
+import tracemalloc
+from collections import namedtuple
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), 'baselines.json')
+DEFAULT_SIZES = '1000'
+DEFAULT_TOLERANCE = 3.0
+# below these absolute deltas, variations are considered as noise
+TIME_NOISE = 0.005
+MEMORY_NOISE = 256 * 1024
+
+Measure = namedtuple('Measure', ['name', 'size', 'elapsed', 'peak_memory', 'baseline'])
+
+results = []
+
+
+def bench_sizes() -> list[int]:
+    return [int(s) for s in os.getenv('wired_exchange_bench_sizes', DEFAULT_SIZES).split(',') if s.strip()]
+
+
+def tolerance() -> float:
+    return float(os.getenv('wired_exchange_bench_tolerance', DEFAULT_TOLERANCE))
+
+
+def update_requested() -> bool:
+    return os.getenv('wired_exchange_bench_update', '0') == '1'
+
+
+def load_baselines() -> dict:
+    if not os.path.exists(BASELINES_PATH):
+        return {}
+    with open(BASELINES_PATH, 'r') as f:
+        return json.load(f)
+
+
+def save_baselines(measures: list[Measure]):
+    baselines = load_baselines()
+    for m in measures:
+        baselines.setdefault(m.name, {})[str(m.size)] = dict(elapsed=round(m.elapsed, 6),
+                                                             peak_memory=m.peak_memory)
+    with open(BASELINES_PATH, 'w') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+
+
+def measure(name: str, size: int, func, *args, **kwargs):
+    """run func once, recording wall time and python allocations peak, return func result"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    record(name, size, elapsed, peak)
+    return result
+
+
+def record(name: str, size: int, elapsed: float, peak_memory: int) -> Measure:
+    """register a measure taken elsewhere (e.g. in a subprocess) for reporting and baseline comparison"""
+    measured = Measure(name, size, elapsed, peak_memory, load_baselines().get(name, {}).get(str(size)))
+    results.append(measured)
+    return measured
+
+
+def regressions(m: Measure) -> list[str]:
+    if m.baseline is None:
+        return []
+    issues = []
+    ratio = tolerance()
+    if m.elapsed > m.baseline['elapsed'] * ratio and m.elapsed - m.baseline['elapsed'] > TIME_NOISE:
+        issues.append(f'{m.name}[{m.size}]: {m.elapsed:.4f}s exceeds baseline {m.baseline["elapsed"]:.4f}s')
+    if m.peak_memory > m.baseline['peak_memory'] * ratio \
+            and m.peak_memory - m.baseline['peak_memory'] > MEMORY_NOISE:
+        issues.append(f'{m.name}[{m.size}]: {m.peak_memory} bytes exceeds baseline {m.baseline["peak_memory"]} bytes')
+    return issues
+
+
+def report_lines(measures: list[Measure]) -> list[str]:
+    lines = [f'{"converter":<45}{"rows":>10}{"time (s)":>12}{"baseline":>12}{"peak (MiB)":>12}{"baseline":>12}']
+    for m in measures:
+        baseline_time = f'{m.baseline["elapsed"]:.4f}' if m.baseline else '-'
+        baseline_memory = f'{m.baseline["peak_memory"] / 2 ** 20:.2f}' if m.baseline else '-'
+        lines.append(f'{m.name:<45}{m.size:>10}{m.elapsed:>12.4f}{baseline_time:>12}'
+                     f'{m.peak_memory / 2 ** 20:>12.2f}{baseline_memory:>12}')
+    return lines
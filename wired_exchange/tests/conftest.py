@@ -0,0 +1,12 @@
+from wired_exchange.tests import benchmark
+
+
+def pytest_terminal_summary(terminalreporter):
+    if len(benchmark.results) == 0:
+        return
+    terminalreporter.section('converters benchmark')
+    for line in benchmark.report_lines(benchmark.results):
+        terminalreporter.write_line(line)
+    if benchmark.update_requested():
+        benchmark.save_baselines(benchmark.results)
+        terminalreporter.write_line(f'baselines saved to {benchmark.BASELINES_PATH}')
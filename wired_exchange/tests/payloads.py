@@ -0,0 +1,156 @@
+"""synthetic exchange payloads shaped after the documented REST responses (see README Model section)"""
+import json
+
+import numpy as np
+import pandas as pd
+
+import httpx
+
+CURRENCIES = ['BTC', 'ETH', 'KCS', 'LINK', 'SOL', 'DOT', 'ADA', 'XRP', 'FTM', 'MNW', 'FTG', 'ATOM']
+START_TIME_MS = 1609459200000  # 2021-01-01T00:00:00Z
+KUCOIN_PAGE_SIZE = 500
+
+
+def _random(size: int, seed: int = 42):
+    rnd = np.random.default_rng(seed)
+    return rnd, rnd.integers(0, len(CURRENCIES), size)
+
+
+def kucoin_fills(size: int) -> list:
+    rnd, currencies = _random(size)
+    prices = rnd.uniform(0.01, 50000, size)
+    sizes = rnd.uniform(0.001, 100, size)
+    return [dict(symbol=f'{CURRENCIES[c]}-USDT', tradeId=f'{i:024x}', orderId=f'{i + size:024x}',
+                 counterOrderId=f'{i + 2 * size:024x}', side='buy' if i % 2 else 'sell', liquidity='taker',
+                 forceTaker=True, price=str(prices[i]), size=str(sizes[i]), funds=str(prices[i] * sizes[i]),
+                 fee='0.1', feeRate='0.001', feeCurrency='USDT', stop='', tradeType='TRADE', type='limit',
+                 createdAt=START_TIME_MS + i * 1000)
+            for i, c in enumerate(currencies)]
+
+
+def kucoin_orders(size: int) -> list:
+    rnd, currencies = _random(size)
+    prices = rnd.uniform(0.01, 50000, size)
+    sizes = rnd.uniform(0.001, 100, size)
+    return [dict(id=f'{i:024x}', symbol=f'{CURRENCIES[c]}-USDT', opType='DEAL', type='limit',
+                 side='buy' if i % 2 else 'sell', price=str(prices[i]), size=str(sizes[i]), funds='0',
+                 dealFunds='0', dealSize='0', fee='0', feeCurrency='USDT', stp='', stop='', stopTriggered=False,
+                 stopPrice='0', timeInForce='GTC', postOnly=False, hidden=False, iceberg=False, visibleSize='0',
+                 cancelAfter=0, channel='API', clientOid='', remark='', tags='', isActive=bool(i % 3 == 0),
+                 cancelExist=False, tradeType='TRADE', createdAt=START_TIME_MS + i * 1000)
+            for i, c in enumerate(currencies)]
+
+
+def kucoin_all_tickers(size: int) -> dict:
+    rnd = np.random.default_rng(42)
+    prices = rnd.uniform(0.01, 50000, size)
+    quotes = ['USDT', 'BTC', 'ETH']
+    return dict(code='200000', data=dict(time=START_TIME_MS, ticker=[
+        dict(symbol=f'C{i}-{quotes[i % 3]}', symbolName=f'C{i}-{quotes[i % 3]}', buy=str(prices[i]),
+             sell=str(prices[i] * 1.001), changeRate='0.01', changePrice='1.2', high=str(prices[i] * 1.1),
+             low=str(prices[i] * 0.9), vol='1000.5', volValue='2000.5', last=str(prices[i]),
+             averagePrice=str(prices[i]), takerFeeRate='0.001', makerFeeRate='0.001', takerCoefficient='1',
+             makerCoefficient='1')
+        for i in range(size)]))
+
+
+def kucoin_candles(size: int) -> list:
+    rnd = np.random.default_rng(42)
+    closes = rnd.uniform(1, 100, size)
+    return [[str(START_TIME_MS // 1000 + i * 60), str(closes[i]), str(closes[i]), str(closes[i] * 1.01),
+             str(closes[i] * 0.99), '10.5', '1050.5'] for i in range(size)]
+
+
+def klines(size: int) -> pd.DataFrame:
+    rnd = np.random.default_rng(42)
+    closes = rnd.uniform(1, 100, size)
+    return pd.DataFrame(dict(time=START_TIME_MS + np.arange(size, dtype='int64') * 60000,
+                             open=closes, high=closes * 1.01, low=closes * 0.99, close=closes,
+                             volume=rnd.uniform(0, 1000, size)))
+
+
+def transactions(size: int) -> pd.DataFrame:
+    rnd, currencies = _random(size)
+    return pd.DataFrame(dict(id=[f'kucoin_{i:024x}' for i in range(size)],
+                             base_currency=np.array(CURRENCIES)[currencies], quote_currency='USDT',
+                             side=np.where(np.arange(size) % 2 == 0, 'buy', 'sell'),
+                             price=rnd.uniform(0.01, 50000, size), size=rnd.uniform(0.001, 100, size),
+                             fee=rnd.uniform(0, 1, size), fee_currency='USDT', platform='kucoin',
+                             time=pd.to_datetime(START_TIME_MS + np.arange(size, dtype='int64') * 1000,
+                                                 unit='ms', utc=True)))
+
+
+def ftx_balances(size: int) -> list:
+    rnd = np.random.default_rng(42)
+    totals = rnd.uniform(0, 10, size)
+    totals[::10] = 0.0
+    return [dict(coin=f'C{i}', total=totals[i], free=totals[i], availableWithoutBorrow=totals[i],
+                 usdValue=totals[i] * 10, spotBorrow=0.0) for i in range(size)]
+
+
+def ftx_markets(size: int) -> dict:
+    rnd = np.random.default_rng(42)
+    prices = rnd.uniform(0.01, 50000, size)
+    return dict(success=True, result=[
+        dict(name=f'C{i}/USDT', enabled=True, postOnly=False, priceIncrement=0.01, sizeIncrement=0.01,
+             minProvideSize=0.01, last=prices[i], bid=prices[i], ask=prices[i] * 1.001, price=prices[i],
+             type='spot', baseCurrency=f'C{i}', quoteCurrency='USDT', underlying=None, restricted=False,
+             highLeverageFeeExempt=True, change1h=0.0, change24h=0.0, changeBod=0.0, quoteVolume24h=1000.0,
+             volumeUsd24h=1000.0, tokenizedEquity=False)
+        for i in range(size)])
+
+
+def ftx_fills(size: int) -> list:
+    rnd, currencies = _random(size)
+    prices = rnd.uniform(0.01, 50000, size)
+    sizes = rnd.uniform(0.001, 100, size)
+    times = pd.to_datetime(START_TIME_MS + np.arange(size, dtype='int64') * 1000, unit='ms', utc=True) \
+        .strftime('%Y-%m-%dT%H:%M:%S.%f+00:00')
+    return [dict(id=i, market=f'{CURRENCIES[c]}/USD', future=None, baseCurrency=CURRENCIES[c], quoteCurrency='USD',
+                 type='order', side='buy' if i % 2 else 'sell', price=prices[i], size=sizes[i], orderId=i + size,
+                 tradeId=i + 2 * size, time=times[i], feeRate=0.0007, fee=0.1, feeCurrency='USD',
+                 liquidity='taker')
+            for i, c in enumerate(currencies)]
+
+
+def bitpanda_trades(size: int) -> list:
+    rnd, currencies = _random(size)
+    prices = rnd.uniform(0.01, 50000, size)
+    times = pd.to_datetime(START_TIME_MS + np.arange(size, dtype='int64') * 1000, unit='ms', utc=True) \
+        .strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    return [dict(trade_id=f'{i:036x}', order_id=f'{i + size:036x}', account_id='acc',
+                 instrument_code=f'{CURRENCIES[c]}_CHF', side='BUY' if i % 2 else 'SELL', amount=str(prices[i]),
+                 price=str(prices[i]), time=times[i], sequence=i, fee_amount='0.1', fee_percentage='0.1',
+                 fee_group_id='default', fee_currency='CHF', fee_type='TAKER')
+            for i, c in enumerate(currencies)]
+
+
+def kucoin_pages(items: list, page_size: int = KUCOIN_PAGE_SIZE):
+    """serve items as Kucoin paginated responses"""
+    total_pages = max(1, (len(items) + page_size - 1) // page_size)
+
+    def handler(request: httpx.Request):
+        page = int(request.url.params.get('current_page', 1))
+        page_items = items[(page - 1) * page_size:page * page_size]
+        return json_response(dict(code='200000', data=dict(currentPage=page, pageSize=page_size,
+                                                           totalNum=len(items), totalPage=total_pages,
+                                                           items=page_items)))
+
+    return handler
+
+
+def json_response(payload) -> httpx.Response:
+    return httpx.Response(200, content=json.dumps(payload).encode('utf-8'),
+                          headers={'Content-Type': 'application/json'})
+
+
+def mock_transport(routes: dict) -> httpx.MockTransport:
+    """build an httpx transport serving path suffix -> payload or handler"""
+
+    def handler(request: httpx.Request):
+        for path, payload in routes.items():
+            if request.url.path.endswith(path):
+                return payload(request) if callable(payload) else json_response(payload)
+        return httpx.Response(404, json=dict(code='404000', msg=f'{request.url.path}: no route'))
+
+    return httpx.MockTransport(handler)
@@ -0,0 +1,439 @@
+"""local stand-in for Kucoin, FTX and BitPanda Pro REST APIs and the Kucoin websocket feed, for offline load tests
+
+clients are pointed at it through host_url:
+
+    with ExchangeSimulator(SimulatorConfig(latency=0.01, rate_limit=30)) as simulator:
+        kucoin = KucoinSpotClient('key', 'pass', 'secret', host_url=simulator.url('kucoin'))
+
+payloads are generated by wired_exchange.tests.payloads, requests are not authenticated.
+run `python -m wired_exchange.tests.simulator` to serve it until interrupted"""
+import asyncio
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from collections import namedtuple, Counter
+from decimal import Decimal
+from urllib.parse import urlsplit, parse_qsl
+
+import numpy as np
+import pandas as pd
+import websockets
+
+from wired_exchange.tests import payloads
+
+SimulatorConfig = namedtuple('SimulatorConfig', ['latency', 'jitter', 'rate_limit', 'rate_burst', 'throttle_every',
+                                                 'throttle_length', 'pages', 'page_size', 'tickers', 'candles',
+                                                 'message_rate', 'seed'],
+                             defaults=[0.0, 0.0, None, 10, None, 1, 3, 500, 100, 1500, 10.0, 42])
+SimulatorConfig.__doc__ = """simulated exchange behavior
+
+- latency, jitter: seconds added to each REST response, jitter is uniformly drawn
+- rate_limit, rate_burst: requests per second and bucket size per platform, a 429 is returned once exceeded
+- throttle_every, throttle_length: every throttle_every requests, the next throttle_length requests get a 429
+- pages, page_size: paginated endpoints serve pages x page_size items
+- tickers, candles: number of tickers and candles returned
+- message_rate: websocket messages per second of each subscription"""
+
+# platform -> api root of its host_url
+API_ROOTS = dict(kucoin='api', kucoin_futures='api', ftx='api', bitpanda_pro='public')
+REASONS = {200: 'OK', 404: 'Not Found', 429: 'Too Many Requests'}
+PUBLISH_TICK = 0.01
+
+Route = namedtuple('Route', ['platform', 'method', 'pattern', 'handler'])
+
+
+class ExchangeSimulator:
+    """REST and websocket servers running on their own event loop thread, bound to free local ports"""
+
+    def __init__(self, config: SimulatorConfig = None, host: str = '127.0.0.1'):
+        self.config = config if config is not None else SimulatorConfig()
+        self.host = host
+        self.http_port = None
+        self.ws_port = None
+        # served requests by (platform, path), throttled ones included
+        self.requests = Counter()
+        self.throttled = 0
+        self.messages = 0
+        self.connections = 0
+        self._request_count = 0
+        self._throttle_remaining = 0
+        self._buckets = {}
+        self._datasets = {}
+        self._random = random.Random(self.config.seed)
+        self._routes = self._build_routes()
+        self._writers = set()
+        self._ws_connections = set()
+        self._loop = None
+        self._stopping = None
+        self._started = threading.Event()
+        self._thread = None
+        self._logger = logging.getLogger(type(self).__name__)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def url(self, platform: str = 'kucoin') -> str:
+        """host_url of platform clients"""
+        return f'http://{self.host}:{self.http_port}/{platform}/{API_ROOTS[platform]}'
+
+    def drop_connections(self):
+        """close every websocket connection as a network failure would, clients reconnect"""
+        async def close_all():
+            for ws in list(self._ws_connections):
+                await ws.close(1011, 'connection dropped by simulator')
+
+        asyncio.run_coroutine_threadsafe(close_all(), self._loop).result()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='exchange-simulator', daemon=True)
+        self._thread.start()
+        self._started.wait()
+        self._logger.info(f'serving REST on port {self.http_port} and websocket on port {self.ws_port}')
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+            self._thread.join()
+            self._loop = None
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._serve())
+        finally:
+            self._loop.close()
+
+    async def _serve(self):
+        self._stopping = asyncio.Event()
+        http_server = await asyncio.start_server(self._handle_http, self.host, 0)
+        ws_server = await websockets.serve(self._handle_ws, self.host, 0)
+        self.http_port = http_server.sockets[0].getsockname()[1]
+        self.ws_port = next(iter(ws_server.sockets)).getsockname()[1]
+        self._started.set()
+        await self._stopping.wait()
+        http_server.close()
+        for writer in list(self._writers):
+            writer.close()
+        ws_server.close()
+        await http_server.wait_closed()
+        await ws_server.wait_closed()
+
+    async def _handle_http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if len(request_line) == 0:
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                status, payload = await self._respond(method, target, body)
+                content = _dumps(payload).encode('utf-8')
+                writer.write(f'HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n'
+                             f'Content-Length: {len(content)}\r\n\r\n'.encode('latin-1') + content)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _respond(self, method: str, target: str, body: bytes) -> tuple[int, dict]:
+        url = urlsplit(target)
+        parts = url.path.split('/', 3)
+        if len(parts) < 4:
+            return 404, dict(code='404000', msg=f'{url.path}: no route')
+        platform, path = parts[1], '/' + parts[3]
+        self.requests[(platform, path)] += 1
+        if self.config.latency > 0 or self.config.jitter > 0:
+            await asyncio.sleep(self.config.latency + self._random.uniform(0, self.config.jitter))
+        if self._throttle(platform):
+            self.throttled += 1
+            return 429, dict(code='429000', msg='Too many requests', success=False)
+        params = dict(parse_qsl(url.query))
+        for route in self._routes:
+            if route.platform == platform and route.method == method:
+                match = route.pattern.fullmatch(path)
+                if match is not None:
+                    return 200, route.handler(params, json.loads(body) if len(body) > 0 else None, *match.groups())
+        return 404, dict(code='404000', msg=f'{path}: no route', success=False)
+
+    def _throttle(self, platform: str) -> bool:
+        self._request_count += 1
+        if self.config.throttle_every is not None and self._request_count % self.config.throttle_every == 0:
+            self._throttle_remaining = self.config.throttle_length
+        if self._throttle_remaining > 0:
+            self._throttle_remaining -= 1
+            return True
+        if self.config.rate_limit is None:
+            return False
+        now = time.monotonic()
+        tokens, last = self._buckets.get(platform, (self.config.rate_burst, now))
+        tokens = min(self.config.rate_burst, tokens + (now - last) * self.config.rate_limit)
+        if tokens < 1:
+            self._buckets[platform] = (tokens, now)
+            return True
+        self._buckets[platform] = (tokens - 1, now)
+        return False
+
+    async def _handle_ws(self, ws, path: str = None):
+        self.connections += 1
+        connect_id = dict(parse_qsl(urlsplit(ws.path).query)).get('connectId', '')
+        publishers = []
+        self._ws_connections.add(ws)
+        try:
+            await ws.send(_dumps(dict(id=connect_id, type='welcome')))
+            async for message in ws:
+                request = json.loads(message)
+                if request.get('type') == 'ping':
+                    await ws.send(_dumps(dict(id=request.get('id'), type='pong')))
+                elif request.get('type') in ('subscribe', 'unsubscribe'):
+                    if request.get('response', False):
+                        await ws.send(_dumps(dict(id=request.get('id'), type='ack')))
+                    if request['type'] == 'subscribe':
+                        publishers.append(asyncio.create_task(self._publish_async(ws, request['topic'])))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self._ws_connections.discard(ws)
+            for publisher in publishers:
+                publisher.cancel()
+
+    async def _publish_async(self, ws, topic: str):
+        """send message_rate messages per second, symbols of the topic in turn"""
+        prefix, _, symbols = topic.partition(':')
+        symbols = symbols.split(',')
+        rate = self.config.message_rate
+        started = time.perf_counter()
+        sent = 0
+        try:
+            while True:
+                due = int((time.perf_counter() - started) * rate) + 1
+                while sent < due:
+                    await ws.send(_dumps(self._feed_message(prefix, symbols[sent % len(symbols)], sent)))
+                    sent += 1
+                    self.messages += 1
+                await asyncio.sleep(min(1 / rate, PUBLISH_TICK))
+        except websockets.ConnectionClosed:
+            pass
+
+    def _feed_message(self, prefix: str, symbol: str, sequence: int) -> dict:
+        now_ms = int(time.time() * 1000)
+        price = 100 * (1 + 0.01 * np.sin(sequence / 10))
+        if prefix == '/market/ticker':
+            subject = 'trade.ticker'
+            if symbol == 'all':
+                subject = f'C{sequence % self.config.tickers}-USDT'
+            return dict(type='message', topic=f'{prefix}:{symbol}', subject=subject,
+                        data=dict(sequence=str(sequence), price=str(price), size='0.1', bestAsk=str(price * 1.001),
+                                  bestAskSize='1', bestBid=str(price * 0.999), bestBidSize='1', time=now_ms))
+        if prefix == '/market/candles':
+            market, _, resolution = symbol.partition('_')
+            return dict(type='message', topic=f'{prefix}:{symbol}', subject='trade.candles.update',
+                        data=dict(symbol=market, time=now_ms * 1_000_000,
+                                  candles=[str(now_ms // 60000 * 60), str(price), str(price), str(price * 1.01),
+                                           str(price * 0.99), '10.5', str(price * 10.5)]))
+        if prefix == '/contract/instrument':
+            if sequence % 10 == 9:
+                return dict(type='message', topic=f'{prefix}:{symbol}', subject='funding.rate',
+                            data=dict(granularity=60000, fundingRate=0.0001, timestamp=now_ms))
+            return dict(type='message', topic=f'{prefix}:{symbol}', subject='mark.index.price',
+                        data=dict(granularity=1000, indexPrice=price, markPrice=price, timestamp=now_ms))
+        if prefix == '/contract/position':
+            # position changes caused by the mark price do not carry quantity nor entry price
+            return dict(type='message', topic=f'{prefix}:{symbol}', subject='position.change', channelType='private',
+                        data=dict(markPrice=price, markValue=price * 0.01, realLeverage=2.0, posMargin=5.0,
+                                  unrealisedPnl=0.0, unrealisedPnlPcnt=0.0, settleCurrency='USDT',
+                                  changeReason='markPriceChange', currentTimestamp=now_ms))
+        if prefix == '/spotMarket/tradeOrders':
+            return dict(type='message', topic=prefix, subject='orderChange', channelType='private',
+                        data=dict(orderId=f'{sequence:024x}', clientOid=str(sequence), symbol='BTC-USDT',
+                                  orderType='limit', side='buy', type='open', price=str(price), size='1',
+                                  filledSize='0', remainSize='1', orderTime=now_ms * 1_000_000,
+                                  ts=now_ms * 1_000_000))
+        if prefix == '/account/balance':
+            return dict(type='message', topic=prefix, subject='account.balance', channelType='private',
+                        data=dict(currency='USDT', total='1000', available='900', hold='100',
+                                  relationEvent='trade.hold', time=str(now_ms)))
+        return dict(type='message', topic=f'{prefix}:{symbol}', subject='update', data=dict(time=now_ms))
+
+    def _build_routes(self) -> list[Route]:
+        routes = dict(kucoin=[('GET', '/v1/timestamp', self._kucoin_time),
+                              ('GET', '/v1/fills', self._kucoin_page('kucoin_fills')),
+                              ('GET', '/v1/(?:hist-)?orders', self._kucoin_page('kucoin_orders')),
+                              ('GET', '/v1/(?:stop-order|deposits|withdrawals)', self._kucoin_page(None)),
+                              ('GET', '/v1/market/candles', self._kucoin_candles),
+                              ('GET', '/v1/market/allTickers', self._kucoin_tickers),
+                              ('GET', '/v1/accounts', self._kucoin_accounts),
+                              ('GET', '/v2/symbols', self._kucoin_symbols),
+                              ('POST', '/v1/bullet-(?:public|private)', self._kucoin_bullet),
+                              ('POST', '/v1/(?:orders|stop-order)', self._kucoin_order),
+                              ('POST', '/v3/oco/order', self._kucoin_order),
+                              ('POST', '/v1/orders/multi', self._kucoin_multi_orders)],
+                      kucoin_futures=[('GET', '/v1/timestamp', self._kucoin_time),
+                                      ('GET', '/v1/positions', self._kucoin_positions),
+                                      ('GET', '/v1/contracts/active', self._kucoin_contracts),
+                                      ('POST', '/v1/bullet-private', self._kucoin_bullet)],
+                      ftx=[('GET', '/time', self._ftx_time),
+                           ('GET', '/fills', self._ftx_fills),
+                           ('GET', '/orders/history', lambda params, body: dict(success=True, result=[],
+                                                                                hasMoreData=False)),
+                           ('GET', '/markets', self._ftx_markets),
+                           ('GET', '/markets/([^/]+)/([^/]+)', self._ftx_market),
+                           ('GET', '/markets/([^/]+)/([^/]+)/candles', self._ftx_candles),
+                           ('GET', '/wallet/balances', self._ftx_balances),
+                           ('GET', '/wallet/(?:deposits|withdrawals)', lambda params, body: dict(
+                               success=True, result=[], hasMoreData=False))],
+                      bitpanda_pro=[('GET', '/v1/account/trades', self._bitpanda_trades),
+                                    ('GET', '/v1/account/orders', lambda params, body: dict(order_history=[])),
+                                    ('GET', '/v1/account/balances', lambda params, body: dict(balances=[])),
+                                    ('GET', '/v1/market-ticker', self._bitpanda_tickers)])
+        return [Route(platform, method, re.compile(pattern), handler)
+                for platform, platform_routes in routes.items() for method, pattern, handler in platform_routes]
+
+    def _dataset(self, name: str) -> list:
+        """generated items of a paginated endpoint, oldest first"""
+        if name not in self._datasets:
+            self._datasets[name] = getattr(payloads, name)(self.config.pages * self.config.page_size)
+        return self._datasets[name]
+
+    def _kucoin_page(self, dataset: str = None):
+        def handler(params: dict, body):
+            items = self._dataset(dataset) if dataset is not None else []
+            page = int(params.get('current_page', params.get('currentPage', 1)))
+            page_size = self.config.page_size
+            return _kucoin(data=dict(currentPage=page, pageSize=page_size, totalNum=len(items),
+                                     totalPage=max(1, (len(items) + page_size - 1) // page_size),
+                                     items=items[(page - 1) * page_size:page * page_size]))
+
+        return handler
+
+    @staticmethod
+    def _kucoin_time(params: dict, body):
+        return _kucoin(data=int(time.time() * 1000))
+
+    def _kucoin_candles(self, params: dict, body):
+        return _kucoin(data=payloads.kucoin_candles(self.config.candles))
+
+    def _kucoin_tickers(self, params: dict, body):
+        return payloads.kucoin_all_tickers(self.config.tickers)
+
+    @staticmethod
+    def _kucoin_accounts(params: dict, body):
+        return _kucoin(data=[dict(id=f'{i:024x}', currency=c, type='trade', balance='10.5', available='10',
+                                  holds='0.5') for i, c in enumerate(payloads.CURRENCIES)])
+
+    def _kucoin_symbols(self, params: dict, body):
+        return _kucoin(data=[dict(symbol=f'C{i}-USDT', baseCurrency=f'C{i}', quoteCurrency='USDT',
+                                  priceIncrement='0.0001', baseIncrement='0.0001', enableTrading=True)
+                             for i in range(self.config.tickers)])
+
+    def _kucoin_contracts(self, params: dict, body):
+        return _kucoin(data=[dict(symbol=f'C{i}USDTM', baseCurrency=f'C{i}', quoteCurrency='USDT',
+                                  settleCurrency='USDT', isInverse=False, multiplier=0.01, tickSize=0.01,
+                                  markPrice=100.0, fundingFeeRate=0.0001)
+                             for i in range(self.config.tickers)])
+
+    def _kucoin_positions(self, params: dict, body):
+        now_ms = int(time.time() * 1000)
+        return _kucoin(data=[dict(symbol=f'C{i}USDTM', isOpen=True, isInverse=False, settleCurrency='USDT',
+                                  realLeverage=2.0, currentQty=10 * (i + 1), avgEntryPrice=100.0, markPrice=100.0,
+                                  liquidationPrice=50.0, posMargin=5.0, maintainMargin=0.5, realisedPnl=0.0,
+                                  unrealisedPnl=0.0, unrealisedPnlPcnt=0.0, openingTimestamp=now_ms - 60000,
+                                  currentTimestamp=now_ms)
+                             for i in range(self.config.tickers)])
+
+    def _kucoin_bullet(self, params: dict, body):
+        return _kucoin(data=dict(token=str(uuid.uuid4()), instanceServers=[
+            dict(endpoint=f'ws://{self.host}:{self.ws_port}/endpoint', encrypt=False, protocol='websocket',
+                 pingInterval=18000, pingTimeout=10000)]))
+
+    @staticmethod
+    def _kucoin_order(params: dict, body: dict):
+        return _kucoin(data=dict(orderId=uuid.uuid4().hex[:24]))
+
+    @staticmethod
+    def _kucoin_multi_orders(params: dict, body: dict):
+        return _kucoin(data=dict(data=[dict(order, id=uuid.uuid4().hex[:24], symbol=body['symbol'], status='success',
+                                            failMsg=None) for order in body['orderList']]))
+
+    @staticmethod
+    def _ftx_time(params: dict, body):
+        return dict(success=True, result=pd.Timestamp.now(tz='UTC').isoformat())
+
+    def _ftx_fills(self, params: dict, body):
+        """FTX pages backward in time: most recent fills up to end_time (inclusive, fractional seconds)"""
+        fills = self._dataset('ftx_fills')
+        if 'ftx_fills_times' not in self._datasets:
+            self._datasets['ftx_fills_times'] = pd.to_datetime([f['time'] for f in fills]).astype('int64')
+        times = self._datasets['ftx_fills_times']
+        end = int(np.searchsorted(times, int(Decimal(params['end_time']) * 10 ** 9), side='right')) \
+            if 'end_time' in params else len(fills)
+        start = max(0, end - self.config.page_size)
+        return dict(success=True, result=fills[start:end][::-1], hasMoreData=start > 0)
+
+    def _bitpanda_tickers(self, params: dict, body):
+        return [dict(instrument_code=f'C{i}_USDT', best_bid=str(100.0 + i), best_ask=str(100.2 + i),
+                     last_price=str(100.1 + i)) for i in range(self.config.tickers)]
+
+    def _ftx_markets(self, params: dict, body):
+        return payloads.ftx_markets(self.config.tickers)
+
+    @staticmethod
+    def _ftx_market(params: dict, body, base: str, quote: str):
+        return dict(success=True, result=dict(name=f'{base}/{quote}', price=100.0, bid=99.9, ask=100.1,
+                                              last=100.0))
+
+    def _ftx_candles(self, params: dict, body, base: str, quote: str):
+        candles = payloads.klines(self.config.candles)
+        candles['startTime'] = pd.to_datetime(candles['time'], unit='ms', utc=True).map(pd.Timestamp.isoformat)
+        return dict(success=True, result=candles.to_dict('records'))
+
+    def _ftx_balances(self, params: dict, body):
+        return dict(success=True, result=payloads.ftx_balances(self.config.tickers))
+
+    def _bitpanda_trades(self, params: dict, body):
+        """BitPanda Pro cursor pages, the cursor is the next item offset"""
+        trades = self._dataset('bitpanda_trades')
+        offset = int(params.get('cursor', 0))
+        page_size = int(params.get('max_page_size', self.config.page_size))
+        response = dict(trade_history=[dict(trade=t, fee={}) for t in trades[offset:offset + page_size]],
+                        max_page_size=page_size)
+        if offset + page_size < len(trades):
+            response['cursor'] = str(offset + page_size)
+        return response
+
+
+def _kucoin(**response) -> dict:
+    return dict(code='200000', **response)
+
+
+def _dumps(payload) -> str:
+    # clients match raw messages such as "type":"pong" before parsing them
+    return json.dumps(payload, separators=(',', ':'))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    with ExchangeSimulator() as simulator:
+        for name in API_ROOTS.keys():
+            print(f'{name}: {simulator.url(name)}')
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,68 @@
+import asyncio
+import json
+import time
+
+import pandas as pd
+
+from wired_exchange.kucoin import KucoinSpotClient
+from wired_exchange.kucoin.AccountBook import KucoinAccountBook, ORDERS_TOPIC
+from wired_exchange.kucoin.WebSocket import WebSocketNotification
+from wired_exchange.tests.simulator import ExchangeSimulator, SimulatorConfig
+
+
+def _order_change(order_id: str, change: str, ts: int) -> str:
+    return json.dumps(dict(type='message', topic=ORDERS_TOPIC, subject='orderChange', data=dict(
+        orderId=order_id, symbol='BTC-USDT', orderType='limit', side='buy', type=change, price='100', size='1',
+        filledSize='0', remainSize='1', orderTime=ts, ts=ts)), separators=(',', ':'))
+
+
+def test_updates_received_before_the_snapshot_are_replayed():
+    with ExchangeSimulator(SimulatorConfig(pages=1, page_size=10)) as simulator:
+        book = KucoinAccountBook()
+        now_ns = time.time_ns()
+        assert book.handle(_order_change('late', 'open', now_ns + 10 ** 9))
+        with KucoinSpotClient('key', 'pass', 'secret', host_url=simulator.url('kucoin')) as kucoin:
+            book.seed(kucoin)
+    orders = book.get_open_orders()
+    assert book.is_live() and 'late' in set(orders['id'])
+    # a change older than the stored order is ignored, an unknown order is added
+    book.handle(_order_change('late', 'canceled', now_ns))
+    book.handle(_order_change('stale', 'open', now_ns - 10 ** 12))
+    assert len(book.get_open_orders()) == len(orders) + 1
+    book.handle(_order_change('late', 'canceled', now_ns + 2 * 10 ** 9))
+    assert len(book.get_open_orders()) == len(orders) and book.get_orders()['status'].eq('CANCELED').sum() == 1
+
+
+def test_book_is_seeded_again_once_reconnected():
+    async def stream(simulator: ExchangeSimulator) -> list[bool]:
+        book = KucoinAccountBook()
+        with KucoinSpotClient('key', 'pass', 'secret', host_url=simulator.url('kucoin')) as kucoin:
+            await kucoin.register_account_book_async(book)
+            await asyncio.sleep(0.2)
+            live = [book.is_live()]
+            book.on_notification(WebSocketNotification.CONNECTION_LOST)
+            live.append(book.is_live())
+            await asyncio.to_thread(simulator.drop_connections)
+            for _ in range(50):
+                if book.is_live():
+                    break
+                await asyncio.sleep(0.1)
+            live.append(book.is_live())
+            restored_at = pd.Timestamp.now(tz='UTC')
+            await asyncio.sleep(0.2)
+            kucoin.stop_reading()
+        # private channels are subscribed again
+        balances = book.get_balances(by_account=True)
+        live.append(balances.loc[('trade', 'USDT'), 'updated'] > restored_at)
+        return live
+
+    with ExchangeSimulator(SimulatorConfig(pages=1, page_size=10, message_rate=50)) as simulator:
+        assert asyncio.run(stream(simulator)) == [True, False, True, True]
+        assert simulator.connections == 2
+        assert simulator.requests[('kucoin', '/v1/accounts')] == 2
+
+
+def test_notifications_before_any_seed_are_ignored():
+    book = KucoinAccountBook()
+    book.on_notification(WebSocketNotification.CONNECTION_RESTORED)
+    assert not book.is_live()
@@ -0,0 +1,71 @@
+import importlib
+import time
+
+from wired_exchange.accounts import Account, Accounts, load_accounts
+from wired_exchange.core.RateLimiter import RateLimiter
+from wired_exchange.tests.simulator import ExchangeSimulator, SimulatorConfig
+from wired_exchange.tests.test_simulator import START_TIME
+
+portfolio_module = importlib.import_module('wired_exchange.portfolio')
+LATENCY = 0.2
+
+
+def test_accounts_are_queried_concurrently(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # missing prices are completed from FTX live rates, out of reach of the simulator
+    monkeypatch.setattr(portfolio_module, '_enrich_prices', lambda positions: positions)
+    with ExchangeSimulator(SimulatorConfig(latency=LATENCY, tickers=10)) as simulator:
+        accounts = [Account(f'kucoin_{i}', 'kucoin', f'key_{i}', 'secret', 'pass', host_url=simulator.url('kucoin'))
+                    for i in range(6)]
+        accounts += [Account(f'ftx_{i}', 'ftx', f'key_{i}', 'secret', host_url=simulator.url('ftx'))
+                     for i in range(6)]
+        with Accounts('accounts', accounts) as portfolio:
+            started = time.monotonic()
+            positions = portfolio.get_positions(deadline=10)
+            elapsed = time.monotonic() - started
+    assert sorted(positions['account'].unique()) == sorted(a.name for a in accounts)
+    assert not positions['stale'].any()
+    # a Kucoin account takes 3 round trips (server time, accounts, tickers), 12 accounts in a row would take 36
+    assert elapsed < 12 * LATENCY
+
+
+def test_transactions_are_partitioned_by_account(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with ExchangeSimulator(SimulatorConfig(pages=2, page_size=50)) as simulator:
+        with Accounts('accounts', [Account(name, 'ftx', f'{name}_key', 'secret', host_url=simulator.url('ftx'))
+                                   for name in ('main', 'bot')]) as portfolio:
+            assert portfolio.import_transactions(START_TIME) == 200
+            bot = portfolio._db.read_transactions('bot')
+            assert len(bot) == 100 and (bot['account'] == 'bot').all()
+            assert bot.index.str.startswith('bot_ftx_').all()
+            assert len(portfolio.get_transaction()) == 200
+            assert portfolio.sync_orders(START_TIME) == {}
+
+
+def test_load_accounts(tmp_path):
+    (tmp_path / '.env-EBL').write_text('kucoin_api_key=k\nkucoin_api_secret=s\nkucoin_api_passphrase=p\n'
+                                       'ftx_api_key=f\nftx_api_secret=s\nftx_subaccounts=bot, Long Term\n')
+    accounts = load_accounts(['EBL'], str(tmp_path / '.env-{profile}'))
+    assert [(a.name, a.platform, a.subaccount) for a in accounts] == [
+        ('ebl_kucoin', 'kucoin', None), ('ebl_ftx', 'ftx', None), ('ebl_ftx_bot', 'ftx', 'bot'),
+        ('ebl_ftx_long_term', 'ftx', 'Long Term')]
+    assert accounts[0].api_passphrase == 'p'
+
+
+def test_rate_limiter_spreads_bursts():
+    limiter = RateLimiter('test', rate=50, capacity=2)
+    started = time.monotonic()
+    waits = [limiter.acquire() for _ in range(7)]
+    assert waits[:2] == [0.0, 0.0]
+    assert time.monotonic() - started >= 5 / 50 * 0.9
+
+
+def test_rate_limiters_do_not_name_the_api_key(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with ExchangeSimulator(SimulatorConfig()) as simulator:
+        accounts = [Account(name, 'ftx', 'shared_secret_key', 'secret', subaccount=name, host_url=simulator.url('ftx'))
+                    for name in ('main', 'bot')]
+        with Accounts('accounts', accounts) as portfolio:
+            limiters = [portfolio.client(account).rate_limiter for account in accounts]
+    # subaccounts of an API key share its limiter
+    assert limiters[0] is limiters[1] and 'shared_secret_key' not in limiters[0].name
@@ -0,0 +1,82 @@
+import random
+
+from wired_exchange.alerts import AlertEngine
+from wired_exchange.storage import WiredStorage
+
+
+def test_level_alerts_fire_once():
+    engine = AlertEngine()
+    above = engine.add_alert('BTC-USDT', 'above', 105)
+    below = engine.add_alert('BTC-USDT', 'below', 95)
+    removed = engine.add_alert('BTC-USDT', 'above', 102)
+    assert engine.remove_alert(removed)
+    for price in [100, 104, 106, 104, 107, 94]:
+        engine.on_price('BTC-USDT', price)
+    assert [(a.id, a.price) for a in engine.fired] == [(above, 106), (below, 94)]
+    assert len(engine.get_alerts()) == 0
+
+
+def test_trailing_alerts_follow_best_price():
+    engine = AlertEngine()
+    engine.on_price('ETH-USDT', 100)
+    down = engine.add_alert('ETH-USDT', 'trailing_down', 10)
+    up = engine.add_alert('ETH-USDT', 'trailing_up', 10)
+    engine.on_price('ETH-USDT', 95)
+    # added later, from a lower best price
+    late_down = engine.add_alert('ETH-USDT', 'trailing_down', 5)
+    for price in [92, 110, 104, 98]:
+        engine.on_price('ETH-USDT', price)
+    # 110 is 19.6% above 92, 104 is 5.5% below 110 and 98 is 10.9% below 110
+    assert [(a.id, a.price) for a in engine.fired] == [(up, 110), (late_down, 104), (down, 98)]
+
+
+def test_fired_alerts_are_saved(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    engine = AlertEngine('alerts')
+    engine.add_alert('SOL-USDT', 'below', 20)
+    engine.handle('{"type":"message","topic":"/market/ticker:SOL-USDT","subject":"trade.ticker",'
+                  '"data":{"price":"21","time":1700000000000}}')
+    engine.handle('{"type":"message","topic":"/market/ticker:SOL-USDT","subject":"trade.ticker",'
+                  '"data":{"price":"19.5","time":1700000001000}}')
+    engine.close()
+    # alert ids of a later run are not those already saved
+    engine = AlertEngine('alerts')
+    engine.add_alert('SOL-USDT', 'above', 20)
+    for price in [19, 21]:
+        engine.on_price('SOL-USDT', price)
+    engine.close()
+    alerts = WiredStorage('alerts').read_alerts()
+    assert alerts['id'].nunique() == 2
+    alerts = alerts.iloc[:1]
+    assert alerts[['symbol', 'kind', 'level', 'price']].values.tolist() == [['SOL-USDT', 'below', 20.0, 19.5]]
+    assert alerts['time'].iloc[0].timestamp() == 1700000001
+
+
+def test_trailing_alerts_fire_as_when_checked_one_by_one():
+    random.seed(7)
+    engine = AlertEngine()
+    levels, best, removed = {}, {}, set()
+    price = 100.0
+    for tick in range(300):
+        if tick % 3 == 0:
+            kind = random.choice(['trailing_down', 'trailing_up'])
+            alert_id = engine.add_alert('BTC-USDT', kind, random.choice([1, 2, 3, 5]))
+            levels[alert_id] = engine.get_alerts().at[alert_id, 'level'], kind
+            best[alert_id] = price
+        if tick % 7 == 0 and len(levels) > 0:
+            alert_id = random.choice(sorted(levels))
+            assert engine.remove_alert(alert_id)
+            removed.add(alert_id)
+            del levels[alert_id]
+        price = round(price * random.uniform(0.98, 1.02), 2)
+        fired = {a.id for a in engine.on_price('BTC-USDT', price)}
+        expected = set()
+        for alert_id, (percent, kind) in levels.items():
+            best[alert_id] = min(best[alert_id], price) if kind == 'trailing_up' else max(best[alert_id], price)
+            moved = price / best[alert_id] - 1 if kind == 'trailing_up' else 1 - price / best[alert_id]
+            if moved * 100 >= percent:
+                expected.add(alert_id)
+        assert fired == expected
+        for alert_id in fired:
+            del levels[alert_id]
+    assert len(engine.fired) > 0 and not removed & {a.id for a in engine.fired}
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from wired_exchange.backtest import backtest, hold_between, TRADE_COLUMNS
+
+
+def _klines(closes: list, opens: list = None) -> pd.DataFrame:
+    return pd.DataFrame(dict(open=opens if opens is not None else closes, close=closes),
+                        index=pd.date_range('2022-01-01', periods=len(closes), freq='H', tz='UTC'), dtype='float64')
+
+
+def test_long_trade_is_filled_at_the_next_open():
+    result = backtest(_klines([100, 110, 120, 130], opens=[100, 100, 110, 120]), np.array([1, 1, 0, 0]),
+                      fee_rate=0)
+    trade = result.trades.iloc[0]
+    assert (trade['side'], trade['entry_price'], trade['exit_price'], trade['is_open']) == ('long', 100, 120, False)
+    assert result.equity.tolist() == pytest.approx([1000, 1100, 1200, 1200])
+    assert result.stats['total_return'] == pytest.approx(0.2) and result.stats['win_rate'] == 1.0
+
+
+def test_short_trade_gains_what_the_price_loses():
+    result = backtest(_klines([100, 90, 80]), np.array([-1, -1, 0]), fee_rate=0, fill='close')
+    assert result.trades['side'].tolist() == ['short']
+    assert result.equity.tolist() == pytest.approx([1000, 1100, 1200])
+
+
+def test_reversal_closes_the_long_and_opens_a_short():
+    result = backtest(_klines([100, 110, 99]), np.array([1, -1, 0]), fee_rate=0, fill='close')
+    assert result.trades['side'].tolist() == ['long', 'short']
+    assert result.trades['exit_time'].iloc[0] == result.trades['entry_time'].iloc[1]
+    assert result.trades['return'].tolist() == pytest.approx([0.1, 0.1])
+    assert result.stats['total_return'] == pytest.approx(0.21) and result.stats['trade_count'] == 2
+
+
+def test_fees_are_charged_on_entry_and_exit_notional():
+    result = backtest(_klines([100, 110, 110]), np.array([1, 0, 0]), fee_rate=0.01, fill='close')
+    trade = result.trades.iloc[0]
+    # 1% of 1000 on entry, 1% of 990 x 1.1 on exit
+    assert trade['fee'] == pytest.approx(10 + 10.89) and trade['size'] == pytest.approx(9.9)
+    assert trade['pnl'] == pytest.approx(1000 * (0.99 * 1.1 * 0.99 - 1))
+    # an open trade is valued at the last close without exit fee
+    result = backtest(_klines([100, 100, 120]), np.array([0, 1, 1]), fee_rate=0.01, fill='close')
+    assert result.trades['is_open'].tolist() == [True] and result.stats['fees'] == pytest.approx(10)
+    assert result.equity.iloc[-1] == pytest.approx(990 * 1.2) and np.isnan(result.stats['win_rate'])
+
+
+def test_empty_klines_give_an_empty_result():
+    result = backtest(_klines([]), lambda klines: hold_between(klines['close'] > 0, klines['close'] < 0))
+    assert len(result.equity) == 0 and list(result.trades.columns) == TRADE_COLUMNS and len(result.trades) == 0
+    assert result.stats['total_return'] == 0.0 and result.stats['trade_count'] == 0
@@ -0,0 +1,61 @@
+import asyncio
+
+import httpx
+
+from wired_exchange.coingecko import CoinGeckoClient, CoinGeckoReference, MARKETS_BATCH_SIZE
+from wired_exchange.storage import WiredStorage
+
+COINS = [{'id': f'coin-{i}', 'symbol': f'c{i}', 'name': f'Coin {i}'} for i in range(600)]
+COINS += [{'id': 'bitcoin', 'symbol': 'btc', 'name': 'Bitcoin'},
+          {'id': 'bitcoin-wrapped-clone', 'symbol': 'btc', 'name': 'Bitcoin clone'}]
+
+
+def _coingecko(coins: list[dict], calls: list[str]) -> CoinGeckoReference:
+    def handle(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        if request.url.path.endswith('/coins/list'):
+            return httpx.Response(200, json=coins)
+        if request.url.path.endswith('/exchanges/list'):
+            return httpx.Response(200, json=[{'id': 'kucoin', 'name': 'KuCoin'}, {'id': 'ftx_spot', 'name': 'FTX'}])
+        ids = request.url.params['ids'].split(',')
+        assert len(ids) <= MARKETS_BATCH_SIZE
+        by_id = {c['id']: c for c in coins}
+        return httpx.Response(200, json=[dict(by_id[i], current_price=1.0, last_updated='2022-01-01T00:00:00.000Z',
+                                              market_cap=1e9 if i == 'bitcoin' else 1e3) for i in ids])
+
+    client = CoinGeckoClient('https://api.coingecko.com/api/v3')
+    client.transport = httpx.MockTransport(handle)
+    client.rate_limiter = None
+    return CoinGeckoReference(WiredStorage('test'), client)
+
+
+async def _sync(coins: list[dict], calls: list[str]):
+    async with _coingecko(coins, calls) as reference:
+        return await reference.sync_async()
+
+
+def test_reference_data_sync_only_writes_changes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert asyncio.run(_sync(COINS, [])) == {'COINS': (602, 0), 'EXCHANGES': (2, 0)}
+    renamed = [dict(c, name='Coin one') if c['id'] == 'coin-1' else c for c in COINS[1:]]
+    assert asyncio.run(_sync(renamed + [COINS[0] | {'id': 'coin-new'}], [])) == {'COINS': (2, 1),
+                                                                                   'EXCHANGES': (0, 0)}
+    with WiredStorage('test') as db:
+        coins = db.read_reference_data('COINS')
+    assert len(coins) == 602 and 'coin-0' not in coins.index and coins.at['coin-1', 'name'] == 'Coin one'
+    assert coins.at['coin-new', 'symbol'] == 'c0'
+
+
+def test_market_data_is_batched(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    async def load():
+        async with _coingecko(COINS, calls) as reference:
+            await reference.sync_coins_async()
+            return await reference.get_markets_async([c['symbol'].upper() for c in COINS] + ['UNKNOWN'])
+
+    calls = []
+    markets = asyncio.run(load())
+    assert calls.count('/api/v3/coins/markets') == 3
+    assert len(markets) == 601 and markets.at['BTC', 'id'] == 'bitcoin'
+    assert str(markets['last_updated'].dtype) == 'datetime64[ns, UTC]'
@@ -0,0 +1,80 @@
+import pandas as pd
+import pytest
+
+from wired_exchange.bitpandapro import BitPandaProClient
+from wired_exchange.core import to_klines, to_transactions
+from wired_exchange.ftx import FTXClient
+from wired_exchange.kucoin import KucoinSpotClient
+from wired_exchange.tests import payloads
+from wired_exchange.tests.benchmark import bench_sizes, measure, regressions, results
+
+SIZES = bench_sizes()
+
+
+def _check(result):
+    assert len(result) > 0
+    issues = regressions(results[-1])
+    assert len(issues) == 0, '\n'.join(issues)
+
+
+def _open(client, routes: dict = None):
+    client.transport = payloads.mock_transport(routes if routes is not None else {})
+    return client.open()
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_kucoin_to_transactions(size):
+    fills = pd.DataFrame(payloads.kucoin_fills(size))
+    with _open(KucoinSpotClient('key', 'pass', 'secret')) as kucoin:
+        _check(measure('KucoinSpotClient._to_transactions', size, kucoin._to_transactions, fills))
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_kucoin_get_transactions(size):
+    routes = {'/v1/fills': payloads.kucoin_pages(payloads.kucoin_fills(size))}
+    with _open(KucoinSpotClient('key', 'pass', 'secret'), routes) as kucoin:
+        start_time = pd.Timestamp(payloads.START_TIME_MS, unit='ms', tz='UTC').to_pydatetime()
+        end_time = start_time + pd.Timedelta(days=1).to_pytimedelta()
+        _check(measure('KucoinSpotClient.get_transactions', size, kucoin.get_transactions,
+                       start_time, end_time))
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_kucoin_convert_to_ticker(size):
+    routes = {'/v1/market/allTickers': payloads.kucoin_all_tickers(size)}
+    with _open(KucoinSpotClient('key', 'pass', 'secret'), routes) as kucoin:
+        _check(measure('KucoinSpotClient.get_all_tickers', size, kucoin.get_all_tickers))
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_kucoin_to_orders(size):
+    orders = pd.DataFrame(payloads.kucoin_orders(size))
+    with _open(KucoinSpotClient('key', 'pass', 'secret')) as kucoin:
+        _check(measure('KucoinSpotClient._to_orders', size, kucoin._to_orders, orders))
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_ftx_to_balances(size):
+    routes = {'/markets': payloads.ftx_markets(size)}
+    balances = payloads.ftx_balances(size)
+    with _open(FTXClient('key', 'secret'), routes) as ftx:
+        _check(measure('FTXClient._to_balances', size, ftx._to_balances, balances))
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_bitpanda_to_response_dataframe(size):
+    trades = payloads.bitpanda_trades(size)
+    with _open(BitPandaProClient('secret')) as bp:
+        _check(measure('BitPandaProClient.to_response_dataframe', size, bp.to_response_dataframe, trades))
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_to_klines(size):
+    candles = payloads.klines(size)
+    _check(measure('core.to_klines', size, to_klines, candles, 'BTC', 'USDT'))
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_to_transactions(size):
+    tr = payloads.transactions(size)
+    _check(measure('core.to_transactions', size, to_transactions, tr))
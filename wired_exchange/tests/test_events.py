@@ -0,0 +1,70 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from wired_exchange.alerts import AlertEngine
+from wired_exchange.backtest import rsi
+from wired_exchange.events import EventBus, IndicatorCross, PriceChange, PriceCross, TickerFeed
+from wired_exchange.quotes import ConsolidatedQuotes, KucoinQuoteFeed
+
+SECOND = 1_000_000_000
+
+
+def test_price_crossings():
+    bus = EventBus()
+    events = []
+    above = bus.subscribe(PriceCross('BTC-USDT', 105), events.append)
+    below = bus.subscribe(PriceCross('BTC-USDT', 95, 'below'), events.append)
+    bus.subscribe(PriceCross('ETH-USDT', 101), events.append)
+    for price in [100, 104, 106, 107, 103, 106, 94]:
+        bus.publish('BTC-USDT', price)
+    assert [e.subscription for e in events] == [above, above, below]
+    assert bus.unsubscribe(above)
+    assert not bus.unsubscribe(above)
+    bus.publish('BTC-USDT', 110)
+    assert len(events) == 3
+
+
+def test_price_change_over_window_for_any_symbol():
+    bus = EventBus()
+    events = []
+    bus.subscribe(PriceChange(None, 5, 60, 'down'), events.append)
+    for second, price in [(0, 100), (60, 97), (90, 94), (120, 93), (200, 93)]:
+        bus.publish('SOL-USDT', price, second * SECOND)
+    # 94 is down 6% from the last price 60 seconds before
+    assert [(e.symbol, e.time // SECOND) for e in events] == [('SOL-USDT', 90)]
+    assert events[0].value == (94 / 100 - 1) * 100
+
+
+def test_indicator_crossings_match_backtest_rsi():
+    prices = 100 * np.exp(np.cumsum(np.random.default_rng(1).normal(0, 0.01, 2000)))
+    bus = EventBus()
+    events = []
+    bus.subscribe(IndicatorCross('ETH-USDT', 'rsi', 14, 30, 'below'), events.append)
+    for i, price in enumerate(prices):
+        bus.publish('ETH-USDT', price, i * SECOND)
+    values = rsi(pd.Series(prices)).to_numpy()
+    expected = [i for i in range(1, len(prices)) if values[i - 1] >= 30 > values[i]]
+    assert len(expected) > 0
+    assert [e.time // SECOND for e in events] == expected
+
+
+def test_ticker_strategies_take_the_symbol_of_all_tickers_from_the_subject():
+    def ticker(topic: str, subject: str, price: float) -> str:
+        return json.dumps(dict(type='message', topic=topic, subject=subject, data=dict(
+            price=str(price), bestBid=str(price), bestBidSize='1', bestAsk=str(price + 1), bestAskSize='1',
+            time=1_700_000_000_000)), separators=(',', ':'))
+
+    bus, quotes, engine = EventBus(), ConsolidatedQuotes(), AlertEngine()
+    events = []
+    bus.subscribe(PriceCross('ETH-USDT', 105), events.append)
+    engine.add_alert('ETH-USDT', 'above', 105)
+    strategies = [TickerFeed(bus, ['ETH']), KucoinQuoteFeed(quotes), engine]
+    assert strategies[0].tickers == [('ETH', 'USDT')] and strategies[1].tickers is None
+    for message in [ticker('/market/ticker:ETH-USDT', 'trade.ticker', 100),
+                    ticker('/market/ticker:all', 'ETH-USDT', 110)]:
+        for strategy in strategies:
+            assert strategy.can_handle(message) and strategy.handle(message)
+    assert [e.symbol for e in events] == ['ETH-USDT'] and [a.symbol for a in engine.fired] == ['ETH-USDT']
+    assert list(quotes.get_book()['symbol']) == ['ETH-USDT']
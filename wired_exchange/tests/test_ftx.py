@@ -0,0 +1,58 @@
+from collections import Counter
+from decimal import Decimal
+
+import httpx
+import pandas as pd
+
+from wired_exchange.ftx import FTXClient
+from wired_exchange.tests import payloads
+
+PAGE_SIZE = 100
+
+
+def _fills_route(fills: list):
+    """FTX fills, most recent first, up to the inclusive end_time in fractional seconds"""
+    times = pd.to_datetime([f['time'] for f in fills]).astype('int64')
+
+    def handle(request: httpx.Request):
+        end_time = request.url.params.get('end_time')
+        kept = [f for f, t in zip(fills, times) if end_time is None or t <= Decimal(end_time) * 10 ** 9]
+        kept.sort(key=lambda f: f['time'], reverse=True)
+        return payloads.json_response(dict(success=True, result=kept[:PAGE_SIZE], hasMoreData=len(kept) > PAGE_SIZE))
+
+    return handle
+
+
+def test_pages_of_a_same_second_are_not_truncated():
+    # 250 fills within one second, 3 by millisecond
+    fills = payloads.ftx_fills(250)
+    for i, fill in enumerate(fills):
+        fill['time'] = pd.Timestamp(payloads.START_TIME_MS + i // 3, unit='ms', tz='UTC').isoformat()
+    ftx = FTXClient('key', 'secret')
+    ftx.transport = payloads.mock_transport({'/fills': _fills_route(fills)})
+    with ftx.open():
+        ids = [f['id'] for page in ftx._iter_pages('/fills', {}, 'time') for f in page]
+    assert sorted(ids) == list(range(250))
+
+
+def test_usd_prices_are_fetched_once_per_import():
+    calls = Counter()
+
+    def candles(request: httpx.Request):
+        calls[request.url.path.split('/')[-3]] += 1
+        start, end = int(request.url.params['start_time']), int(request.url.params['end_time'])
+        return payloads.json_response(dict(success=True, result=[
+            dict(time=t * 1000, open=2.0, high=2.0, low=2.0, close=2.0, volume=1.0)
+            for t in range(start - start % 3600, end, 3600)]))
+
+    start_time = pd.Timestamp(payloads.START_TIME_MS, unit='ms', tz='UTC')
+    ftx = FTXClient('key', 'secret')
+    ftx.transport = payloads.mock_transport({'/candles': candles})
+    with ftx.open():
+        # pages of an import go backward in time
+        for day in range(5, 0, -1):
+            batch = pd.DataFrame(dict(time=pd.date_range(start_time + pd.Timedelta(days=day), periods=10, freq='H'),
+                                      quote_currency='USDT', fee_currency=['KCS', 'USDT'] * 5))
+            enriched, _ = ftx.enrich_usd_prices(batch, start_time)
+            assert (enriched['price_usd'] == 2.0).all() and (enriched['fee_usd'] == 2.0).all()
+    assert calls == {'USDT': 1, 'KCS': 1}
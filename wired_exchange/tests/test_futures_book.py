@@ -0,0 +1,61 @@
+import asyncio
+import json
+import time
+
+from wired_exchange.kucoin import KucoinFuturesClient
+from wired_exchange.kucoin.FuturesBook import KucoinFuturesBook, INSTRUMENT_TOPIC, POSITION_TOPIC
+from wired_exchange.kucoin.WebSocket import WebSocketNotification
+from wired_exchange.tests.simulator import ExchangeSimulator, SimulatorConfig
+
+SYMBOL = 'C0USDTM'
+
+
+def _message(topic: str, subject: str, **data) -> str:
+    return json.dumps(dict(type='message', topic=f'{topic}:{SYMBOL}', subject=subject, data=data),
+                      separators=(',', ':'))
+
+
+def test_mark_price_changes_keep_the_position():
+    with ExchangeSimulator(SimulatorConfig(tickers=1)) as simulator:
+        with KucoinFuturesClient('key', 'pass', 'secret', simulator.url('kucoin_futures')) as kucoin:
+            book = KucoinFuturesBook([SYMBOL])
+            book.seed(kucoin)
+    now_ms = int(time.time() * 1000)
+    book.handle(_message(INSTRUMENT_TOPIC, 'mark.index.price', markPrice=110.0, timestamp=now_ms + 2000))
+    book.handle(_message(POSITION_TOPIC, 'position.change', markPrice=105.0, posMargin=6.0,
+                         changeReason='markPriceChange', currentTimestamp=now_ms + 1000))
+    position = book.get_positions().iloc[0]
+    # the older position change neither drops the quantity nor rolls the mark price back
+    assert position['currentQty'] == 10 and position['avgEntryPrice'] == 100
+    assert position['markPrice'] == 110 and position['posMargin'] == 6 and position['unrealisedPnl'] == 1.0
+    book.handle(_message(POSITION_TOPIC, 'position.change', currentQty=20, avgEntryPrice=105.0,
+                         liquidationPrice=60.0, changeReason='positionChange', currentTimestamp=now_ms + 1500))
+    position = book.get_positions().iloc[0]
+    assert position['currentQty'] == 20 and position['markPrice'] == 110 and position['unrealisedPnl'] == 1.0
+
+
+def test_book_is_seeded_again_once_reconnected():
+    async def stream(simulator: ExchangeSimulator) -> list[bool]:
+        book = KucoinFuturesBook([SYMBOL])
+        with KucoinFuturesClient('key', 'pass', 'secret', simulator.url('kucoin_futures')) as kucoin:
+            await kucoin.register_futures_book_async(book)
+            await asyncio.sleep(0.2)
+            live = [book.is_live()]
+            book.on_notification(WebSocketNotification.CONNECTION_LOST)
+            live.append(book.is_live())
+            await asyncio.to_thread(simulator.drop_connections)
+            for _ in range(50):
+                if book.is_live():
+                    break
+                await asyncio.sleep(0.1)
+            live.append(book.is_live())
+            await asyncio.sleep(0.2)
+            kucoin.stop_reading()
+        # position changes streamed since then only moved the mark price
+        live.append(book.get_positions()['currentQty'].tolist() == [10])
+        return live
+
+    with ExchangeSimulator(SimulatorConfig(tickers=1, message_rate=50)) as simulator:
+        assert asyncio.run(stream(simulator)) == [True, False, True, True]
+        assert simulator.connections == 2
+        assert simulator.requests[('kucoin_futures', '/v1/positions')] == 2
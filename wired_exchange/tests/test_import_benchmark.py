@@ -0,0 +1,37 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from wired_exchange.tests.benchmark import record, regressions
+
+# cold start budget of a bare package import, in seconds
+IMPORT_TIME_BUDGET = 0.05
+HEAVY_MODULES = ['pandas', 'numpy', 'httpx', 'sqlalchemy', 'websockets', 'pytomlpp']
+
+PROBE = """
+import json, sys, time, tracemalloc
+tracemalloc.start()
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+_, peak = tracemalloc.get_traced_memory()
+print(json.dumps(dict(elapsed=elapsed, peak=peak, modules=[m for m in {heavy} if m in sys.modules])))
+"""
+
+
+def _cold_import(module: str) -> dict:
+    output = subprocess.run([sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+
+@pytest.mark.parametrize('module', ['wired_exchange', 'wired_exchange.core'])
+def test_cold_import(module):
+    probe = _cold_import(module)
+    measured = record(f'import {module}', 1, probe['elapsed'], probe['peak'])
+    assert probe['modules'] == [], f'{module} eagerly imports {probe["modules"]}'
+    assert probe['elapsed'] < IMPORT_TIME_BUDGET, f'{module} import takes {probe["elapsed"]:.3f}s'
+    issues = regressions(measured)
+    assert len(issues) == 0, '\n'.join(issues)
@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+
+from wired_exchange.lots import LotBook
+
+
+def _transactions(rows: list) -> pd.DataFrame:
+    transactions = pd.DataFrame(rows, columns=['type', 'side', 'base_currency', 'quote_currency', 'price', 'size',
+                                               'fee', 'fee_currency'])
+    transactions['price_usd'] = 1.0
+    transactions['fee_usd'] = 1.0
+    transactions['time'] = pd.to_datetime(range(len(rows)), unit='s', utc=True)
+    return transactions
+
+
+TRADES = _transactions([('limit', 'buy', 'BTC', 'USDT', 100, 1, 1, 'USDT'),
+                        ('limit', 'buy', 'BTC', 'USDT', 200, 1, 0, 'USDT'),
+                        ('limit', 'sell', 'BTC', 'USDT', 300, 1, 2, 'USDT')])
+
+
+@pytest.mark.parametrize('method, realized, cost', [('fifo', 197, 200), ('lifo', 98, 101), ('average', 147.5, 150.5)])
+def test_realized_pnl(method, realized, cost):
+    book = LotBook(method)
+    book.process(TRADES)
+    pnl = book.get_pnl(pd.Series(dict(BTC=400.0)))
+    assert pnl.loc['BTC', 'realized_pnl_usd'] == pytest.approx(realized)
+    assert pnl.loc['BTC', 'cost_usd'] == pytest.approx(cost)
+    assert pnl.loc['BTC', 'unrealized_pnl_usd'] == pytest.approx(400 - cost)
+    assert pnl.loc['BTC', 'fees_usd'] == pytest.approx(3)
+
+
+def test_transfers_keep_cost_and_resume_from_frames():
+    transactions = _transactions([('limit', 'buy', 'ETH', 'BTC', 0.1, 2, 0, 'BTC'),
+                                  ('withdrawal', None, 'ETH', None, None, 2, None, None),
+                                  ('deposit', None, 'ETH', None, None, 3, None, None),
+                                  ('limit', 'sell', 'ETH', 'USDT', 5, 3, 0, 'USDT')])
+    book = LotBook()
+    book.process(transactions.iloc[:2])
+    book = LotBook.from_frames('fifo', **book.to_frames())
+    assert book.covers(transactions)
+    assert book.process(transactions) == 2
+    # only the 2 transferred ETH have a known cost of 0.1 BTC priced 1 USD
+    assert book.realized['ETH'] == pytest.approx(10 - 0.2)
+    assert book.get_lots().empty
+
+
+def test_quote_fee_of_a_crypto_quoted_pair_is_counted_once():
+    transactions = _transactions([('limit', 'buy', 'BTC', 'USDT', 20000, 1, 0, 'USDT'),
+                                  ('limit', 'buy', 'ETH', 'BTC', 0.05, 1, 0.001, 'BTC'),
+                                  ('limit', 'sell', 'ETH', 'BTC', 0.05, 1, 0.001, 'BTC')])
+    transactions.loc[1:, ['price_usd', 'fee_usd']] = 20000.0
+    book = LotBook()
+    book.process(transactions)
+    pnl = book.get_pnl()
+    # both fees are 20 USD, the BTC disposed of and acquired back at market value realize nothing
+    assert pnl.loc['ETH', 'fees_usd'] == pytest.approx(40)
+    assert pnl['realized_pnl_usd'].sum() == pytest.approx(-40)
+    assert pnl.loc['BTC', 'realized_pnl_usd'] == pytest.approx(0)
+    assert pnl.loc['BTC', 'cost_usd'] == pytest.approx(0.998 * 20000)
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import threading
+import time
+
+from wired_exchange.core.ServerClock import ServerClock
+from wired_exchange.kucoin import KucoinSpotClient
+from wired_exchange.kucoin.AccountBook import KucoinAccountBook, ORDERS_TOPIC
+from wired_exchange.kucoin.OrderGateway import KucoinOrderGateway, OrderRequest
+from wired_exchange.tests.simulator import ExchangeSimulator, SimulatorConfig
+
+EXIT_PATHS = ['/v3/oco/order', '/v1/orders', '/v1/stop-order']
+
+
+def _filled(order: OrderRequest) -> str:
+    ts = time.time_ns()
+    return json.dumps(dict(type='message', topic=ORDERS_TOPIC, subject='orderChange', data=dict(
+        orderId=order.client_oid[:24], clientOid=order.client_oid, symbol=order.symbol, orderType='limit',
+        side=order.side, type='filled', price=str(order.price), size=str(order.size), filledSize=str(order.size),
+        remainSize='0', orderTime=ts, ts=ts)), separators=(',', ':'))
+
+
+def _exit_requests(simulator: ExchangeSimulator, seeded: list[int] = None) -> list[int]:
+    """requests of exit paths, GET requests of the book seed excluded"""
+    return [simulator.requests[('kucoin', path)] - (seeded[i] if seeded is not None else 0)
+            for i, path in enumerate(EXIT_PATHS)]
+
+
+def test_orders_of_a_symbol_are_placed_in_batches():
+    async def place(simulator: ExchangeSimulator):
+        with KucoinSpotClient('key', 'pass', 'secret', host_url=simulator.url('kucoin')) as kucoin:
+            async with KucoinOrderGateway(kucoin) as gateway:
+                return await gateway.place_orders_async([OrderRequest(f'C{i % 2}-USDT', 'buy', 1.5, 2)
+                                                         for i in range(12)])
+
+    with ExchangeSimulator(SimulatorConfig(tickers=2)) as simulator:
+        results = asyncio.run(place(simulator))
+        # 6 orders of each symbol, 5 by request
+        assert simulator.requests[('kucoin', '/v1/orders/multi')] == 4
+    assert len(results) == 12 and all(r.success for r in results)
+
+
+def test_stale_server_clock_is_synchronized_off_the_event_loop():
+    sync_threads = []
+
+    def fetch_server_time() -> int:
+        sync_threads.append(threading.current_thread())
+        return int(time.time() * 1000)
+
+    async def place(simulator: ExchangeSimulator):
+        with KucoinSpotClient('key', 'pass', 'secret', host_url=simulator.url('kucoin')) as kucoin:
+            kucoin._authenticator.clock = ServerClock(fetch_server_time)
+            async with KucoinOrderGateway(kucoin, max_concurrency=1) as gateway:
+                kucoin._authenticator.clock.invalidate()
+                return await gateway.place_orders_async([OrderRequest(f'C{i}-USDT', 'buy', 1.5, 2)
+                                                         for i in range(3)])
+
+    with ExchangeSimulator(SimulatorConfig(tickers=3)) as simulator:
+        results = asyncio.run(place(simulator))
+    assert all(r.success for r in results)
+    assert len(sync_threads) == 2 and threading.main_thread() not in sync_threads
+
+
+def test_exit_order_type_follows_the_legs_set():
+    async def trade(simulator: ExchangeSimulator):
+        book = KucoinAccountBook()
+        with KucoinSpotClient('key', 'pass', 'secret', host_url=simulator.url('kucoin')) as kucoin:
+            await asyncio.to_thread(book.seed, kucoin)
+            seeded = _exit_requests(simulator)
+            async with KucoinOrderGateway(kucoin, book) as gateway:
+                requests = []
+                for i, (take_profit, stop_loss) in enumerate([(10, 5), (10, None), (None, 5)]):
+                    order = OrderRequest('C0-USDT', 'buy', 100, 1, take_profit_pct=take_profit,
+                                         stop_loss_pct=stop_loss, client_oid=f'entry-{i}')
+                    await gateway.place_order_async(order)
+                    book.handle(_filled(order))
+                    await asyncio.sleep(0.2)
+                    requests.append(_exit_requests(simulator, seeded))
+                return requests, gateway.get_orders()
+
+    with ExchangeSimulator(SimulatorConfig(tickers=1, pages=1, page_size=10)) as simulator:
+        requests, orders = asyncio.run(trade(simulator))
+    assert requests == [[1, 0, 0], [1, 1, 0], [1, 1, 1]]
+    exits = orders[orders['role'] == 'exit']
+    assert list(exits['status']) == ['NEW'] * 3 and list(exits['side']) == ['sell'] * 3
+    assert list(exits['price']) == ['110', '110', '95']
+
+
+def test_exit_of_an_order_filled_while_closed_is_placed_once_reopened():
+    book = KucoinAccountBook()
+    order = OrderRequest('C0-USDT', 'sell', 100, 1, stop_loss_pct=5, client_oid='short-entry')
+
+    async def place(gateway: KucoinOrderGateway):
+        async with gateway:
+            await gateway.place_order_async(order)
+
+    async def reopen(gateway: KucoinOrderGateway):
+        async with gateway:
+            await asyncio.sleep(0.2)
+
+    with ExchangeSimulator(SimulatorConfig(tickers=1, pages=1, page_size=10)) as simulator:
+        with KucoinSpotClient('key', 'pass', 'secret', host_url=simulator.url('kucoin')) as kucoin:
+            book.seed(kucoin)
+            seeded = _exit_requests(simulator)
+            gateway = KucoinOrderGateway(kucoin, book)
+            asyncio.run(place(gateway))
+            book.handle(_filled(order))
+            assert _exit_requests(simulator, seeded) == [0, 0, 0]
+            asyncio.run(reopen(gateway))
+        assert _exit_requests(simulator, seeded) == [0, 0, 1]
+    exit_order = gateway.get_orders().iloc[-1]
+    assert exit_order['side'] == 'buy' and exit_order['price'] == '105' and exit_order['status'] == 'NEW'
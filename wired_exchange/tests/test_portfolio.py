@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from wired_exchange.ftx import FTXClient
+from wired_exchange.portfolio import Portfolio, _enrich_prices
+from wired_exchange.storage import WiredStorage
+from wired_exchange.tests.benchmark import bench_sizes, measure, regressions, results
+
+USDT_USD = 0.5
+T0 = pd.Timestamp('2020-01-01', tz='UTC')
+HOUR = 3600
+
+
+def _store_history(days: int, bases: list[str]):
+    """1000 USDT deposited at T0, 2 BTC bought at 100 USDT a day later, hourly closes of bases in USDT and KCS"""
+    transactions = pd.DataFrame([
+        dict(id='d1', base_currency='USDT', type='deposit', size=1000.0, fee=0.0, time=T0, platform='kucoin'),
+        dict(id='t1', base_currency='BTC', quote_currency='USDT', type='trade', side='buy', price=100.0, size=2.0,
+             fee=0.5, fee_currency='USDT', time=T0 + pd.Timedelta(days=1), platform='kucoin')]).set_index('id')
+    times = pd.date_range(T0, periods=days * 24, freq='H', name='time')
+    with WiredStorage('test') as db:
+        db.save_transactions(transactions)
+        for base in bases:
+            for quote, close in [('USDT', np.linspace(100, 200, len(times))), ('KCS', 5.0)]:
+                db.save_candles('kucoin', HOUR, pd.DataFrame(dict(
+                    base_currency=base, quote_currency=quote, open=close, high=close, low=close, close=close,
+                    volume=1.0), index=times))
+
+
+def test_missing_prices_are_completed_from_ftx_rates(monkeypatch):
+    def get_live_rate(ftx, base_currency: str, quote_currency: str) -> float:
+        rates = {('USDT', 'USD'): USDT_USD, ('SOL', 'USDT'): 100.0}
+        if (base_currency, quote_currency) not in rates:
+            raise Exception(f'no {base_currency}/{quote_currency} market')
+        return rates[(base_currency, quote_currency)]
+
+    monkeypatch.setattr(FTXClient, 'get_live_rate', get_live_rate)
+    positions = pd.DataFrame(dict(price=[np.nan, 2000.0, np.nan, np.nan, np.nan],
+                                  price_usd=[30000.0, np.nan, np.nan, np.nan, np.nan],
+                                  platform=['ftx', 'kucoin', 'kucoin', 'ftx', 'kucoin']),
+                             index=pd.Index(['BTC', 'ETH', 'USDT', 'XYZ', 'SOL'], name='currency'))
+    enriched = _enrich_prices(positions)
+    assert enriched['price'].tolist()[:3] == [60000.0, 2000.0, 1.0] and enriched.at['SOL', 'price'] == 100.0
+    assert enriched['price_usd'].tolist()[:3] == [30000.0, 1000.0, 0.5] and enriched.at['SOL', 'price_usd'] == 50.0
+    # a currency without market keeps its missing prices
+    assert np.isnan(enriched.at['XYZ', 'price']) and np.isnan(enriched.at['XYZ', 'price_usd'])
+    assert positions['price'].isna().sum() == 4
+
+
+def test_valuation_history_values_holdings_with_closes_in_quote_currency(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _store_history(10, ['BTC', 'ETH'])
+    history = Portfolio('test').valuation_history(T0, T0 + pd.Timedelta(days=5), resolution=HOUR)
+    assert list(history.holdings.columns) == ['BTC', 'USDT'] and len(history.total) == 6
+    assert history.holdings['BTC'].tolist() == [0, 2, 2, 2, 2, 2]
+    # a candle closing at midnight is the one opened an hour before
+    btc = np.linspace(100, 200, 240)[[24 * day - 1 for day in range(1, 6)]]
+    assert np.isnan(history.prices.at[T0, 'BTC']) and history.prices['BTC'].iloc[1:].tolist() == pytest.approx(btc)
+    assert history.total.tolist() == pytest.approx([1000] + list(799.5 + 2 * btc))
+
+
+@pytest.mark.parametrize('start, freq', [(T0 + pd.Timedelta(days=1), '2D'), (T0, '7H')])
+def test_valuation_times_not_aligned_on_their_step_are_valued(start, freq, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _store_history(10, ['BTC'])
+    history = Portfolio('test').valuation_history(start, T0 + pd.Timedelta(days=7), freq=freq, resolution=HOUR)
+    hours = ((history.prices.index - T0) // pd.Timedelta(hours=1)).to_numpy()
+    btc = np.linspace(100, 200, 240)[hours[hours > 0] - 1]
+    assert history.prices['BTC'][hours > 0].tolist() == pytest.approx(btc)
+
+
+@pytest.mark.parametrize('size', bench_sizes())
+def test_hourly_valuation_history(size, tmp_path, monkeypatch):
+    """hourly curve over size days"""
+    monkeypatch.chdir(tmp_path)
+    _store_history(size, ['BTC', 'ETH', 'SOL', 'ADA', 'XRP'])
+    portfolio = Portfolio('test')
+    history = measure('Portfolio.valuation_history', size, portfolio.valuation_history, T0,
+                      T0 + pd.Timedelta(days=size - 1), freq='H', resolution=HOUR)
+    assert len(history.total) == (size - 1) * 24 + 1 and history.total.notna().all()
+    issues = regressions(results[-1])
+    assert len(issues) == 0, '\n'.join(issues)
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from wired_exchange.bitpandapro import BitPandaProClient
+from wired_exchange.ftx import FTXClient
+from wired_exchange.kucoin import KucoinSpotClient
+from wired_exchange.quotes import ConsolidatedQuotes, KucoinQuoteFeed, QuotePoller
+from wired_exchange.tests.simulator import ExchangeSimulator, SimulatorConfig
+
+NOW = 1_700_000_000_000_000_000
+
+
+def test_spread_and_arbitrage_events():
+    quotes = ConsolidatedQuotes(taker_fee_rates=dict(kucoin=0.001, ftx=0.001), min_edge_pcnt=0.1)
+    events = []
+    quotes.add_listener(events.append)
+    quotes.update('kucoin', 'BTC-USDT', 100.0, 100.2, time_ns=NOW)
+    assert [e.kind for e in events] == ['spread']
+    assert quotes.update('kucoin', 'BTC-USDT', 100.0, 100.2, time_ns=NOW) == []
+    # bids above the kucoin ask, but not by more than fees and the minimum edge
+    quotes.update('ftx', 'BTC-USDT', 100.4, 100.6, time_ns=NOW)
+    assert [e.kind for e in events] == ['spread', 'spread']
+    quotes.update('ftx', 'BTC-USDT', 101.0, 101.2, time_ns=NOW)
+    arbitrage = events[-1]
+    assert arbitrage.kind == 'arbitrage'
+    assert (arbitrage.bid_venue, arbitrage.ask_venue) == ('ftx', 'kucoin')
+    assert arbitrage.edge_pcnt == pytest.approx((101.0 * 0.999 / (100.2 * 1.001) - 1) * 100)
+    best = quotes.get_best().loc['BTC-USDT']
+    assert best['spread_pcnt'] < 0
+    # stale quotes are left out of the consolidated book
+    quotes.update('kucoin', 'ETH-USDT', 10.0, 10.1, time_ns=NOW + 60 * 1_000_000_000)
+    quotes.update('ftx', 'BTC-USDT', 101.0, 101.1, time_ns=NOW + 60 * 1_000_000_000)
+    assert quotes.get_best().loc['BTC-USDT', 'ask_venue'] == 'ftx'
+    assert len(quotes.get_book()) == 3
+
+
+def test_streamed_and_polled_quotes(monkeypatch):
+    monkeypatch.setenv('bitpanda_pro_api_key', 'key')
+
+    async def monitor(simulator: ExchangeSimulator, quotes: ConsolidatedQuotes):
+        with KucoinSpotClient('key', 'pass', 'secret', host_url=simulator.url('kucoin')) as kucoin, \
+                FTXClient('key', 'secret', host_url=simulator.url('ftx')) as ftx, \
+                BitPandaProClient('secret', host_url=simulator.url('bitpanda_pro')) as bp:
+            await kucoin.register_ticker_strategy_async(KucoinQuoteFeed(quotes, ['C0', 'C1', 'C2']))
+            pollers = [QuotePoller(quotes, ftx, 0.1), QuotePoller(quotes, bp, 0.1)]
+            tasks = [asyncio.create_task(poller.run_async()) for poller in pollers]
+            await asyncio.sleep(0.5)
+            for poller in pollers:
+                poller.stop()
+            await asyncio.gather(*tasks)
+            kucoin.stop_reading()
+
+    quotes = ConsolidatedQuotes()
+    events = []
+    quotes.add_listener(events.append)
+    with ExchangeSimulator(SimulatorConfig(tickers=5, message_rate=100)) as simulator:
+        asyncio.run(monitor(simulator, quotes))
+    book = quotes.get_book('C1-USDT')
+    assert set(book['venue']) == {'kucoin', 'ftx', 'bitpanda_pro'}
+    assert {e.venue for e in events} == {'kucoin', 'ftx', 'bitpanda_pro'}
+    assert any(e.kind == 'arbitrage' for e in events)
+
+
+def test_all_tickers_are_streamed_under_their_symbol():
+    async def monitor(simulator: ExchangeSimulator, quotes: ConsolidatedQuotes):
+        with KucoinSpotClient('key', 'pass', 'secret', host_url=simulator.url('kucoin')) as kucoin:
+            await kucoin.register_ticker_strategy_async(KucoinQuoteFeed(quotes))
+            await asyncio.sleep(0.3)
+            kucoin.stop_reading()
+
+    quotes = ConsolidatedQuotes()
+    with ExchangeSimulator(SimulatorConfig(tickers=3, message_rate=100)) as simulator:
+        asyncio.run(monitor(simulator, quotes))
+        # a client which is not opened yet opens itself
+        kucoin = KucoinSpotClient('key', 'pass', 'secret', host_url=simulator.url('kucoin'))
+        tickers = kucoin.get_book_tickers()
+        kucoin.close()
+    assert set(quotes.get_book()['symbol']) == {'C0-USDT', 'C1-USDT', 'C2-USDT'}
+    assert len(tickers) == 3
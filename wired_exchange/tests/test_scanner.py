@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+
+from wired_exchange.scanner import MarketScanner, RANK_COLUMNS, rank, to_close_matrix
+
+
+def test_empty_cache_ranks_nothing(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ranking = MarketScanner('test').scan()
+    assert len(ranking) == 0 and list(ranking.columns) == RANK_COLUMNS
+
+
+def test_rank_of_every_symbol():
+    times = pd.date_range('2022-01-01', periods=60, freq='H', tz='UTC')
+    trend = np.linspace(0.0, 1.0, len(times))
+    candles = pd.concat([pd.DataFrame(dict(time=times, base_currency=base, close=100.0 * (1 + slope * trend)))
+                         for base, slope in (('UP', 0.5), ('DOWN', -0.5))])
+    ranking = rank(to_close_matrix(candles))
+    assert list(ranking.columns) == RANK_COLUMNS
+    # the falling symbol is the most oversold
+    assert list(ranking.index) == ['DOWN', 'UP'] and ranking.at['DOWN', 'rsi'] < ranking.at['UP', 'rsi']
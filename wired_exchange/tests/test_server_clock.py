@@ -0,0 +1,109 @@
+import base64
+import hashlib
+import hmac
+import time
+from collections import Counter
+
+import httpx
+
+from wired_exchange.core.ServerClock import ServerClock
+from wired_exchange.kucoin import KucoinSpotClient, KucoinFuturesClient
+from wired_exchange.tests import payloads
+from wired_exchange.tests.test_simulator import START_TIME, END_TIME
+
+# server acceptance window of request timestamps
+WINDOW_MS = 5000
+
+
+def test_offset_is_measured_once_per_interval():
+    calls = []
+
+    def fetch() -> int:
+        calls.append(1)
+        return int(time.time() * 1000) + 60_000
+
+    clock = ServerClock(fetch, sync_interval=60)
+    assert all(abs(clock.now_ms() - int(time.time() * 1000) - 60_000) < 1000 for _ in range(10))
+    assert len(calls) == 1
+    clock.invalidate()
+    clock.now_ms()
+    assert len(calls) == 2
+
+
+def test_failed_sync_keeps_previous_offset():
+    responses = iter([int(time.time() * 1000) + 60_000])
+    clock = ServerClock(lambda: next(responses))
+    clock.sync()
+    clock.sync()
+    assert abs(clock.offset_ms - 60_000) < 1000
+
+
+def test_rejected_timestamp_is_signed_again_with_a_synced_clock():
+    server = dict(offset_ms=0)
+    requests = Counter()
+
+    def timestamp(request: httpx.Request):
+        requests['timestamp'] += 1
+        return payloads.json_response(dict(code='200000', data=int(time.time() * 1000) + server['offset_ms']))
+
+    def fills(request: httpx.Request):
+        requests['fills'] += 1
+        server_time = int(time.time() * 1000) + server['offset_ms']
+        if abs(int(request.headers['KC-API-TIMESTAMP']) - server_time) > WINDOW_MS:
+            return httpx.Response(400, json=dict(code='400002', msg='Invalid KC-API-TIMESTAMP'))
+        payload = f'{request.headers["KC-API-TIMESTAMP"]}GET{request.url.raw_path.decode("utf-8")}'
+        expected = base64.b64encode(hmac.new(b'secret', payload.encode('utf-8'), hashlib.sha256).digest())
+        assert request.headers['KC-API-SIGN'] == expected.decode('utf-8')
+        return payloads.json_response(dict(code='200000', data=dict(currentPage=1, pageSize=50, totalNum=0,
+                                                                     totalPage=1, items=[])))
+
+    kucoin = KucoinSpotClient('key', 'pass', 'secret')
+    kucoin.transport = payloads.mock_transport({'/v1/timestamp': timestamp, '/v1/fills': fills})
+    with kucoin.open():
+        assert len(kucoin.get_transactions(START_TIME, END_TIME)) == 0
+        # server clock drifts away from the measured offset
+        server['offset_ms'] = 60_000
+        assert len(kucoin.get_transactions(START_TIME, END_TIME)) == 0
+    assert requests == {'timestamp': 2, 'fills': 3}
+
+
+def test_every_signed_request_is_signed_again_once_rejected():
+    server = dict(offset_ms=0)
+    requests = Counter()
+
+    def timestamp(request: httpx.Request):
+        requests['timestamp'] += 1
+        return payloads.json_response(dict(code='200000', data=int(time.time() * 1000) + server['offset_ms']))
+
+    def signed(request: httpx.Request):
+        requests[request.url.path] += 1
+        server_time = int(time.time() * 1000) + server['offset_ms']
+        if abs(int(request.headers['KC-API-TIMESTAMP']) - server_time) > WINDOW_MS:
+            return httpx.Response(400, json=dict(code='400002', msg='Invalid KC-API-TIMESTAMP'))
+        return payloads.json_response(dict(code='200000', data=[]))
+
+    kucoin = KucoinSpotClient('key', 'pass', 'secret')
+    futures = KucoinFuturesClient('key', 'pass', 'secret')
+    for client in (kucoin, futures):
+        client.transport = payloads.mock_transport({'/v1/timestamp': timestamp, '/v1/accounts': signed,
+                                                    '/v1/positions': signed})
+    with kucoin.open(), futures.open():
+        for _ in range(2):
+            assert kucoin.get_accounts().size == 0 and futures.get_positions().size == 0
+            # server clock drifts away from the measured offsets
+            server['offset_ms'] = 60_000
+    assert requests == {'timestamp': 4, '/api/v1/accounts': 3, '/api/v1/positions': 3}
+
+
+def test_signing_context_is_built_once():
+    kucoin = KucoinSpotClient('key', 'pass', 'secret')
+    kucoin.transport = payloads.mock_transport({'/v1/timestamp': dict(code='200000',
+                                                                      data=int(time.time() * 1000))})
+    with kucoin.open():
+        first, second = (kucoin._httpClient.build_request('GET', '/v1/accounts') for _ in range(2))
+        kucoin._authenticate(first)
+        signer = kucoin._authenticator._hmac
+        kucoin._authenticate(second)
+    assert kucoin._authenticator._hmac is signer
+    passphrase = base64.b64encode(hmac.new(b'secret', b'pass', hashlib.sha256).digest()).decode('utf-8')
+    assert second.headers['KC-API-PASSPHRASE'] == passphrase and second.headers['KC-API-KEY-VERSION'] == '2'
@@ -0,0 +1,78 @@
+import asyncio
+import importlib
+
+import pandas as pd
+
+from wired_exchange.bitpandapro import BitPandaProClient
+from wired_exchange.ftx import FTXClient
+from wired_exchange.kucoin import KucoinSpotClient
+from wired_exchange.tests import payloads
+from wired_exchange.tests.simulator import ExchangeSimulator, SimulatorConfig
+
+START_TIME = pd.Timestamp(payloads.START_TIME_MS, unit='ms', tz='UTC').to_pydatetime()
+END_TIME = START_TIME + pd.Timedelta(days=1).to_pytimedelta()
+# the package exports the client class under its module name
+kucoin_module = importlib.import_module('wired_exchange.kucoin.KucoinSpotClient')
+
+
+def test_kucoin_pages():
+    with ExchangeSimulator(SimulatorConfig(pages=4, page_size=100)) as simulator:
+        with KucoinSpotClient('key', 'pass', 'secret', host_url=simulator.url('kucoin')) as kucoin:
+            transactions = kucoin.get_transactions(START_TIME, END_TIME)
+        assert len(transactions) == 400
+        assert simulator.requests[('kucoin', '/v1/fills')] == 4
+
+
+def test_kucoin_retries_throttled_requests(monkeypatch):
+    monkeypatch.setattr(kucoin_module, 'RATE_LIMIT_DELAY', 0.01)
+    config = SimulatorConfig(pages=5, page_size=100, throttle_every=2, throttle_length=1)
+    with ExchangeSimulator(config) as simulator:
+        with KucoinSpotClient('key', 'pass', 'secret', host_url=simulator.url('kucoin')) as kucoin:
+            transactions = kucoin.get_transactions(START_TIME, END_TIME)
+        assert len(transactions) == 500
+        assert simulator.throttled > 0
+        assert simulator.requests[('kucoin', '/v1/fills')] == 5 + simulator.throttled
+
+
+def test_ftx_and_bitpanda_pages(monkeypatch):
+    # BitPanda Pro bearer token is read from the environment
+    monkeypatch.setenv('bitpanda_pro_api_key', 'key')
+    with ExchangeSimulator(SimulatorConfig(pages=3, page_size=100)) as simulator:
+        with FTXClient('key', 'secret', host_url=simulator.url('ftx')) as ftx:
+            assert len(ftx.get_transactions()) == 300
+        with BitPandaProClient('secret', host_url=simulator.url('bitpanda_pro')) as bp:
+            assert len(bp.get_transactions()) == 300
+        # the oldest fill of a page is the inclusive end of the next one, the last page only holds its seen fill
+        assert simulator.requests[('ftx', '/fills')] == 4
+
+
+class _TickerCounter:
+    tickers = [('BTC', 'USDT'), ('ETH', 'USDT')]
+
+    def __init__(self):
+        self.count = 0
+
+    def can_handle(self, message: str) -> bool:
+        return '"subject":"trade.ticker"' in message
+
+    def handle(self, message: str) -> bool:
+        self.count += 1
+        return True
+
+    def on_notification(self, notification):
+        pass
+
+
+def test_kucoin_websocket_feed():
+    async def stream(url: str) -> int:
+        strategy = _TickerCounter()
+        with KucoinSpotClient('key', 'pass', 'secret', host_url=url) as kucoin:
+            await kucoin.register_ticker_strategy_async(strategy)
+            await asyncio.sleep(0.5)
+            kucoin.stop_reading()
+        return strategy.count
+
+    with ExchangeSimulator(SimulatorConfig(message_rate=100)) as simulator:
+        count = asyncio.run(stream(simulator.url('kucoin')))
+        assert count >= 20
+        assert simulator.connections == 1
@@ -0,0 +1,40 @@
+import pandas as pd
+
+from wired_exchange.storage import WiredStorage
+
+T0 = pd.Timestamp('2022-01-01', tz='UTC')
+
+
+def _orders(*orders) -> pd.DataFrame:
+    """orders as (id, status, minutes after T0)"""
+    return pd.DataFrame([dict(id=f'kucoin_{order_id}', base_currency='BTC', quote_currency='USDT', type='limit',
+                              side='buy', price=100.0, size=1.0, status=status, platform='kucoin',
+                              time=T0 + pd.Timedelta(minutes=minutes)) for order_id, status, minutes in orders])
+
+
+def test_orders_sync_time_follows_the_oldest_open_order(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with WiredStorage('test') as db:
+        assert db.read_orders_sync_time('kucoin') is None
+        db.save_orders('kucoin', _orders(('1', 'FILLED', 0), ('2', 'NEW', 10), ('3', 'FILLED', 20)))
+        assert db.read_orders_sync_time('kucoin') == T0 + pd.Timedelta(minutes=10)
+        # the refresh from sync time brings the new status of order 2, later on it is no longer fetched
+        db.save_orders('kucoin', _orders(('2', 'CANCELED', 10), ('3', 'FILLED', 20)),
+                       since=T0 + pd.Timedelta(minutes=10))
+        assert db.read_orders_sync_time('kucoin') == T0 + pd.Timedelta(minutes=20)
+        orders = db.read_orders('kucoin')
+        assert list(orders['id']) == ['kucoin_3', 'kucoin_2', 'kucoin_1']
+        assert list(orders['status']) == ['FILLED', 'CANCELED', 'FILLED']
+        assert len(db.read_orders('kucoin', open_only=True)) == 0
+
+
+def test_open_orders_missing_from_a_refresh_are_removed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with WiredStorage('test') as db:
+        db.save_orders('kucoin', _orders(('1', 'NEW', 0), ('2', 'NEW', 10)))
+        db.save_orders('kucoin', _orders(('b1', 'NEW', 0)), account='bot')
+        # order 2 was cancelled and discarded by the exchange, order 1 is older than the refresh
+        db.save_orders('kucoin', _orders(('3', 'NEW', 20)), since=T0 + pd.Timedelta(minutes=5))
+        assert set(db.read_orders('kucoin', open_only=True)['id']) == {'kucoin_1', 'kucoin_3', 'kucoin_b1'}
+        assert list(db.read_orders(account='bot')['id']) == ['kucoin_b1']
+        assert db.read_orders_sync_time('kucoin', 'bot') == T0
@@ -0,0 +1,32 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from wired_exchange.core import from_timestamp, to_timestamp_in_milliseconds, to_isoformat
+from wired_exchange.core.times import to_epoch, to_epoch_ns, to_utc_datetimes
+
+NEW_YEAR_MS = 1640995200000
+
+
+def test_scalar_conversions_are_utc_and_exact():
+    aware = datetime(2022, 1, 1, 0, 0, 0, 123456, tzinfo=timezone.utc)
+    assert to_timestamp_in_milliseconds(aware) == NEW_YEAR_MS + 123
+    assert from_timestamp(NEW_YEAR_MS + 123, 'ms') == datetime(2022, 1, 1, 0, 0, 0, 123000, tzinfo=timezone.utc)
+    assert to_isoformat(NEW_YEAR_MS // 1000, 's') == '2022-01-01T00:00:00+00:00'
+    # naive datetimes are UTC
+    assert to_epoch(datetime(2022, 1, 1), 'ms') == NEW_YEAR_MS
+    assert to_epoch('2022-01-01T01:00:00+01:00', 'ms') == NEW_YEAR_MS
+    assert to_epoch_ns(pd.Timestamp(NEW_YEAR_MS * 1_000_000 + 7, tz='UTC')) == NEW_YEAR_MS * 1_000_000 + 7
+    assert to_epoch_ns(np.datetime64('2022-01-01')) == NEW_YEAR_MS * 1_000_000
+
+
+def test_column_conversions():
+    expected = pd.Series(pd.to_datetime([NEW_YEAR_MS + 123, None, NEW_YEAR_MS], unit='ms', utc=True))
+    # missing values turn epoch milliseconds into floats, they still convert exactly
+    pd.testing.assert_series_equal(to_utc_datetimes(pd.Series([NEW_YEAR_MS + 123, None, str(NEW_YEAR_MS)]), 'ms'),
+                                   expected)
+    pd.testing.assert_series_equal(to_utc_datetimes(pd.Series(['2022-01-01T00:00:00.123Z', None,
+                                                               '2022-01-01T01:00:00+01:00'])), expected)
+    local = pd.Series(pd.date_range('2022-01-01 01:00', periods=1, tz='Europe/Paris'))
+    assert to_utc_datetimes(local).iat[0] == expected.iat[2]